@@ -0,0 +1,492 @@
+/**
+ * Dashboard performance benchmark
+ *
+ * Serves the dashboard from this directory, points it at the in-process fake
+ * HA (fake-ha.js) and measures, in Chromium with tablet-class CPU throttling:
+ *
+ *   - time to interactive of the initial load and of every view: the view is
+ *     visible and the main thread has had no long task for --quiet ms
+ *   - per view, over a --steady window of live state changes: websocket
+ *     messages, DOM mutation batches ("re-renders") and mutations per state
+ *     change, layouts, style recalcs and script time per second
+ *   - with --soak, heap / DOM node / listener growth over a long session,
+ *     sampled after a forced GC, as a slope per hour and per 1000 state
+ *     changes; growth above the thresholds is reported as a leak
+ *
+ * Requests to HA and other LAN hosts get an immediate 503 so nothing real is
+ * touched; CDN scripts load normally unless --offline.
+ *
+ * Usage:
+ *   node perf/dashboard-bench.js                          # all views of index.html
+ *   node perf/dashboard-bench.js --page mobile.html --views home,energy
+ *   node perf/dashboard-bench.js --soak 60 --rate-scale 10 --soak-cycle
+ *   node perf/dashboard-bench.js --history history.json   # replay real HA history
+ *   node perf/dashboard-bench.js --save                   # store as baseline
+ *   node perf/dashboard-bench.js --compare                # exit 1 on regression/leak
+ *
+ * Needs: npm install && npx playwright install chromium
+ */
+
+const fs = require('fs');
+const http = require('http');
+const path = require('path');
+const { parseArgs } = require('util');
+const { FakeHA } = require('./fake-ha');
+
+const DASHBOARD_DIR = path.join(__dirname, '..');
+const BASE_PATH = '/local/dashboard/';
+const BASELINE_FILE = path.join(__dirname, 'baseline.json');
+
+// Regression if slower by both the ratio and the absolute amount
+const TTI_REGRESSION = [1.20, 100];         // ms
+const SCRIPT_REGRESSION = [1.25, 20];       // script ms per second of steady state
+// Soak growth reported as a leak
+const LEAK_HEAP_MB_PER_HOUR = 5;
+const LEAK_NODES_PER_HOUR = 1000;
+const LEAK_LISTENERS_PER_HOUR = 200;
+
+const CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.webp': 'image/webp',
+    '.woff2': 'font/woff2',
+};
+
+// Runs in the page before any dashboard script
+const INIT_SCRIPT = () => {
+    localStorage.setItem('ha_token', 'perf-token');
+
+    const perf = window.__perf = {
+        mutations: 0, renderPasses: 0,
+        longTasks: 0, longTaskMs: 0, lastBusy: 0,
+        statesAt: null,
+    };
+
+    new PerformanceObserver((list) => {
+        for (const entry of list.getEntries()) {
+            perf.longTasks++;
+            perf.longTaskMs += entry.duration;
+            perf.lastBusy = Math.max(perf.lastBusy, entry.startTime + entry.duration);
+        }
+    }).observe({ type: 'longtask', buffered: true });
+
+    new MutationObserver((records) => {
+        perf.renderPasses++;
+        perf.mutations += records.length;
+    }).observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+
+    // Note when the first get_states result arrives (the dashboard's data-ready point)
+    const NativeWebSocket = window.WebSocket;
+    window.WebSocket = class extends NativeWebSocket {
+        constructor(...args) {
+            super(...args);
+            this.addEventListener('message', (event) => {
+                if (perf.statesAt === null && typeof event.data === 'string' && event.data.includes('"result":[')) {
+                    perf.statesAt = performance.now();
+                }
+            });
+        }
+    };
+
+    // Resolve with ms from t0 to interactive: ready() holds and no long task
+    // has run for quietMs since it started holding
+    perf.interactive = (kind, name, t0, quietMs, timeoutMs) => new Promise((resolve) => {
+        let readyAt = null;
+        const ready = () => {
+            if (kind === 'load') return perf.statesAt !== null;
+            const el = document.getElementById(`view-${name}`);
+            return !!el && !el.classList.contains('hidden') && el.getClientRects().length > 0;
+        };
+        const check = () => {
+            const now = performance.now();
+            if (readyAt === null && ready()) readyAt = kind === 'load' ? perf.statesAt : now;
+            if (readyAt !== null) {
+                const busy = Math.max(readyAt, perf.lastBusy);
+                if (now - busy >= quietMs) return resolve(busy - t0);
+            }
+            if (now - t0 > timeoutMs) return resolve(null);
+            setTimeout(check, 25);
+        };
+        check();
+    });
+};
+
+// ============================================
+// HELPERS
+// ============================================
+
+function loadPlaywright() {
+    try {
+        return require('playwright');
+    } catch (e) {
+        console.error('playwright is not installed: npm install && npx playwright install chromium');
+        process.exit(2);
+    }
+}
+
+function staticServer() {
+    const server = http.createServer((req, res) => {
+        const url = new URL(req.url, 'http://localhost');
+        if (!url.pathname.startsWith(BASE_PATH)) {
+            res.writeHead(404);
+            return res.end();
+        }
+        const file = path.join(DASHBOARD_DIR, decodeURIComponent(url.pathname.slice(BASE_PATH.length)));
+        if (!file.startsWith(DASHBOARD_DIR)) {
+            res.writeHead(403);
+            return res.end();
+        }
+        fs.readFile(file, (err, data) => {
+            if (err) {
+                res.writeHead(404);
+                return res.end();
+            }
+            res.writeHead(200, {
+                'Content-Type': CONTENT_TYPES[path.extname(file)] || 'application/octet-stream',
+                'Cache-Control': 'no-cache',
+            });
+            res.end(data);
+        });
+    });
+    return new Promise(resolve => server.listen(0, '127.0.0.1', () => resolve(server)));
+}
+
+function isPrivateHost(hostname) {
+    return /^(localhost|127\.|10\.|192\.168\.|172\.(1[6-9]|2\d|3[01])\.)/.test(hostname)
+        || hostname.endsWith('.local') || hostname.endsWith('.nabu.casa');
+}
+
+async function cdpMetrics(cdp) {
+    const { metrics } = await cdp.send('Performance.getMetrics');
+    const out = {};
+    for (const { name, value } of metrics) out[name] = value;
+    return out;
+}
+
+async function counters(page, cdp, ha, gc = false) {
+    if (gc) await cdp.send('HeapProfiler.collectGarbage');
+    const metrics = await cdpMetrics(cdp);
+    const inPage = await page.evaluate(() => {
+        const { mutations, renderPasses, longTasks, longTaskMs } = window.__perf;
+        return { t: performance.now(), mutations, renderPasses, longTasks, longTaskMs };
+    });
+    return {
+        heapMB: metrics.JSHeapUsedSize / 1048576,
+        nodes: metrics.Nodes,
+        listeners: metrics.JSEventListeners,
+        layouts: metrics.LayoutCount,
+        styleRecalcs: metrics.RecalcStyleCount,
+        scriptMs: metrics.ScriptDuration * 1000,
+        taskMs: metrics.TaskDuration * 1000,
+        ...inPage,
+        ...ha.snapshot(),
+    };
+}
+
+function delta(before, after) {
+    const out = {};
+    for (const key of Object.keys(after)) {
+        if (typeof after[key] === 'number' && typeof before[key] === 'number') out[key] = after[key] - before[key];
+    }
+    return out;
+}
+
+/** Least-squares slope of ys over xs. */
+function slope(xs, ys) {
+    const n = xs.length;
+    if (n < 2) return 0;
+    const mx = xs.reduce((a, b) => a + b, 0) / n;
+    const my = ys.reduce((a, b) => a + b, 0) / n;
+    let num = 0;
+    let den = 0;
+    for (let i = 0; i < n; i++) {
+        num += (xs[i] - mx) * (ys[i] - my);
+        den += (xs[i] - mx) ** 2;
+    }
+    return den ? num / den : 0;
+}
+
+const round = (value, digits = 1) => value === null ? null : Number(value.toFixed(digits));
+
+// ============================================
+// MEASUREMENTS
+// ============================================
+
+async function viewNames(page, pageName) {
+    if (pageName === 'index.html') {
+        return page.evaluate(async (base) => {
+            const registry = await import(`${base}js/view-registry.js`);
+            return registry.getViewNames();
+        }, BASE_PATH);
+    }
+    return page.evaluate(() => [...document.querySelectorAll('.view[id^="view-"]')].map(el => el.id.slice(5)));
+}
+
+async function measureView(page, cdp, ha, name, opts) {
+    const before = await counters(page, cdp, ha);
+    const t0 = await page.evaluate((view) => {
+        const t = performance.now();
+        (window.dashboard || window.mobile).showView(view);
+        return t;
+    }, name);
+    const tti = await page.evaluate(
+        ({ view, start, quiet, timeout }) => window.__perf.interactive('view', view, start, quiet, timeout),
+        { view: name, start: t0, quiet: opts.quiet, timeout: opts.timeout });
+    const shown = await counters(page, cdp, ha);
+
+    await page.waitForTimeout(opts.steady * 1000);
+    const after = await counters(page, cdp, ha);
+
+    const sw = delta(before, shown);
+    const steady = delta(shown, after);
+    const seconds = steady.t / 1000;
+    return {
+        tti_ms: round(tti),
+        switch: { mutations: sw.mutations, renderPasses: sw.renderPasses, layouts: sw.layouts, nodes: sw.nodes },
+        steady: {
+            seconds: round(seconds),
+            stateChanges: steady.stateChanges,
+            wsMessagesPerSec: round(steady.messagesOut / seconds),
+            wsKBPerSec: round(steady.bytesOut / 1024 / seconds),
+            renderPassesPerSec: round(steady.renderPasses / seconds),
+            mutationsPerChange: steady.stateChanges ? round(steady.mutations / steady.stateChanges, 2) : null,
+            layoutsPerSec: round(steady.layouts / seconds, 2),
+            styleRecalcsPerSec: round(steady.styleRecalcs / seconds, 2),
+            scriptMsPerSec: round(steady.scriptMs / seconds),
+            longTasks: steady.longTasks,
+        },
+        heapMB: round(after.heapMB),
+        nodes: after.nodes,
+    };
+}
+
+async function soak(page, cdp, ha, views, opts) {
+    const samples = [];
+    const end = Date.now() + opts.soak * 60000;
+    let next = 0;
+    console.log(`Soak: ${opts.soak} min, sample every ${opts.sample}s` +
+                (opts.soakCycle ? `, cycling ${views.length} views` : ` on ${views[0]}`));
+    await page.evaluate(view => (window.dashboard || window.mobile).showView(view), views[0]);
+
+    while (true) {
+        const sample = await counters(page, cdp, ha, true);
+        samples.push(sample);
+        process.stdout.write(`  ${((sample.t - samples[0].t) / 60000).toFixed(1)} min  heap ${sample.heapMB.toFixed(1)} MB  ` +
+                             `nodes ${sample.nodes}  listeners ${sample.listeners}\n`);
+        if (Date.now() >= end) break;
+        const deadline = Date.now() + opts.sample * 1000;
+        if (opts.soakCycle) {
+            // Walk the views so per-view setup/teardown leaks accumulate
+            while (Date.now() < deadline) {
+                next = (next + 1) % views.length;
+                await page.evaluate(view => (window.dashboard || window.mobile).showView(view), views[next]);
+                await page.waitForTimeout(Math.min(5000, Math.max(0, deadline - Date.now())));
+            }
+        } else {
+            await page.waitForTimeout(opts.sample * 1000);
+        }
+    }
+
+    // The first sample still includes start-up allocations; fit from the second
+    const fit = samples.length > 2 ? samples.slice(1) : samples;
+    const hours = fit.map(s => s.t / 3600000);
+    const changes = fit.map(s => s.stateChanges / 1000);
+    const first = fit[0];
+    const last = fit[fit.length - 1];
+    const result = {
+        minutes: round((last.t - samples[0].t) / 60000),
+        samples: samples.length,
+        stateChanges: last.stateChanges - samples[0].stateChanges,
+        heapMB: { start: round(first.heapMB), end: round(last.heapMB), perHour: round(slope(hours, fit.map(s => s.heapMB)), 2),
+                  perThousandChanges: round(slope(changes, fit.map(s => s.heapMB)), 3) },
+        nodes: { start: first.nodes, end: last.nodes, perHour: round(slope(hours, fit.map(s => s.nodes))) },
+        listeners: { start: first.listeners, end: last.listeners, perHour: round(slope(hours, fit.map(s => s.listeners))) },
+        series: samples.map(s => ({ t: round((s.t - samples[0].t) / 1000), heapMB: round(s.heapMB, 2), nodes: s.nodes,
+                                    listeners: s.listeners, stateChanges: s.stateChanges })),
+    };
+    result.leaks = [];
+    if (result.heapMB.perHour > opts.leakHeap) result.leaks.push(`heap +${result.heapMB.perHour} MB/h`);
+    if (result.nodes.perHour > LEAK_NODES_PER_HOUR) result.leaks.push(`DOM nodes +${result.nodes.perHour}/h`);
+    if (result.listeners.perHour > LEAK_LISTENERS_PER_HOUR) result.leaks.push(`listeners +${result.listeners.perHour}/h`);
+    return result;
+}
+
+// ============================================
+// REPORTING
+// ============================================
+
+function printReport(report) {
+    console.log(`\n${report.page}: ${report.entities} entities, ~${report.changeRate} state changes/s, ` +
+                `CPU throttle ${report.cpuThrottle}x`);
+    console.log(`Initial load: interactive in ${report.load.tti_ms} ms, ${report.load.wsMessages} ws messages ` +
+                `(${report.load.wsKB} KB), heap ${report.load.heapMB} MB, ${report.load.nodes} nodes\n`);
+    console.log('View             TTI ms  msg/s  renders/s  mut/change  layouts/s  script ms/s  long tasks');
+    for (const [name, v] of Object.entries(report.views)) {
+        const s = v.steady;
+        console.log(`${name.padEnd(15)} ${String(v.tti_ms ?? 'timeout').padStart(7)} ${String(s.wsMessagesPerSec).padStart(6)} ` +
+                    `${String(s.renderPassesPerSec).padStart(10)} ${String(s.mutationsPerChange ?? '-').padStart(11)} ` +
+                    `${String(s.layoutsPerSec).padStart(10)} ${String(s.scriptMsPerSec).padStart(12)} ${String(s.longTasks).padStart(11)}`);
+    }
+    if (report.soak) {
+        const s = report.soak;
+        console.log(`\nSoak ${s.minutes} min, ${s.stateChanges} state changes: heap ${s.heapMB.start} -> ${s.heapMB.end} MB ` +
+                    `(${s.heapMB.perHour} MB/h, ${s.heapMB.perThousandChanges} MB per 1000 changes), ` +
+                    `nodes ${s.nodes.perHour}/h, listeners ${s.listeners.perHour}/h`);
+        if (s.leaks.length) console.log(`LEAK: ${s.leaks.join(', ')}`);
+    }
+}
+
+function compare(report, baseline) {
+    const problems = [];
+    const check = (label, now, then, [ratio, absolute], unit) => {
+        if (now === null || then === null || now === undefined || then === undefined) return;
+        if (now > then * ratio && now - then > absolute) {
+            problems.push(`${label}: ${then} -> ${now} ${unit}`);
+        }
+    };
+    check('initial load TTI', report.load.tti_ms, baseline.load?.tti_ms, TTI_REGRESSION, 'ms');
+    for (const [name, view] of Object.entries(report.views)) {
+        const old = baseline.views?.[name];
+        if (!old) continue;
+        check(`${name} TTI`, view.tti_ms, old.tti_ms, TTI_REGRESSION, 'ms');
+        check(`${name} script time`, view.steady.scriptMsPerSec, old.steady.scriptMsPerSec, SCRIPT_REGRESSION, 'ms/s');
+    }
+    return problems;
+}
+
+// ============================================
+// MAIN
+// ============================================
+
+async function main() {
+    const { values: args } = parseArgs({
+        options: {
+            page: { type: 'string', default: 'index.html' },
+            views: { type: 'string' },
+            quiet: { type: 'string', default: '1000' },
+            timeout: { type: 'string', default: '30000' },
+            steady: { type: 'string', default: '10' },
+            soak: { type: 'string', default: '0' },
+            sample: { type: 'string', default: '30' },
+            'soak-cycle': { type: 'boolean', default: false },
+            'leak-heap': { type: 'string', default: String(LEAK_HEAP_MB_PER_HOUR) },
+            filler: { type: 'string', default: '600' },
+            'rate-scale': { type: 'string', default: '1' },
+            history: { type: 'string' },
+            'cpu-throttle': { type: 'string', default: '4' },
+            viewport: { type: 'string', default: '1280x800' },
+            offline: { type: 'boolean', default: false },
+            headed: { type: 'boolean', default: false },
+            out: { type: 'string' },
+            save: { type: 'boolean', default: false },
+            compare: { type: 'boolean', default: false },
+            baseline: { type: 'string', default: BASELINE_FILE },
+            help: { type: 'boolean', short: 'h', default: false },
+        },
+    });
+    if (args.help) {
+        console.log(fs.readFileSync(__filename, 'utf8').match(/\/\*\*([\s\S]*?)\*\//)[1].replace(/^ \* ?/gm, ''));
+        return 0;
+    }
+    const opts = {
+        quiet: Number(args.quiet), timeout: Number(args.timeout), steady: Number(args.steady),
+        soak: Number(args.soak), sample: Number(args.sample), soakCycle: args['soak-cycle'],
+        leakHeap: Number(args['leak-heap']),
+    };
+    const cpuThrottle = Number(args['cpu-throttle']);
+    const [width, height] = args.viewport.split('x').map(Number);
+
+    const { chromium } = loadPlaywright();
+    const ha = new FakeHA({ filler: Number(args.filler), rateScale: Number(args['rate-scale']), history: args.history });
+    const server = await staticServer();
+    const origin = `http://127.0.0.1:${server.address().port}`;
+    const browser = await chromium.launch({ headless: !args.headed });
+
+    let exitCode = 0;
+    try {
+        const context = await browser.newContext({ viewport: { width, height } });
+        await context.routeWebSocket(/\/api\/websocket$/, route => ha.attach(route));
+        await context.route(url => url.origin !== origin && (args.offline || isPrivateHost(url.hostname)),
+                            route => route.fulfill({ status: 503, body: '' }));
+        await context.addInitScript(INIT_SCRIPT);
+
+        const page = await context.newPage();
+        const errors = [];
+        page.on('pageerror', err => errors.push(err.message));
+        const cdp = await context.newCDPSession(page);
+        await cdp.send('Performance.enable');
+        if (cpuThrottle > 1) await cdp.send('Emulation.setCPUThrottlingRate', { rate: cpuThrottle });
+
+        ha.start();
+        await page.goto(`${origin}${BASE_PATH}${args.page}`, { waitUntil: 'commit' });
+        const loadTti = await page.evaluate(
+            ({ quiet, timeout }) => window.__perf.interactive('load', null, 0, quiet, timeout),
+            { quiet: opts.quiet, timeout: opts.timeout });
+        const loaded = await counters(page, cdp, ha);
+
+        const report = {
+            page: args.page,
+            date: new Date().toISOString(),
+            entities: ha.entityCount,
+            changeRate: round(ha.changeRate),
+            cpuThrottle,
+            viewport: args.viewport,
+            load: {
+                tti_ms: round(loadTti),
+                wsMessages: loaded.messagesOut + loaded.messagesIn,
+                wsKB: round((loaded.bytesOut + loaded.bytesIn) / 1024),
+                heapMB: round(loaded.heapMB),
+                nodes: loaded.nodes,
+                longTasks: loaded.longTasks,
+            },
+            views: {},
+        };
+
+        const views = args.views ? args.views.split(',') : await viewNames(page, args.page);
+        for (const name of views) {
+            process.stdout.write(`Measuring ${name}...\n`);
+            report.views[name] = await measureView(page, cdp, ha, name, opts);
+        }
+        if (opts.soak > 0) report.soak = await soak(page, cdp, ha, views, opts);
+        report.pageErrors = [...new Set(errors)];
+
+        printReport(report);
+        if (report.pageErrors.length) console.log(`\n${report.pageErrors.length} distinct page errors (see JSON output)`);
+        if (report.soak && report.soak.leaks.length) exitCode = 1;
+
+        if (args.out) {
+            fs.writeFileSync(args.out, JSON.stringify(report, null, 2));
+            console.log(`\nWrote ${args.out}`);
+        }
+        if (args.compare) {
+            if (!fs.existsSync(args.baseline)) {
+                console.log(`\nNo baseline at ${args.baseline}`);
+            } else {
+                const problems = compare(report, JSON.parse(fs.readFileSync(args.baseline, 'utf8')));
+                console.log(problems.length ? `\nREGRESSIONS:\n  ${problems.join('\n  ')}` : '\nNo regressions against baseline');
+                if (problems.length) exitCode = 1;
+            }
+        }
+        if (args.save) {
+            const { series, ...soakSummary } = report.soak || {};
+            fs.writeFileSync(args.baseline, JSON.stringify({ ...report, soak: report.soak ? soakSummary : undefined }, null, 2));
+            console.log(`\nSaved baseline ${args.baseline}`);
+        }
+    } finally {
+        ha.stop();
+        await browser.close();
+        server.close();
+    }
+    return exitCode;
+}
+
+main().then(code => process.exit(code), err => {
+    console.error(err);
+    process.exit(2);
+});
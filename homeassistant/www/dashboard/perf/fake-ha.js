@@ -0,0 +1,407 @@
+/**
+ * Fake Home Assistant for the dashboard performance harness
+ *
+ * Speaks enough of HA's websocket API for the dashboards (auth, get_states,
+ * subscribe_events, call_service, history/history_during_period) and keeps a
+ * realistic entity set changing at a realistic rate:
+ *
+ *   - every entity the dashboard source refers to (scanned from js/, src/,
+ *     views/, modals/ and the HTML entry points), with plausible states,
+ *     plus --filler sensors the dashboard never shows but still receives,
+ *     since it subscribes to every state_changed event
+ *   - update periods by kind: inverter power/voltage every few seconds,
+ *     temperatures every minute, motion sensors toggling, phones rarely
+ *
+ * Or, with a history file (the output of HA's /api/history/period), the
+ * initial states and the exact sequence of changes are replayed instead.
+ *
+ * Used in-process by dashboard-bench.js through Playwright's routeWebSocket,
+ * so no websocket server or extra dependency is needed.
+ */
+
+const fs = require('fs');
+const path = require('path');
+
+const DASHBOARD_DIR = path.join(__dirname, '..');
+const SCAN_DIRS = ['js', 'src', 'views', 'modals'];
+const SCAN_FILES = ['index.html', 'mobile.html', 'family-status.html'];
+const ENTITY_RE = /\b(light|switch|sensor|binary_sensor|input_boolean|input_select|input_number|input_datetime|input_text|climate|cover|lock|camera|alarm_control_panel|media_player|person|device_tracker|weather|fan|automation|script|select|number|vacuum|update)\.[a-z0-9_]+\b/g;
+const HA_VERSION = '2025.12.0';
+
+// Seconds between updates by entity kind (jittered per entity)
+const UPDATE_PERIODS = [
+    [/^sensor\.filler_/, 60],
+    [/_(power|current|frequency)$|_pv\d?_|_smoothed$/, 5],
+    [/_voltage$/, 10],
+    [/temperature|humidity|_data_age$/, 60],
+    [/^binary_sensor\..*(motion|occupancy|person|presence)/, 45],
+    [/^binary_sensor\./, 600],
+    [/battery/, 300],
+    [/^(light|switch|input_boolean|cover|lock|fan)\./, 900],
+];
+const DEFAULT_PERIOD = 1800;
+
+// ============================================
+// ENTITY SET
+// ============================================
+
+function walk(dir, out) {
+    for (const name of fs.readdirSync(dir)) {
+        const full = path.join(dir, name);
+        if (fs.statSync(full).isDirectory()) walk(full, out);
+        else if (/\.(js|html)$/.test(name)) out.push(full);
+    }
+    return out;
+}
+
+function scanEntityIds() {
+    const files = [];
+    for (const dir of SCAN_DIRS) {
+        const full = path.join(DASHBOARD_DIR, dir);
+        if (fs.existsSync(full)) walk(full, files);
+    }
+    for (const name of SCAN_FILES) {
+        const full = path.join(DASHBOARD_DIR, name);
+        if (fs.existsSync(full)) files.push(full);
+    }
+    const ids = new Set();
+    for (const file of files) {
+        for (const match of fs.readFileSync(file, 'utf8').matchAll(ENTITY_RE)) ids.add(match[0]);
+    }
+    return [...ids].sort();
+}
+
+function friendlyName(entityId) {
+    const name = entityId.split('.')[1].replace(/_/g, ' ');
+    return name.charAt(0).toUpperCase() + name.slice(1);
+}
+
+function sensorShape(entityId) {
+    if (/_power$|_pv\d?_power|_smoothed$/.test(entityId)) return { unit: 'W', min: 0, max: 5000, decimals: 0 };
+    if (/voltage/.test(entityId)) return { unit: 'V', min: 225, max: 245, decimals: 1 };
+    if (/current/.test(entityId)) return { unit: 'A', min: 0, max: 20, decimals: 1 };
+    if (/frequency/.test(entityId)) return { unit: 'Hz', min: 49.9, max: 50.1, decimals: 2 };
+    if (/temperature/.test(entityId)) return { unit: '°C', min: 12, max: 35, decimals: 1 };
+    if (/humidity/.test(entityId)) return { unit: '%', min: 30, max: 80, decimals: 0 };
+    if (/battery/.test(entityId)) return { unit: '%', min: 20, max: 100, decimals: 0 };
+    if (/energy/.test(entityId)) return { unit: 'kWh', min: 0, max: 40, decimals: 2 };
+    if (/steps|floors|distance/.test(entityId)) return { unit: '', min: 0, max: 12000, decimals: 0 };
+    return null;
+}
+
+function initialState(entityId, rng) {
+    const domain = entityId.split('.')[0];
+    const attributes = { friendly_name: friendlyName(entityId) };
+    let value;
+    switch (domain) {
+        case 'light':
+            value = rng() < 0.3 ? 'on' : 'off';
+            attributes.brightness = value === 'on' ? Math.round(rng() * 255) : null;
+            attributes.supported_color_modes = ['brightness'];
+            break;
+        case 'switch': case 'input_boolean': case 'fan': case 'automation':
+            value = rng() < 0.3 ? 'on' : 'off';
+            break;
+        case 'binary_sensor':
+            value = 'off';
+            break;
+        case 'cover':
+            value = 'closed';
+            break;
+        case 'lock':
+            value = 'locked';
+            break;
+        case 'person': case 'device_tracker':
+            value = 'home';
+            break;
+        case 'alarm_control_panel':
+            value = 'disarmed';
+            break;
+        case 'camera':
+            value = 'idle';
+            attributes.access_token = 'perf';
+            break;
+        case 'media_player':
+            value = 'off';
+            break;
+        case 'weather':
+            value = 'sunny';
+            Object.assign(attributes, { temperature: 24, humidity: 50, pressure: 1015, wind_speed: 12 });
+            break;
+        case 'input_select': case 'select':
+            value = 'off';
+            attributes.options = ['off', 'outside', 'stay', 'away'];
+            break;
+        case 'input_number': case 'number':
+            value = '50';
+            Object.assign(attributes, { min: 0, max: 100, step: 1 });
+            break;
+        default: {
+            const shape = sensorShape(entityId);
+            if (shape) {
+                value = (shape.min + rng() * (shape.max - shape.min)).toFixed(shape.decimals);
+                if (shape.unit) attributes.unit_of_measurement = shape.unit;
+            } else {
+                value = 'unknown';
+            }
+        }
+    }
+    return { state: value, attributes };
+}
+
+function nextValue(entityId, current, rng) {
+    const domain = entityId.split('.')[0];
+    if (['light', 'switch', 'input_boolean', 'fan', 'binary_sensor'].includes(domain)) {
+        return { state: current.state === 'on' ? 'off' : 'on' };
+    }
+    if (domain === 'cover') return { state: current.state === 'closed' ? 'open' : 'closed' };
+    const shape = sensorShape(entityId);
+    if (shape) {
+        const prev = parseFloat(current.state);
+        const span = shape.max - shape.min;
+        const drift = (rng() - 0.5) * span * 0.1;
+        const next = Math.min(shape.max, Math.max(shape.min, (isNaN(prev) ? shape.min : prev) + drift));
+        return { state: next.toFixed(shape.decimals) };
+    }
+    return null;
+}
+
+function updatePeriod(entityId) {
+    for (const [pattern, seconds] of UPDATE_PERIODS) {
+        if (pattern.test(entityId)) return seconds;
+    }
+    return DEFAULT_PERIOD;
+}
+
+/** Deterministic PRNG so runs are comparable. */
+function mulberry32(seed) {
+    return function () {
+        seed |= 0; seed = seed + 0x6D2B79F5 | 0;
+        let t = Math.imul(seed ^ seed >>> 15, 1 | seed);
+        t = t + Math.imul(t ^ t >>> 7, 61 | t) ^ t;
+        return ((t ^ t >>> 14) >>> 0) / 4294967296;
+    };
+}
+
+// ============================================
+// FAKE HA
+// ============================================
+
+class FakeHA {
+    /**
+     * @param {object} options
+     * @param {number} options.filler   extra sensors not shown by the dashboard
+     * @param {number} options.rateScale  multiply the update rate (10 = ten times faster)
+     * @param {string} [options.history]  HA /api/history/period JSON to replay instead
+     */
+    constructor({ filler = 600, rateScale = 1, history = null, seed = 1 } = {}) {
+        this.rng = mulberry32(seed);
+        this.rateScale = rateScale;
+        this.states = new Map();
+        this.schedule = new Map();      // entity_id -> next update (ms, synthetic mode)
+        this.replay = null;             // [{offset ms, entity_id, state, attributes}]
+        this.clients = new Set();
+        this.stats = { messagesIn: 0, messagesOut: 0, bytesIn: 0, bytesOut: 0, stateChanges: 0, serviceCalls: 0 };
+        this.timer = null;
+
+        if (history) this._loadHistory(history);
+        else this._synthesize(filler);
+    }
+
+    _synthesize(filler) {
+        const now = Date.now();
+        const ids = scanEntityIds();
+        for (let i = 0; i < filler; i++) ids.push(`sensor.filler_${String(i).padStart(4, '0')}_power`);
+        for (const entityId of ids) {
+            this._setState(entityId, initialState(entityId, this.rng));
+            const period = updatePeriod(entityId) * 1000;
+            this.schedule.set(entityId, now + this.rng() * period / this.rateScale);
+        }
+    }
+
+    _loadHistory(file) {
+        const series = JSON.parse(fs.readFileSync(file, 'utf8'));
+        const changes = [];
+        for (const entries of series) {
+            if (!entries.length) continue;
+            const [first, ...rest] = entries;
+            this._setState(first.entity_id, { state: first.state, attributes: first.attributes || {} });
+            for (const entry of rest) {
+                changes.push({ t: Date.parse(entry.last_updated || entry.last_changed), entity_id: first.entity_id,
+                               state: entry.state, attributes: entry.attributes });
+            }
+        }
+        changes.sort((a, b) => a.t - b.t);
+        const start = changes.length ? changes[0].t : 0;
+        this.replay = changes.map(c => ({ ...c, offset: (c.t - start) / this.rateScale }));
+        this.replaySpan = this.replay.length ? this.replay[this.replay.length - 1].offset + 1000 : 0;
+    }
+
+    get entityCount() {
+        return this.states.size;
+    }
+
+    /** Expected state changes per second (synthetic mode). */
+    get changeRate() {
+        if (this.replay) return this.replaySpan ? this.replay.length / (this.replaySpan / 1000) : 0;
+        let rate = 0;
+        for (const entityId of this.states.keys()) rate += 1 / updatePeriod(entityId);
+        return rate * this.rateScale;
+    }
+
+    _setState(entityId, { state, attributes }) {
+        const now = new Date().toISOString();
+        const old = this.states.get(entityId) || null;
+        const next = {
+            entity_id: entityId,
+            state: String(state),
+            attributes: attributes ? { ...(old ? old.attributes : {}), ...attributes } : (old ? old.attributes : {}),
+            last_changed: old && old.state === String(state) ? old.last_changed : now,
+            last_updated: now,
+            context: { id: 'perf', parent_id: null, user_id: null },
+        };
+        this.states.set(entityId, next);
+        return { old, next };
+    }
+
+    /** Start generating state changes. */
+    start(tickMs = 100) {
+        const started = Date.now();
+        let replayIndex = 0;
+        let replayLoop = 0;
+        this.timer = setInterval(() => {
+            const now = Date.now();
+            if (this.replay) {
+                if (!this.replay.length) return;
+                const elapsed = now - started - replayLoop * this.replaySpan;
+                while (replayIndex < this.replay.length && this.replay[replayIndex].offset <= elapsed) {
+                    const c = this.replay[replayIndex++];
+                    this.change(c.entity_id, { state: c.state, attributes: c.attributes });
+                }
+                if (replayIndex >= this.replay.length) {
+                    replayIndex = 0;
+                    replayLoop++;
+                }
+                return;
+            }
+            for (const [entityId, due] of this.schedule) {
+                if (due > now) continue;
+                const period = updatePeriod(entityId) * 1000 / this.rateScale;
+                this.schedule.set(entityId, now + period * (0.8 + this.rng() * 0.4));
+                const update = nextValue(entityId, this.states.get(entityId), this.rng);
+                if (update) this.change(entityId, update);
+            }
+        }, tickMs);
+    }
+
+    stop() {
+        clearInterval(this.timer);
+        this.timer = null;
+    }
+
+    change(entityId, update) {
+        const { old, next } = this._setState(entityId, update);
+        this.stats.stateChanges++;
+        const event = {
+            event_type: 'state_changed',
+            data: { entity_id: entityId, old_state: old, new_state: next },
+            origin: 'LOCAL', time_fired: next.last_updated, context: next.context,
+        };
+        for (const client of this.clients) {
+            for (const [subId, eventType] of client.subscriptions) {
+                if (!eventType || eventType === 'state_changed') {
+                    client.send({ id: subId, type: 'event', event });
+                }
+            }
+        }
+    }
+
+    snapshot() {
+        return { ...this.stats };
+    }
+
+    // ---- websocket ----
+
+    /** Attach a Playwright WebSocketRoute. */
+    attach(route) {
+        const client = {
+            subscriptions: new Map(),
+            send: (msg) => {
+                const text = JSON.stringify(msg);
+                this.stats.messagesOut++;
+                this.stats.bytesOut += text.length;
+                route.send(text);
+            },
+        };
+        this.clients.add(client);
+        route.onClose(() => this.clients.delete(client));
+        route.onMessage((message) => {
+            const text = typeof message === 'string' ? message : message.toString();
+            this.stats.messagesIn++;
+            this.stats.bytesIn += text.length;
+            let data;
+            try {
+                data = JSON.parse(text);
+            } catch (e) {
+                return;
+            }
+            for (const msg of Array.isArray(data) ? data : [data]) this._handle(client, msg);
+        });
+        client.send({ type: 'auth_required', ha_version: HA_VERSION });
+    }
+
+    _handle(client, msg) {
+        const result = (value = null) => client.send({ id: msg.id, type: 'result', success: true, result: value });
+        switch (msg.type) {
+            case 'auth':
+                client.send({ type: 'auth_ok', ha_version: HA_VERSION });
+                break;
+            case 'supported_features':
+                result();
+                break;
+            case 'ping':
+                client.send({ id: msg.id, type: 'pong' });
+                break;
+            case 'get_states':
+                result([...this.states.values()]);
+                break;
+            case 'subscribe_events':
+                client.subscriptions.set(msg.id, msg.event_type || null);
+                result();
+                break;
+            case 'unsubscribe_events':
+                client.subscriptions.delete(msg.subscription);
+                result();
+                break;
+            case 'call_service':
+                this.stats.serviceCalls++;
+                result({ context: { id: 'perf' }, response: null });
+                break;
+            case 'history/history_during_period':
+                result(this._history(msg));
+                break;
+            default:
+                client.send({ id: msg.id, type: 'result', success: false,
+                              error: { code: 'unknown_command', message: `Unknown command: ${msg.type}` } });
+        }
+    }
+
+    /** A day of samples every 5 minutes around each entity's current value. */
+    _history(msg) {
+        const start = Date.parse(msg.start_time) || Date.now() - 86400000;
+        const end = Date.parse(msg.end_time) || Date.now();
+        const out = {};
+        for (const entityId of msg.entity_ids || []) {
+            const current = this.states.get(entityId);
+            const base = current ? parseFloat(current.state) || 0 : 0;
+            const points = [];
+            for (let t = start; t <= end; t += 300000) {
+                points.push({ s: (base * (0.5 + this.rng())).toFixed(1), lu: t / 1000 });
+            }
+            out[entityId] = points;
+        }
+        return out;
+    }
+}
+
+module.exports = { FakeHA, scanEntityIds };
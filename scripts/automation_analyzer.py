@@ -0,0 +1,738 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Automation Analyzer - trigger fan-out index and cost ranking
+
+Parses configuration.yaml (following !include, !include_dir_*, !secret and
+!env_var) together with the automations, scripts and template entities it
+pulls in, and builds:
+
+  - an index from entity / MQTT topic / event type to the automations and
+    template entities that react to it (trigger) or read it (condition,
+    action)
+  - lint flags for patterns that are expensive on a busy install: firehose
+    MQTT triggers, templates that touch many or all states, time_pattern
+    polling, state_changed / call_service event triggers
+  - a ranking by estimated evaluation cost per day, combining the static
+    index with observed rates from the recorder database (--db), a counts
+    file (--counts) and/or a live MQTT sample (--mqtt-sample SECONDS)
+
+Usage:
+    automation_analyzer.py index [--entity GLOB] [--topic GLOB]
+    automation_analyzer.py lint
+    automation_analyzer.py rank [--db home-assistant_v2.db] [--counts counts.json]
+                                [--mqtt-sample 300] [--top 20] [--json]
+
+counts.json (raw counts observed over window_seconds; all keys optional):
+    {"window_seconds": 86400,
+     "automations": {"automation.some_alias": 12},
+     "entities": {"sensor.x": 5000}, "events": {"timer.finished": 3},
+     "topics": {"frigate/events": 40000}}
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+HA_CONFIG_DIR = Path(os.environ.get("HA_CONFIG_DIR", HOMELAB_DIR / "homeassistant"))
+
+# Relative cost of one evaluation, in "template render" units
+TRIGGER_COST = {
+    "state": 1, "numeric_state": 2, "template": 10, "mqtt": 2, "event": 1,
+    "time_pattern": 1, "time": 1, "homeassistant": 1, "webhook": 1,
+}
+DEFAULT_TRIGGER_COST = 1
+VALUE_TEMPLATE_COST = 10
+TEMPLATE_COST = 10
+RUN_COST = 20
+
+# Flag thresholds
+FIREHOSE_TOPICS = {"frigate/events", "frigate/reviews", "frigate/tracked_object_update"}
+FIREHOSE_PER_DAY = 5000
+BROAD_TEMPLATE_ENTITIES = 10
+POLLING_PER_DAY = 96           # time_pattern more often than every 15 minutes
+BROAD_EVENT_TYPES = {"state_changed", "call_service", "state_reported"}
+
+# HA rate-limits templates that iterate states: all states once a minute,
+# a whole domain once a second
+ALL_STATES_MAX_PER_DAY = 1440
+DOMAIN_MAX_PER_DAY = 86400
+
+ENTITY_DOMAINS = {
+    "alarm_control_panel", "automation", "binary_sensor", "button", "calendar",
+    "camera", "climate", "counter", "cover", "device_tracker", "event", "fan",
+    "group", "image", "input_boolean", "input_button", "input_datetime",
+    "input_number", "input_select", "input_text", "light", "lock", "media_player",
+    "number", "person", "remote", "scene", "schedule", "script", "select",
+    "sensor", "siren", "sun", "switch", "timer", "update", "vacuum", "water_heater",
+    "weather", "zone",
+}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# YAML LOADING
+# ============================================
+
+class LineDict(dict):
+    """dict that remembers the file and line it was loaded from."""
+    file = None
+    line = None
+
+
+def make_loader(config_dir: Path, secrets: dict):
+    """SafeLoader subclass that understands Home Assistant's YAML tags."""
+
+    class ConfigLoader(yaml.SafeLoader):
+        pass
+
+    def construct_mapping(loader, node):
+        loader.flatten_mapping(node)
+        mapping = LineDict(loader.construct_pairs(node, deep=True))
+        mapping.file = loader.name
+        mapping.line = node.start_mark.line + 1
+        return mapping
+
+    def here(loader) -> Path:
+        name = getattr(loader, "name", None)
+        return Path(name).parent if name and not name.startswith("<") else config_dir
+
+    def include(loader, node):
+        return load_yaml(here(loader) / loader.construct_scalar(node), config_dir, secrets)
+
+    def dir_files(loader, node):
+        directory = here(loader) / loader.construct_scalar(node)
+        return sorted(p for p in directory.rglob("*.yaml") if not p.name.startswith("."))
+
+    def include_dir_list(loader, node):
+        return [load_yaml(p, config_dir, secrets) for p in dir_files(loader, node)]
+
+    def include_dir_named(loader, node):
+        return {p.stem: load_yaml(p, config_dir, secrets) for p in dir_files(loader, node)}
+
+    def include_dir_merge_list(loader, node):
+        merged = []
+        for p in dir_files(loader, node):
+            value = load_yaml(p, config_dir, secrets)
+            merged.extend(value if isinstance(value, list) else [value] if value else [])
+        return merged
+
+    def include_dir_merge_named(loader, node):
+        merged = {}
+        for p in dir_files(loader, node):
+            value = load_yaml(p, config_dir, secrets)
+            if isinstance(value, dict):
+                merged.update(value)
+        return merged
+
+    def secret(loader, node):
+        name = loader.construct_scalar(node)
+        return secrets.get(name, f"!secret {name}")
+
+    def env_var(loader, node):
+        name, _, default = loader.construct_scalar(node).partition(" ")
+        return os.environ.get(name, default or f"!env_var {name}")
+
+    def placeholder(loader, node):
+        return f"{node.tag} {loader.construct_scalar(node)}"
+
+    ConfigLoader.add_constructor(yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping)
+    for tag, fn in (("!include", include), ("!include_dir_list", include_dir_list),
+                    ("!include_dir_named", include_dir_named),
+                    ("!include_dir_merge_list", include_dir_merge_list),
+                    ("!include_dir_merge_named", include_dir_merge_named),
+                    ("!secret", secret), ("!env_var", env_var), ("!input", placeholder)):
+        ConfigLoader.add_constructor(tag, fn)
+    return ConfigLoader
+
+
+def load_yaml(path: Path, config_dir: Path, secrets: dict):
+    if not path.exists():
+        logger.warning(f"Included file not found: {path}")
+        return None
+    with open(path, encoding="utf-8") as f:
+        return yaml.load(f, Loader=make_loader(config_dir, secrets))
+
+
+def load_secrets(config_dir: Path) -> dict:
+    """secrets.yaml, falling back to the committed example for key names."""
+    for name in ("secrets.yaml", "secrets.yaml.example"):
+        path = config_dir / name
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                return yaml.safe_load(f) or {}
+    return {}
+
+# ============================================
+# REFERENCE EXTRACTION
+# ============================================
+
+_DOMAINS = "|".join(sorted(ENTITY_DOMAINS))
+QUOTED_ENTITY_RE = re.compile(rf"""['"]((?:{_DOMAINS})\.[a-z0-9_]+)['"]""")
+STATES_ATTR_RE = re.compile(rf"\bstates\.((?:{_DOMAINS})\.[a-z0-9_]+)")
+DOMAIN_ITER_RE = re.compile(rf"\bstates\.({_DOMAINS})\b(?!\.)")
+ALL_STATES_RE = re.compile(r"\bstates\b\s*(?:\||\)|\]|$)|\bexpand\(\s*states\s*\)")
+
+
+def is_template(value) -> bool:
+    return isinstance(value, str) and ("{{" in value or "{%" in value)
+
+
+class TemplateRefs:
+    """Entities a Jinja template reads, as far as can be told statically."""
+
+    def __init__(self, text: str):
+        self.entities = set(QUOTED_ENTITY_RE.findall(text)) | set(STATES_ATTR_RE.findall(text))
+        self.domains = set(DOMAIN_ITER_RE.findall(text))
+        self.all_states = bool(ALL_STATES_RE.search(text))
+        self.uses_now = "now()" in text
+
+
+def _entity_ids(value) -> list:
+    if isinstance(value, str):
+        return [e.strip() for e in value.split(",") if "." in e and not is_template(e)]
+    if isinstance(value, list):
+        return [e for item in value for e in _entity_ids(item)]
+    return []
+
+
+def walk_refs(node, found: set, templates: list):
+    """Collect entity ids (entity_id keys and template literals) and templates."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "entity_id":
+                found.update(_entity_ids(value))
+            walk_refs(value, found, templates)
+    elif isinstance(node, list):
+        for item in node:
+            walk_refs(item, found, templates)
+    elif is_template(node):
+        templates.append(node)
+        refs = TemplateRefs(node)
+        found.update(refs.entities)
+
+# ============================================
+# MODEL
+# ============================================
+
+def _time_pattern_field(value, size: int) -> int:
+    if value is None or str(value) == "*":
+        return size
+    value = str(value)
+    if value.startswith("/"):
+        return -(-size // max(1, int(value[1:])))
+    return 1
+
+
+def time_pattern_per_day(trigger: dict) -> int:
+    hours, minutes, seconds = trigger.get("hours"), trigger.get("minutes"), trigger.get("seconds")
+    # Same defaults as HA: unspecified smaller units are 0, larger ones "*"
+    if seconds is None and (hours is not None or minutes is not None):
+        seconds = 0
+    if minutes is None and hours is not None:
+        minutes = 0
+    return (_time_pattern_field(hours, 24) * _time_pattern_field(minutes, 60)
+            * _time_pattern_field(seconds, 60))
+
+
+class Trigger:
+    """One trigger: what it listens to and whether it narrows before running."""
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.platform = spec.get("platform") or spec.get("trigger") or "unknown"
+        self.entities = _entity_ids(spec.get("entity_id"))
+        self.topic = spec.get("topic") if self.platform == "mqtt" else None
+        self.event_type = spec.get("event_type") if self.platform == "event" else None
+        self.value_template = is_template(spec.get("value_template"))
+        self.template = None
+        self.schedule_per_day = None
+        self.flags = []
+
+        if self.platform == "template":
+            self.template = TemplateRefs(spec.get("value_template", ""))
+            self.entities = sorted(self.template.entities)
+        elif self.platform == "time_pattern":
+            self.schedule_per_day = time_pattern_per_day(spec)
+        elif self.platform == "time":
+            at = spec.get("at")
+            self.schedule_per_day = len(at) if isinstance(at, list) else 1
+        elif self.platform == "sun":
+            self.schedule_per_day = 1
+        elif self.platform == "homeassistant":
+            self.schedule_per_day = 0
+
+        # Does the trigger itself filter, or does every source change run the action?
+        # (not_to / not_from only drop unavailable/unknown, so they do not count)
+        narrowing = {"to", "from", "attribute", "above", "below", "event_data",
+                     "payload", "value_template", "for"}
+        self.filtered = self.platform == "template" or bool(narrowing.intersection(spec))
+
+        if self.topic is not None:
+            if "#" in self.topic or self.topic in FIREHOSE_TOPICS:
+                self.flags.append(f"mqtt firehose '{self.topic}'"
+                                  + ("" if self.value_template else " with no value_template"))
+        if self.event_type is not None and (self.event_type in BROAD_EVENT_TYPES):
+            self.flags.append(f"event trigger on {self.event_type}")
+        if self.platform == "event" and not self.event_type:
+            self.flags.append("event trigger on every event type")
+        if self.template is not None:
+            self.flags.extend(template_flags(self.template))
+        if self.platform == "time_pattern" and self.schedule_per_day >= POLLING_PER_DAY:
+            every = 86400 / self.schedule_per_day
+            self.flags.append(f"time_pattern polling every {every / 60:g} min"
+                              if every >= 60 else f"time_pattern polling every {every:g} s")
+
+    def describe(self) -> str:
+        if self.topic is not None:
+            return f"mqtt {self.topic}"
+        if self.event_type is not None:
+            return f"event {self.event_type}"
+        if self.entities:
+            more = f" +{len(self.entities) - 1}" if len(self.entities) > 1 else ""
+            return f"{self.platform} {self.entities[0]}{more}"
+        return self.platform
+
+
+def template_flags(refs: TemplateRefs) -> list:
+    flags = []
+    if refs.all_states:
+        flags.append("template iterates all states")
+    for domain in sorted(refs.domains):
+        flags.append(f"template iterates states.{domain}")
+    if len(refs.entities) > BROAD_TEMPLATE_ENTITIES:
+        flags.append(f"template reads {len(refs.entities)} entities")
+    return flags
+
+
+class Unit:
+    """An automation, template entity or script."""
+
+    def __init__(self, kind: str, ident: str, name: str, spec: dict, triggers=(),
+                 run_sections=(), extra=None):
+        self.kind = kind
+        self.ident = ident
+        self.name = name
+        self.file = getattr(spec, "file", None)
+        self.line = getattr(spec, "line", None)
+        self.triggers = [Trigger(t) for t in triggers if isinstance(t, dict)]
+        self.refs = {"trigger": set(), "condition": set(), "action": set()}
+        for t in self.triggers:
+            self.refs["trigger"].update(t.entities)
+
+        # Templates evaluated on every run (conditions, variables)
+        self.run_templates = []
+        for role, section in run_sections:
+            found, templates = set(), []
+            walk_refs(section, found, templates)
+            self.refs[role].update(found)
+            if role == "condition":
+                self.run_templates.extend(templates)
+        self.tracked = extra  # TemplateRefs for state-based template entities
+        self.flags = [flag for t in self.triggers for flag in t.flags]
+        if extra is not None:
+            self.flags.extend(template_flags(extra))
+
+    @property
+    def location(self) -> str:
+        if self.file is None:
+            return ""
+        return f"{Path(self.file).name}:{self.line}"
+
+    @property
+    def entity_id(self) -> str:
+        return f"{self.kind}.{slugify(self.name)}" if self.kind in ("automation", "script") else None
+
+
+def slugify(text: str) -> str:
+    """Approximation of HA's slugify, used to derive automation entity ids."""
+    text = re.sub(r"[^a-z0-9]+", "_", str(text).lower())
+    return text.strip("_")
+
+
+def _section(spec: dict, *keys):
+    for key in keys:
+        if key in spec:
+            return spec[key]
+    return None
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def automation_unit(spec: dict) -> Unit:
+    ident = str(spec.get("id") or spec.get("alias") or "?")
+    return Unit(
+        "automation", ident, spec.get("alias") or ident, spec,
+        triggers=_as_list(_section(spec, "triggers", "trigger")),
+        run_sections=[("condition", _section(spec, "conditions", "condition")),
+                      ("condition", spec.get("variables")),
+                      ("condition", spec.get("trigger_variables")),
+                      ("action", _section(spec, "actions", "action"))])
+
+
+def template_units(block: dict) -> list:
+    """Entities from one item of the template: integration list."""
+    units = []
+    triggers = _as_list(_section(block, "triggers", "trigger"))
+    for domain, entities in block.items():
+        if domain in ("trigger", "triggers", "condition", "conditions", "action",
+                      "actions", "variables", "unique_id"):
+            continue
+        for entity in _as_list(entities):
+            if not isinstance(entity, dict):
+                continue
+            name = str(entity.get("name") or entity.get("unique_id") or domain)
+            ident = f"{domain}.{slugify(name)}"
+            found, templates = set(), []
+            walk_refs(entity, found, templates)
+            if triggers:
+                unit = Unit("template", ident, name, entity, triggers=triggers,
+                            run_sections=[("action", entity)])
+            else:
+                # State-based: re-rendered whenever an entity it reads changes
+                unit = Unit("template", ident, name, entity, run_sections=[("trigger", entity)],
+                            extra=TemplateRefs("\n".join(templates)))
+            unit.run_templates = templates
+            units.append(unit)
+    return units
+
+
+def load_units(config_dir: Path) -> list:
+    secrets = load_secrets(config_dir)
+    config = load_yaml(config_dir / "configuration.yaml", config_dir, secrets) or {}
+    units = []
+    for key, value in config.items():
+        # "automation", "automation manual", "automation old" ... are all merged by HA
+        if key.split(" ")[0] == "automation":
+            units.extend(automation_unit(a) for a in _as_list(value) if isinstance(a, dict))
+        elif key == "script" and isinstance(value, dict):
+            for script_id, spec in value.items():
+                if isinstance(spec, dict):
+                    units.append(Unit("script", script_id, script_id, spec,
+                                      run_sections=[("action", _section(spec, "sequence"))]))
+        elif key == "template":
+            for block in _as_list(value):
+                if isinstance(block, dict):
+                    units.extend(template_units(block))
+    return units
+
+# ============================================
+# INDEX
+# ============================================
+
+def build_index(units: list) -> dict:
+    """{"entities": {id: [(unit, role)]}, "topics": {...}, "events": {...}}"""
+    index = {"entities": {}, "topics": {}, "events": {}}
+    for unit in units:
+        for role, entities in unit.refs.items():
+            for entity_id in entities:
+                index["entities"].setdefault(entity_id, []).append((unit, role))
+        for t in unit.triggers:
+            if t.topic is not None:
+                index["topics"].setdefault(t.topic, []).append((unit, "trigger"))
+            if t.event_type is not None:
+                index["events"].setdefault(str(t.event_type), []).append((unit, "trigger"))
+    return index
+
+# ============================================
+# RATES
+# ============================================
+
+class Rates:
+    """Observed rates per day for entities, events, topics and automation runs."""
+
+    def __init__(self):
+        self.entities = {}
+        self.events = {}
+        self.topics = {}
+        self.automations = {}
+        self.sources = []
+
+    def add(self, kind: str, counts: dict, window_seconds: float):
+        scale = 86400 / window_seconds
+        target = getattr(self, kind)
+        for key, count in counts.items():
+            target[key] = target.get(key, 0) + count * scale
+
+    def topic(self, pattern: str):
+        """Messages/day on a topic filter, or None if it was not sampled."""
+        if not self.topics:
+            return None
+        total = 0.0
+        for topic, rate in self.topics.items():
+            if topic_matches(pattern, topic):
+                total += rate
+        return total
+
+    def domain(self, domain: str) -> float:
+        prefix = domain + "."
+        return sum(r for e, r in self.entities.items() if e.startswith(prefix))
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    p, t = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(p):
+        if part == "#":
+            return True
+        if i >= len(t) or (part != "+" and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+def rates_from_db(rates: Rates, path: Path):
+    import recorder_db
+    conn = recorder_db.open_readonly(path)
+    try:
+        first, last = recorder_db.time_span(conn)
+        if first is None:
+            logger.warning(f"{path} has no states")
+            return
+        window = max(last - first, 3600)
+        rates.add("entities", recorder_db.state_counts(conn), window)
+        rates.add("events", recorder_db.event_counts(conn), window)
+        fired = recorder_db.automation_trigger_counts(conn)
+        rates.add("automations", fired, window)
+        rates.sources.append(f"recorder {path.name} ({window / 86400:.1f} days)")
+        if not fired:
+            logger.info("No automation_triggered events recorded (automation domain "
+                        "excluded from recorder?) - runs will be estimated")
+    finally:
+        conn.close()
+
+
+def rates_from_counts(rates: Rates, path: Path):
+    data = json.loads(path.read_text())
+    window = float(data.get("window_seconds", 86400))
+    for kind in ("entities", "events", "topics", "automations"):
+        rates.add(kind, data.get(kind, {}), window)
+    rates.sources.append(f"counts {path.name}")
+
+
+def rates_from_mqtt(rates: Rates, seconds: int, host: str, port: int):
+    import threading
+    import mqtt_client
+    counts = {}
+    lock = threading.Lock()
+
+    def on_message(topic, payload):
+        with lock:
+            counts[topic] = counts.get(topic, 0) + 1
+
+    logger.info(f"Sampling MQTT traffic for {seconds}s...")
+    client = mqtt_client.create_client(f"automation-analyzer-{os.getpid()}", host=host,
+                                       port=port, subscriptions=[("#", 0)],
+                                       on_message=on_message)
+    time.sleep(seconds)
+    mqtt_client.close_client(client)
+    rates.add("topics", counts, seconds)
+    rates.sources.append(f"MQTT sample ({seconds}s, {len(counts)} topics)")
+
+# ============================================
+# COST MODEL
+# ============================================
+
+def trigger_rate(t: Trigger, rates: Rates):
+    """Evaluations per day for one trigger, or None if unknown."""
+    if t.schedule_per_day is not None:
+        return float(t.schedule_per_day)
+    if t.topic is not None:
+        return rates.topic(t.topic)
+    if t.event_type is not None:
+        return rates.events.get(t.event_type)
+    if t.template is not None:
+        if t.template.all_states:
+            return float(min(ALL_STATES_MAX_PER_DAY, sum(rates.entities.values()))) if rates.entities else None
+        total = sum(rates.entities.get(e, 0) for e in t.template.entities)
+        total += sum(min(DOMAIN_MAX_PER_DAY, rates.domain(d)) for d in t.template.domains)
+        return total if rates.entities else None
+    if t.entities:
+        return sum(rates.entities.get(e, 0) for e in t.entities) if rates.entities else None
+    return None
+
+
+def estimate(unit: Unit, rates: Rates) -> dict:
+    evaluations = 0.0
+    cost = 0.0
+    runs_estimate = 0.0
+    unknown = []
+    flags = []
+    for t in unit.triggers:
+        rate = trigger_rate(t, rates)
+        if rate is None:
+            unknown.append(t.describe())
+            continue
+        if t.topic is not None and rate >= FIREHOSE_PER_DAY and not t.flags:
+            flags.append(f"mqtt topic '{t.topic}' carries {rate:,.0f} messages/day")
+        weight = TRIGGER_COST.get(t.platform, DEFAULT_TRIGGER_COST)
+        if t.value_template:
+            weight += VALUE_TEMPLATE_COST
+        evaluations += rate
+        cost += rate * weight
+        if not t.filtered:
+            runs_estimate += rate
+
+    if unit.tracked is not None:
+        # State-based template entity: re-rendered when a tracked entity changes
+        refs = unit.tracked
+        rate = sum(rates.entities.get(e, 0) for e in refs.entities)
+        rate += sum(min(DOMAIN_MAX_PER_DAY, rates.domain(d)) for d in refs.domains)
+        if refs.all_states:
+            rate = max(rate, float(ALL_STATES_MAX_PER_DAY))
+        if refs.uses_now:
+            rate += 1440
+        evaluations += rate
+        cost += rate * TEMPLATE_COST * max(1, len(unit.run_templates))
+        runs_estimate = rate
+
+    recorded = None
+    if unit.entity_id and unit.entity_id in rates.automations:
+        recorded = rates.automations[unit.entity_id]
+    elif unit.ident in rates.automations:
+        recorded = rates.automations[unit.ident]
+    runs = recorded if recorded is not None else runs_estimate
+    run_cost = RUN_COST + TEMPLATE_COST * len(unit.run_templates)
+    if unit.kind == "template":
+        run_cost = TEMPLATE_COST * max(1, len(unit.run_templates))
+    if unit.tracked is None:
+        cost += runs * run_cost
+
+    return {"evaluations": evaluations, "runs": runs, "runs_recorded": recorded is not None,
+            "cost": cost, "unknown": unknown, "flags": unit.flags + flags}
+
+# ============================================
+# COMMANDS
+# ============================================
+
+def _label(unit: Unit) -> str:
+    return f"{unit.kind}:{unit.name}"
+
+
+def cmd_index(args, units) -> int:
+    index = build_index(units)
+    sections = [("entities", args.entity), ("topics", args.topic), ("events", None)]
+    if args.entity or args.topic:
+        sections = [(k, p) for k, p in sections if p]
+    for kind, pattern in sections:
+        print(f"{kind.upper()}")
+        for key in sorted(index[kind]):
+            if pattern and not fnmatch.fnmatch(key, pattern):
+                continue
+            users = index[kind][key]
+            print(f"  {key}  ({len(users)})")
+            for unit, role in sorted(users, key=lambda u: (u[1], u[0].name)):
+                print(f"      {role:<9} {_label(unit)}  {unit.location}")
+        print()
+    return 0
+
+
+def cmd_lint(args, units) -> int:
+    flagged = [u for u in units if u.flags]
+    for unit in flagged:
+        print(f"{unit.location:<24} {_label(unit)}")
+        for flag in unit.flags:
+            print(f"    - {flag}")
+    print(f"\n{len(flagged)} of {len(units)} automations/template entities flagged")
+    return 0
+
+
+def cmd_rank(args, units) -> int:
+    rates = Rates()
+    if args.db:
+        rates_from_db(rates, args.db)
+    if args.counts:
+        rates_from_counts(rates, args.counts)
+    if args.mqtt_sample:
+        rates_from_mqtt(rates, args.mqtt_sample, args.mqtt_host, args.mqtt_port)
+    if not rates.sources:
+        logger.warning("No --db, --counts or --mqtt-sample given: only schedules can be costed")
+
+    ranked = []
+    for unit in units:
+        if unit.kind == "script":
+            continue
+        result = estimate(unit, rates)
+        ranked.append((unit, result))
+    ranked.sort(key=lambda r: r[1]["cost"], reverse=True)
+    total = sum(r["cost"] for _, r in ranked) or 1
+
+    if args.json:
+        print(json.dumps({"sources": rates.sources, "ranking": [
+            {"kind": u.kind, "id": u.ident, "name": u.name, "location": u.location,
+             "evaluations_per_day": round(r["evaluations"], 1),
+             "runs_per_day": round(r["runs"], 1), "runs_recorded": r["runs_recorded"],
+             "cost_per_day": round(r["cost"], 1), "share": round(r["cost"] / total, 4),
+             "flags": r["flags"], "unknown_rates": r["unknown"]}
+            for u, r in ranked]}, indent=2))
+        return 0
+
+    print(f"Rates from: {', '.join(rates.sources) or 'schedules only'}\n")
+    print(f"{'#':>3} {'Cost/day':>10} {'Share':>6} {'Evals/day':>10} {'Runs/day':>9}  Name")
+    for i, (unit, r) in enumerate(ranked[:args.top], 1):
+        runs = f"{r['runs']:.0f}" + ("" if r["runs_recorded"] else "~")
+        print(f"{i:>3} {r['cost']:>10,.0f} {r['cost'] / total:>6.1%} {r['evaluations']:>10,.0f} "
+              f"{runs:>9}  {_label(unit)} ({unit.location})")
+        for flag in r["flags"]:
+            print(f"{'':>44}! {flag}")
+        if r["unknown"]:
+            print(f"{'':>44}? no rate for: {', '.join(r['unknown'])}")
+    print("\nCost is in template-render units per day; ~ marks estimated runs.")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Index and cost-rank Home Assistant automations")
+    parser.add_argument("--config-dir", type=Path, default=HA_CONFIG_DIR,
+                        help="Home Assistant config directory (default: HA_CONFIG_DIR)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("index", help="Which automations use each entity, topic and event")
+    p.add_argument("--entity", help="Only entities matching this glob")
+    p.add_argument("--topic", help="Only MQTT topics matching this glob")
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("lint", help="Flag expensive trigger and template patterns")
+    p.set_defaults(func=cmd_lint)
+
+    p = sub.add_parser("rank", help="Rank by estimated evaluation cost per day")
+    p.add_argument("--db", type=Path, help="Copy of home-assistant_v2.db (opened read-only)")
+    p.add_argument("--counts", type=Path, help="JSON file of observed counts")
+    p.add_argument("--mqtt-sample", type=int, metavar="SECONDS",
+                   help="Sample live MQTT traffic for topic rates")
+    p.add_argument("--mqtt-host", default=os.environ.get("MQTT_HOST", "127.0.0.1"))
+    p.add_argument("--mqtt-port", type=int, default=int(os.environ.get("MQTT_PORT", "1883")))
+    p.add_argument("--top", type=int, default=25)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_rank)
+
+    args = parser.parse_args()
+    config = args.config_dir / "configuration.yaml"
+    if not config.exists():
+        logger.error(f"{config} not found")
+        return 1
+    units = load_units(args.config_dir)
+    return args.func(args, units)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,12 @@
 # Runs at 2am daily, only if changes detected
 # Local retention: 7 days | Cloud retention: indefinite
 #
-# Usage: ./backup-to-cloud.sh [--force]
-#   --force: Run backup even if no changes detected
+# Nightly backups are deduplicated snapshots: files are split into chunks,
+# each unique chunk is stored once and only new chunks are uploaded.
+#
+# Usage: ./backup-to-cloud.sh [--force] [--archive]
+#   --force:   Run backup even if no changes detected
+#   --archive: Also stream a full standalone archive (.tar.zst) to local and cloud
 #
 
 set -euo pipefail
@@ -17,21 +21,18 @@ set -euo pipefail
 HOMELAB_DIR="/opt/homelab"
 BACKUP_DIR="${HOMELAB_DIR}/backups/local"
 RCLONE_CONFIG="${HOMELAB_DIR}/backups/rclone.conf"
-CHECKSUM_FILE="${HOMELAB_DIR}/backups/.last-backup-checksum"
+BACKUP_ENGINE="${HOMELAB_DIR}/scripts/backup_engine.py"
 LOG_FILE="/var/log/homelab-backup.log"
 
 # Backblaze B2 settings
 B2_BUCKET="your-bucket-name"
 B2_REMOTE="backblaze:${B2_BUCKET}"
+B2_REPO="${B2_REMOTE}/repo"
 
 # Retention settings
 LOCAL_RETENTION_DAYS=7
 MIN_FREE_SPACE_GB=10
 
-# Timestamp format
-TIMESTAMP=$(date +%Y%m%d_%H%M%S)
-DATE_STAMP=$(date +%Y-%m-%d)
-
 # ============================================
 # LOGGING
 # ============================================
@@ -58,248 +59,67 @@ check_disk_space() {
     return 0
 }
 
-calculate_checksum() {
-    # Calculate checksum of all backed-up files to detect changes
-    local checksum=""
-
-    # HA config files
-    for file in configuration.yaml automations.yaml scripts.yaml secrets.yaml scenes.yaml; do
-        if [[ -f "${HOMELAB_DIR}/homeassistant/${file}" ]]; then
-            checksum+=$(md5sum "${HOMELAB_DIR}/homeassistant/${file}" 2>/dev/null | awk '{print $1}')
-        fi
-    done
-
-    # Frigate config
-    if [[ -f "${HOMELAB_DIR}/frigate/config/config.yml" ]]; then
-        checksum+=$(md5sum "${HOMELAB_DIR}/frigate/config/config.yml" | awk '{print $1}')
-    fi
-
-    # Docker compose
-    if [[ -f "${HOMELAB_DIR}/docker-compose.yml" ]]; then
-        checksum+=$(md5sum "${HOMELAB_DIR}/docker-compose.yml" | awk '{print $1}')
-    fi
-
-    # Environment file
-    if [[ -f "${HOMELAB_DIR}/.env" ]]; then
-        checksum+=$(md5sum "${HOMELAB_DIR}/.env" | awk '{print $1}')
-    fi
-
-    # Dashboard files (HTML, JS, CSS) - exclude node_modules and data
-    for ext in html js css; do
-        find "${HOMELAB_DIR}/homeassistant/www/dashboard" \
-            -name "*.${ext}" \
-            ! -path "*/node_modules/*" \
-            ! -path "*/data/*" \
-            -type f 2>/dev/null | sort | while read -r file; do
-            checksum+=$(md5sum "$file" 2>/dev/null | awk '{print $1}')
-        done
-    done
-
-    # Dashboard subdirectories (views, modals, src)
-    for dir in views modals src css js images; do
-        if [[ -d "${HOMELAB_DIR}/homeassistant/www/dashboard/${dir}" ]]; then
-            checksum+=$(find "${HOMELAB_DIR}/homeassistant/www/dashboard/${dir}" -type f -exec md5sum {} \; 2>/dev/null | sort | md5sum | awk '{print $1}')
-        fi
-    done
-
-    # Scripts
-    checksum+=$(find "${HOMELAB_DIR}/scripts" -type f -exec md5sum {} \; 2>/dev/null | sort | md5sum | awk '{print $1}')
-
-    # CLAUDE.md
-    if [[ -f "${HOMELAB_DIR}/CLAUDE.md" ]]; then
-        checksum+=$(md5sum "${HOMELAB_DIR}/CLAUDE.md" | awk '{print $1}')
-    fi
-
-    # Nginx and Mosquitto configs
-    checksum+=$(find "${HOMELAB_DIR}/nginx-proxy" "${HOMELAB_DIR}/mosquitto/config" -type f -exec md5sum {} \; 2>/dev/null | sort | md5sum | awk '{print $1}')
-
-    echo "$checksum" | md5sum | awk '{print $1}'
-}
-
 has_changes() {
-    local current_checksum=$(calculate_checksum)
-
-    if [[ -f "$CHECKSUM_FILE" ]]; then
-        local last_checksum=$(cat "$CHECKSUM_FILE")
-        if [[ "$current_checksum" == "$last_checksum" ]]; then
+    # Stat-walk change detection against the manifest of the last backup.
+    # backup_engine.py exits 0 on changes, 3 on no changes, anything else on error.
+    local rc=0
+    local changes
+    changes=$(python3 "$BACKUP_ENGINE" changes 2>>"$LOG_FILE") || rc=$?
+
+    case $rc in
+        0)
+            log "Changes detected - proceeding with backup"
+            while IFS= read -r line; do
+                log "  ${line}"
+            done <<< "$changes"
+            return 0
+            ;;
+        3)
             log "No changes detected since last backup"
             return 1
-        fi
-    fi
-
-    log "Changes detected - proceeding with backup"
-    echo "$current_checksum" > "$CHECKSUM_FILE"
-    return 0
+            ;;
+        *)
+            log_error "Change detection failed (exit ${rc}) - backing up anyway"
+            return 0
+            ;;
+    esac
 }
 
-create_backup() {
-    local backup_name="homelab-backup-${TIMESTAMP}"
-    local backup_path="${BACKUP_DIR}/${backup_name}"
-    local archive_path="${BACKUP_DIR}/${backup_name}.tar.gz"
-
-    log "Creating backup: ${backup_name}"
-
-    # Create temporary directory for backup
-    mkdir -p "$backup_path"
-
-    # ============================================
-    # BACKUP HOME ASSISTANT CONFIG
-    # ============================================
-    log "  - Backing up Home Assistant configuration..."
-    mkdir -p "${backup_path}/homeassistant"
-
-    for file in configuration.yaml automations.yaml scripts.yaml secrets.yaml scenes.yaml; do
-        if [[ -f "${HOMELAB_DIR}/homeassistant/${file}" ]]; then
-            cp "${HOMELAB_DIR}/homeassistant/${file}" "${backup_path}/homeassistant/"
-        fi
-    done
-
-    # ============================================
-    # BACKUP DASHBOARD FILES
-    # ============================================
-    log "  - Backing up dashboard files..."
-    mkdir -p "${backup_path}/homeassistant/www/dashboard"
-
-    # Copy HTML files
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.html "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-
-    # Copy JS files (root level)
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.js "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-
-    # Copy JSON files (manifest.json, version.json, etc)
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.json "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-
-    # Copy family photos (needed for family status display)
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.png "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.jpeg "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.jpg "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-
-    # Copy utility scripts
-    cp "${HOMELAB_DIR}/homeassistant/www/dashboard/"*.sh "${backup_path}/homeassistant/www/dashboard/" 2>/dev/null || true
-
-    # Copy subdirectories (excluding node_modules, data)
-    for dir in js css views modals src images; do
-        if [[ -d "${HOMELAB_DIR}/homeassistant/www/dashboard/${dir}" ]]; then
-            cp -r "${HOMELAB_DIR}/homeassistant/www/dashboard/${dir}" "${backup_path}/homeassistant/www/dashboard/"
-        fi
-    done
-
-    # ============================================
-    # BACKUP FRIGATE CONFIG
-    # ============================================
-    log "  - Backing up Frigate configuration..."
-    mkdir -p "${backup_path}/frigate/config"
-    cp "${HOMELAB_DIR}/frigate/config/config.yml" "${backup_path}/frigate/config/" 2>/dev/null || true
-    cp "${HOMELAB_DIR}/frigate/config/go2rtc_homekit.yml" "${backup_path}/frigate/config/" 2>/dev/null || true
-
-    # ============================================
-    # BACKUP DOCKER COMPOSE & ENV
-    # ============================================
-    log "  - Backing up Docker configuration..."
-    cp "${HOMELAB_DIR}/docker-compose.yml" "${backup_path}/"
-    cp "${HOMELAB_DIR}/.env" "${backup_path}/" 2>/dev/null || true
-    cp "${HOMELAB_DIR}/.gitignore" "${backup_path}/" 2>/dev/null || true
-
-    # ============================================
-    # BACKUP SUPPORTING CONFIGS
-    # ============================================
-    log "  - Backing up supporting configurations..."
-
-    # Nginx proxy
-    if [[ -d "${HOMELAB_DIR}/nginx-proxy" ]]; then
-        cp -r "${HOMELAB_DIR}/nginx-proxy" "${backup_path}/"
-    fi
-
-    # Mosquitto config
-    if [[ -d "${HOMELAB_DIR}/mosquitto/config" ]]; then
-        mkdir -p "${backup_path}/mosquitto"
-        cp -r "${HOMELAB_DIR}/mosquitto/config" "${backup_path}/mosquitto/"
+create_snapshot() {
+    # Chunk changed files into the local repository and upload new chunks only
+    log "Creating deduplicated snapshot..."
+    local snapshot_id
+    if snapshot_id=$(python3 "$BACKUP_ENGINE" backup --remote "$B2_REPO" \
+            --rclone-config "$RCLONE_CONFIG" 2> >(tee -a "$LOG_FILE" >&2)); then
+        log "Snapshot ${snapshot_id} uploaded to ${B2_REPO}"
+        return 0
+    else
+        log_error "Snapshot backup failed"
+        return 1
     fi
-
-    # ============================================
-    # BACKUP SCRIPTS
-    # ============================================
-    log "  - Backing up scripts..."
-    cp -r "${HOMELAB_DIR}/scripts" "${backup_path}/"
-
-    # ============================================
-    # BACKUP DOCUMENTATION
-    # ============================================
-    log "  - Backing up documentation..."
-    cp "${HOMELAB_DIR}/CLAUDE.md" "${backup_path}/" 2>/dev/null || true
-    cp "${HOMELAB_DIR}/README.md" "${backup_path}/" 2>/dev/null || true
-
-    # ============================================
-    # CREATE MANIFEST
-    # ============================================
-    log "  - Creating backup manifest..."
-    cat > "${backup_path}/MANIFEST.txt" << EOF
-Homelab Backup Manifest
-=======================
-Created: $(date '+%Y-%m-%d %H:%M:%S %Z')
-Hostname: $(hostname)
-Backup ID: ${backup_name}
-
-Contents:
----------
-- Home Assistant configuration (configuration.yaml, automations.yaml, scripts.yaml, secrets.yaml, scenes.yaml)
-- Dashboard files (HTML, JS, CSS, views, modals, src, images)
-- Frigate NVR configuration
-- Docker Compose and environment files
-- Nginx proxy configuration
-- Mosquitto MQTT configuration
-- System scripts
-- Documentation (CLAUDE.md)
-
-Restore Instructions:
----------------------
-1. Extract this archive to /opt/homelab
-2. Run: cd /opt/homelab && npm install (in dashboard directory)
-3. Run: sudo docker compose up -d
-4. Reload Home Assistant configuration
-
-Note: Frigate models will be re-downloaded on first start.
-EOF
-
-    # ============================================
-    # CREATE COMPRESSED ARCHIVE
-    # ============================================
-    log "  - Compressing backup..."
-    tar -czf "$archive_path" -C "$BACKUP_DIR" "$backup_name"
-
-    # Clean up uncompressed backup
-    rm -rf "$backup_path"
-
-    local size=$(du -h "$archive_path" | awk '{print $1}')
-    log "Backup created: ${archive_path} (${size})"
-
-    # Set global variable for return value (avoid log pollution in stdout)
-    BACKUP_ARCHIVE_PATH="$archive_path"
 }
 
-upload_to_cloud() {
-    local archive_path="$1"
-    local archive_name=$(basename "$archive_path")
-
-    log "Uploading to Backblaze B2: ${archive_name}"
+create_archive() {
+    # Stream a full archive straight into ${BACKUP_DIR} and B2 in one pass:
+    # each file is read once, hashed and compressed (zstd when available)
+    # with no staging copy and no intermediate tar
+    log "Creating streaming archive..."
+    local archive_name
+    if ! archive_name=$(BACKUP_DIR="$BACKUP_DIR" python3 "$BACKUP_ENGINE" archive \
+            --remote "$B2_REMOTE" --rclone-config "$RCLONE_CONFIG" 2> >(tee -a "$LOG_FILE" >&2)); then
+        log_error "Archive creation or upload failed"
+        return 1
+    fi
 
-    # Upload using rclone
-    local upload_output
-    if upload_output=$(rclone --config="$RCLONE_CONFIG" copy "$archive_path" "${B2_REMOTE}/" -v 2>&1); then
-        echo "$upload_output" >> "$LOG_FILE"
-        log "Upload successful: ${archive_name}"
+    local size=$(du -h "${BACKUP_DIR}/${archive_name}" 2>/dev/null | awk '{print $1}')
+    log "Backup created: ${BACKUP_DIR}/${archive_name} (${size})"
 
-        # Verify upload
-        if rclone --config="$RCLONE_CONFIG" ls "${B2_REMOTE}/${archive_name}" &>/dev/null; then
-            log "Upload verified: ${archive_name} exists in cloud"
-            return 0
-        else
-            log_error "Upload verification failed: ${archive_name} not found in cloud"
-            return 1
-        fi
+    # Verify upload
+    if rclone --config="$RCLONE_CONFIG" ls "${B2_REMOTE}/${archive_name}" &>/dev/null; then
+        log "Upload verified: ${archive_name} exists in cloud"
+        return 0
     else
-        echo "$upload_output" >> "$LOG_FILE"
-        log_error "Upload failed: ${archive_name}"
+        log_error "Upload verification failed: ${archive_name} not found in cloud"
         return 1
     fi
 }
@@ -312,7 +132,8 @@ cleanup_old_backups() {
         log "  - Removing old backup: $(basename "$file")"
         rm -f "$file"
         ((count++))
-    done < <(find "$BACKUP_DIR" -name "homelab-backup-*.tar.gz" -mtime +${LOCAL_RETENTION_DAYS} -print0 2>/dev/null)
+    done < <(find "$BACKUP_DIR" \( -name "homelab-backup-*.tar.*" -o -name "homelab-backup-*.index.json.gz" \) \
+        -mtime +${LOCAL_RETENTION_DAYS} -print0 2>/dev/null)
 
     if (( count > 0 )); then
         log "Removed ${count} old backup(s)"
@@ -321,13 +142,22 @@ cleanup_old_backups() {
     fi
 
     # Also show current local backups
-    local current_count=$(find "$BACKUP_DIR" -name "homelab-backup-*.tar.gz" 2>/dev/null | wc -l)
+    local current_count=$(find "$BACKUP_DIR" -name "homelab-backup-*.tar.*" 2>/dev/null | wc -l)
     log "Current local backups: ${current_count}"
+
+    # Snapshot retention and chunk garbage collection for the local repository
+    python3 "$BACKUP_ENGINE" prune --keep-days "$LOCAL_RETENTION_DAYS" 2>>"$LOG_FILE" \
+        || log_error "Local snapshot prune failed"
 }
 
 list_cloud_backups() {
     log "Cloud backups in ${B2_BUCKET}:"
-    rclone --config="$RCLONE_CONFIG" ls "${B2_REMOTE}/" 2>/dev/null | while read -r line; do
+    rclone --config="$RCLONE_CONFIG" ls --max-depth 1 "${B2_REMOTE}/" 2>/dev/null | while read -r line; do
+        log "  - $line"
+    done
+    log "Cloud snapshots in ${B2_REPO}:"
+    python3 "$BACKUP_ENGINE" snapshots --remote "$B2_REPO" --rclone-config "$RCLONE_CONFIG" \
+        2>/dev/null | tail -n 5 | while read -r line; do
         log "  - $line"
     done
 }
@@ -338,6 +168,7 @@ list_cloud_backups() {
 
 main() {
     local force=false
+    local archive=false
 
     # Parse arguments
     while [[ $# -gt 0 ]]; do
@@ -346,6 +177,10 @@ main() {
                 force=true
                 shift
                 ;;
+            --archive)
+                archive=true
+                shift
+                ;;
             *)
                 log_error "Unknown argument: $1"
                 exit 1
@@ -377,14 +212,20 @@ main() {
         log "Force flag set - bypassing change detection"
     fi
 
-    # Create backup
-    create_backup
-
-    # Upload to cloud
-    if upload_to_cloud "$BACKUP_ARCHIVE_PATH"; then
+    # Snapshot into the chunk repository (commits the manifest on success)
+    if create_snapshot; then
         log "Cloud upload successful"
     else
-        log_error "Cloud upload failed - keeping local backup"
+        log_error "Cloud upload failed - changes will be retried next run"
+    fi
+
+    # Full standalone archive on request
+    if [[ "$archive" == "true" ]]; then
+        if create_archive; then
+            log "Archive upload successful"
+        else
+            log_error "Archive upload failed - keeping local backup"
+        fi
     fi
 
     # Cleanup old local backups
@@ -0,0 +1,415 @@
+"""
+Streaming archive writer for homelab backups.
+
+Source files are read exactly once. Each read block is hashed and fed to the
+compressor in the same pass, and the compressed stream is written straight
+to every sink (the local archive file and the rclone upload) - there is no
+staging copy of the tree and no intermediate uncompressed tar.
+
+Every tar member (header + data + padding) is compressed as an independent
+frame. Concatenated zstd frames (or gzip members) are still a single valid
+stream, so `tar -I zstd -xf` / `tar -xzf` extract the archive as usual, while
+the sidecar index records each member's compressed offset and length so a
+restore can range-read individual files.
+
+zstd (multi-threaded, via the `zstandard` package) is used when installed;
+otherwise the archive falls back to gzip members.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import socket
+import subprocess
+import tarfile
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+ZSTD_LEVEL = 6
+GZIP_LEVEL = 6
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Files up to this size are read and compressed by worker threads in parallel;
+# larger ones are streamed block by block with zstd's own worker threads
+PARALLEL_FILE_LIMIT = 4 * 1024 * 1024
+WORKERS = os.cpu_count() or 2
+
+INDEX_VERSION = 1
+
+# ============================================
+# CODECS
+# ============================================
+
+class Codec:
+    """Per-frame compressor factory with a matching decoder."""
+
+    name = None
+    suffix = None
+
+    def compressobj(self, threads: int = 0):
+        raise NotImplementedError
+
+    def decompress(self, frame: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    suffix = ".tar.zst"
+
+    def compressobj(self, threads: int = 0):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads).compressobj()
+
+    def decompress(self, frame: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(frame)
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    suffix = ".tar.gz"
+
+    def compressobj(self, threads: int = 0):
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def decompress(self, frame: bytes) -> bytes:
+        return zlib.decompress(frame, 31)
+
+
+def get_codec(name: str = None) -> Codec:
+    """Return the requested codec, defaulting to zstd when available."""
+    if name in (None, "zstd"):
+        if zstandard is not None:
+            return ZstdCodec()
+        if name == "zstd":
+            raise RuntimeError("zstandard not installed. Run: pip install zstandard")
+    return GzipCodec()
+
+
+def codec_for_archive(name: str) -> Codec:
+    return ZstdCodec() if name.endswith(".zst") else GzipCodec()
+
+# ============================================
+# SINKS
+# ============================================
+
+class Tee:
+    """
+    Write the compressed stream to several sinks at once, tracking the
+    offset and a running hash of everything written.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = [s for s in sinks if s is not None]
+        self.offset = 0
+        self.digest = hashlib.blake2b(digest_size=20)
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        for sink in self.sinks:
+            sink.write(data)
+        self.digest.update(data)
+        self.offset += len(data)
+
+
+class RcloneUpload:
+    """Stream bytes to `rclone rcat`, which uploads without a local copy."""
+
+    def __init__(self, target: str, config: str = None):
+        cmd = ["rclone"]
+        if config:
+            cmd.append(f"--config={config}")
+        cmd.extend(["rcat", target])
+        self.target = target
+        # stderr goes to a file: an unread pipe fills up on retries/progress
+        # output and rclone would block while we are still feeding stdin
+        self.stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self.stderr)
+
+    def write(self, data: bytes):
+        self.proc.stdin.write(data)
+
+    def close(self):
+        self.proc.stdin.close()
+        code = self.proc.wait()
+        self.stderr.seek(0)
+        stderr = self.stderr.read().decode(errors="replace").strip()
+        self.stderr.close()
+        if code != 0:
+            raise RuntimeError(f"rclone rcat {self.target} failed: {stderr}")
+
+    def abort(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.stderr.close()
+
+
+def open_upload(remote: str, name: str, rclone_config: str = None):
+    """Open an upload sink: a file under a local directory, or rclone rcat."""
+    if remote.startswith(("/", ".", "file://")):
+        directory = Path(remote[len("file://"):] if remote.startswith("file://") else remote)
+        directory.mkdir(parents=True, exist_ok=True)
+        return open(directory / name, "wb")
+    return RcloneUpload(f"{remote.rstrip('/')}/{name}", rclone_config)
+
+
+def close_sink(sink, ok: bool):
+    if sink is None:
+        return
+    if isinstance(sink, RcloneUpload) and not ok:
+        sink.abort()
+    else:
+        sink.close()
+
+# ============================================
+# ARCHIVE WRITER
+# ============================================
+
+def _tar_header(arcname: str, size: int, mtime: float, mode: int) -> bytes:
+    info = tarfile.TarInfo(arcname)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = mode
+    info.uname = info.gname = "root"
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _padding(size: int) -> bytes:
+    remainder = size % tarfile.BLOCKSIZE
+    return b"\0" * (tarfile.BLOCKSIZE - remainder) if remainder else b""
+
+
+def _compress_small(codec: Codec, root: Path, rel: str, arcname: str):
+    """Worker: read, hash and compress one small file into a complete frame."""
+    path = root / rel
+    st = path.stat()
+    with open(path, "rb") as f:
+        data = f.read()
+    header = _tar_header(arcname, len(data), st.st_mtime, st.st_mode & 0o7777)
+    cobj = codec.compressobj()
+    frame = cobj.compress(header) + cobj.compress(data) + cobj.compress(_padding(len(data)))
+    frame += cobj.flush()
+    entry = {
+        "path": rel, "size": len(data), "mtime": int(st.st_mtime),
+        "mode": st.st_mode & 0o7777,
+        "hash": hashlib.blake2b(data, digest_size=20).hexdigest(),
+        "header_size": len(header),
+    }
+    return entry, frame
+
+
+def _stream_large(codec: Codec, out: Tee, f, st: os.stat_result, rel: str, arcname: str) -> dict:
+    """
+    Stream one large, already opened file through a multi-threaded
+    compressor. Once the header is written a read error cannot be skipped
+    (the member is half in the stream), so it is raised as RuntimeError.
+    """
+    size = st.st_size
+    header = _tar_header(arcname, size, st.st_mtime, st.st_mode & 0o7777)
+    digest = hashlib.blake2b(digest_size=20)
+    cobj = codec.compressobj(threads=-1)
+    out.write(cobj.compress(header))
+
+    remaining = size
+    while remaining > 0:
+        try:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+        except OSError as e:
+            raise RuntimeError(f"Reading {rel} failed after {size - remaining} bytes: {e}") from e
+        if not block:
+            # File shrank while reading: keep the tar stream consistent
+            block = b"\0" * remaining
+        digest.update(block)
+        out.write(cobj.compress(block))
+        remaining -= len(block)
+
+    out.write(cobj.compress(_padding(size)))
+    out.write(cobj.flush())
+
+    return {
+        "path": rel, "size": size, "mtime": int(st.st_mtime),
+        "mode": st.st_mode & 0o7777, "hash": digest.hexdigest(),
+        "header_size": len(header),
+    }
+
+
+def manifest_text(name: str) -> bytes:
+    return (
+        "Homelab Backup Manifest\n"
+        "=======================\n"
+        f"Created: {time.strftime('%Y-%m-%d %H:%M:%S %Z')}\n"
+        f"Hostname: {socket.gethostname()}\n"
+        f"Backup ID: {name}\n\n"
+        "Restore Instructions:\n"
+        "---------------------\n"
+        "1. Extract this archive to /opt/homelab\n"
+        "2. Run: cd /opt/homelab && npm install (in dashboard directory)\n"
+        "3. Run: sudo docker compose up -d\n"
+        "4. Reload Home Assistant configuration\n\n"
+        "Note: Frigate models will be re-downloaded on first start.\n"
+    ).encode()
+
+
+def write_archive(root: Path, files, name: str, sinks, codec: Codec) -> dict:
+    """
+    Stream files (iterable of (relative path, stat)) into a tar archive
+    written to all sinks. Members are stored under "<name>/". Returns the
+    archive index.
+
+    A file that vanished or cannot be opened or read before any of it is
+    written is left out. Sink write errors and read errors part way through
+    a member are raised - the archive is incomplete and must not be kept.
+    """
+    out = Tee(*sinks)
+    entries = []
+
+    def emit(entry, frame):
+        entry["offset"] = out.offset
+        out.write(frame)
+        entry["length"] = out.offset - entry["offset"]
+        entries.append(entry)
+
+    # MANIFEST.txt first, generated in memory
+    manifest = manifest_text(name)
+    cobj = codec.compressobj()
+    header = _tar_header(f"{name}/MANIFEST.txt", len(manifest), time.time(), 0o644)
+    frame = cobj.compress(header + manifest + _padding(len(manifest))) + cobj.flush()
+    emit({"path": "MANIFEST.txt", "size": len(manifest), "mtime": int(time.time()),
+          "mode": 0o644, "hash": hashlib.blake2b(manifest, digest_size=20).hexdigest(),
+          "header_size": len(header)}, frame)
+
+    # Small files compress in parallel; results are written in order through a
+    # bounded window so memory stays at roughly WORKERS * PARALLEL_FILE_LIMIT
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        pending = []
+
+        def drain(limit):
+            while len(pending) > limit:
+                try:
+                    result = pending.pop(0).result()
+                except OSError:
+                    continue
+                emit(*result)
+
+        for rel, st in files:
+            arcname = f"{name}/{rel}"
+            if st.st_size <= PARALLEL_FILE_LIMIT:
+                pending.append(pool.submit(_compress_small, codec, root, rel, arcname))
+                drain(WORKERS * 2)
+                continue
+            drain(0)
+            try:
+                f = open(root / rel, "rb")
+                st = os.fstat(f.fileno())
+            except OSError:
+                continue
+            offset = out.offset
+            with f:
+                entry = _stream_large(codec, out, f, st, rel, arcname)
+            entry["offset"] = offset
+            entry["length"] = out.offset - offset
+            entries.append(entry)
+        drain(0)
+
+    # End-of-archive marker as its own frame
+    cobj = codec.compressobj()
+    out.write(cobj.compress(b"\0" * tarfile.BLOCKSIZE * 2) + cobj.flush())
+
+    return {
+        "version": INDEX_VERSION,
+        "archive": name + codec.suffix,
+        "codec": codec.name,
+        "prefix": name,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "hostname": socket.gethostname(),
+        "archive_size": out.offset,
+        "archive_hash": out.digest.hexdigest(),
+        "files": entries,
+    }
+
+
+def index_name(archive_name: str) -> str:
+    """homelab-backup-X.tar.zst -> homelab-backup-X.index.json.gz"""
+    base = archive_name.split(".tar.")[0]
+    return f"{base}.index.json.gz"
+
+
+def encode_index(index: dict) -> bytes:
+    return gzip.compress(json.dumps(index, separators=(",", ":")).encode(), mtime=0)
+
+
+def decode_index(blob: bytes) -> dict:
+    return json.loads(gzip.decompress(blob))
+
+
+def create_archive(root: Path, files, name: str, local_dir: Path = None,
+                   remote: str = None, rclone_config: str = None,
+                   codec: Codec = None) -> dict:
+    """
+    Archive files into local_dir and/or remote in a single streaming pass,
+    then write the index next to the archive in both places.
+    """
+    codec = codec or get_codec()
+    archive_name = name + codec.suffix
+    local = upload = None
+    ok = False
+    try:
+        if local_dir is not None:
+            local_dir.mkdir(parents=True, exist_ok=True)
+            local = open(local_dir / (archive_name + ".partial"), "wb")
+        if remote:
+            upload = open_upload(remote, archive_name, rclone_config)
+        index = write_archive(root, files, name, [local, upload], codec)
+        ok = True
+    finally:
+        # Close every sink even if one fails; a failed close (ENOSPC on the
+        # final flush, rclone exiting non-zero) fails the whole archive
+        written, error = ok, None
+        for sink in (local, upload):
+            try:
+                close_sink(sink, ok)
+            except Exception as e:
+                error = error or e
+                ok = False
+        if local_dir is not None:
+            partial = local_dir / (archive_name + ".partial")
+            if ok:
+                os.replace(partial, local_dir / archive_name)
+            else:
+                partial.unlink(missing_ok=True)
+        if written and error is not None:
+            raise error
+
+    blob = encode_index(index)
+    if local_dir is not None:
+        (local_dir / index_name(archive_name)).write_bytes(blob)
+    if remote:
+        sink = open_upload(remote, index_name(archive_name), rclone_config)
+        try:
+            sink.write(blob)
+        finally:
+            close_sink(sink, True)
+    return index
+
+
+def read_member(archive: io.BufferedIOBase, entry: dict, codec: Codec) -> bytes:
+    """Decode one member's data given an open archive and its index entry."""
+    archive.seek(entry["offset"])
+    frame = archive.read(entry["length"])
+    raw = codec.decompress(frame)
+    start = entry["header_size"]
+    return raw[start:start + entry["size"]]
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Homelab Backup Engine - Incremental change detection for backup-to-cloud.sh
+
+Keeps a persistent manifest of (path, size, mtime, blake2b hash) for every
+file that goes into a backup. Each run is a stat walk: only files whose
+size/mtime changed since the last scan are re-hashed, and the result is
+compared against the state that was last successfully backed up.
+
+Backups are stored in a deduplicated chunk repository (see backup_store.py):
+only chunks that are new since the last run are written and uploaded.
+
+Usage:
+    backup_engine.py changes [--json]   Exit 0 if files changed, 3 if not
+    backup_engine.py commit             Mark the current scan as backed up
+    backup_engine.py list               Print every tracked file
+    backup_engine.py backup [--remote R] Snapshot into the chunk repository
+    backup_engine.py snapshots [--remote R]
+    backup_engine.py prune [--keep-days N] [--keep-last N]
+    backup_engine.py verify [--remote R] [--read-data]
+    backup_engine.py archive [--remote R] Stream a full standalone archive
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import backup_archive
+import backup_store
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+MANIFEST_FILE = Path(os.environ.get(
+    "BACKUP_MANIFEST", HOMELAB_DIR / "backups" / ".backup-manifest.json"))
+
+# Chunk repository: local copy plus the remote it is mirrored to
+LOCAL_REPO = Path(os.environ.get("BACKUP_LOCAL_REPO", HOMELAB_DIR / "backups" / "repo"))
+BACKUP_REMOTE = os.environ.get("BACKUP_REMOTE", "backblaze:your-bucket-name/repo")
+# Full standalone archives (backup-to-cloud.sh --archive)
+ARCHIVE_DIR = Path(os.environ.get("BACKUP_DIR", HOMELAB_DIR / "backups" / "local"))
+ARCHIVE_REMOTE = os.environ.get("BACKUP_ARCHIVE_REMOTE", "backblaze:your-bucket-name")
+RCLONE_CONFIG = os.environ.get("RCLONE_CONFIG", str(HOMELAB_DIR / "backups" / "rclone.conf"))
+
+# Local retention (cloud retention is indefinite)
+LOCAL_RETENTION_DAYS = 7
+LOCAL_KEEP_LAST = 7
+
+MANIFEST_VERSION = 1
+HASH_DIGEST_SIZE = 20
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Distinct from 1 so a crash is never mistaken for "nothing changed"
+EXIT_NO_CHANGES = 3
+
+# What goes into a backup: (directory relative to HOMELAB_DIR, recursive, patterns)
+# Mirrors the file set copied by create_backup() in backup-to-cloud.sh
+BACKUP_SOURCES = [
+    ("homeassistant", False,
+     ("configuration.yaml", "automations.yaml", "scripts.yaml", "secrets.yaml", "scenes.yaml")),
+    ("homeassistant/www/dashboard", False,
+     ("*.html", "*.js", "*.json", "*.png", "*.jpeg", "*.jpg", "*.sh")),
+    ("homeassistant/www/dashboard/js", True, ("*",)),
+    ("homeassistant/www/dashboard/css", True, ("*",)),
+    ("homeassistant/www/dashboard/views", True, ("*",)),
+    ("homeassistant/www/dashboard/modals", True, ("*",)),
+    ("homeassistant/www/dashboard/src", True, ("*",)),
+    ("homeassistant/www/dashboard/images", True, ("*",)),
+    ("frigate/config", False, ("config.yml", "go2rtc_homekit.yml")),
+    ("", False, ("docker-compose.yml", ".env", ".gitignore", "CLAUDE.md", "README.md")),
+    ("nginx-proxy", True, ("*",)),
+    ("mosquitto/config", True, ("*",)),
+    ("scripts", True, ("*",)),
+]
+
+# Directories never descended into, wherever they appear
+EXCLUDE_DIRS = {"node_modules", "data", "__pycache__", ".git"}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# SCANNING
+# ============================================
+
+def hash_file(path: Path) -> str:
+    """Return the blake2b hex digest of a file's contents."""
+    digest = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    with open(path, "rb") as f:
+        while block := f.read(READ_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _walk(directory: Path, recursive: bool):
+    """Yield (path, stat) for regular files under directory."""
+    try:
+        entries = list(os.scandir(directory))
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive and entry.name not in EXCLUDE_DIRS:
+                    yield from _walk(Path(entry.path), recursive)
+            elif entry.is_file():
+                yield Path(entry.path), entry.stat()
+        except OSError:
+            continue
+
+
+def iter_backup_files(root: Path = None):
+    """Yield (relative path, stat) for every file covered by BACKUP_SOURCES."""
+    root = root or HOMELAB_DIR
+    seen = set()
+    for rel_dir, recursive, patterns in BACKUP_SOURCES:
+        for path, st in _walk(root / rel_dir, recursive):
+            if not any(fnmatch.fnmatch(path.name, p) for p in patterns):
+                continue
+            rel = path.relative_to(root).as_posix()
+            if rel not in seen:
+                seen.add(rel)
+                yield rel, st
+
+
+class Manifest:
+    """
+    Persistent record of file metadata and content hashes.
+
+    `files` is the most recent scan ({path: [size, mtime_ns, hash]}) and acts
+    as the stat cache. `committed` is {path: hash} as of the last successful
+    backup; the difference between the two is what needs backing up.
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = path or MANIFEST_FILE
+        self.files = {}
+        self.committed = {}
+        self.scanned_at_ns = 0
+        self.rehashed = 0
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return self
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+            return self
+
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning(f"Manifest version mismatch, rebuilding: {self.path}")
+            return self
+
+        self.files = data.get("files", {})
+        self.committed = data.get("committed", {})
+        self.scanned_at_ns = data.get("scanned_at_ns", 0)
+        return self
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "scanned_at_ns": self.scanned_at_ns,
+                "files": self.files,
+                "committed": self.committed,
+            }, f, separators=(",", ":"), sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def scan(self, root: Path = None):
+        """
+        Refresh `files` with a stat walk, re-hashing only changed files.
+
+        A cached hash is trusted only if size and mtime match and the file
+        was not modified within the same timestamp window as the previous
+        scan (a write landing in that window would not move the mtime).
+        """
+        root = root or HOMELAB_DIR
+        started_ns = time.time_ns()
+        racy_after_ns = self.scanned_at_ns - 2_000_000_000
+        current = {}
+        self.rehashed = 0
+
+        for rel, st in iter_backup_files(root):
+            cached = self.files.get(rel)
+            if (cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns
+                    and st.st_mtime_ns < racy_after_ns):
+                current[rel] = cached
+                continue
+            try:
+                digest = hash_file(root / rel)
+            except OSError as e:
+                logger.warning(f"Could not read {rel}: {e}")
+                continue
+            current[rel] = [st.st_size, st.st_mtime_ns, digest]
+            self.rehashed += 1
+
+        self.files = current
+        self.scanned_at_ns = started_ns
+        return self
+
+    def diff(self) -> dict:
+        """Compare the latest scan against the last committed backup."""
+        added, modified = [], []
+        for rel, (_, _, digest) in self.files.items():
+            previous = self.committed.get(rel)
+            if previous is None:
+                added.append(rel)
+            elif previous != digest:
+                modified.append(rel)
+        removed = [rel for rel in self.committed if rel not in self.files]
+        return {
+            "added": sorted(added),
+            "modified": sorted(modified),
+            "removed": sorted(removed),
+        }
+
+    def commit(self):
+        self.committed = {rel: entry[2] for rel, entry in self.files.items()}
+
+# ============================================
+# COMMANDS
+# ============================================
+
+def cmd_changes(args) -> int:
+    manifest = Manifest().load().scan()
+    manifest.save()
+    changes = manifest.diff()
+    total = sum(len(v) for v in changes.values())
+
+    if args.json:
+        print(json.dumps({"changed": total, **changes}, indent=2))
+    else:
+        for kind, marker in (("added", "+"), ("modified", "M"), ("removed", "-")):
+            for rel in changes[kind]:
+                print(f"{marker} {rel}")
+
+    logger.info(f"Scanned {len(manifest.files)} files, re-hashed {manifest.rehashed}, "
+                f"{total} changed since last backup")
+    return 0 if total else EXIT_NO_CHANGES
+
+
+def cmd_commit(args) -> int:
+    manifest = Manifest().load()
+    if not manifest.files:
+        manifest.scan()
+    manifest.commit()
+    manifest.save()
+    logger.info(f"Committed {len(manifest.committed)} files as backed up")
+    return 0
+
+
+def cmd_list(args) -> int:
+    manifest = Manifest().load().scan()
+    manifest.save()
+    for rel, (size, _, digest) in sorted(manifest.files.items()):
+        print(f"{digest}  {size:>10}  {rel}")
+    return 0
+
+
+def _remote(args):
+    return backup_store.open_remote(args.remote, args.rclone_config) if args.remote else None
+
+
+def cmd_backup(args) -> int:
+    manifest = Manifest().load().scan()
+    manifest.save()
+
+    store = backup_store.ChunkStore(backup_store.LocalRemote(LOCAL_REPO), _remote(args))
+    snapshot = store.create_snapshot(HOMELAB_DIR, manifest.files)
+    stats = store.stats
+    logger.info(f"Snapshot {snapshot['id']}: {stats['files']} files "
+                f"({stats['reused_files']} unchanged), {stats['new_chunks']}/{stats['chunks']} "
+                f"new chunks, {stats['new_bytes']} bytes new, {stats['stored_bytes']} stored")
+
+    if store.remote is not None:
+        try:
+            uploaded = store.push(snapshot)
+        except Exception as e:
+            logger.error(f"Upload to {store.remote} failed: {e}")
+            return 1
+        logger.info(f"Uploaded {uploaded} chunk(s) and snapshot index to {store.remote}")
+
+    manifest.commit()
+    manifest.save()
+    print(snapshot["id"])
+    return 0
+
+
+def cmd_snapshots(args) -> int:
+    repo = _remote(args) or backup_store.LocalRemote(LOCAL_REPO)
+    for snapshot_id in backup_store.list_snapshots(repo):
+        snapshot = backup_store.load_snapshot(repo, snapshot_id)
+        size = sum(f["size"] for f in snapshot["files"])
+        print(f"{snapshot_id}  {len(snapshot['files']):>5} files  {size:>12} bytes  "
+              f"{snapshot['hostname']}")
+    return 0
+
+
+def cmd_prune(args) -> int:
+    store = backup_store.ChunkStore(backup_store.LocalRemote(LOCAL_REPO))
+    snapshots, chunks = store.prune(args.keep_last, args.keep_days)
+    logger.info(f"Pruned {snapshots} local snapshot(s) and {chunks} unreferenced chunk(s)")
+    return 0
+
+
+def cmd_verify(args) -> int:
+    repo = _remote(args) or backup_store.LocalRemote(LOCAL_REPO)
+    problems = backup_store.verify_repository(repo, args.snapshot, args.read_data)
+    for problem in problems:
+        logger.error(problem)
+    if problems:
+        return 1
+    logger.info(f"Repository {repo} verified OK")
+    return 0
+
+
+def cmd_archive(args) -> int:
+    name = f"homelab-backup-{time.strftime('%Y%m%d_%H%M%S')}"
+    local_dir = None if args.no_local else ARCHIVE_DIR
+    try:
+        codec = backup_archive.get_codec(args.codec)
+        started = time.monotonic()
+        index = backup_archive.create_archive(
+            HOMELAB_DIR, iter_backup_files(), name, local_dir=local_dir,
+            remote=args.remote, rclone_config=args.rclone_config, codec=codec)
+    except Exception as e:
+        logger.error(f"Archive failed: {e}")
+        return 1
+
+    elapsed = time.monotonic() - started
+    raw = sum(f["size"] for f in index["files"])
+    logger.info(f"Archived {len(index['files'])} files ({raw} bytes) into "
+                f"{index['archive']} ({index['archive_size']} bytes, {codec.name}) "
+                f"in {elapsed:.1f}s")
+    print(index["archive"])
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Homelab backup engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("changes", help="Report files changed since the last backup")
+    p.add_argument("--json", action="store_true", help="Print the change report as JSON")
+    p.set_defaults(func=cmd_changes)
+
+    p = sub.add_parser("commit", help="Record the current scan as backed up")
+    p.set_defaults(func=cmd_commit)
+
+    p = sub.add_parser("list", help="List tracked files with their hashes")
+    p.set_defaults(func=cmd_list)
+
+    def add_remote_args(p, default=None):
+        p.add_argument("--remote", default=default,
+                       help="Remote repository: a local directory or an rclone remote")
+        p.add_argument("--rclone-config", default=RCLONE_CONFIG)
+
+    p = sub.add_parser("backup", help="Snapshot changed files into the chunk repository")
+    add_remote_args(p, BACKUP_REMOTE)
+    p.add_argument("--no-upload", dest="remote", action="store_const", const=None,
+                   help="Only write to the local repository")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("snapshots", help="List snapshots (local repository by default)")
+    add_remote_args(p)
+    p.set_defaults(func=cmd_snapshots)
+
+    p = sub.add_parser("prune", help="Apply local retention and garbage-collect chunks")
+    p.add_argument("--keep-days", type=int, default=LOCAL_RETENTION_DAYS)
+    p.add_argument("--keep-last", type=int, default=LOCAL_KEEP_LAST)
+    p.set_defaults(func=cmd_prune)
+
+    p = sub.add_parser("archive", help="Stream a full archive to the local dir and remote")
+    add_remote_args(p, ARCHIVE_REMOTE)
+    p.add_argument("--no-upload", dest="remote", action="store_const", const=None,
+                   help="Only write the local archive")
+    p.add_argument("--no-local", action="store_true", help="Only upload, keep no local copy")
+    p.add_argument("--codec", choices=("zstd", "gzip"),
+                   help="Compression codec (default: zstd if installed, else gzip)")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("verify", help="Check that snapshots are complete and intact")
+    add_remote_args(p)
+    p.add_argument("--snapshot", action="append", help="Only verify these snapshot ids")
+    p.add_argument("--read-data", action="store_true",
+                   help="Download and re-hash every chunk, not just check existence")
+    p.set_defaults(func=cmd_verify)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Homelab Selective Restore - restore individual files from cloud backups
+
+Works from the small per-backup indexes instead of whole archives:
+  - Snapshots (backup_store.py repository): the snapshot index lists each
+    file's chunks, so only those chunks are downloaded.
+  - Full archives (backup_archive.py): the sidecar index records each
+    member's compressed offset/length, so only those byte ranges are read.
+
+Downloads run in parallel, every file is checked against its recorded hash,
+and nothing in the target tree is touched until all requested files have
+been fetched and verified. Existing files are then swapped out atomically
+(temp file + rename) after being copied to a pre-restore directory.
+
+Usage:
+    backup_restore.py list
+    backup_restore.py files <backup> [PATTERN ...]
+    backup_restore.py restore <backup> PATH [PATH ...] [--target DIR]
+
+<backup> is a snapshot id (e.g. 20250114_020001), a unique prefix of one,
+"latest", or an archive name such as homelab-backup-20250114_020001.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import backup_archive
+import backup_engine
+import backup_store
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = backup_engine.HOMELAB_DIR
+PRE_RESTORE_DIR = HOMELAB_DIR / "backups"
+DOWNLOAD_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# INDEX LOOKUP
+# ============================================
+
+ARCHIVE_PREFIX = "homelab-backup-"
+
+
+class Backup:
+    """A snapshot or archive, resolved to its file index."""
+
+    def __init__(self, kind: str, name: str, remote, files: list, codec=None, archive=None):
+        self.kind = kind
+        self.name = name
+        self.remote = remote
+        self.files = files
+        self.codec = codec
+        self.archive = archive
+
+
+def resolve_backup(ident: str, repo, archives) -> Backup:
+    """Load the index for a snapshot id/prefix, "latest" or an archive name."""
+    if ident.startswith(ARCHIVE_PREFIX):
+        base = ident.split(".tar.")[0].removesuffix(".index.json.gz")
+        index = backup_archive.decode_index(archives.get(f"{base}.index.json.gz"))
+        return Backup("archive", base, archives, index["files"],
+                      codec=backup_archive.codec_for_archive(index["archive"]),
+                      archive=index["archive"])
+
+    snapshots = backup_store.list_snapshots(repo)
+    if not snapshots:
+        raise LookupError(f"No snapshots in {repo}")
+    if ident == "latest":
+        matches = snapshots[-1:]
+    else:
+        matches = [s for s in snapshots if s.startswith(ident)]
+    if len(matches) != 1:
+        raise LookupError(f"'{ident}' matches {len(matches)} snapshots in {repo}")
+
+    snapshot = backup_store.load_snapshot(repo, matches[0])
+    return Backup("snapshot", matches[0], repo, snapshot["files"])
+
+
+def select_files(files: list, patterns: list) -> list:
+    """Entries matching any pattern: an exact path, a directory, or a glob."""
+    if not patterns:
+        return list(files)
+    selected = []
+    for entry in files:
+        path = entry["path"]
+        for pattern in patterns:
+            pattern = pattern.strip("/")
+            if (path == pattern or path.startswith(pattern + "/")
+                    or fnmatch.fnmatch(path, pattern)):
+                selected.append(entry)
+                break
+    return selected
+
+# ============================================
+# FETCHING
+# ============================================
+
+def _verify(entry: dict, data: bytes) -> bytes:
+    if hashlib.blake2b(data, digest_size=20).hexdigest() != entry["hash"]:
+        raise ValueError(f"{entry['path']}: content hash mismatch")
+    return data
+
+
+def fetch_files(backup: Backup, entries: list, workers: int = DOWNLOAD_WORKERS) -> dict:
+    """Download and verify the given entries in parallel. Returns {path: bytes}."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if backup.kind == "archive":
+            def fetch_member(entry):
+                frame = backup.remote.get_range(backup.archive, entry["offset"], entry["length"])
+                raw = backup.codec.decompress(frame)
+                start = entry["header_size"]
+                return entry["path"], _verify(entry, raw[start:start + entry["size"]])
+
+            return dict(pool.map(fetch_member, entries))
+
+        # Snapshot: fetch each distinct chunk once, then assemble files
+        needed = sorted({cid for entry in entries for cid in entry["chunks"]})
+
+        def fetch_chunk(cid):
+            chunk = backup_store.decode_chunk(backup.remote.get(backup_store.chunk_path(cid)))
+            if backup_store.chunk_id(chunk) != cid:
+                raise ValueError(f"Chunk {cid} is corrupt")
+            return cid, chunk
+
+        chunks = dict(pool.map(fetch_chunk, needed))
+
+    return {
+        entry["path"]: _verify(entry, b"".join(chunks[cid] for cid in entry["chunks"]))
+        for entry in entries
+    }
+
+# ============================================
+# ATOMIC APPLY
+# ============================================
+
+def apply_files(target: Path, entries: list, contents: dict, pre_restore: Path = None) -> int:
+    """
+    Write every file to a temp file beside its destination, then rename them
+    all into place. If any temp write fails, nothing is replaced.
+    """
+    staged = []
+    try:
+        for entry in entries:
+            dest = target / entry["path"]
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".restore")
+            staged.append((tmp, dest, entry))
+            with os.fdopen(fd, "wb") as f:
+                f.write(contents[entry["path"]])
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, entry.get("mode", 0o644))
+            mtime = entry.get("mtime_ns", entry.get("mtime", 0) * 1_000_000_000)
+            os.utime(tmp, ns=(mtime, mtime))
+    except BaseException:
+        for tmp, _, _ in staged:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+        raise
+
+    for tmp, dest, entry in staged:
+        if pre_restore is not None and dest.exists():
+            keep = pre_restore / entry["path"]
+            keep.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(dest, keep)
+        os.replace(tmp, dest)
+    return len(staged)
+
+# ============================================
+# COMMANDS
+# ============================================
+
+def _remotes(args):
+    repo = backup_store.open_remote(args.repo, args.rclone_config)
+    archives = backup_store.open_remote(args.archives, args.rclone_config)
+    return repo, archives
+
+
+def cmd_list(args) -> int:
+    repo, archives = _remotes(args)
+    print("Snapshots:")
+    for snapshot_id in backup_store.list_snapshots(repo):
+        print(f"  {snapshot_id}")
+    print("Archives:")
+    for name in archives.glob(f"{ARCHIVE_PREFIX}*.index.json.gz"):
+        print(f"  {name.removesuffix('.index.json.gz')}")
+    return 0
+
+
+def cmd_files(args) -> int:
+    repo, archives = _remotes(args)
+    backup = resolve_backup(args.backup, repo, archives)
+    for entry in select_files(backup.files, args.patterns):
+        mtime = time.strftime("%Y-%m-%d %H:%M", time.localtime(
+            entry.get("mtime_ns", entry.get("mtime", 0) * 1_000_000_000) / 1e9))
+        print(f"{entry['size']:>10}  {mtime}  {entry['path']}")
+    return 0
+
+
+def cmd_restore(args) -> int:
+    repo, archives = _remotes(args)
+    started = time.monotonic()
+    backup = resolve_backup(args.backup, repo, archives)
+    entries = select_files(backup.files, args.paths)
+    if not entries:
+        logger.error(f"No files in {backup.name} match: {' '.join(args.paths)}")
+        return 1
+
+    logger.info(f"Restoring {len(entries)} file(s) from {backup.kind} {backup.name}")
+    try:
+        contents = fetch_files(backup, entries, args.jobs)
+    except Exception as e:
+        logger.error(f"Download failed, nothing restored: {e}")
+        return 1
+    fetched = sum(len(v) for v in contents.values())
+
+    if args.dry_run:
+        for entry in entries:
+            print(f"would restore {entry['path']} ({entry['size']} bytes)")
+        return 0
+
+    pre_restore = None
+    if not args.no_pre_restore:
+        pre_restore = PRE_RESTORE_DIR / f"pre-restore-{time.strftime('%Y%m%d_%H%M%S')}"
+    count = apply_files(args.target, entries, contents, pre_restore)
+
+    for entry in entries:
+        print(f"restored {entry['path']}")
+    logger.info(f"Restored {count} file(s), {fetched} bytes in {time.monotonic() - started:.1f}s")
+    if pre_restore is not None and pre_restore.exists():
+        logger.info(f"Previous versions saved to {pre_restore}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Restore individual files from backups")
+    parser.add_argument("--repo", default=backup_engine.BACKUP_REMOTE,
+                        help="Snapshot repository (local directory or rclone remote)")
+    parser.add_argument("--archives", default=backup_engine.ARCHIVE_REMOTE,
+                        help="Location of full archives and their indexes")
+    parser.add_argument("--rclone-config", default=backup_engine.RCLONE_CONFIG)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list", help="List snapshots and archives")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("files", help="List files in a backup without downloading it")
+    p.add_argument("backup")
+    p.add_argument("patterns", nargs="*", help="Paths, directories or globs")
+    p.set_defaults(func=cmd_files)
+
+    p = sub.add_parser("restore", help="Restore selected files")
+    p.add_argument("backup")
+    p.add_argument("paths", nargs="+", help="Paths, directories or globs to restore")
+    p.add_argument("--target", type=Path, default=HOMELAB_DIR,
+                   help="Directory to restore into (default: HOMELAB_DIR)")
+    p.add_argument("--jobs", type=int, default=DOWNLOAD_WORKERS, help="Parallel downloads")
+    p.add_argument("--dry-run", action="store_true", help="Fetch and verify, but write nothing")
+    p.add_argument("--no-pre-restore", action="store_true",
+                   help="Do not keep copies of the files being replaced")
+    p.set_defaults(func=cmd_restore)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except LookupError as e:
+        logger.error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+"""
+Content-addressed chunk store for homelab backups.
+
+Files are split into variable-size chunks with a gear-hash content-defined
+chunker, so an edit in the middle of automations.yaml only produces new
+chunks around the edit. Each unique chunk is stored once, compressed, under
+its blake2b id. A backup run writes a small snapshot index that lists every
+file with its chunk ids.
+
+Repository layout (identical locally and on the remote):
+    chunks/<id[:2]>/<id>        Compressed chunk payload
+    snapshots/<snapshot>.json.gz  Snapshot index
+
+Remotes are either a local directory (used for testing and local mirrors)
+or an rclone remote such as "backblaze:bucket/repo".
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+# ============================================
+# CHUNKING
+# ============================================
+
+CHUNK_MIN = 16 * 1024
+CHUNK_AVG = 64 * 1024
+CHUNK_MAX = 256 * 1024
+
+CHUNK_ID_SIZE = 20
+
+# FastCDC normalized chunking: a stricter mask before the average size and a
+# looser one after it keeps chunk sizes clustered around CHUNK_AVG
+_MASK_STRICT = ((1 << 18) - 1) << 40
+_MASK_LOOSE = ((1 << 14) - 1) << 40
+_MASK_64 = (1 << 64) - 1
+
+GEAR = [
+    int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "big")
+    for i in range(256)
+]
+
+
+def _cut_point(data: bytes, start: int, end: int) -> int:
+    """Return the end offset of the chunk beginning at start."""
+    if end - start <= CHUNK_MIN:
+        return end
+
+    limit = min(start + CHUNK_MAX, end)
+    normal = min(start + CHUNK_AVG, limit)
+    gear = GEAR
+    h = 0
+
+    i = start + CHUNK_MIN
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & _MASK_64
+        i += 1
+        if not h & _MASK_STRICT:
+            return i
+    while i < limit:
+        h = ((h << 1) + gear[data[i]]) & _MASK_64
+        i += 1
+        if not h & _MASK_LOOSE:
+            return i
+    return limit
+
+
+def iter_chunks(data: bytes):
+    """Yield consecutive content-defined chunks of data."""
+    pos = 0
+    end = len(data)
+    while pos < end:
+        cut = _cut_point(data, pos, end)
+        yield data[pos:cut]
+        pos = cut
+
+
+def chunk_id(chunk: bytes) -> str:
+    return hashlib.blake2b(chunk, digest_size=CHUNK_ID_SIZE).hexdigest()
+
+# ============================================
+# CHUNK ENCODING
+# ============================================
+
+# One-byte codec tag in front of every stored chunk. Ids are computed over the
+# plaintext, so switching codecs never breaks deduplication.
+CODEC_NONE = b"N"
+CODEC_ZLIB = b"Z"
+
+
+def encode_chunk(chunk: bytes) -> bytes:
+    compressed = zlib.compress(chunk, 6)
+    if len(compressed) >= len(chunk):
+        return CODEC_NONE + chunk
+    return CODEC_ZLIB + compressed
+
+
+def decode_chunk(blob: bytes) -> bytes:
+    codec, payload = blob[:1], blob[1:]
+    if codec == CODEC_NONE:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    raise ValueError(f"Unknown chunk codec: {codec!r}")
+
+# ============================================
+# REMOTES
+# ============================================
+
+def chunk_path(cid: str) -> str:
+    return f"chunks/{cid[:2]}/{cid}"
+
+
+def snapshot_path(snapshot_id: str) -> str:
+    return f"snapshots/{snapshot_id}.json.gz"
+
+
+class LocalRemote:
+    """Repository stored in a local directory."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def __str__(self):
+        return str(self.root)
+
+    def list(self, prefix: str) -> set:
+        base = self.root / prefix
+        if not base.is_dir():
+            return set()
+        return {
+            p.relative_to(self.root).as_posix()
+            for p in base.rglob("*") if p.is_file() and not p.name.endswith(".tmp")
+        }
+
+    def exists(self, name: str) -> bool:
+        return (self.root / name).is_file()
+
+    def get(self, name: str) -> bytes:
+        return (self.root / name).read_bytes()
+
+    def get_range(self, name: str, offset: int, length: int) -> bytes:
+        with open(self.root / name, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def glob(self, pattern: str) -> list:
+        """Top-level object names matching pattern."""
+        return sorted(p.name for p in self.root.glob(pattern) if p.is_file())
+
+    def put(self, name: str, data: bytes):
+        """Write an object atomically (temp file + rename)."""
+        target = self.root / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, name: str):
+        try:
+            (self.root / name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def push(self, source: "LocalRemote", names):
+        """Copy objects from another local repository."""
+        for name in names:
+            self.put(name, source.get(name))
+
+
+class RcloneRemote:
+    """Repository stored on an rclone remote (e.g. Backblaze B2)."""
+
+    def __init__(self, remote: str, config: str = None):
+        self.remote = remote.rstrip("/")
+        self.config = config
+
+    def __str__(self):
+        return self.remote
+
+    def _rclone(self, *args, input=None) -> bytes:
+        cmd = ["rclone"]
+        if self.config:
+            cmd.append(f"--config={self.config}")
+        cmd.extend(args)
+        result = subprocess.run(cmd, input=input, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"rclone {args[0]} failed: {result.stderr.decode().strip()}")
+        return result.stdout
+
+    def list(self, prefix: str) -> set:
+        try:
+            out = self._rclone("lsf", "-R", "--files-only", f"{self.remote}/{prefix}")
+        except RuntimeError as e:
+            if "directory not found" in str(e):
+                return set()
+            raise
+        return {f"{prefix.rstrip('/')}/{line}" for line in out.decode().splitlines() if line}
+
+    def exists(self, name: str) -> bool:
+        return bool(self._rclone("lsf", f"{self.remote}/{name}").strip())
+
+    def get(self, name: str) -> bytes:
+        return self._rclone("cat", f"{self.remote}/{name}")
+
+    def get_range(self, name: str, offset: int, length: int) -> bytes:
+        """Ranged GET - only the requested bytes are downloaded."""
+        return self._rclone("cat", "--offset", str(offset), "--count", str(length),
+                            f"{self.remote}/{name}")
+
+    def glob(self, pattern: str) -> list:
+        """Top-level object names matching pattern."""
+        out = self._rclone("lsf", "--max-depth", "1", "--files-only",
+                           "--include", pattern, self.remote)
+        return sorted(line for line in out.decode().splitlines() if line)
+
+    def put(self, name: str, data: bytes):
+        self._rclone("rcat", f"{self.remote}/{name}", input=data)
+
+    def delete(self, name: str):
+        self._rclone("deletefile", f"{self.remote}/{name}")
+
+    def push(self, source: LocalRemote, names):
+        """Upload objects from a local repository in one rclone invocation."""
+        names = list(names)
+        if not names:
+            return
+        with tempfile.NamedTemporaryFile("w", suffix=".lst") as files_from:
+            files_from.write("\n".join(names) + "\n")
+            files_from.flush()
+            self._rclone("copy", "--files-from", files_from.name, "--no-traverse",
+                         str(source.root), self.remote)
+
+
+def open_remote(spec: str, rclone_config: str = None):
+    """A path (or file:// URL) is a local directory, anything else is rclone."""
+    if spec.startswith("file://"):
+        return LocalRemote(spec[len("file://"):])
+    if spec.startswith(("/", ".")):
+        return LocalRemote(spec)
+    return RcloneRemote(spec, rclone_config)
+
+# ============================================
+# SNAPSHOTS
+# ============================================
+
+def encode_snapshot(snapshot: dict) -> bytes:
+    raw = json.dumps(snapshot, separators=(",", ":"), sort_keys=True).encode()
+    return gzip.compress(raw, mtime=0)
+
+
+def decode_snapshot(blob: bytes) -> dict:
+    return json.loads(gzip.decompress(blob))
+
+
+def new_snapshot_id() -> str:
+    return time.strftime("%Y%m%d_%H%M%S")
+
+
+def list_snapshots(repo) -> list:
+    """Snapshot ids in repo, oldest first."""
+    return sorted(n.rsplit("/", 1)[-1][:-len(".json.gz")]
+                  for n in repo.list("snapshots") if n.endswith(".json.gz"))
+
+
+def load_snapshot(repo, snapshot_id: str) -> dict:
+    return decode_snapshot(repo.get(snapshot_path(snapshot_id)))
+
+
+class ChunkStore:
+    """
+    Local repository plus the remote it mirrors.
+
+    New chunks are written to the local repository first and then pushed to
+    the remote in one batch; chunks the remote already has are never sent.
+    """
+
+    def __init__(self, local: LocalRemote, remote=None):
+        self.local = local
+        self.remote = remote
+        self.local_chunks = {name.rsplit("/", 1)[-1] for name in local.list("chunks")}
+        self.stats = {"files": 0, "reused_files": 0, "chunks": 0,
+                      "new_chunks": 0, "new_bytes": 0, "stored_bytes": 0}
+
+    def latest_snapshot(self):
+        ids = list_snapshots(self.local)
+        return load_snapshot(self.local, ids[-1]) if ids else None
+
+    # ---- writing ----
+
+    def store_file(self, path: Path) -> tuple:
+        """Chunk a file into the local repository. Returns (hash, size, chunk ids)."""
+        data = path.read_bytes()
+        file_hash = hashlib.blake2b(data, digest_size=20).hexdigest()
+        ids = []
+        for chunk in iter_chunks(data):
+            cid = chunk_id(chunk)
+            ids.append(cid)
+            self.stats["chunks"] += 1
+            if cid not in self.local_chunks:
+                blob = encode_chunk(chunk)
+                self.local.put(chunk_path(cid), blob)
+                self.local_chunks.add(cid)
+                self.stats["new_chunks"] += 1
+                self.stats["new_bytes"] += len(chunk)
+                self.stats["stored_bytes"] += len(blob)
+        return file_hash, len(data), ids
+
+    def create_snapshot(self, root: Path, files: dict) -> dict:
+        """
+        Build a snapshot of root from a scan ({path: [size, mtime_ns, hash]}).
+
+        Files whose content hash already appears in the previous snapshot
+        reuse its chunk list without being read again.
+        """
+        previous = self.latest_snapshot()
+        known = {}
+        if previous:
+            known = {f["hash"]: f["chunks"] for f in previous["files"]}
+
+        entries = []
+        for rel, (size, mtime_ns, digest) in sorted(files.items()):
+            self.stats["files"] += 1
+            path = root / rel
+            try:
+                mode = path.stat().st_mode & 0o7777
+                if digest in known:
+                    chunks = known[digest]
+                    self.stats["reused_files"] += 1
+                else:
+                    digest, size, chunks = self.store_file(path)
+            except OSError:
+                continue
+            entries.append({"path": rel, "size": size, "mtime_ns": mtime_ns,
+                            "mode": mode, "hash": digest, "chunks": chunks})
+
+        snapshot = {
+            "id": new_snapshot_id(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "hostname": socket.gethostname(),
+            "parent": previous["id"] if previous else None,
+            "files": entries,
+        }
+        self.local.put(snapshot_path(snapshot["id"]), encode_snapshot(snapshot))
+        return snapshot
+
+    def push(self, snapshot: dict) -> int:
+        """Upload the chunks the remote is missing, then the snapshot index."""
+        if self.remote is None:
+            return 0
+        remote_chunks = {n.rsplit("/", 1)[-1] for n in self.remote.list("chunks")}
+        needed = {cid for f in snapshot["files"] for cid in f["chunks"]}
+        missing = sorted(needed - remote_chunks)
+        self.remote.push(self.local, [chunk_path(cid) for cid in missing])
+        # Index last: a snapshot on the remote implies all its chunks are there
+        self.remote.push(self.local, [snapshot_path(snapshot["id"])])
+        return len(missing)
+
+    # ---- retention ----
+
+    def prune(self, keep_last: int, keep_days: int) -> tuple:
+        """
+        Drop local snapshots outside the retention policy and garbage-collect
+        chunks no remaining snapshot references. Returns (snapshots, chunks)
+        removed.
+        """
+        ids = list_snapshots(self.local)
+        cutoff = time.strftime("%Y%m%d_%H%M%S", time.localtime(time.time() - keep_days * 86400))
+        keep = set(ids[-keep_last:]) if keep_last > 0 else set()
+        keep.update(i for i in ids if i >= cutoff)
+
+        removed_snapshots = 0
+        for snapshot_id in ids:
+            if snapshot_id not in keep:
+                self.local.delete(snapshot_path(snapshot_id))
+                removed_snapshots += 1
+
+        referenced = set()
+        for snapshot_id in keep:
+            for f in load_snapshot(self.local, snapshot_id)["files"]:
+                referenced.update(f["chunks"])
+
+        removed_chunks = 0
+        for cid in list(self.local_chunks - referenced):
+            self.local.delete(chunk_path(cid))
+            self.local_chunks.discard(cid)
+            removed_chunks += 1
+        return removed_snapshots, removed_chunks
+
+# ============================================
+# VERIFICATION
+# ============================================
+
+def verify_repository(repo, snapshot_ids=None, read_data=False) -> list:
+    """
+    Check that every chunk referenced by the given snapshots (default: all)
+    exists in repo. With read_data, chunks are downloaded, decoded and
+    re-hashed, and whole files are checked against their recorded hash.
+    Returns a list of problem descriptions; empty means the repo is sound.
+    """
+    problems = []
+    available = {n.rsplit("/", 1)[-1] for n in repo.list("chunks")}
+
+    for snapshot_id in snapshot_ids or list_snapshots(repo):
+        try:
+            snapshot = load_snapshot(repo, snapshot_id)
+        except Exception as e:
+            problems.append(f"{snapshot_id}: unreadable snapshot index ({e})")
+            continue
+
+        for f in snapshot["files"]:
+            missing = [cid for cid in f["chunks"] if cid not in available]
+            if missing:
+                problems.append(f"{snapshot_id}: {f['path']} missing {len(missing)} chunk(s)")
+                continue
+            if not read_data:
+                continue
+
+            digest = hashlib.blake2b(digest_size=20)
+            for cid in f["chunks"]:
+                try:
+                    chunk = decode_chunk(repo.get(chunk_path(cid)))
+                except Exception:
+                    chunk = None
+                if chunk is None or chunk_id(chunk) != cid:
+                    problems.append(f"{snapshot_id}: {f['path']} corrupt chunk {cid}")
+                    break
+                digest.update(chunk)
+            else:
+                if digest.hexdigest() != f["hash"]:
+                    problems.append(f"{snapshot_id}: {f['path']} content hash mismatch")
+    return problems
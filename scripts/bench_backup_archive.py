@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Backup Archive Benchmark - legacy staging tar/gzip vs streaming archiver
+
+Legacy path (what create_backup() + upload_to_cloud() used to do):
+    cp every file into a staging directory, tar -czf the staging tree,
+    delete the staging tree, then copy the archive to the "remote".
+Streaming path (backup_archive.py):
+    read each file once and stream compressed frames to the local archive
+    and the remote at the same time.
+
+The remote is a local directory so the numbers are repeatable. Reports wall
+time, bytes written to the backup disk and peak extra disk usage.
+
+Usage:
+    bench_backup_archive.py [--source DIR] [--synthetic-mb N] [--runs N]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import backup_archive
+import backup_engine
+
+
+def dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def make_synthetic_tree(root: Path, megabytes: int):
+    """A homelab-shaped tree: many small YAML/JS files plus some images."""
+    import random
+    rng = random.Random(42)
+    words = [b"automation", b"trigger", b"entity_id", b"service", b"camera",
+             b"front_door", b"person", b"condition", b"state", b"action"]
+
+    def text(size):
+        out = bytearray()
+        while len(out) < size:
+            out += b"  " + b" ".join(rng.choice(words) for _ in range(8)) + b"\n"
+        return bytes(out[:size])
+
+    budget = megabytes * 1024 * 1024
+    written = 0
+    dirs = ["homeassistant", "homeassistant/www/dashboard/js",
+            "homeassistant/www/dashboard/views", "homeassistant/www/dashboard/images",
+            "scripts", "frigate/config", "nginx-proxy", "mosquitto/config"]
+    for d in dirs:
+        (root / d).mkdir(parents=True, exist_ok=True)
+    for name in ("configuration.yaml", "automations.yaml", "scripts.yaml"):
+        data = text(200 * 1024)
+        (root / "homeassistant" / name).write_bytes(data)
+        written += len(data)
+    (root / "docker-compose.yml").write_bytes(text(10 * 1024))
+
+    i = 0
+    while written < budget:
+        if i % 10 == 0:
+            data = rng.randbytes(rng.randint(50, 500) * 1024)
+            path = root / "homeassistant/www/dashboard/images" / f"img{i}.png"
+        else:
+            data = text(rng.randint(2, 60) * 1024)
+            path = root / rng.choice(dirs[1:3] + ["scripts"]) / f"file{i}.js"
+        path.write_bytes(data)
+        written += len(data)
+        i += 1
+
+
+def run_legacy(source: Path, work: Path, files) -> dict:
+    backup_dir = work / "local"
+    remote = work / "remote"
+    backup_dir.mkdir()
+    remote.mkdir()
+    name = "homelab-backup-bench"
+    staging = backup_dir / name
+
+    start = time.perf_counter()
+    for rel, _ in files:
+        target = staging / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source / rel, target)
+    staged = dir_size(staging)
+    archive = backup_dir / f"{name}.tar.gz"
+    subprocess.run(["tar", "-czf", str(archive), "-C", str(backup_dir), name], check=True)
+    archive_size = archive.stat().st_size
+    shutil.rmtree(staging)
+    shutil.copyfile(archive, remote / archive.name)
+    elapsed = time.perf_counter() - start
+
+    return {"seconds": elapsed, "archive_bytes": archive_size,
+            "disk_written": staged + archive_size,
+            "peak_disk": staged + archive_size}
+
+
+def run_streaming(source: Path, work: Path, files, codec) -> dict:
+    backup_dir = work / "local"
+    remote = work / "remote"
+
+    start = time.perf_counter()
+    index = backup_archive.create_archive(
+        source, files, "homelab-backup-bench", local_dir=backup_dir,
+        remote=str(remote), codec=codec)
+    elapsed = time.perf_counter() - start
+
+    return {"seconds": elapsed, "archive_bytes": index["archive_size"],
+            "disk_written": index["archive_size"], "peak_disk": index["archive_size"]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--source", type=Path, default=backup_engine.HOMELAB_DIR,
+                        help="Tree to back up (default: HOMELAB_DIR)")
+    parser.add_argument("--synthetic-mb", type=int,
+                        help="Generate a synthetic tree of this size instead of --source")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="backup-bench-") as tmp:
+        tmp = Path(tmp)
+        source = args.source
+        if args.synthetic_mb:
+            source = tmp / "source"
+            make_synthetic_tree(source, args.synthetic_mb)
+
+        files = list(backup_engine.iter_backup_files(source))
+        raw = sum(st.st_size for _, st in files)
+        if not files:
+            print(f"No backup files found under {source}")
+            return 1
+        print(f"Source: {source} ({len(files)} files, {raw / 1e6:.1f} MB)\n")
+
+        variants = [("legacy cp + tar -czf", lambda w: run_legacy(source, w, files)),
+                    ("stream gzip", lambda w: run_streaming(
+                        source, w, files, backup_archive.GzipCodec()))]
+        if backup_archive.zstandard is not None:
+            variants.append(("stream zstd", lambda w: run_streaming(
+                source, w, files, backup_archive.ZstdCodec())))
+        else:
+            print("zstandard not installed - skipping zstd (pip install zstandard)\n")
+
+        print(f"{'Variant':<22} {'Median s':>9} {'Archive MB':>11} "
+              f"{'Disk written MB':>16} {'Peak disk MB':>13}")
+        for label, run in variants:
+            results = []
+            for i in range(args.runs):
+                work = tmp / f"run-{label.split()[0]}-{i}"
+                work.mkdir()
+                results.append(run(work))
+                shutil.rmtree(work)
+            last = results[-1]
+            print(f"{label:<22} {statistics.median(r['seconds'] for r in results):>9.3f} "
+                  f"{last['archive_bytes'] / 1e6:>11.2f} {last['disk_written'] / 1e6:>16.2f} "
+                  f"{last['peak_disk'] / 1e6:>13.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Frigate Event Router Benchmark - firehose triggers vs routed topics
+
+Replays a synthetic Frigate event stream (new -> many updates -> end per
+tracked object, with full before/after payloads) through a local MQTT broker
+twice, with a subscriber that behaves like Home Assistant's MQTT triggers:
+
+  firehose: the triggers automations.yaml used before the router - seven
+            subscribed to frigate/events, each decoding every payload.
+  routed:   the current triggers on frigate/events/<camera>/<label>/<type>,
+            with the router running in this process.
+
+Reports messages delivered to HA, trigger evaluations (value_template
+renders or automation runs), JSON bytes decoded, subscriber CPU time, and
+publish -> HA delivery latency (the difference is what the router adds).
+
+Needs a broker, e.g.:
+    docker run --rm -p 1883:1883 eclipse-mosquitto:2 mosquitto -c /mosquitto-no-auth.conf
+
+Usage:
+    bench_frigate_router.py [--host 127.0.0.1] [--port 1883] [--events 200]
+"""
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+
+import frigate_event_router
+import mqtt_client
+
+CAMERAS = {
+    "front_door": ["External_Front_Corridor", "Street"],
+    "backyard": ["Back_Yard", "Pool"],
+    "wyze_garage": ["Garage_Entrance", "Garage"],
+    "ezviz_indoor": ["Front_Door_and_Stairs", "Kitchen", "Ground_Passage", "TV_Room"],
+}
+LABELS = ["person", "person", "car", "dog"]
+
+INDOOR = ["Front_Door_and_Stairs", "Kitchen", "Ground_Passage", "TV_Room"]
+DOG_MODE_ZONES = {"front_door": ["External_Front_Corridor"], "backyard": ["Back_Yard"],
+                  "wyze_garage": ["Garage_Entrance", "Garage"], "ezviz_indoor": INDOOR}
+
+
+def _firehose_dog_mode(camera, threshold):
+    def check(v):
+        a = v["after"]
+        return (v["type"] == "new" and a["camera"] == camera and a["label"] == "person"
+                and a["score"] >= threshold
+                and any(z in DOG_MODE_ZONES[camera] for z in a.get("current_zones") or []))
+    return check
+
+
+def _routed_dog_mode(camera, threshold):
+    def check(v):
+        return v["score"] >= threshold and any(z in DOG_MODE_ZONES[camera] for z in v["zones"])
+    return check
+
+
+# (topic, check) pairs mirroring the MQTT triggers in automations.yaml.
+# check=None means no value_template: every message runs the automation,
+# whose variables/conditions decode the payload again.
+FIREHOSE_TRIGGERS = [
+    ("frigate/events", lambda v: v["type"] == "new" and v["after"]["camera"] == "wyze_garage"
+     and v["after"]["label"] == "person"),
+    ("frigate/events", _firehose_dog_mode("front_door", 0.65)),
+    ("frigate/events", _firehose_dog_mode("backyard", 0.65)),
+    ("frigate/events", _firehose_dog_mode("wyze_garage", 0.65)),
+    ("frigate/events", _firehose_dog_mode("ezviz_indoor", 0.75)),
+    ("frigate/events", None),   # critical alerts
+    ("frigate/events", None),   # armed dual notify
+]
+
+ROUTED_TRIGGERS = [
+    ("frigate/events/wyze_garage/person/new", None),
+    ("frigate/events/front_door/person/new", _routed_dog_mode("front_door", 0.65)),
+    ("frigate/events/backyard/person/new", _routed_dog_mode("backyard", 0.65)),
+    ("frigate/events/wyze_garage/person/new", _routed_dog_mode("wyze_garage", 0.65)),
+    ("frigate/events/ezviz_indoor/person/new", _routed_dog_mode("ezviz_indoor", 0.75)),
+    ("frigate/events/+/person/new", None),
+    ("frigate/events/+/person/zone", None),
+    ("frigate/events/+/person/new", None),
+]
+
+# ============================================
+# SYNTHETIC EVENTS
+# ============================================
+
+def synthetic_events(count: int, seed: int = 7):
+    """Yield raw frigate/events payloads shaped like Frigate 0.16's."""
+    rng = random.Random(seed)
+    now = time.time()
+    for n in range(count):
+        camera = rng.choice(list(CAMERAS))
+        label = rng.choice(LABELS)
+        event_id = f"{now + n:.6f}-{rng.randrange(36 ** 6):06x}"
+        yield from synthetic_event(rng, camera, label, event_id, now + n)
+
+
+def synthetic_event(rng, camera: str, label: str, event_id: str, start: float,
+                    updates: int = None, frame_interval: float = 0.2):
+    """Yield one tracked object's new -> updates -> end payloads, frame_interval apart."""
+    zones = []
+    score = top = rng.uniform(0.5, 0.7)
+    sub_label = None
+    has_snapshot = False
+    before = None
+    if updates is None:
+        updates = rng.randint(10, 60)
+    for i in range(updates + 2):
+        kind = "new" if i == 0 else "end" if i == updates + 1 else "update"
+        frame_time = start + i * frame_interval
+        score = min(0.99, max(0.4, score + rng.uniform(-0.05, 0.06)))
+        top = max(top, score)
+        if rng.random() < 0.08 and CAMERAS.get(camera):
+            zones = rng.sample(CAMERAS[camera], rng.randint(0, len(CAMERAS[camera])))
+        if label == "person" and sub_label is None and rng.random() < 0.02:
+            sub_label = ["person1", round(rng.uniform(0.8, 0.95), 2)]
+        has_snapshot = has_snapshot or i > 2
+        x, y = rng.randrange(1800), rng.randrange(1000)
+        after = {
+            "id": event_id, "camera": camera, "frame_time": frame_time,
+            "snapshot": {"frame_time": frame_time, "box": [x, y, x + 120, y + 300],
+                         "area": 36000, "region": [x - 100, y - 100, x + 220, y + 400],
+                         "score": score, "attributes": []},
+            "label": label, "sub_label": sub_label, "top_score": top,
+            "false_positive": top < 0.7, "start_time": start,
+            "end_time": frame_time if kind == "end" else None,
+            "score": score, "box": [x, y, x + 120, y + 300], "area": 36000,
+            "ratio": 0.4, "region": [x - 100, y - 100, x + 220, y + 400],
+            "active": True, "stationary": False, "motionless_count": 0,
+            "position_changes": i, "current_zones": zones,
+            "entered_zones": sorted(set(zones)), "has_clip": i > 3,
+            "has_snapshot": has_snapshot, "attributes": {},
+            "current_attributes": [], "pending_loitering": False,
+            "max_severity": "alert", "current_estimated_speed": 0,
+            "average_estimated_speed": 0, "velocity_angle": 0,
+            "path_data": [[[round(rng.random(), 4), round(rng.random(), 4)],
+                           start + k * frame_interval] for k in range(min(i, 12))],
+            "recognized_license_plate": None,
+        }
+        yield json.dumps({"before": before or after, "after": after, "type": kind}).encode()
+        before = after
+
+# ============================================
+# HA-LIKE SUBSCRIBER
+# ============================================
+
+class TriggerCounter:
+    """Subscribes once per topic and evaluates every trigger, like HA does."""
+
+    def __init__(self, triggers, sent: dict):
+        self.triggers = triggers
+        self.sent = sent
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.messages = self.evaluations = self.decoded = self.fired = 0
+        self.cpu = 0.0
+        self.last = time.monotonic()
+
+    def on_message(self, topic, payload):
+        received = time.perf_counter()
+        started = time.thread_time()
+        with self.lock:
+            published = self.sent.pop(payload, None)
+            if published is not None:
+                self.latencies.append(received - published)
+            self.messages += 1
+            for pattern, check in self.triggers:
+                if not _matches(pattern, topic):
+                    continue
+                value = json.loads(payload)
+                self.decoded += len(payload)
+                self.evaluations += 1
+                if check is None or check(value):
+                    self.fired += 1
+            self.cpu += time.thread_time() - started
+            self.last = time.monotonic()
+
+
+def _matches(pattern: str, topic: str) -> bool:
+    p, t = pattern.split("/"), topic.split("/")
+    if len(p) != len(t):
+        return False
+    return all(a == "+" or a == b for a, b in zip(p, t))
+
+
+def run_variant(args, events, triggers, with_router: bool) -> dict:
+    # payload -> time the originating frigate/events message was published
+    sent = {}
+    counter = TriggerCounter(triggers, sent)
+    topics = sorted({t for t, _ in triggers})
+    ha = mqtt_client.create_client(f"bench-ha-{time.time_ns()}", args.host, args.port,
+                                   args.user, args.password,
+                                   subscriptions=[(t, 0) for t in topics],
+                                   on_message=counter.on_message)
+    router = router_client = None
+    if with_router:
+        router = frigate_event_router.EventRouter()
+
+        def on_raw(topic, payload):
+            published = sent.pop(payload, None)
+            for out_topic, out_payload in router.route(payload):
+                if published is not None:
+                    sent[out_payload.encode()] = published
+                router_client.publish(out_topic, out_payload)
+
+        router_client = mqtt_client.create_client(
+            f"bench-router-{time.time_ns()}", args.host, args.port, args.user, args.password,
+            subscriptions=[(frigate_event_router.SOURCE_TOPIC, 0)], on_message=on_raw)
+    publisher = mqtt_client.create_client(f"bench-frigate-{time.time_ns()}", args.host,
+                                          args.port, args.user, args.password)
+    time.sleep(1)
+
+    started = time.perf_counter()
+    for payload in events:
+        sent[payload] = time.perf_counter()
+        publisher.publish(frigate_event_router.SOURCE_TOPIC, payload)
+        if args.rate:
+            time.sleep(1 / args.rate)
+    # Wait until the subscriber has been idle for a second
+    counter.last = max(counter.last, time.monotonic())
+    while time.monotonic() - counter.last < 1.0:
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - started - 1.0
+
+    for client in (publisher, ha) + ((router_client,) if with_router else ()):
+        mqtt_client.close_client(client)
+
+    return {"messages": counter.messages, "evaluations": counter.evaluations,
+            "decoded": counter.decoded, "fired": counter.fired, "cpu": counter.cpu,
+            "seconds": elapsed, "latencies": sorted(counter.latencies),
+            "router": dict(router.stats) if router else None}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--user", default=mqtt_client.MQTT_USER)
+    parser.add_argument("--password", default=mqtt_client.MQTT_PASS)
+    parser.add_argument("--events", type=int, default=200, help="Tracked objects to replay")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Messages per second (default: as fast as possible)")
+    args = parser.parse_args()
+    logging.getLogger("mqtt_client").setLevel(logging.WARNING)
+
+    events = list(synthetic_events(args.events))
+    raw_bytes = sum(len(e) for e in events)
+    print(f"Replaying {len(events)} frigate/events messages ({raw_bytes / 1e6:.1f} MB) "
+          f"from {args.events} tracked objects via {args.host}:{args.port}\n")
+
+    try:
+        firehose = run_variant(args, events, FIREHOSE_TRIGGERS, with_router=False)
+        routed = run_variant(args, events, ROUTED_TRIGGERS, with_router=True)
+    except (RuntimeError, OSError) as e:
+        print(f"Benchmark failed: {e}")
+        return 1
+
+    print(f"{'':<28} {'firehose':>12} {'routed':>12} {'ratio':>8}")
+    for label, key, fmt in (("Messages delivered to HA", "messages", "{:>12,}"),
+                            ("Trigger evaluations", "evaluations", "{:>12,}"),
+                            ("JSON decoded (MB)", "decoded", "{:>12.2f}"),
+                            ("Subscriber CPU (s)", "cpu", "{:>12.3f}")):
+        a, b = firehose[key], routed[key]
+        if key == "decoded":
+            a, b = a / 1e6, b / 1e6
+        ratio = f"{a / b:>7.1f}x" if b else "       -"
+        print(f"{label:<28} {fmt.format(a)} {fmt.format(b)} {ratio}")
+    print(f"{'Automations passing trigger':<28} {firehose['fired']:>12,} {routed['fired']:>12,}")
+
+    for label, result in (("firehose", firehose), ("routed", routed)):
+        lat = result["latencies"]
+        if lat:
+            print(f"Publish -> HA latency ({label}): p50 {statistics.median(lat) * 1000:.2f} ms, "
+                  f"p99 {lat[max(0, int(len(lat) * 0.99) - 1)] * 1000:.2f} ms")
+
+    stats = routed["router"]
+    print(f"\nRouter: received {stats['received']:,}, published {stats['published']:,}, "
+          f"deduplicated {stats['deduplicated']:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+MQTT Broker Benchmark - headroom of the mosquitto container
+
+Drives the broker with the traffic the homelab produces and measures what
+it can take:
+
+  load        synthetic cameras (Frigate-style frigate/events lifecycles plus
+              per-camera motion / object-count topics), synthetic sensors, and
+              optionally a replay of traffic captured with `record`
+  consumers   --subscribers concurrent clients, each subscribed to the same
+              topic set HA uses (MQTT discovery, the Frigate integration's
+              topics and every MQTT trigger in the automations)
+  report      published and delivered messages/s, delivery ratio, publish ->
+              subscriber latency p50/p95/p99, and broker CPU / memory from
+              the Docker Engine API (or psutil for a local broker) plus the
+              broker's own $SYS counters
+
+`ramp` repeats the run with more cameras per stage and marks the first stage
+where latency or loss goes past the limits - the point where adding cameras
+tips the broker over.
+
+Every published payload carries a 12-byte trailer (magic + send time) so
+subscribers can time delivery without parsing it. Topics are published under
+--prefix (default "bench/") so a run against the production broker does not
+reach Home Assistant or Frigate; use --prefix "" against a scratch broker,
+e.g. the same config on another port:
+    docker run --rm -p 18830:1883 -v $PWD/mosquitto/config:/mosquitto/config:ro eclipse-mosquitto:2
+
+Usage:
+    bench_mqtt_broker.py record --seconds 600 --out frigate.jsonl [--topic 'frigate/#']
+    bench_mqtt_broker.py run [--cameras 4] [--sensors 100] [--replay frigate.jsonl]
+                             [--subscribers 5] [--qos 0] [--duration 60]
+    bench_mqtt_broker.py ramp --cameras 4,8,16,32 [--stage-seconds 30]
+"""
+
+import argparse
+import base64
+import heapq
+import json
+import logging
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+import automation_analyzer
+import bench_frigate_router
+import docker_api
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+BROKER_CONTAINER = "mosquitto"
+
+# Subscriptions HA holds besides its MQTT triggers: discovery, the Frigate
+# integration's per-camera/object topics, and its availability/stats topics.
+HA_BASE_SUBSCRIPTIONS = [
+    "homeassistant/#",
+    "frigate/available",
+    "frigate/stats",
+    "frigate/events",
+    "frigate/reviews",
+    "frigate/+/+",
+    "frigate/+/+/state",
+]
+SENSOR_TOPIC = "homelab/sensor/{index}/state"
+SENSOR_SUBSCRIPTION = "homelab/sensor/+/state"
+
+TRAILER_MAGIC = b"MQB1"
+TRAILER = struct.Struct("!4sd")
+
+# Ramp limits: a stage "tips over" past either
+LATENCY_LIMIT_P99 = 0.5         # seconds
+LOSS_LIMIT = 0.005              # fraction of expected deliveries
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# LOAD SOURCES
+# ============================================
+# Each source yields (send_time, topic, payload) in time order.
+
+def camera_source(camera: str, start: float, end: float, events_per_minute: float,
+                  updates: int, seed: int):
+    rng = random.Random(seed)
+    pending = []    # events overlap, so messages are merged through a heap
+    seq = 0
+    t = start + rng.expovariate(events_per_minute / 60)
+    while t < end or pending:
+        while pending and (pending[0][0] <= t or t >= end):
+            at, _, topic, payload = heapq.heappop(pending)
+            if at < end:
+                yield at, topic, payload
+        if t >= end:
+            break
+        event_id = f"{t:.6f}-{rng.randrange(36 ** 6):06x}"
+        label = rng.choice(bench_frigate_router.LABELS)
+        messages = [(t, f"frigate/{camera}/motion", b"ON"),
+                    (t + 0.05, f"frigate/{camera}/{label}", b"1"),
+                    (t + 0.05, f"frigate/{camera}/all", b"1")]
+        lifecycle = bench_frigate_router.synthetic_event(rng, camera, label, event_id, t, updates)
+        for i, payload in enumerate(lifecycle):
+            messages.append((t + i * 0.2, "frigate/events", payload))
+        done = t + (updates + 1) * 0.2
+        messages += [(done, f"frigate/{camera}/{label}", b"0"),
+                     (done, f"frigate/{camera}/all", b"0"),
+                     (done + 30, f"frigate/{camera}/motion", b"OFF")]
+        for at, topic, payload in messages:
+            heapq.heappush(pending, (at, seq, topic, payload))
+            seq += 1
+        t += rng.expovariate(events_per_minute / 60)
+
+
+def sensor_source(indexes, start: float, end: float, interval: float, seed: int):
+    rng = random.Random(seed)
+    heap = [(start + rng.uniform(0, interval), i) for i in indexes]
+    heapq.heapify(heap)
+    while heap:
+        t, i = heapq.heappop(heap)
+        if t >= end:
+            continue
+        payload = json.dumps({"state": round(rng.uniform(0, 100), 2), "battery": 87,
+                              "linkquality": rng.randrange(40, 255),
+                              "last_seen": round(t, 3)}).encode()
+        yield t, SENSOR_TOPIC.format(index=i), payload
+        heapq.heappush(heap, (t + interval, i))
+
+
+def replay_source(path: Path, start: float, end: float, speed: float, loop: bool):
+    records = []
+    with open(path) as f:
+        for line in f:
+            r = json.loads(line)
+            payload = base64.b64decode(r["b64"]) if "b64" in r else r["p"].encode()
+            records.append((r["t"], r["topic"], payload))
+    if not records:
+        return
+    span = records[-1][0] - records[0][0] + 1
+    offset = start - records[0][0] / speed
+    while True:
+        for t, topic, payload in records:
+            at = offset + t / speed
+            if at >= end:
+                return
+            yield at, topic, payload
+        if not loop:
+            return
+        offset += span / speed
+
+# ============================================
+# CLIENTS
+# ============================================
+
+class Stats:
+    """Per-stage counters; each publisher/subscriber thread writes only its own slot."""
+
+    def __init__(self, publishers: int, subscribers: int):
+        self.published = [0] * publishers
+        self.publish_errors = [0] * publishers
+        self.expected = [0] * publishers
+        self.delivered = [0] * subscribers
+        self.latencies = [[] for _ in range(subscribers)]
+
+
+class Subscriber:
+    def __init__(self, index: int, args, subscriptions: list, bench):
+        self.index = index
+        self.bench = bench
+        self.client = mqtt_client.create_client(
+            f"bench-sub-{os.getpid()}-{index}", args.host, args.port,
+            subscriptions=[(args.prefix + s, args.qos) for s in subscriptions],
+            on_message=self.on_message)
+
+    def on_message(self, topic: str, payload: bytes):
+        received = time.time()
+        stats = self.bench.stats
+        stats.delivered[self.index] += 1
+        if len(payload) >= TRAILER.size:
+            magic, sent = TRAILER.unpack_from(payload, len(payload) - TRAILER.size)
+            if magic == TRAILER_MAGIC:
+                stats.latencies[self.index].append(received - sent)
+
+
+def publisher(index: int, args, sources: list, bench, stop: threading.Event):
+    """Publish the merged sources on schedule; runs until they are exhausted."""
+    client = mqtt_client.create_client(f"bench-pub-{os.getpid()}-{index}", args.host, args.port)
+    try:
+        for at, topic, payload in heapq.merge(*sources, key=lambda m: m[0]):
+            if stop.is_set():
+                break
+            delay = at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            topic = args.prefix + topic
+            info = client.publish(topic, payload + TRAILER.pack(TRAILER_MAGIC, time.time()), qos=args.qos)
+            stats = bench.stats
+            if info.rc == 0:
+                stats.published[index] += 1
+                stats.expected[index] += bench.fanout(topic)
+            else:
+                stats.publish_errors[index] += 1
+    finally:
+        time.sleep(0.5)
+        mqtt_client.close_client(client)
+
+# ============================================
+# BROKER RESOURCES
+# ============================================
+
+class BrokerMonitor:
+    """Samples broker CPU / memory in the background and keeps the latest $SYS values."""
+
+    SYS_KEYS = {
+        "$SYS/broker/clients/connected": "clients",
+        "$SYS/broker/heap/current": "heap_bytes",
+        "$SYS/broker/messages/stored": "stored",
+        "$SYS/broker/publish/messages/dropped": "dropped",
+        "$SYS/broker/load/messages/received/1min": "received_1min",
+        "$SYS/broker/load/messages/sent/1min": "sent_1min",
+    }
+
+    def __init__(self, args):
+        self.samples = []
+        self.sys = {}
+        self.source = None
+        self.stop = threading.Event()
+        self._docker = None
+        self._process = None
+
+        if args.broker_pid:
+            self._use_process(args.broker_pid)
+        else:
+            docker = docker_api.DockerClient()
+            if docker.ping():
+                try:
+                    docker.inspect(args.container)
+                    self._docker, self.container = docker, args.container
+                    self.source = f"docker container {args.container}"
+                except docker_api.DockerError:
+                    pass
+            if self._docker is None:
+                self._find_local_broker()
+
+        self._sys_client = mqtt_client.create_client(
+            f"bench-sys-{os.getpid()}", args.host, args.port,
+            subscriptions=[("$SYS/broker/#", 0)], on_message=self._on_sys)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _use_process(self, pid: int):
+        try:
+            import psutil
+        except ImportError:
+            logger.warning("psutil not installed, broker CPU/memory unavailable (pip install psutil)")
+            return
+        self._process = psutil.Process(pid)
+        self._process.cpu_percent(None)
+        self.source = f"process {pid} ({self._process.name()})"
+
+    def _find_local_broker(self):
+        try:
+            import psutil
+        except ImportError:
+            return
+        for proc in psutil.process_iter(["name"]):
+            if proc.info["name"] == "mosquitto":
+                self._use_process(proc.pid)
+                return
+
+    def _on_sys(self, topic: str, payload: bytes):
+        key = self.SYS_KEYS.get(topic)
+        if key:
+            try:
+                self.sys[key] = float(payload)
+            except ValueError:
+                pass
+
+    def _sample(self):
+        if self._docker is not None:
+            s = self._docker.stats(self.container)    # stream=0 fills precpu_stats
+            cpu, pre = s["cpu_stats"], s["precpu_stats"]
+            cpu_delta = cpu["cpu_usage"]["total_usage"] - pre["cpu_usage"]["total_usage"]
+            sys_delta = cpu.get("system_cpu_usage", 0) - pre.get("system_cpu_usage", 0)
+            cpus = cpu.get("online_cpus") or len(cpu["cpu_usage"].get("percpu_usage") or [1])
+            mem = s.get("memory_stats", {})
+            inactive = mem.get("stats", {}).get("inactive_file", mem.get("stats", {}).get("cache", 0))
+            return (cpu_delta / sys_delta * cpus * 100 if sys_delta > 0 else 0.0,
+                    (mem.get("usage", 0) - inactive) / 1e6)
+        if self._process is not None:
+            return self._process.cpu_percent(None), self._process.memory_info().rss / 1e6
+        return None
+
+    def _run(self):
+        while not self.stop.wait(2):
+            try:
+                sample = self._sample()
+            except Exception as e:
+                logger.warning(f"Broker resource sample failed: {e}")
+                continue
+            if sample is not None:
+                self.samples.append((time.time(), *sample))
+
+    def window(self, start: float, end: float) -> dict:
+        rows = [s for s in self.samples if start <= s[0] <= end]
+        if not rows:
+            return {}
+        return {"cpu_avg": sum(r[1] for r in rows) / len(rows), "cpu_max": max(r[1] for r in rows),
+                "mem_mb": max(r[2] for r in rows)}
+
+    def close(self):
+        self.stop.set()
+        mqtt_client.close_client(self._sys_client)
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def ha_subscriptions(config_dir: Path) -> list:
+    topics = list(HA_BASE_SUBSCRIPTIONS)
+    try:
+        units = automation_analyzer.load_units(config_dir)
+    except Exception as e:
+        logger.warning(f"Could not read MQTT triggers from {config_dir}: {e}")
+        units = []
+    for unit in units:
+        for trigger in unit.triggers:
+            if trigger.topic and "{" not in trigger.topic and trigger.topic not in topics:
+                topics.append(trigger.topic)
+    return topics
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.stats = Stats(args.publishers, args.subscribers)
+        self.subscriptions = ha_subscriptions(args.config_dir)
+        if args.sensors:
+            self.subscriptions.append(SENSOR_SUBSCRIPTION)
+        self._fanout = {}
+        self.subscribers = []
+
+    def fanout(self, topic: str) -> int:
+        """Deliveries expected for one publish on topic (overlapping filters count once)."""
+        n = self._fanout.get(topic)
+        if n is None:
+            n = len(self.subscribers) if any(
+                automation_analyzer.topic_matches(self.args.prefix + s, topic)
+                for s in self.subscriptions) else 0
+            self._fanout[topic] = n
+        return n
+
+    def start_subscribers(self):
+        logger.info(f"Starting {self.args.subscribers} subscriber(s) x {len(self.subscriptions)} subscriptions")
+        for i in range(self.args.subscribers):
+            self.subscribers.append(Subscriber(i, self.args, self.subscriptions, self))
+        time.sleep(1 + self.args.subscribers * 0.05)
+
+    def stop_subscribers(self):
+        for sub in self.subscribers:
+            mqtt_client.close_client(sub.client)
+
+    def run_stage(self, cameras: int, seconds: float) -> dict:
+        args = self.args
+        start = time.time() + 0.5
+        end = start + seconds
+        camera_names = [f"cam{i:02d}" for i in range(cameras)]
+        sources = [[] for _ in range(args.publishers)]
+        for i, camera in enumerate(camera_names):
+            sources[i % args.publishers].append(camera_source(
+                camera, start, end, args.events_per_minute, args.updates, seed=i))
+        for p in range(args.publishers):
+            indexes = range(p, args.sensors, args.publishers)
+            if indexes:
+                sources[p].append(sensor_source(indexes, start, end, args.sensor_interval, seed=1000 + p))
+        if args.replay:
+            sources[0].append(replay_source(args.replay, start, end, args.speed, loop=True))
+
+        self.stats = stats = Stats(args.publishers, args.subscribers)
+        stop = threading.Event()
+        threads = [threading.Thread(target=publisher, args=(p, args, sources[p], self, stop), daemon=True)
+                   for p in range(args.publishers) if sources[p]]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(seconds + 30)
+        stop.set()
+        time.sleep(args.drain)
+
+        elapsed = max(time.time() - start - args.drain, 1e-9)
+        latencies = sorted(v for per_sub in stats.latencies for v in per_sub)
+        published, delivered, expected = sum(stats.published), sum(stats.delivered), sum(stats.expected)
+        result = {
+            "cameras": cameras, "seconds": round(elapsed, 1),
+            "published_per_s": published / elapsed,
+            "delivered_per_s": delivered / elapsed,
+            "publish_errors": sum(stats.publish_errors),
+            "delivery_ratio": delivered / expected if expected else None,
+        }
+        if latencies:
+            result.update({f"p{p}": latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+                           for p in (50, 95, 99)})
+        return result
+
+
+def _fmt_row(r: dict, broker: dict) -> str:
+    ratio = r["delivery_ratio"]
+    lat = "".join(f"{r[k] * 1000:>9.1f}" if k in r else f"{'-':>9}" for k in ("p50", "p95", "p99"))
+    res = (f"{broker['cpu_avg']:>7.1f}{broker['cpu_max']:>7.1f}{broker['mem_mb']:>8.1f}"
+           if broker else f"{'-':>7}{'-':>7}{'-':>8}")
+    return (f"{r['cameras']:>7}{r['published_per_s']:>10.0f}{r['delivered_per_s']:>11.0f}"
+            f"{(f'{ratio * 100:.2f}%' if ratio is not None else '-'):>10}{lat}{res}")
+
+
+def print_header(monitor: BrokerMonitor):
+    print()
+    print(f"Broker resources: {monitor.source or 'unavailable (no docker socket or local mosquitto)'}")
+    print(f"{'cameras':>7}{'pub/s':>10}{'deliv/s':>11}{'delivered':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cpu%':>7}{'max%':>7}{'mem MB':>8}")
+
+
+def tipped(r: dict) -> str:
+    if r.get("p99", 0) > LATENCY_LIMIT_P99:
+        return f"p99 {r['p99'] * 1000:.0f}ms > {LATENCY_LIMIT_P99 * 1000:.0f}ms"
+    if r["delivery_ratio"] is not None and r["delivery_ratio"] < 1 - LOSS_LIMIT:
+        return f"{(1 - r['delivery_ratio']) * 100:.2f}% of deliveries lost"
+    if r["publish_errors"]:
+        return f"{r['publish_errors']} publish errors"
+    return None
+
+
+def run_bench(args, stages: list) -> int:
+    bench = Bench(args)
+    monitor = BrokerMonitor(args)
+    bench.start_subscribers()
+    results = []
+    try:
+        for cameras in stages:
+            logger.info(f"Stage: {cameras} cameras, {args.sensors} sensors, "
+                        f"{args.subscribers} subscribers, QoS {args.qos}, {args.stage_seconds:.0f}s")
+            started = time.time()
+            r = bench.run_stage(cameras, args.stage_seconds)
+            r["broker"] = monitor.window(started, time.time())
+            results.append(r)
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    finally:
+        bench.stop_subscribers()
+        monitor.close()
+
+    print_header(monitor)
+    tip = None
+    for r in results:
+        print(_fmt_row(r, r["broker"]))
+        if tip is None and tipped(r):
+            tip = (r["cameras"], tipped(r))
+    if monitor.sys:
+        print("\n$SYS: " + ", ".join(f"{k}={v:g}" for k, v in sorted(monitor.sys.items())))
+    if len(stages) > 1:
+        print()
+        print(f"Tipping point: {tip[0]} cameras ({tip[1]})" if tip
+              else f"No stage exceeded p99 {LATENCY_LIMIT_P99 * 1000:.0f}ms or {LOSS_LIMIT * 100:.1f}% loss")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: str(v) for k, v in vars(args).items()},
+                       "subscriptions": bench.subscriptions, "stages": results,
+                       "sys": monitor.sys}, f, indent=1)
+    return 0
+
+# ============================================
+# RECORD
+# ============================================
+
+def record(args) -> int:
+    lock = threading.Lock()
+    started = time.time()
+    count = 0
+    out = open(args.out, "w")
+
+    def on_message(topic, payload):
+        nonlocal count
+        row = {"t": round(time.time() - started, 4), "topic": topic}
+        try:
+            row["p"] = payload.decode()
+        except UnicodeDecodeError:
+            row["b64"] = base64.b64encode(payload).decode()
+        with lock:
+            out.write(json.dumps(row) + "\n")
+            count += 1
+
+    client = mqtt_client.create_client(f"bench-record-{os.getpid()}", args.host, args.port,
+                                       subscriptions=[(t, 0) for t in args.topic],
+                                       on_message=on_message)
+    logger.info(f"Recording {', '.join(args.topic)} for {args.seconds}s to {args.out}")
+    try:
+        time.sleep(args.seconds)
+    except KeyboardInterrupt:
+        pass
+    mqtt_client.close_client(client)
+    with lock:
+        out.close()
+    logger.info(f"Recorded {count} messages")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the MQTT broker with homelab-shaped load")
+    parser.add_argument("--host", default=mqtt_client.MQTT_HOST)
+    parser.add_argument("--port", type=int, default=mqtt_client.MQTT_PORT)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="Capture live traffic for --replay")
+    p.add_argument("--topic", action="append", help="Topic filter (repeatable, default frigate/#)")
+    p.add_argument("--seconds", type=float, default=600)
+    p.add_argument("--out", required=True)
+
+    for name, help_text in (("run", "One load level"), ("ramp", "Increase cameras per stage")):
+        p = sub.add_parser(name, help=help_text)
+        if name == "run":
+            p.add_argument("--cameras", type=int, default=4)
+            p.add_argument("--duration", dest="stage_seconds", type=float, default=60)
+        else:
+            p.add_argument("--cameras", default="4,8,16,32",
+                           help="Comma-separated camera counts, one stage each")
+            p.add_argument("--stage-seconds", type=float, default=30)
+        p.add_argument("--events-per-minute", type=float, default=2,
+                       help="Tracked objects per camera per minute")
+        p.add_argument("--updates", type=int, default=20, help="Event updates per tracked object")
+        p.add_argument("--sensors", type=int, default=100)
+        p.add_argument("--sensor-interval", type=float, default=10, help="Seconds between sensor updates")
+        p.add_argument("--replay", type=Path, help="Recording from `record`, looped")
+        p.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+        p.add_argument("--subscribers", type=int, default=5)
+        p.add_argument("--publishers", type=int, default=2)
+        p.add_argument("--qos", type=int, choices=(0, 1, 2), default=0)
+        p.add_argument("--prefix", default="bench/", help="Topic prefix for all load and subscriptions")
+        p.add_argument("--drain", type=float, default=2, help="Seconds to wait for in-flight messages")
+        p.add_argument("--container", default=BROKER_CONTAINER)
+        p.add_argument("--broker-pid", type=int, help="Sample this local broker process instead of Docker")
+        p.add_argument("--config-dir", type=Path, default=automation_analyzer.HA_CONFIG_DIR)
+        p.add_argument("--json", help="Write results to this file")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "record":
+            args.topic = args.topic or ["frigate/#"]
+            return record(args)
+        if args.command == "ramp":
+            return run_bench(args, [int(c) for c in args.cameras.split(",")])
+        return run_bench(args, [args.cameras])
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
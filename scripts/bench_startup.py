@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark - what each script costs before it does any work
+
+system-monitor.py and tplink-ip-updater.py start at boot next to the whole
+Docker stack, and the Playwright scripts are run to check state that is
+usually already right. For every script entry point this measures:
+
+  cold start   wall time of a fresh interpreter running the entry point,
+               median over --runs
+  imports      -X importtime: total import time and the most expensive
+               top-level imports
+  peak RSS     high-water resident set size of the process (VmHWM)
+
+Entry points run their real code path wherever that is safe against the
+stand-ins, so lazy imports and first-use setup are counted:
+
+  one-shot     a real command that exits on its own (SCENARIOS): lint the
+               repo's HA config, index/status an empty scratch tree, list an
+               empty stats store, the Playwright scripts' "nothing to do"
+               path against the stand-in HA
+  service      long-running services (SERVICES) are started for real and
+               interrupted after SERVICE_SECONDS; peak RSS and imports are
+               measured, wall time is not (it is fixed by design)
+  --help       everything else - scripts whose real path needs a broker,
+               Docker, the LAN or a remote; flagged as such in the report
+
+The stand-ins are fake_ha_server.py on a free local port, an unused MQTT
+port, and a scratch LOG_DIR/HOMELAB_DIR, so nothing touches the live stack.
+
+--update-baseline keeps the results in scripts/bench_startup_baseline.json,
+next to this script, so the baseline is committed with the code it measures
+(data/ is neither in git nor in the backups). Later runs compare against it
+(or against --compare FILE). The exit
+status is 1 when a script got slower or bigger than the thresholds, so a
+change that adds boot-time cost shows up.
+
+Usage:
+    bench_startup.py [--runs 5] [--only system-monitor,tplink-ip-updater]
+                     [--update-baseline] [--save run.json] [--compare before.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import fake_ha_server
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = Path(os.environ.get("STARTUP_BASELINE", SCRIPTS_DIR / "bench_startup_baseline.json"))
+
+# Real commands that exit on their own against the stand-ins. {scratch} is
+# the scratch directory, {tree} an empty directory in it, {config} the
+# repo's homeassistant/ directory (read only), {port} a free local port
+SCENARIOS = {
+    "automation_analyzer.py": ["--config-dir", "{config}", "lint"],
+    "cgroup_stats.py": ["json", "--interval", "0.2"],
+    "frigate_stats_store.py": ["--store", "{scratch}/stats", "series"],
+    "hacs_setup.py": [],
+    "hacs_configure.py": [],
+    "migration_engine.py": ["--journal", "{scratch}/migration.db", "status", "{tree}", "{tree}"],
+    "storage_index.py": ["--db", "{scratch}/storage_index.db", "usage", "--root", "{tree}"],
+    "tuya_reauth.py": [],
+}
+# Long-running services started on their real path, interrupted (SIGINT)
+# after SERVICE_SECONDS
+SERVICES = {
+    "media_retention.py": ["run", "--no-mqtt"],
+    "snapshot_service.py": ["--port", "{port}", "--cache-db", "{scratch}/snapshot_cache.db"],
+    "system-monitor.py": [],
+}
+SERVICE_SECONDS = 2
+# Scripts that are tools rather than entry points of the stack
+SKIP_PREFIXES = ("bench_", "fake_")
+NEEDS_FAKE_HA = {"hacs_setup.py", "hacs_configure.py", "tuya_reauth.py",
+                 "snapshot_service.py", "system-monitor.py"}
+
+RUN_TIMEOUT = 60
+TOP_IMPORTS = 3
+
+# Regression thresholds for --compare: both the relative and absolute
+# limit must be exceeded
+WALL_REGRESSION = (1.20, 10.0)     # x baseline, + ms
+RSS_REGRESSION = (1.15, 3.0)       # x baseline, + MB
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# ENTRY POINTS
+# ============================================
+
+def entry_points(only=None) -> dict:
+    """script name -> argv for every script with a __main__ block"""
+    found = {}
+    for path in sorted(SCRIPTS_DIR.glob("*.py")):
+        if path.name.startswith(SKIP_PREFIXES):
+            continue
+        source = path.read_text()
+        if '__name__ == "__main__"' not in source:
+            continue
+        if path.name in SCENARIOS or path.name in SERVICES:
+            found[path.stem] = SCENARIOS.get(path.name, SERVICES.get(path.name))
+        elif "argparse" in source:
+            found[path.stem] = ["--help"]
+    if only:
+        found = {name: argv for name, argv in found.items() if name in only}
+    return found
+
+# ============================================
+# STAND-INS
+# ============================================
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_ha(port: int):
+    """fake_ha_server.py in a subprocess; None if it cannot run here (no aiohttp)."""
+    if fake_ha_server.web is None:
+        return None
+    proc = subprocess.Popen([sys.executable, str(SCRIPTS_DIR / "fake_ha_server.py"),
+                             "--port", str(port), "--sensors", "0"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                return None
+            time.sleep(0.1)
+    proc.kill()
+    return None
+
+
+def stand_in_env(log_dir: str, ha_port: int) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "HA_URL": f"http://127.0.0.1:{ha_port}",
+        "HA_TOKEN": fake_ha_server.DEFAULT_TOKEN,
+        "MQTT_HOST": "127.0.0.1",
+        "MQTT_PORT": str(free_port()),
+        "LOG_DIR": log_dir,
+        "HOMELAB_DIR": log_dir,
+    })
+    for name in ("TRACE_FILE", "TRACE_PROFILE", "PYTHONPROFILEIMPORTTIME"):
+        env.pop(name, None)
+    return env
+
+# ============================================
+# MEASUREMENT
+# ============================================
+
+# Runs the entry point under runpy and records the process's own peak RSS
+# (VmHWM) at exit. rusage from wait4 is no use here: ru_maxrss carries over
+# the benchmark's own footprint from before the exec.
+BOOTSTRAP = """
+import atexit, os, runpy, sys
+def _report():
+    with open("/proc/self/status") as f:
+        peak = next(line.split()[1] for line in f if line.startswith("VmHWM:"))
+    with open(os.environ["BENCH_STARTUP_RSS"], "w") as f:
+        f.write(peak)
+atexit.register(_report)
+sys.argv = sys.argv[1:]
+sys.path[0] = os.path.dirname(sys.argv[0])
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def run_once(argv: list, env: dict, until: float = None):
+    """
+    Run one process; returns (wall ms, peak RSS MB, exit code). With until,
+    the process is interrupted after that many seconds and wall is None.
+    """
+    with tempfile.NamedTemporaryFile("r") as rss:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", BOOTSTRAP] + argv, cwd=SCRIPTS_DIR,
+                                env={**env, "BENCH_STARTUP_RSS": rss.name},
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # wait(timeout=) polls in steps of up to 50 ms, which would swamp the
+        # measurement; block in waitpid and let timers interrupt or kill it
+        interrupt = None
+        if until:
+            interrupt = threading.Timer(until, proc.send_signal, (signal.SIGINT,))
+            interrupt.start()
+        timer = threading.Timer((until or 0) + RUN_TIMEOUT, proc.kill)
+        timer.start()
+        code = proc.wait()
+        wall = (time.perf_counter() - start) * 1000
+        if not timer.is_alive():
+            raise subprocess.TimeoutExpired(proc.args, RUN_TIMEOUT)
+        timer.cancel()
+        if interrupt is not None:
+            interrupt.cancel()
+            wall = None
+        peak_kb = rss.read().strip()
+    return wall, int(peak_kb) / 1024 if peak_kb else None, code
+
+
+def import_profile(argv: list, env: dict, until: float = None) -> str:
+    """stderr of a -X importtime run (interrupted after until seconds)."""
+    proc = subprocess.Popen([sys.executable, "-X", "importtime"] + argv, cwd=SCRIPTS_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if until:
+            try:
+                return proc.communicate(timeout=until)[1].decode(errors="replace")
+            except subprocess.TimeoutExpired:
+                proc.send_signal(signal.SIGINT)
+        return proc.communicate(timeout=RUN_TIMEOUT)[1].decode(errors="replace")
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise
+
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr: str):
+    """(total import ms, [(module, cumulative ms)] for top-level imports, costliest first)"""
+    top = []
+    for match in IMPORT_LINE.finditer(stderr):
+        cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 1:
+            top.append((module, cumulative / 1000))
+    total = sum(ms for _, ms in top)
+    return total, sorted(top, key=lambda item: item[1], reverse=True)
+
+
+def measure(name: str, argv: list, env: dict, runs: int, places: dict) -> dict:
+    script = str(SCRIPTS_DIR / f"{name}.py")
+    until = SERVICE_SECONDS if f"{name}.py" in SERVICES else None
+    command = [script] + [arg.format(**places) for arg in argv]
+    walls, rss = [], []
+    code = None
+    for _ in range(runs):
+        wall, peak, code = run_once(command, env, until)
+        if wall is not None:
+            walls.append(wall)
+        if peak is not None:
+            rss.append(peak)
+    import_ms, top = parse_importtime(import_profile(command, env, until))
+    return {
+        "argv": argv,
+        "service": until is not None,
+        "exit_code": code,
+        "wall_ms": round(statistics.median(walls), 1) if walls else None,
+        "wall_min_ms": round(min(walls), 1) if walls else None,
+        "import_ms": round(import_ms, 1),
+        "peak_rss_mb": round(statistics.median(rss), 1) if rss else None,
+        "top_imports": [[module, round(ms, 1)] for module, ms in top[:TOP_IMPORTS]],
+    }
+
+# ============================================
+# REPORT
+# ============================================
+
+def regressions(result: dict, base: dict) -> list:
+    found = []
+    if result["argv"] != base.get("argv"):
+        return found    # a different scenario; not comparable
+    ratio, extra = WALL_REGRESSION
+    if None not in (result["wall_ms"], base["wall_ms"]) and \
+            result["wall_ms"] > base["wall_ms"] * ratio and result["wall_ms"] - base["wall_ms"] > extra:
+        found.append(f"cold start {base['wall_ms']:.0f} -> {result['wall_ms']:.0f} ms")
+    ratio, extra = RSS_REGRESSION
+    if None in (result["peak_rss_mb"], base["peak_rss_mb"]):
+        return found
+    if result["peak_rss_mb"] > base["peak_rss_mb"] * ratio and \
+            result["peak_rss_mb"] - base["peak_rss_mb"] > extra:
+        found.append(f"peak RSS {base['peak_rss_mb']:.1f} -> {result['peak_rss_mb']:.1f} MB")
+    return found
+
+
+def print_report(results: dict, baseline: dict = None) -> int:
+    print(f"\n{'script':<24}{'cold ms':>9}{'import ms':>11}{'RSS MB':>9}  top imports (ms)")
+    print("-" * 100)
+    failed = 0
+    for name, r in results.items():
+        if r.get("skipped"):
+            print(f"{name:<24}  skipped: {r['skipped']}")
+            continue
+        top = ", ".join(f"{module} {ms:.0f}" for module, ms in r["top_imports"])
+        flag = "" if r["exit_code"] == 0 else f"  [exit {r['exit_code']}]"
+        if r["argv"] == ["--help"]:
+            flag += "  [--help only]"
+        elif r.get("service"):
+            flag += "  [service]"
+        wall = f"{r['wall_ms']:>9.0f}" if r["wall_ms"] is not None else f"{'-':>9}"
+        rss = f"{r['peak_rss_mb']:>9.1f}" if r["peak_rss_mb"] is not None else f"{'-':>9}"
+        print(f"{name:<24}{wall}{r['import_ms']:>11.0f}{rss}  {top}{flag}")
+        base = (baseline or {}).get(name)
+        if base and not base.get("skipped") and base.get("argv") == r["argv"]:
+            rss_delta = (f"{r['peak_rss_mb'] - base['peak_rss_mb']:>+9.1f}"
+                         if None not in (r["peak_rss_mb"], base["peak_rss_mb"]) else f"{'':>9}")
+            wall_delta = (f"{r['wall_ms'] - base['wall_ms']:>+9.0f}"
+                          if None not in (r["wall_ms"], base["wall_ms"]) else f"{'':>9}")
+            delta = (f"{'  vs baseline':<24}{wall_delta}"
+                     f"{r['import_ms'] - base['import_ms']:>+11.0f}{rss_delta}")
+            found = regressions(r, base)
+            print(delta + ("  REGRESSION: " + "; ".join(found) if found else ""))
+            failed += bool(found)
+    return failed
+
+# ============================================
+# MAIN
+# ============================================
+
+def save(path: Path, results: dict, runs: int):
+    path.write_text(json.dumps({"created": time.time(), "python": sys.version.split()[0],
+                                "runs": runs, "results": results}, indent=1))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure cold start, import time and peak RSS per script")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per script (median reported)")
+    parser.add_argument("--only", help="Comma-separated script names (without .py)")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help=f"Baseline JSON from an earlier --save (default {BASELINE_FILE} if present)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"Merge these results into {BASELINE_FILE}")
+    args = parser.parse_args()
+    if args.compare is None and BASELINE_FILE.exists():
+        args.compare = str(BASELINE_FILE)
+
+    scripts = entry_points(set(args.only.split(",")) if args.only else None)
+    if not scripts:
+        logger.error("No matching entry points")
+        return 1
+
+    ha_port = free_port()
+    fake_ha = start_fake_ha(ha_port) if NEEDS_FAKE_HA & {f"{n}.py" for n in scripts} else None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as log_dir:
+        env = stand_in_env(log_dir, ha_port)
+        places = {"scratch": log_dir, "tree": os.path.join(log_dir, "tree"),
+                  "config": str(SCRIPTS_DIR.parent / "homeassistant"), "port": free_port()}
+        os.mkdir(places["tree"])
+        try:
+            for name, argv in scripts.items():
+                if f"{name}.py" in NEEDS_FAKE_HA and fake_ha is None:
+                    results[name] = {"skipped": "fake HA unavailable (needs aiohttp)"}
+                    continue
+                logger.info(f"Measuring {name} {' '.join(argv)}".rstrip())
+                try:
+                    results[name] = measure(name, argv, env, args.runs, places)
+                except subprocess.TimeoutExpired:
+                    results[name] = {"skipped": f"did not exit within {RUN_TIMEOUT}s"}
+        finally:
+            if fake_ha is not None:
+                fake_ha.terminate()
+                fake_ha.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    failed = print_report(results, baseline)
+
+    if args.save:
+        save(Path(args.save), results, args.runs)
+        logger.info(f"Saved results to {args.save}")
+    if args.update_baseline:
+        # Merged, so a --only run refreshes just those scripts
+        previous = json.loads(BASELINE_FILE.read_text())["results"] if BASELINE_FILE.exists() else {}
+        BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        save(BASELINE_FILE, {**previous, **results}, args.runs)
+        logger.info(f"Updated baseline {BASELINE_FILE}")
+    if failed:
+        logger.warning(f"{failed} script(s) regressed against {args.compare}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Cgroup Stats - per-container CPU, memory, IO and pressure from cgroup v2
+
+`docker stats` costs an API round-trip per container and the daemon does
+the sampling itself; psutil only sees the host as a whole. This collector
+reads each container's cgroup v2 files directly:
+
+    cpu.stat          usage_usec, throttled_usec
+    memory.current    bytes charged to the container (memory.max = limit)
+    io.stat           rbytes/wbytes/rios/wios per device
+    cpu.pressure      \
+    memory.pressure    > PSI: share of time tasks were stalled (some/full)
+    io.pressure       /
+
+Containers are listed through the Docker socket once and their cgroup
+directories resolved and cached (systemd or cgroupfs driver layouts, else
+via the container's init pid). The files are kept open and re-read with
+pread, so a sample of the whole stack is a few dozen syscalls and can run
+every second. The list is refreshed only when a cgroup disappears or every
+RESCAN_INTERVAL for newly started containers.
+
+Rates (CPU %, bytes/s, stall %) are computed between consecutive samples.
+CPU % follows `docker stats`: 100 = one core busy.
+
+Usage:
+    cgroup_stats.py top [--interval 2] [--count 0]
+    cgroup_stats.py json
+    cgroup_stats.py serve [--port 8768] [--interval 2]   # GET /api/containers
+"""
+
+import argparse
+import errno
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import docker_api
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+CGROUP_ROOT = os.environ.get("CGROUP_ROOT", "/sys/fs/cgroup")
+RESCAN_INTERVAL = 300        # seconds between container list refreshes
+SAMPLE_INTERVAL = 2
+READ_SIZE = 8192
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# PARSING
+# ============================================
+
+def parse_flat_keyed(text: str) -> dict:
+    """cpu.stat style: one "key value" per line."""
+    out = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        if value:
+            out[key] = int(value)
+    return out
+
+
+def parse_io_stat(text: str) -> dict:
+    """io.stat summed over devices: {"rbytes": .., "wbytes": .., "rios": .., "wios": ..}."""
+    out = {"rbytes": 0, "wbytes": 0, "rios": 0, "wios": 0}
+    for line in text.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key in out:
+                out[key] += int(value)
+    return out
+
+
+def parse_pressure(text: str) -> dict:
+    """PSI file: {"some": {"avg10": .., "total": ..}, "full": {...}}."""
+    out = {}
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        values = {}
+        for field in fields:
+            key, _, value = field.partition("=")
+            values[key] = int(value) if key == "total" else float(value)
+        out[kind] = values
+    return out
+
+# ============================================
+# COLLECTOR
+# ============================================
+
+class ContainerCgroup:
+    """One container's cgroup directory with its stat files held open."""
+
+    def __init__(self, name: str, container_id: str, path: str):
+        self.name = name
+        self.id = container_id
+        self.path = path
+        self._fds = {}
+        self.previous = None        # (monotonic, raw counters) of the last sample
+
+    def read(self, filename: str):
+        """File contents, or None if the controller is not enabled for this cgroup."""
+        fd = self._fds.get(filename)
+        if fd is None:
+            try:
+                fd = self._fds[filename] = os.open(os.path.join(self.path, filename), os.O_RDONLY)
+            except FileNotFoundError:
+                if not os.path.isdir(self.path):
+                    raise
+                self._fds[filename] = -1
+                return None
+        if fd < 0:
+            return None
+        return os.pread(fd, READ_SIZE, 0).decode()
+
+    def raw(self) -> dict:
+        """Counters and gauges as read, no rates. Raises OSError once the cgroup is gone."""
+        cpu = self.read("cpu.stat")
+        memory = self.read("memory.current")
+        limit = self.read("memory.max")
+        io = self.read("io.stat")
+        raw = {
+            "cpu": parse_flat_keyed(cpu) if cpu else {},
+            "memory": int(memory) if memory else None,
+            "memory_max": int(limit) if limit and limit.strip() != "max" else None,
+            "io": parse_io_stat(io) if io is not None else None,
+        }
+        for resource in ("cpu", "memory", "io"):
+            text = self.read(f"{resource}.pressure")
+            raw[f"{resource}_pressure"] = parse_pressure(text) if text else None
+        return raw
+
+    def close(self):
+        for fd in self._fds.values():
+            if fd >= 0:
+                os.close(fd)
+        self._fds.clear()
+
+
+def _rate(new, old, seconds: float):
+    return max(0.0, (new - old) / seconds) if seconds > 0 else 0.0
+
+
+def container_rates(raw: dict, previous, now: float) -> dict:
+    """Turn two raw samples into the published per-container figures."""
+    stats = {"memory_bytes": raw["memory"], "memory_limit": raw["memory_max"]}
+    if previous is None:
+        return stats
+    then, old = previous
+    seconds = now - then
+    cpu, old_cpu = raw["cpu"], old["cpu"]
+    if "usage_usec" in cpu and "usage_usec" in old_cpu:
+        stats["cpu_percent"] = round(_rate(cpu["usage_usec"], old_cpu["usage_usec"], seconds) / 1e4, 2)
+    if "throttled_usec" in cpu and "throttled_usec" in old_cpu:
+        stats["cpu_throttled_percent"] = round(
+            _rate(cpu["throttled_usec"], old_cpu["throttled_usec"], seconds) / 1e4, 2)
+    if raw["io"] is not None and old["io"] is not None:
+        for key, name in (("rbytes", "read_bps"), ("wbytes", "write_bps"),
+                          ("rios", "read_iops"), ("wios", "write_iops")):
+            stats[name] = round(_rate(raw["io"][key], old["io"][key], seconds), 1)
+    for resource in ("cpu", "memory", "io"):
+        psi, old_psi = raw[f"{resource}_pressure"], old[f"{resource}_pressure"]
+        if psi is None or old_psi is None:
+            continue
+        # Stall % over our own interval from the totals (the kernel's avg10 lags)
+        stats[f"{resource}_pressure"] = {
+            kind: {"stall_percent": round(_rate(psi[kind]["total"], old_psi[kind]["total"], seconds) / 1e4, 2),
+                   "avg10": psi[kind]["avg10"]}
+            for kind in psi if kind in old_psi}
+    return stats
+
+
+def resolve_cgroup(container: dict, root: str = CGROUP_ROOT, docker=None):
+    """cgroup v2 directory of a container from the list API, or None."""
+    container_id = container["Id"]
+    for candidate in (f"system.slice/docker-{container_id}.scope", f"docker/{container_id}"):
+        path = os.path.join(root, candidate)
+        if os.path.isdir(path):
+            return path
+    # Other layouts (rootless, nested): ask where the init process lives
+    if docker is None:
+        return None
+    pid = docker.inspect(container_id).get("State", {}).get("Pid")
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    path = os.path.join(root, line[3:].strip().lstrip("/"))
+                    return path if os.path.isdir(path) else None
+    except OSError:
+        return None
+    return None
+
+
+class CgroupCollector:
+    """
+    Samples every running container's cgroup. Thread-safe; sample() returns
+    {name: stats} with rates relative to the previous call.
+    """
+
+    def __init__(self, docker: docker_api.DockerClient = None, root: str = CGROUP_ROOT):
+        self.docker = docker or docker_api.DockerClient(timeout=10)
+        self.root = root
+        self.cgroups = {}        # container id -> ContainerCgroup
+        self.scanned = 0.0
+        self.lock = threading.Lock()
+        self.latest = {}
+        self.stats = {"samples": 0, "rescans": 0, "sample_ms": 0.0}
+
+    def rescan(self):
+        """Re-list running containers; only new ids are resolved."""
+        self.stats["rescans"] += 1
+        self.scanned = time.monotonic()
+        running = {c["Id"]: c for c in self.docker.containers(all=False)}
+        for container_id in set(self.cgroups) - set(running):
+            self.cgroups.pop(container_id).close()
+        for container_id, container in running.items():
+            if container_id in self.cgroups:
+                continue
+            name = (container.get("Names") or [container_id[:12]])[0].lstrip("/")
+            path = resolve_cgroup(container, self.root, self.docker)
+            if path is None:
+                logger.warning(f"No cgroup v2 directory found for {name}")
+                continue
+            self.cgroups[container_id] = ContainerCgroup(name, container_id, path)
+
+    def sample(self) -> dict:
+        with self.lock:
+            started = time.monotonic()
+            if not self.cgroups or started - self.scanned >= RESCAN_INTERVAL:
+                self.rescan()
+            out = {}
+            gone = False
+            for cgroup in list(self.cgroups.values()):
+                try:
+                    raw = cgroup.raw()
+                except OSError as e:
+                    if e.errno not in (errno.ENOENT, errno.ENODEV):
+                        raise
+                    gone = True       # container stopped or was recreated
+                    continue
+                now = time.monotonic()
+                out[cgroup.name] = {"id": cgroup.id[:12], **container_rates(raw, cgroup.previous, now)}
+                cgroup.previous = (now, raw)
+            if gone:
+                self.rescan()
+            self.stats["samples"] += 1
+            self.stats["sample_ms"] = round((time.monotonic() - started) * 1000, 3)
+            self.latest = out
+            return out
+
+    def close(self):
+        with self.lock:
+            for cgroup in self.cgroups.values():
+                cgroup.close()
+            self.cgroups.clear()
+
+# ============================================
+# COMMANDS
+# ============================================
+
+def _mb(value):
+    return f"{value / 1048576:8.1f}" if value is not None else "       -"
+
+
+def _stall(stats: dict, resource: str) -> str:
+    psi = stats.get(f"{resource}_pressure") or {}
+    some = psi.get("some", {}).get("stall_percent")
+    return f"{some:6.1f}" if some is not None else "     -"
+
+
+def print_table(sample: dict):
+    print(f"{'CONTAINER':<22} {'CPU%':>7} {'MEM MB':>8} {'READ/s':>8} {'WRITE/s':>8} "
+          f"{'cpuPSI':>6} {'memPSI':>6} {'ioPSI':>6}")
+    for name, s in sorted(sample.items(), key=lambda item: -item[1].get("cpu_percent", 0)):
+        print(f"{name[:22]:<22} {s.get('cpu_percent', 0):7.1f} {_mb(s['memory_bytes'])} "
+              f"{_mb(s.get('read_bps'))} {_mb(s.get('write_bps'))} "
+              f"{_stall(s, 'cpu')} {_stall(s, 'memory')} {_stall(s, 'io')}")
+
+
+def cmd_top(collector: CgroupCollector, args) -> int:
+    collector.sample()
+    shown = 0
+    while args.count == 0 or shown < args.count:
+        time.sleep(args.interval)
+        sample = collector.sample()
+        print_table(sample)
+        print(f"({len(sample)} containers, sampled in {collector.stats['sample_ms']:.2f} ms)\n")
+        shown += 1
+    return 0
+
+
+def cmd_json(collector: CgroupCollector, args) -> int:
+    collector.sample()
+    time.sleep(args.interval)
+    print(json.dumps(collector.sample(), indent=2))
+    return 0
+
+
+def cmd_serve(collector: CgroupCollector, args) -> int:
+    import http.server   # Only this command needs it
+
+    def sampler():
+        while True:
+            try:
+                collector.sample()
+            except Exception as e:
+                logger.warning(f"Sample failed: {e}")
+            time.sleep(args.interval)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/api/containers":
+                body = {"time": time.time(), "interval": args.interval, "containers": collector.latest,
+                        "collector": collector.stats}
+                status = 200
+            else:
+                body, status = {"error": "not found"}, 404
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    threading.Thread(target=sampler, daemon=True).start()
+    server = http.server.ThreadingHTTPServer((args.host, args.port), Handler)
+    logger.info(f"Serving container stats on http://{args.host}:{args.port}/api/containers "
+                f"(every {args.interval}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-container cgroup v2 resource usage")
+    parser.add_argument("--cgroup-root", default=CGROUP_ROOT)
+    parser.add_argument("--socket", default=docker_api.DOCKER_SOCKET)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("top", help="Refreshing table of containers")
+    p.add_argument("--interval", type=float, default=SAMPLE_INTERVAL)
+    p.add_argument("--count", type=int, default=0, help="Stop after N tables (0 = forever)")
+    p = sub.add_parser("json", help="One sample as JSON")
+    p.add_argument("--interval", type=float, default=1.0)
+    p = sub.add_parser("serve", help="HTTP endpoint for the dashboard / metrics")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=8768)
+    p.add_argument("--interval", type=float, default=SAMPLE_INTERVAL)
+    args = parser.parse_args()
+
+    collector = CgroupCollector(docker_api.DockerClient(args.socket, timeout=10), args.cgroup_root)
+    try:
+        return {"top": cmd_top, "json": cmd_json, "serve": cmd_serve}[args.command](collector, args)
+    except KeyboardInterrupt:
+        return 0
+    except (OSError, docker_api.DockerError) as e:
+        logger.error(f"Cannot sample containers: {e}")
+        return 1
+    finally:
+        collector.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
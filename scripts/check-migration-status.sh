@@ -11,38 +11,19 @@ echo -e "${YELLOW}MobileData Migration Status${NC}"
 echo "==============================="
 echo ""
 
-# Check if rsync is still running
-RSYNC_PID=$(pgrep -f "rsync.*mobiledata")
-if [ -n "$RSYNC_PID" ]; then
-    echo -e "Status: ${YELLOW}RUNNING${NC} (PID: $RSYNC_PID)"
-else
-    echo -e "Status: ${GREEN}COMPLETED or NOT RUNNING${NC}"
-fi
-echo ""
-
-# Size comparison
-echo "Data Sizes:"
-SOURCE=$(du -sh /mnt/mobiledata/ 2>/dev/null | cut -f1)
-DEST=$(du -sh /mnt/seagate/mobiledata/ 2>/dev/null | cut -f1)
-echo "  Source (/mnt/mobiledata/):         $SOURCE"
-echo "  Destination (/mnt/seagate/mobiledata/): $DEST"
-echo ""
-
-# File count comparison
-echo "File Counts:"
-SOURCE_COUNT=$(find /mnt/mobiledata/ -type f 2>/dev/null | wc -l)
-DEST_COUNT=$(find /mnt/seagate/mobiledata/ -type f 2>/dev/null | wc -l)
-echo "  Source files:      $SOURCE_COUNT"
-echo "  Destination files: $DEST_COUNT"
+# Progress comes from the migration journal (see migration_engine.py): live
+# throughput/ETA while a run is active, and a scan of only the source
+# directories that changed since the last check otherwise
+python3 /opt/homelab/scripts/migration_engine.py status /mnt/mobiledata/ /mnt/seagate/mobiledata/ 2>/dev/null
+COMPLETE=$?
 echo ""
 
-if [ "$SOURCE_COUNT" -eq "$DEST_COUNT" ] && [ -z "$RSYNC_PID" ]; then
-    echo -e "${GREEN}Migration appears COMPLETE!${NC}"
+if [ "$COMPLETE" -eq 0 ]; then
+    echo -e "${GREEN}Migration COMPLETE - every file copied and hash-verified${NC}"
     echo ""
     echo "Next step: Run the Frigate storage setup script:"
     echo "  sudo /opt/homelab/scripts/setup-frigate-storage.sh"
 else
-    echo -e "${YELLOW}Migration still in progress...${NC}"
-    REMAINING=$((SOURCE_COUNT - DEST_COUNT))
-    echo "Files remaining: ~$REMAINING"
+    echo -e "${YELLOW}Migration incomplete. Start or resume it with:${NC}"
+    echo "  sudo python3 /opt/homelab/scripts/migration_engine.py run /mnt/mobiledata/ /mnt/seagate/mobiledata/"
 fi
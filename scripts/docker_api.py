@@ -0,0 +1,154 @@
+"""
+Minimal Docker Engine API client over the unix socket.
+
+Only the standard library is used, so scripts that need container state do
+not have to shell out to `docker inspect` / `docker stats` or install the
+docker SDK. Responses are decoded JSON; the event stream is a generator.
+"""
+
+import http.client
+import json
+import socket
+import threading
+import urllib.parse
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+API_VERSION = "v1.41"
+
+
+class DockerError(Exception):
+    """Non-2xx response from the Docker Engine API."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API {status}: {message}")
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a unix socket instead of TCP."""
+
+    def __init__(self, socket_path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerClient:
+    """
+    Blocking Docker Engine API client. Safe to share between threads: each
+    thread gets its own keep-alive connection.
+    """
+
+    def __init__(self, socket_path: str = DOCKER_SOCKET, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _url(self, path: str, params: dict = None) -> str:
+        url = f"/{API_VERSION}{path}"
+        if params:
+            encoded = {k: json.dumps(v) if isinstance(v, (dict, list)) else v
+                       for k, v in params.items()}
+            url += "?" + urllib.parse.urlencode(encoded)
+        return url
+
+    def request(self, method: str, path: str, params: dict = None, body=None):
+        """Send a request and return the decoded JSON body (or None)."""
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        for attempt in (1, 2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = UnixHTTPConnection(self.socket_path, self.timeout)
+            try:
+                conn.request(method, self._url(path, params), payload, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Daemon closed the keep-alive connection - reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+
+        if resp.status >= 400:
+            try:
+                message = json.loads(data).get("message", "")
+            except ValueError:
+                message = data.decode(errors="replace")
+            raise DockerError(resp.status, message)
+        return json.loads(data) if data else None
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- convenience wrappers ----
+
+    def ping(self) -> bool:
+        try:
+            conn = UnixHTTPConnection(self.socket_path, timeout=2)
+            conn.request("GET", "/_ping")
+            ok = conn.getresponse().status == 200
+            conn.close()
+            return ok
+        except OSError:
+            return False
+
+    def containers(self, all: bool = True, filters: dict = None) -> list:
+        params = {"all": "1" if all else "0"}
+        if filters:
+            params["filters"] = filters
+        return self.request("GET", "/containers/json", params)
+
+    def inspect(self, container: str) -> dict:
+        return self.request("GET", f"/containers/{container}/json")
+
+    def start(self, container: str):
+        try:
+            self.request("POST", f"/containers/{container}/start")
+        except DockerError as e:
+            if e.status != 304:  # already started
+                raise
+
+    def stats(self, container: str) -> dict:
+        return self.request("GET", f"/containers/{container}/stats", {"stream": "0"})
+
+    def events(self, filters: dict = None, since: int = None, on_connect=None):
+        """
+        Yield events as they happen. Uses its own connection with no read
+        timeout; stops when the daemon closes the stream. on_connect is
+        called once the subscription is established.
+        """
+        params = {}
+        if filters:
+            params["filters"] = filters
+        if since is not None:
+            params["since"] = str(since)
+
+        conn = UnixHTTPConnection(self.socket_path, timeout=None)
+        try:
+            conn.request("GET", self._url("/events", params))
+            resp = conn.getresponse()
+            if resp.status >= 400:
+                raise DockerError(resp.status, resp.read().decode(errors="replace"))
+            if on_connect is not None:
+                on_connect()
+            while True:
+                line = resp.readline()
+                if not line:
+                    return
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        finally:
+            conn.close()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Fake Home Assistant server for exercising ha_client.py and dashboard code
+without a real HA instance.
+
+Implements the parts of HA's API the homelab tooling uses:
+  GET  /api/                      200 with a valid token, 401 otherwise
+  WS   /api/websocket             auth, supported_features (coalesce_messages),
+                                  ping, get_states, subscribe_entities,
+                                  subscribe_events / unsubscribe_events,
+                                  call_service (turn_on/turn_off/toggle and
+                                  input_* setters change state;
+                                  ai_task.generate_data answers with
+                                  --ai-response after --ai-latency),
+                                  config_entries/get
+  GET  /api/config/config_entries/entry[?domain=]
+                                  loaded hacs, tuya, mqtt and tplink entries
+  GET  /fake/stats                counters: connections, messages, service calls
+
+Sensors can be made to churn (--updates-per-second) so clients see a steady
+stream of subscribe_entities diffs and state_changed events.
+
+Usage:
+    fake_ha_server.py [--port 8123] [--token test-token] [--sensors 200]
+                      [--updates-per-second 50] [--ai-response "SAFE: ..."]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    from aiohttp import WSMsgType, web
+except ImportError:
+    web = None
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+DEFAULT_TOKEN = "test-token"
+DEFAULT_AI_RESPONSE = "SAFE: No person visible (fake model)."
+HA_VERSION = "2025.12.0"
+
+BASE_ENTITIES = {
+    "input_boolean.frigate_detection_paused": ("off", {"friendly_name": "Frigate Detection Paused"}),
+    "input_boolean.dog_mode": ("off", {"friendly_name": "Dog Mode"}),
+    "input_boolean.cameras_armed": ("off", {"friendly_name": "Cameras Armed"}),
+    "input_select.critical_alerts_mode": ("off", {"options": ["off", "outside", "stay", "away"]}),
+    "alarm_control_panel.alarm_partition_1": ("disarmed", {"friendly_name": "Alarm"}),
+    "light.porch": ("off", {"friendly_name": "Porch", "brightness": None}),
+    "sensor.inverter_device_state": ("Normal", {}),
+    "sensor.inverter_pv_power": ("0", {"unit_of_measurement": "W"}),
+    "sensor.inverter_pv1_power": ("0", {"unit_of_measurement": "W"}),
+    "sensor.inverter_pv2_power": ("0", {"unit_of_measurement": "W"}),
+    "sensor.inverter_battery": ("80", {"unit_of_measurement": "%"}),
+    "sensor.inverter_battery_power": ("0", {"unit_of_measurement": "W"}),
+    "sensor.inverter_grid_power": ("0", {"unit_of_measurement": "W"}),
+    "sensor.inverter_load_power": ("0", {"unit_of_measurement": "W"}),
+}
+
+BASE_CONFIG_ENTRIES = [
+    {"entry_id": "fake_hacs", "domain": "hacs", "title": "HACS", "state": "loaded"},
+    {"entry_id": "fake_tuya", "domain": "tuya", "title": "Tuya", "state": "loaded"},
+    {"entry_id": "fake_mqtt", "domain": "mqtt", "title": "Mosquitto broker", "state": "loaded"},
+    {"entry_id": "fake_tplink", "domain": "tplink", "title": "Garage Switch", "state": "loaded"},
+]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# STATE MACHINE
+# ============================================
+
+class FakeHA:
+    def __init__(self, token: str, sensors: int, ai_response: str = DEFAULT_AI_RESPONSE,
+                 ai_latency: float = 0.0):
+        self.token = token
+        self.ai_response = ai_response
+        self.ai_latency = ai_latency
+        now = time.time()
+        self.states = {}
+        for entity_id, (state, attrs) in BASE_ENTITIES.items():
+            self.states[entity_id] = {"s": state, "a": dict(attrs), "lc": now, "lu": now}
+        for i in range(sensors):
+            self.states[f"sensor.fake_{i:04d}"] = {"s": "0", "a": {"unit_of_measurement": "W"},
+                                                   "lc": now, "lu": now}
+        self.clients = set()
+        self.stats = {"connections": 0, "messages_in": 0, "messages_out": 0,
+                      "frames_out": 0, "service_calls": 0, "state_changes": 0, "ai_calls": 0}
+        self.service_log = []
+
+    def set_state(self, entity_id: str, state: str, attributes: dict = None):
+        now = time.time()
+        old = self.states.get(entity_id)
+        new = {"s": state, "a": dict(old["a"]) if old else {}, "lc": now, "lu": now}
+        if old and old["s"] == state:
+            new["lc"] = old["lc"]
+        if attributes:
+            new["a"].update(attributes)
+        self.states[entity_id] = new
+        self.stats["state_changes"] += 1
+        for client in list(self.clients):
+            client.state_changed(entity_id, old, new)
+
+    def call_service(self, domain: str, service: str, data: dict, target: dict):
+        self.stats["service_calls"] += 1
+        self.service_log.append({"domain": domain, "service": service, "data": data,
+                                 "target": target, "time": time.time()})
+        entity_ids = (target or {}).get("entity_id") or data.get("entity_id") or []
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        for entity_id in entity_ids:
+            current = self.states.get(entity_id)
+            if current is None:
+                continue
+            if service == "turn_on":
+                self.set_state(entity_id, "on")
+            elif service == "turn_off":
+                self.set_state(entity_id, "off")
+            elif service == "toggle":
+                self.set_state(entity_id, "off" if current["s"] == "on" else "on")
+            elif service in ("select_option", "set_value"):
+                self.set_state(entity_id, str(data.get("option", data.get("value"))))
+        for client in list(self.clients):
+            client.fire_event("call_service", {"domain": domain, "service": service,
+                                               "service_data": {**data, **(target or {})}})
+
+
+def _full_state(entity_id: str, s: dict) -> dict:
+    return {"entity_id": entity_id, "state": s["s"], "attributes": s["a"],
+            "last_changed": s["lc"], "last_updated": s["lu"], "context": {"id": "fake"}}
+
+
+def _config_entries(domain: str = None) -> list:
+    return [dict(e, source="user", disabled_by=None) for e in BASE_CONFIG_ENTRIES
+            if domain is None or e["domain"] == domain]
+
+
+class Connection:
+    """One websocket client; outgoing messages are coalesced per loop tick."""
+
+    def __init__(self, ha: FakeHA, ws):
+        self.ha = ha
+        self.ws = ws
+        self.coalesce = False
+        self.entity_subs = {}     # msg id -> set of entity ids or None
+        self.event_subs = {}      # msg id -> event type or None
+        self.outbox = []
+        self.flush_scheduled = False
+
+    def send(self, msg: dict):
+        self.outbox.append(msg)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        self.flush_scheduled = False
+        batch, self.outbox = self.outbox, []
+        if not batch or self.ws.closed:
+            return
+        self.ha.stats["messages_out"] += len(batch)
+        if self.coalesce and len(batch) > 1:
+            self.ha.stats["frames_out"] += 1
+            await self.ws.send_str(json.dumps(batch))
+        else:
+            for msg in batch:
+                self.ha.stats["frames_out"] += 1
+                await self.ws.send_str(json.dumps(msg))
+
+    def state_changed(self, entity_id: str, old: dict, new: dict):
+        for sub_id, wanted in self.entity_subs.items():
+            if wanted is not None and entity_id not in wanted:
+                continue
+            add = {}
+            if old is None or old["s"] != new["s"]:
+                add["s"] = new["s"]
+                add["lc"] = new["lc"]
+            else:
+                add["lu"] = new["lu"]
+            changed = {k: v for k, v in new["a"].items() if old is None or old["a"].get(k) != v}
+            if changed:
+                add["a"] = changed
+            diff = {"+": add}
+            removed = [k for k in (old["a"] if old else {}) if k not in new["a"]]
+            if removed:
+                diff["-"] = {"a": removed}
+            self.send({"id": sub_id, "type": "event", "event": {"c": {entity_id: diff}}})
+        self.fire_event("state_changed", {
+            "entity_id": entity_id,
+            "old_state": _full_state(entity_id, old) if old else None,
+            "new_state": _full_state(entity_id, new)})
+
+    def fire_event(self, event_type: str, data: dict):
+        for sub_id, wanted in self.event_subs.items():
+            if wanted is None or wanted == event_type:
+                self.send({"id": sub_id, "type": "event", "event": {
+                    "event_type": event_type, "data": data, "origin": "LOCAL",
+                    "time_fired": datetime.now(timezone.utc).isoformat()}})
+
+    def result(self, msg_id, result=None):
+        self.send({"id": msg_id, "type": "result", "success": True, "result": result})
+
+    def error(self, msg_id, code: str, message: str):
+        self.send({"id": msg_id, "type": "result", "success": False,
+                   "error": {"code": code, "message": message}})
+
+    async def ai_task(self, msg_id, data: dict):
+        """Stand-in model: fixed answer after a fixed latency."""
+        self.ha.stats["ai_calls"] += 1
+        self.ha.service_log.append({"domain": "ai_task", "service": "generate_data", "data": data,
+                                    "target": None, "time": time.time()})
+        await asyncio.sleep(self.ha.ai_latency)
+        self.result(msg_id, {"context": {"id": "fake"}, "response": {
+            "conversation_id": f"fake-{msg_id}", "data": self.ha.ai_response}})
+
+    def handle(self, msg: dict):
+        msg_id, kind = msg.get("id"), msg.get("type")
+        ha = self.ha
+        if kind == "supported_features":
+            self.coalesce = bool(msg.get("features", {}).get("coalesce_messages"))
+            self.result(msg_id)
+        elif kind == "ping":
+            self.send({"id": msg_id, "type": "pong"})
+        elif kind == "get_states":
+            self.result(msg_id, [_full_state(e, s) for e, s in ha.states.items()])
+        elif kind == "subscribe_entities":
+            wanted = set(msg["entity_ids"]) if msg.get("entity_ids") else None
+            self.entity_subs[msg_id] = wanted
+            self.result(msg_id)
+            self.send({"id": msg_id, "type": "event", "event": {"a": {
+                e: s for e, s in ha.states.items() if wanted is None or e in wanted}}})
+        elif kind == "subscribe_events":
+            self.event_subs[msg_id] = msg.get("event_type")
+            self.result(msg_id)
+        elif kind in ("unsubscribe_events", "unsubscribe_entities"):
+            sub = msg.get("subscription")
+            self.event_subs.pop(sub, None)
+            self.entity_subs.pop(sub, None)
+            self.result(msg_id)
+        elif kind == "call_service" and (msg["domain"], msg["service"]) == ("ai_task", "generate_data"):
+            asyncio.ensure_future(self.ai_task(msg_id, msg.get("service_data") or {}))
+        elif kind == "call_service":
+            ha.call_service(msg["domain"], msg["service"], msg.get("service_data") or {},
+                            msg.get("target"))
+            self.result(msg_id, {"context": {"id": "fake"}, "response": None})
+        elif kind == "config_entries/get":
+            self.result(msg_id, _config_entries(msg.get("domain")))
+        else:
+            self.error(msg_id, "unknown_command", f"Unknown command: {kind}")
+
+# ============================================
+# HTTP / WEBSOCKET
+# ============================================
+
+def make_app(ha: FakeHA):
+    async def api_root(request):
+        if request.headers.get("Authorization") != f"Bearer {ha.token}":
+            return web.json_response({"message": "Unauthorized"}, status=401)
+        return web.json_response({"message": "API running."})
+
+    async def config_entries(request):
+        if request.headers.get("Authorization") != f"Bearer {ha.token}":
+            return web.json_response({"message": "Unauthorized"}, status=401)
+        return web.json_response(_config_entries(request.query.get("domain")))
+
+    async def stats(request):
+        return web.json_response({**ha.stats, "entities": len(ha.states),
+                                  "clients": len(ha.clients)})
+
+    async def websocket(request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await ws.send_json({"type": "auth_required", "ha_version": HA_VERSION})
+        auth = await ws.receive_json()
+        if auth.get("access_token") != ha.token:
+            await ws.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+            await ws.close()
+            return ws
+        await ws.send_json({"type": "auth_ok", "ha_version": HA_VERSION})
+
+        conn = Connection(ha, ws)
+        ha.clients.add(conn)
+        ha.stats["connections"] += 1
+        try:
+            async for frame in ws:
+                if frame.type != WSMsgType.TEXT:
+                    break
+                data = json.loads(frame.data)
+                for msg in data if isinstance(data, list) else [data]:
+                    ha.stats["messages_in"] += 1
+                    conn.handle(msg)
+        finally:
+            ha.clients.discard(conn)
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/api/", api_root)
+    app.router.add_get("/api/websocket", websocket)
+    app.router.add_get("/api/config/config_entries/entry", config_entries)
+    app.router.add_get("/fake/stats", stats)
+    return app
+
+
+async def churn(ha: FakeHA, per_second: float):
+    sensors = [e for e in ha.states if e.startswith("sensor.")]
+    rng = random.Random(1)
+    interval = 1 / per_second
+    while True:
+        await asyncio.sleep(interval)
+        entity_id = rng.choice(sensors)
+        ha.set_state(entity_id, f"{rng.uniform(0, 5000):.1f}")
+
+
+async def serve(host: str, port: int, ha: FakeHA, per_second: float):
+    runner = web.AppRunner(make_app(ha))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Fake HA listening on http://{host}:{port} ({len(ha.states)} entities)")
+    if per_second > 0:
+        asyncio.create_task(churn(ha, per_second))
+    await asyncio.Event().wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake Home Assistant API for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--token", default=DEFAULT_TOKEN)
+    parser.add_argument("--sensors", type=int, default=200, help="Extra sensor.fake_* entities")
+    parser.add_argument("--updates-per-second", type=float, default=0,
+                        help="Random sensor state changes per second")
+    parser.add_argument("--ai-response", default=DEFAULT_AI_RESPONSE,
+                        help="Answer returned by ai_task.generate_data")
+    parser.add_argument("--ai-latency", type=float, default=1.0,
+                        help="Seconds ai_task.generate_data takes to answer")
+    args = parser.parse_args()
+
+    if web is None:
+        logger.error("aiohttp not installed. Run: pip install aiohttp")
+        return 1
+    try:
+        asyncio.run(serve(args.host, args.port,
+                          FakeHA(args.token, args.sensors, args.ai_response, args.ai_latency),
+                          args.updates_per_second))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
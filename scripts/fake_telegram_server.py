@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Fake Telegram Bot API for exercising notification_gateway.py without
+sending real messages.
+
+Implements:
+  POST /bot<token>/getMe
+  POST /bot<token>/sendMessage    JSON or form: chat_id, text
+  POST /bot<token>/sendPhoto      multipart: chat_id, caption, photo
+  GET  /fake/stats                counters
+  GET  /fake/messages             everything accepted so far (photo size only)
+
+Like the real API it enforces a per-chat message limit (--per-minute) and
+answers 429 with parameters.retry_after when it is exceeded. --fail-rate
+makes a fraction of requests fail with 502 to exercise retry/backoff.
+
+Usage:
+    fake_telegram_server.py [--port 8081] [--token test-token] [--per-minute 20]
+                            [--fail-rate 0.1]
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import random
+import sys
+import time
+from collections import deque
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+DEFAULT_TOKEN = "test-token"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# SERVER
+# ============================================
+
+class FakeTelegram:
+    def __init__(self, token: str, per_minute: int, fail_rate: float):
+        self.token = token
+        self.per_minute = per_minute
+        self.fail_rate = fail_rate
+        self.rng = random.Random(1)
+        self.sent = {}      # chat_id -> deque of send times
+        self.messages = []
+        self.stats = {"requests": 0, "messages": 0, "photos": 0, "photo_bytes": 0,
+                      "rate_limited": 0, "failed": 0, "unauthorized": 0}
+
+    def retry_after(self, chat_id: str) -> int:
+        """Seconds until chat_id may send again (0 = allowed now)."""
+        now = time.monotonic()
+        times = self.sent.setdefault(chat_id, deque())
+        while times and now - times[0] >= 60:
+            times.popleft()
+        if len(times) >= self.per_minute:
+            return max(1, math.ceil(60 - (now - times[0])))
+        times.append(now)
+        return 0
+
+
+def _error(code: int, description: str, **parameters):
+    body = {"ok": False, "error_code": code, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return web.json_response(body, status=code)
+
+
+def make_app(tg: FakeTelegram):
+    async def method(request):
+        tg.stats["requests"] += 1
+        if request.match_info["token"] != tg.token:
+            tg.stats["unauthorized"] += 1
+            return _error(401, "Unauthorized")
+        name = request.match_info["method"]
+        if name == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True,
+                                                             "username": "fake_bot"}})
+        if name not in ("sendMessage", "sendPhoto"):
+            return _error(404, "Not Found: method not found")
+        if tg.rng.random() < tg.fail_rate:
+            tg.stats["failed"] += 1
+            return _error(502, "Bad Gateway")
+
+        if request.content_type == "application/json":
+            fields = await request.json()
+        else:
+            fields = dict(await request.post())
+        chat_id = str(fields.get("chat_id", ""))
+        if not chat_id:
+            return _error(400, "Bad Request: chat_id is empty")
+        wait = tg.retry_after(chat_id)
+        if wait:
+            tg.stats["rate_limited"] += 1
+            return _error(429, f"Too Many Requests: retry after {wait}", retry_after=wait)
+
+        entry = {"method": name, "chat_id": chat_id, "time": time.time()}
+        if name == "sendPhoto":
+            photo = fields.get("photo")
+            if photo is None or not hasattr(photo, "file"):
+                return _error(400, "Bad Request: there is no photo in the request")
+            size = len(photo.file.read())
+            entry.update(caption=fields.get("caption", ""), photo_bytes=size)
+            tg.stats["photos"] += 1
+            tg.stats["photo_bytes"] += size
+        else:
+            if not fields.get("text"):
+                return _error(400, "Bad Request: message text is empty")
+            entry["text"] = fields["text"]
+        tg.stats["messages"] += 1
+        tg.messages.append(entry)
+        return web.json_response({"ok": True, "result": {"message_id": len(tg.messages),
+                                                         "chat": {"id": chat_id}}})
+
+    async def stats(request):
+        return web.json_response(tg.stats)
+
+    async def messages(request):
+        return web.json_response(tg.messages)
+
+    app = web.Application(client_max_size=20 * 1024 * 1024)
+    app.router.add_post("/bot{token}/{method}", method)
+    app.router.add_get("/fake/stats", stats)
+    app.router.add_get("/fake/messages", messages)
+    return app
+
+
+async def serve(host: str, port: int, tg: FakeTelegram):
+    runner = web.AppRunner(make_app(tg))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Fake Telegram API listening on http://{host}:{port} "
+                f"({tg.per_minute} msgs/min per chat, fail rate {tg.fail_rate})")
+    await asyncio.Event().wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token", default=DEFAULT_TOKEN)
+    parser.add_argument("--per-minute", type=int, default=20, help="Messages per chat per minute")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered 502")
+    args = parser.parse_args()
+
+    if web is None:
+        logger.error("aiohttp not installed. Run: pip install aiohttp")
+        return 1
+    try:
+        asyncio.run(serve(args.host, args.port, FakeTelegram(args.token, args.per_minute, args.fail_rate)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Frigate Event Router - fan the frigate/events firehose out into slim topics
+
+Frigate publishes every tracked-object change to the single topic
+frigate/events with a large before/after payload. Every Home Assistant
+automation subscribed to that topic decodes the whole payload and renders
+its value_template on every message, even though almost all of them only
+care about a new person on one camera.
+
+This service subscribes to frigate/events once, decodes each payload once
+and republishes a compact message on
+
+    frigate/events/<camera>/<label>/<type>
+
+where <type> is:
+    new     - first message for an event (or first one passing the filters)
+    zone    - the object entered one or more zones it was not in before
+    update  - something an automation can use changed (sub label, zones,
+              snapshot/clip, stationary, top score by SCORE_STEP)
+    end     - the event finished
+
+Updates that only move the bounding box or frame time are dropped, so HA
+automations can subscribe to exactly the camera/label/type they need.
+
+Compact payload:
+    {"type", "id", "camera", "label", "sub_label", "score", "top_score",
+     "zones", "entered_zones", "new_zones", "has_snapshot", "has_clip",
+     "stationary", "start_time", "end_time"}
+
+Optional filters (--min-score, --label, --zone) hold events back until they
+qualify; the first qualifying message is then published as "new".
+
+Usage:
+    frigate_event_router.py [--min-score 0.6] [--label person]
+                            [--zone front_door=External_Front_Corridor]
+"""
+
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+SOURCE_TOPIC = "frigate/events"
+TOPIC_PREFIX = "frigate/events"
+AVAILABILITY_TOPIC = "frigate_router/status"
+CLIENT_ID = "frigate-event-router"
+
+# top_score changes smaller than this do not produce an update
+SCORE_STEP = 0.05
+
+# Forget events that never sent "end" (Frigate restart, missed message)
+STALE_EVENT_SECONDS = 3600
+STATS_INTERVAL = 300
+
+# ============================================
+# LOGGING
+# ============================================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# ROUTING
+# ============================================
+
+def _sub_label(value):
+    """Frigate 0.14+ sends [name, score]; older versions a plain string."""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value or None
+
+
+class EventFilter:
+    """Score / label / per-camera zone requirements for republishing."""
+
+    def __init__(self, min_score: float = 0.0, labels=None, zones: dict = None):
+        self.min_score = min_score
+        self.labels = set(labels or ())
+        self.zones = {camera: set(z) for camera, z in (zones or {}).items()}
+
+    def passes(self, obj: dict) -> bool:
+        if self.labels and obj.get("label") not in self.labels:
+            return False
+        if (obj.get("top_score") or obj.get("score") or 0) < self.min_score:
+            return False
+        required = self.zones.get(obj.get("camera"))
+        if required and not required.intersection(obj.get("current_zones") or ()):
+            return False
+        return True
+
+
+class TrackedEvent:
+    __slots__ = ("published", "zones", "signature", "seen")
+
+    def __init__(self):
+        self.published = False
+        self.zones = frozenset()
+        self.signature = None
+        self.seen = 0.0
+
+
+class EventRouter:
+    """
+    Turns raw frigate/events payloads into (topic, payload) messages.
+    Pure state machine - no MQTT - so it can be benchmarked directly.
+    """
+
+    def __init__(self, event_filter: EventFilter = None, prefix: str = TOPIC_PREFIX,
+                 score_step: float = SCORE_STEP):
+        self.filter = event_filter or EventFilter()
+        self.prefix = prefix
+        self.score_step = score_step
+        self.events = {}
+        self.stats = {"received": 0, "published": 0, "deduplicated": 0,
+                      "filtered": 0, "invalid": 0}
+
+    def _signature(self, obj: dict):
+        return (
+            _sub_label(obj.get("sub_label")),
+            frozenset(obj.get("current_zones") or ()),
+            tuple(obj.get("entered_zones") or ()),
+            bool(obj.get("has_snapshot")),
+            bool(obj.get("has_clip")),
+            bool(obj.get("stationary")),
+            int((obj.get("top_score") or 0) / self.score_step),
+        )
+
+    def _message(self, kind: str, obj: dict, new_zones) -> tuple:
+        body = {
+            "type": kind,
+            "id": obj.get("id"),
+            "camera": obj.get("camera"),
+            "label": obj.get("label"),
+            "sub_label": _sub_label(obj.get("sub_label")),
+            "score": obj.get("score"),
+            "top_score": obj.get("top_score"),
+            "zones": obj.get("current_zones") or [],
+            "entered_zones": obj.get("entered_zones") or [],
+            "new_zones": sorted(new_zones),
+            "has_snapshot": bool(obj.get("has_snapshot")),
+            "has_clip": bool(obj.get("has_clip")),
+            "stationary": bool(obj.get("stationary")),
+            "start_time": obj.get("start_time"),
+            "end_time": obj.get("end_time"),
+        }
+        topic = f"{self.prefix}/{obj.get('camera')}/{obj.get('label')}/{kind}"
+        return topic, json.dumps(body, separators=(",", ":"))
+
+    def route(self, payload: bytes, now: float = None) -> list:
+        """Return the (topic, payload) messages to publish for one raw event."""
+        self.stats["received"] += 1
+        try:
+            event = json.loads(payload)
+            kind = event["type"]
+            obj = event.get("after") or event["before"]
+            event_id = obj["id"]
+        except (ValueError, KeyError, TypeError):
+            self.stats["invalid"] += 1
+            return []
+
+        now = time.monotonic() if now is None else now
+        tracked = self.events.get(event_id)
+        if tracked is None:
+            if kind == "end":
+                return []
+            tracked = self.events[event_id] = TrackedEvent()
+        tracked.seen = now
+
+        if kind == "end":
+            del self.events[event_id]
+            if not tracked.published:
+                return []
+            out = [self._message("end", obj, ())]
+            self.stats["published"] += 1
+            return out
+
+        if not self.filter.passes(obj):
+            # Keep zone state current so re-entering a zone is reported
+            tracked.zones = frozenset(obj.get("current_zones") or ())
+            self.stats["filtered"] += 1
+            return []
+
+        zones = frozenset(obj.get("current_zones") or ())
+        new_zones = zones - tracked.zones
+        signature = self._signature(obj)
+        out = []
+        if not tracked.published:
+            out.append(self._message("new", obj, new_zones))
+            tracked.published = True
+        else:
+            if new_zones:
+                out.append(self._message("zone", obj, new_zones))
+            if signature != tracked.signature:
+                out.append(self._message("update", obj, new_zones))
+            if not out:
+                self.stats["deduplicated"] += 1
+
+        tracked.zones = zones
+        tracked.signature = signature
+        self.stats["published"] += len(out)
+        return out
+
+    def expire(self, now: float = None) -> int:
+        """Drop events that have not been seen for STALE_EVENT_SECONDS."""
+        now = time.monotonic() if now is None else now
+        stale = [eid for eid, t in self.events.items() if now - t.seen > STALE_EVENT_SECONDS]
+        for eid in stale:
+            del self.events[eid]
+        return len(stale)
+
+# ============================================
+# SERVICE
+# ============================================
+
+def parse_zone(value: str):
+    camera, _, zones = value.partition("=")
+    if not camera or not zones:
+        raise argparse.ArgumentTypeError("expected CAMERA=ZONE[,ZONE...]")
+    return camera, [z for z in zones.split(",") if z]
+
+
+def run(router: EventRouter, host: str, port: int):
+    lock = threading.Lock()
+    stop = threading.Event()
+    ready = threading.Event()
+    client = None
+
+    def on_message(topic, payload):
+        with lock:
+            messages = router.route(payload)
+        # The network loop can deliver before create_client() has returned
+        ready.wait()
+        for out_topic, out_payload in messages:
+            client.publish(out_topic, out_payload)
+
+    client = mqtt_client.create_client(
+        CLIENT_ID, host=host, port=port, availability_topic=AVAILABILITY_TOPIC,
+        subscriptions=[(SOURCE_TOPIC, 0)], on_message=on_message)
+    ready.set()
+
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info(f"Routing {SOURCE_TOPIC} -> {TOPIC_PREFIX}/<camera>/<label>/<type>")
+
+    while not stop.wait(STATS_INTERVAL):
+        with lock:
+            expired = router.expire()
+            stats = dict(router.stats)
+            active = len(router.events)
+        logger.info(f"Received {stats['received']}, published {stats['published']}, "
+                    f"deduplicated {stats['deduplicated']}, filtered {stats['filtered']}, "
+                    f"active events {active}" + (f", expired {expired}" if expired else ""))
+
+    mqtt_client.close_client(client, AVAILABILITY_TOPIC)
+    logger.info("Frigate event router stopped")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fan frigate/events out into slim per-camera topics")
+    parser.add_argument("--host", default=mqtt_client.MQTT_HOST)
+    parser.add_argument("--port", type=int, default=mqtt_client.MQTT_PORT)
+    parser.add_argument("--min-score", type=float, default=0.0,
+                        help="Hold back events until top_score reaches this")
+    parser.add_argument("--label", action="append", default=[],
+                        help="Only route these labels (repeatable)")
+    parser.add_argument("--zone", action="append", type=parse_zone, default=[],
+                        help="CAMERA=ZONE[,ZONE] - only route events on CAMERA inside a ZONE")
+    args = parser.parse_args()
+
+    event_filter = EventFilter(args.min_score, args.label, dict(args.zone))
+    try:
+        run(EventRouter(event_filter), args.host, args.port)
+    except (RuntimeError, OSError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
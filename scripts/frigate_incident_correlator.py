@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+Frigate Incident Correlator - one incident per visitor, not one per camera
+
+A person walking from the driveway into the garage is tracked separately by
+front_door, wyze_garage and often backyard, and every one of those "new"
+events used to start its own snapshot, AI call and notification. This service
+subscribes to frigate/events and groups events into incidents:
+
+  - a new event joins an open incident with the same label when all of the
+    incident's events have ended and it appears on a camera linked to one of
+    the incident's cameras (CAMERA_GRAPH) within that link's walking time of
+    the object last being seen there, or on the same camera within
+    SAME_CAMERA_GAP (re-detections). While one of its events is still being
+    tracked, a new event is a second object and starts its own incident
+  - an event whose sub label (recognised face, plate) matches an open
+    incident's joins it within SUB_LABEL_GAP from any camera, and two open
+    incidents that turn out to share a sub label are merged
+
+and publishes the incident lifecycle on the single topic frigate/incidents:
+
+    start   - the first qualifying event of an incident
+    update  - a camera joined, a zone was entered, a sub label was recognised,
+              or a better snapshot (top score by SCORE_STEP) is available
+    end     - no event is active and no linked camera can still join (the
+              incident has been idle longer than its longest link), the
+              incident hit MAX_INCIDENT_SECONDS, or it was merged into another
+
+Payload:
+    {"type", "id", "label", "camera", "cameras", "new_cameras", "latest_camera",
+     "events", "active_events", "sub_labels", "zones", "new_zones",
+     "top_score", "best_event", "best_camera", "has_snapshot",
+     "start_time", "end_time", "duration", "end_reason", "merged_into"}
+
+camera is where the incident started and best_event is the event with the
+highest score that has a snapshot, for the snapshot service and AI analysis.
+Zone names are unique per camera, so zones (every zone any of the incident's
+events entered) can be matched without knowing which camera entered them.
+
+The graph and --min-score / --label / --zone filters are the same kind as
+frigate_event_router.py's; events held back by the filters never start or
+join an incident.
+
+--replay reads a capture from mqtt_logger.sh ("<iso time> | <topic> |
+<payload>" lines, or one raw payload per line) and reports how many per-camera
+events collapse into how many incidents, without a broker.
+
+Usage:
+    frigate_incident_correlator.py [--label person] [--min-score 0.6]
+                                   [--graph graph.json] [--link front_door:backyard:90]
+    frigate_incident_correlator.py --replay /opt/homelab/logs/mqtt_frigate_events.log [-v]
+"""
+
+import argparse
+import json
+import logging
+import secrets
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import frigate_event_router
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+SOURCE_TOPIC = "frigate/events"
+INCIDENT_TOPIC = "frigate/incidents"
+AVAILABILITY_TOPIC = "frigate_incidents/status"
+CLIENT_ID = "frigate-incident-correlator"
+
+# Seconds it takes to walk from one camera's view into the other's (either way)
+CAMERA_GRAPH = {
+    ("front_door", "wyze_garage"): 45,
+    ("front_door", "ezviz_indoor"): 60,
+    ("wyze_garage", "backyard"): 60,
+    ("front_door", "backyard"): 90,
+}
+SAME_CAMERA_GAP = 30          # A new event on a camera the incident is already on
+SUB_LABEL_GAP = 300           # Same recognised face / plate, any camera
+MAX_INCIDENT_SECONDS = 900    # Long incidents (a loitering person) are split here
+
+SCORE_STEP = frigate_event_router.SCORE_STEP
+TICK_SECONDS = 1
+STATS_INTERVAL = 300
+
+# ============================================
+# LOGGING
+# ============================================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# CORRELATION
+# ============================================
+
+def build_graph(links) -> dict:
+    """{(a, b): seconds} -> symmetric {a: {b: seconds}}."""
+    graph = {}
+    for (a, b), seconds in links.items():
+        graph.setdefault(a, {})[b] = seconds
+        graph.setdefault(b, {})[a] = seconds
+    return graph
+
+
+def load_graph(path: str) -> dict:
+    """
+    Read links from JSON, either {"front_door": {"wyze_garage": 45}, ...}
+    or [["front_door", "wyze_garage", 45], ...].
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return {(a, b): float(s) for a, targets in data.items() for b, s in targets.items()}
+    return {(a, b): float(s) for a, b, s in data}
+
+
+class Incident:
+    __slots__ = ("id", "label", "cameras", "events", "active", "last_seen", "sub_labels",
+                 "zones", "top_score", "best", "start", "last_activity", "signature")
+
+    def __init__(self, label: str, now: float):
+        self.id = f"{now:.6f}-{secrets.token_hex(3)}"
+        self.label = label
+        self.cameras = []           # in the order they joined
+        self.events = []
+        self.active = {}            # event id -> camera
+        self.last_seen = {}         # camera -> last time an event there was seen
+        self.sub_labels = []
+        self.zones = set()
+        self.top_score = 0.0
+        self.best = None            # (has_snapshot, top_score, event id, camera)
+        self.start = now
+        self.last_activity = now
+        self.signature = None
+
+
+class IncidentCorrelator:
+    """
+    Turns raw frigate/events payloads into incident (topic, payload) messages.
+    Pure state machine - no MQTT, time passed in - so captures can be replayed.
+    """
+
+    def __init__(self, links: dict = None, event_filter: frigate_event_router.EventFilter = None,
+                 topic: str = INCIDENT_TOPIC, same_camera_gap: float = SAME_CAMERA_GAP,
+                 sub_label_gap: float = SUB_LABEL_GAP, max_duration: float = MAX_INCIDENT_SECONDS):
+        self.graph = build_graph(CAMERA_GRAPH if links is None else links)
+        self.filter = event_filter or frigate_event_router.EventFilter()
+        self.topic = topic
+        self.same_camera_gap = same_camera_gap
+        self.sub_label_gap = sub_label_gap
+        self.max_duration = max_duration
+        self.incidents = {}
+        self.events = {}            # event id -> Incident, or None once its incident has ended
+        self.seen = {}              # event id -> last message time
+        self.stats = {"received": 0, "events": 0, "joined": 0, "incidents": 0, "merged": 0,
+                      "published": 0, "filtered": 0, "invalid": 0}
+
+    # ---- matching ----
+
+    def _gap_limit(self, seen_camera: str, camera: str):
+        if seen_camera == camera:
+            return self.same_camera_gap
+        return self.graph.get(seen_camera, {}).get(camera)
+
+    def _grace(self, incident: Incident) -> float:
+        """How long after its last activity a linked camera could still join."""
+        grace = self.same_camera_gap
+        for camera in incident.cameras:
+            grace = max(grace, *self.graph.get(camera, {}).values(), 0)
+        return grace
+
+    def _match(self, camera: str, label: str, sub_label, now: float):
+        best, best_key = None, None
+        for incident in self.incidents.values():
+            if incident.label != label:
+                continue
+            key = None
+            if sub_label and sub_label in incident.sub_labels and \
+                    now - incident.last_activity <= self.sub_label_gap:
+                key = (0, now - incident.last_activity)
+            elif not incident.active:
+                # Hand-over: the object left one camera and turned up on a linked one
+                for seen_camera, seen in incident.last_seen.items():
+                    limit = self._gap_limit(seen_camera, camera)
+                    if limit is not None and now - seen <= limit:
+                        candidate = (1, now - seen)
+                        key = candidate if key is None else min(key, candidate)
+            if key is not None and (best_key is None or key < best_key):
+                best, best_key = incident, key
+        return best
+
+    # ---- incident state ----
+
+    def _apply(self, incident: Incident, obj: dict, now: float):
+        """Fold one event's current state into its incident."""
+        event_id = obj["id"]
+        camera = obj.get("camera")
+        if camera not in incident.cameras:
+            incident.cameras.append(camera)
+        if event_id not in incident.events:
+            incident.events.append(event_id)
+        incident.active[event_id] = camera
+        incident.last_seen[camera] = now
+        incident.last_activity = now
+
+        sub_label = frigate_event_router._sub_label(obj.get("sub_label"))
+        if sub_label and sub_label not in incident.sub_labels:
+            incident.sub_labels.append(sub_label)
+        incident.zones.update(obj.get("entered_zones") or ())
+        incident.zones.update(obj.get("current_zones") or ())
+        score = obj.get("top_score") or obj.get("score") or 0.0
+        incident.top_score = max(incident.top_score, score)
+        candidate = (bool(obj.get("has_snapshot")), score, event_id, camera)
+        if incident.best is None or candidate[:2] > incident.best[:2] or incident.best[2] == event_id:
+            incident.best = candidate
+
+    def _signature(self, incident: Incident):
+        return (
+            tuple(incident.cameras),
+            tuple(incident.sub_labels),
+            frozenset(incident.zones),
+            incident.best[2] if incident.best else None,
+            bool(incident.best and incident.best[0]),
+            int(incident.top_score / SCORE_STEP),
+        )
+
+    def _message(self, kind: str, incident: Incident, now: float, previous=None, **extra) -> tuple:
+        if previous is None:
+            previous = ((), frozenset()) if kind == "start" else (tuple(incident.cameras), frozenset(incident.zones))
+        old_cameras, old_zones = previous
+        best = incident.best or (False, 0.0, None, None)
+        body = {
+            "type": kind,
+            "id": incident.id,
+            "label": incident.label,
+            "camera": incident.cameras[0] if incident.cameras else None,
+            "cameras": list(incident.cameras),
+            "new_cameras": [c for c in incident.cameras if c not in old_cameras],
+            "latest_camera": max(incident.last_seen, key=incident.last_seen.get) if incident.last_seen else None,
+            "events": list(incident.events),
+            "active_events": len(incident.active),
+            "sub_labels": list(incident.sub_labels),
+            "zones": sorted(incident.zones),
+            "new_zones": sorted(incident.zones - old_zones),
+            "top_score": round(incident.top_score, 3),
+            "best_event": best[2],
+            "best_camera": best[3],
+            "has_snapshot": best[0],
+            "start_time": incident.start,
+            "end_time": now if kind == "end" else None,
+            "duration": round(now - incident.start, 1),
+        }
+        body.update(extra)
+        self.stats["published"] += 1
+        return self.topic, json.dumps(body, separators=(",", ":"))
+
+    def _changed(self, incident: Incident, now: float, previous) -> list:
+        signature = self._signature(incident)
+        if signature == incident.signature:
+            return []
+        incident.signature = signature
+        return [self._message("update", incident, now, previous)]
+
+    def _end(self, incident: Incident, now: float, reason: str, **extra) -> tuple:
+        del self.incidents[incident.id]
+        for event_id in incident.events:
+            if event_id in self.events:
+                # Still-active events stay retired so they cannot restart it
+                if event_id in incident.active:
+                    self.events[event_id] = None
+                else:
+                    del self.events[event_id]
+        return self._message("end", incident, now, end_reason=reason, **extra)
+
+    def _merge(self, keep: Incident, drop: Incident, now: float) -> list:
+        """Fold drop (the younger incident) into keep."""
+        previous = (tuple(keep.cameras), frozenset(keep.zones))
+        for camera in drop.cameras:
+            if camera not in keep.cameras:
+                keep.cameras.append(camera)
+        for event_id in drop.events:
+            if event_id not in keep.events:
+                keep.events.append(event_id)
+            if self.events.get(event_id) is drop:
+                self.events[event_id] = keep
+        keep.active.update(drop.active)
+        for camera, seen in drop.last_seen.items():
+            keep.last_seen[camera] = max(seen, keep.last_seen.get(camera, 0))
+        for sub_label in drop.sub_labels:
+            if sub_label not in keep.sub_labels:
+                keep.sub_labels.append(sub_label)
+        keep.zones |= drop.zones
+        keep.top_score = max(keep.top_score, drop.top_score)
+        if drop.best and (keep.best is None or drop.best[:2] > keep.best[:2]):
+            keep.best = drop.best
+        keep.last_activity = max(keep.last_activity, drop.last_activity)
+        self.stats["merged"] += 1
+
+        del self.incidents[drop.id]
+        out = [self._message("end", drop, now, end_reason="merged", merged_into=keep.id)]
+        return out + self._changed(keep, now, previous)
+
+    # ---- input ----
+
+    def route(self, payload: bytes, now: float = None) -> list:
+        """Return the (topic, payload) messages to publish for one raw event."""
+        self.stats["received"] += 1
+        try:
+            event = json.loads(payload)
+            kind = event["type"]
+            obj = event.get("after") or event["before"]
+            event_id = obj["id"]
+        except (ValueError, KeyError, TypeError):
+            self.stats["invalid"] += 1
+            return []
+
+        now = time.time() if now is None else now
+        incident = self.events.get(event_id)
+
+        if kind == "end":
+            self.seen.pop(event_id, None)
+            if event_id not in self.events:
+                return []
+            del self.events[event_id]
+            if incident is None:
+                return []
+            camera = incident.active.pop(event_id, obj.get("camera"))
+            incident.last_seen[camera] = now
+            incident.last_activity = now
+            return []
+
+        if event_id in self.events and incident is None:
+            self.seen[event_id] = now
+            return []
+
+        if incident is None:
+            if not self.filter.passes(obj):
+                self.stats["filtered"] += 1
+                return []
+            self.stats["events"] += 1
+            sub_label = frigate_event_router._sub_label(obj.get("sub_label"))
+            incident = self._match(obj.get("camera"), obj.get("label"), sub_label, now)
+            self.events[event_id] = incident
+            if incident is None:
+                incident = self.events[event_id] = Incident(obj.get("label"), now)
+                self.incidents[incident.id] = incident
+                self.stats["incidents"] += 1
+                self._apply(incident, obj, now)
+                incident.signature = self._signature(incident)
+                self.seen[event_id] = now
+                return [self._message("start", incident, now)]
+            self.stats["joined"] += 1
+
+        self.seen[event_id] = now
+        previous = (tuple(incident.cameras), frozenset(incident.zones))
+        had_sub_labels = set(incident.sub_labels)
+        self._apply(incident, obj, now)
+
+        # A face recognised here may already belong to another open incident
+        for sub_label in set(incident.sub_labels) - had_sub_labels:
+            for other in list(self.incidents.values()):
+                if other is not incident and other.label == incident.label and sub_label in other.sub_labels:
+                    keep, drop = (other, incident) if other.start <= incident.start else (incident, other)
+                    return self._merge(keep, drop, now)
+        return self._changed(incident, now, previous)
+
+    def tick(self, now: float = None) -> list:
+        """End incidents that went quiet or ran too long."""
+        now = time.time() if now is None else now
+        out = []
+        for incident in list(self.incidents.values()):
+            if now - incident.start >= self.max_duration:
+                out.append(self._end(incident, now, "max_duration"))
+            elif not incident.active and now - incident.last_activity > self._grace(incident):
+                out.append(self._end(incident, now, "idle"))
+        return out
+
+    def expire(self, now: float = None) -> int:
+        """Forget events that have not been seen for STALE_EVENT_SECONDS."""
+        now = time.time() if now is None else now
+        stale = [eid for eid, t in self.seen.items() if now - t > frigate_event_router.STALE_EVENT_SECONDS]
+        for event_id in stale:
+            del self.seen[event_id]
+            incident = self.events.pop(event_id, None)
+            if incident is not None:
+                incident.active.pop(event_id, None)
+        return len(stale)
+
+# ============================================
+# SERVICE
+# ============================================
+
+def parse_link(value: str):
+    try:
+        a, b, seconds = value.split(":")
+        return (a, b), float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected CAMERA:CAMERA:SECONDS")
+
+
+def run(correlator: IncidentCorrelator, host: str, port: int):
+    lock = threading.Lock()
+    stop = threading.Event()
+    ready = threading.Event()
+    client = None
+
+    def publish(messages):
+        # The network loop can deliver before create_client() has returned
+        ready.wait()
+        for topic, payload in messages:
+            client.publish(topic, payload)
+
+    def on_message(topic, payload):
+        with lock:
+            messages = correlator.route(payload)
+        publish(messages)
+
+    client = mqtt_client.create_client(
+        CLIENT_ID, host=host, port=port, availability_topic=AVAILABILITY_TOPIC,
+        subscriptions=[(SOURCE_TOPIC, 0)], on_message=on_message)
+    ready.set()
+
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info(f"Correlating {SOURCE_TOPIC} -> {correlator.topic} "
+                f"({len(correlator.graph)} linked cameras)")
+
+    next_stats = time.monotonic() + STATS_INTERVAL
+    while not stop.wait(TICK_SECONDS):
+        with lock:
+            messages = correlator.tick()
+        publish(messages)
+        if time.monotonic() < next_stats:
+            continue
+        next_stats += STATS_INTERVAL
+        with lock:
+            expired = correlator.expire()
+            stats = dict(correlator.stats)
+            active = len(correlator.incidents)
+        logger.info(f"Received {stats['received']}, events {stats['events']} -> incidents "
+                    f"{stats['incidents']} ({stats['joined']} joined, {stats['merged']} merged), "
+                    f"filtered {stats['filtered']}, open incidents {active}" +
+                    (f", expired {expired}" if expired else ""))
+
+    mqtt_client.close_client(client, AVAILABILITY_TOPIC)
+    logger.info("Frigate incident correlator stopped")
+
+
+def _replay_lines(path: str):
+    """Yield (time, payload) from an mqtt_logger.sh capture or raw JSON lines."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    t = json.loads(line).get("after", {}).get("frame_time")
+                except (ValueError, AttributeError):
+                    t = None
+                yield t, line
+                continue
+            parts = line.split(" | ", 2)
+            if len(parts) != 3 or parts[1] != SOURCE_TOPIC:
+                continue
+            try:
+                t = datetime.fromisoformat(parts[0]).timestamp()
+            except ValueError:
+                t = None
+            yield t, parts[2]
+
+
+def replay(correlator: IncidentCorrelator, path: str, verbose: bool = False) -> int:
+    events = {}                 # camera -> qualifying events
+    started = {}                # camera -> incidents started there
+    now = None
+
+    def show(messages):
+        for _, payload in messages:
+            body = json.loads(payload)
+            if body["type"] == "start":
+                started[body["camera"]] = started.get(body["camera"], 0) + 1
+            if verbose:
+                stamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"{stamp} {body['type']:6} {body['id']} {body['label']} "
+                      f"{'>'.join(body['cameras'])}"
+                      + (f" [{body['end_reason']}]" if body.get("end_reason") else ""))
+
+    for t, payload in _replay_lines(path):
+        if t is None:
+            continue
+        now = t
+        show(correlator.tick(now))
+        before = correlator.stats["events"]
+        show(correlator.route(payload, now))
+        if correlator.stats["events"] > before:
+            camera = json.loads(payload)["after"].get("camera")
+            events[camera] = events.get(camera, 0) + 1
+    if now is not None:
+        now += correlator.max_duration
+        show(correlator.tick(now))
+
+    stats = correlator.stats
+    print(f"\n{stats['received']} messages, {stats['filtered']} held back by filters")
+    print(f"{stats['events']} qualifying events -> {stats['incidents']} incidents "
+          f"({stats['joined']} joined an open incident, {stats['merged']} merges)")
+    for camera, count in sorted(events.items(), key=lambda kv: -kv[1]):
+        print(f"  {camera:16} {count:5} events, {started.get(camera, 0):5} incidents started here")
+    if stats["events"]:
+        print(f"Per-event automations would run {stats['events']} times, per-incident ones "
+              f"{stats['incidents']} times ({1 - stats['incidents'] / stats['events']:.0%} fewer)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Group Frigate events across cameras into incidents")
+    parser.add_argument("--host", default=mqtt_client.MQTT_HOST)
+    parser.add_argument("--port", type=int, default=mqtt_client.MQTT_PORT)
+    parser.add_argument("--graph", help="JSON camera links (replaces the built-in graph)")
+    parser.add_argument("--link", action="append", type=parse_link, default=[],
+                        help="CAMERA:CAMERA:SECONDS - add or override a link (repeatable)")
+    parser.add_argument("--same-camera-gap", type=float, default=SAME_CAMERA_GAP)
+    parser.add_argument("--sub-label-gap", type=float, default=SUB_LABEL_GAP)
+    parser.add_argument("--max-duration", type=float, default=MAX_INCIDENT_SECONDS)
+    parser.add_argument("--min-score", type=float, default=0.0,
+                        help="Events only count once top_score reaches this")
+    parser.add_argument("--label", action="append", default=[],
+                        help="Only correlate these labels (repeatable)")
+    parser.add_argument("--zone", action="append", type=frigate_event_router.parse_zone, default=[],
+                        help="CAMERA=ZONE[,ZONE] - only count events on CAMERA inside a ZONE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="Correlate a captured frigate/events log offline and report")
+    parser.add_argument("-v", "--verbose", action="store_true", help="With --replay, list every incident message")
+    args = parser.parse_args()
+
+    try:
+        links = load_graph(args.graph) if args.graph else dict(CAMERA_GRAPH)
+    except (OSError, ValueError, TypeError) as e:
+        logger.error(f"Could not read graph {args.graph}: {e}")
+        return 1
+    links.update(dict(args.link))
+
+    correlator = IncidentCorrelator(
+        links, frigate_event_router.EventFilter(args.min_score, args.label, dict(args.zone)),
+        same_camera_gap=args.same_camera_gap, sub_label_gap=args.sub_label_gap,
+        max_duration=args.max_duration)
+    if args.replay:
+        return replay(correlator, args.replay, args.verbose)
+    try:
+        run(correlator, args.host, args.port)
+    except (RuntimeError, OSError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Frigate Stats Store - compact local history of Frigate's /api/stats
+
+Camera health checks only ever looked at one /api/stats response. This
+poller records the per-camera and detector figures every POLL_INTERVAL
+into an append-only time-series store so trends can be queried:
+
+    cameras.<camera>.camera_fps | process_fps | detection_fps | skipped_fps
+    detectors.<detector>.inference_speed
+    detection_fps                                     (all cameras)
+
+Storage layout (STORE_DIR/<tier>/<series>/<chunk>.bin):
+
+    raw   every sample              daily chunks,   kept RAW_DAYS
+    1m    per-minute mean/min/max   monthly chunks, kept MINUTE_DAYS
+    1h    per-hour mean/min/max     yearly chunks,  kept HOUR_YEARS
+
+Values are fixed-point (1/SCALE). Each record is stored as zigzag varint
+deltas from the previous record in the chunk (time, then value fields), so
+a steady 5 fps camera polled every 10 s costs about 2 bytes per sample.
+The 1m and 1h tiers are aggregated as samples arrive; on restart the open
+buckets are rebuilt from the raw tier. A record cut short by a crash is
+truncated away when the chunk is reopened.
+
+Queries read only the chunks overlapping the range, from the finest tier
+still covering it. Percentiles on the 1m/1h tiers are taken over bucket
+means, so short spikes are smoothed there.
+
+Usage:
+    frigate_stats_store.py poll [--interval 10]
+    frigate_stats_store.py query 'detectors.*.inference_speed' --since 7d --stat p95
+    frigate_stats_store.py query 'cameras.*.camera_fps' --since 30d --stat min --tier 1m
+    frigate_stats_store.py series
+"""
+
+import argparse
+import bisect
+import fnmatch
+import itertools
+import json
+import logging
+import operator
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+STORE_DIR = Path(os.environ.get("FRIGATE_STATS_DIR", HOMELAB_DIR / "data" / "frigate_stats"))
+FRIGATE_URL = os.environ.get("FRIGATE_URL", "http://127.0.0.1:5002")
+
+POLL_INTERVAL = 10
+SCALE = 100                  # fixed-point: 2 decimals
+RAW_DAYS = 7
+MINUTE_DAYS = 90
+HOUR_YEARS = 5
+
+CAMERA_FIELDS = ("camera_fps", "process_fps", "detection_fps", "skipped_fps")
+DETECTOR_FIELDS = ("inference_speed",)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# ENCODING
+# ============================================
+
+def encode_varints(values) -> bytes:
+    """Zigzag + LEB128 varint encode a sequence of ints."""
+    out = bytearray()
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+_VARINT = re.compile(rb"[\x80-\xff]*[\x00-\x7f]")
+_CONTINUATION = bytes(range(0x80, 0x100))
+_varint_cache = {}
+
+
+def _decode_one(token: bytes) -> int:
+    value = 0
+    for i, byte in enumerate(token):
+        value |= (byte & 0x7F) << (7 * i)
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_varints(data: bytes) -> tuple:
+    """Decode zigzag varints; returns (values, bytes consumed by complete values)."""
+    # Deltas repeat a lot, so split with a regex and memoise each distinct
+    # encoding instead of looping over bytes in Python
+    tokens = _VARINT.findall(data)
+    if len(_varint_cache) > 200000:
+        _varint_cache.clear()
+    for token in set(tokens).difference(_varint_cache):
+        _varint_cache[token] = _decode_one(token)
+    return list(map(_varint_cache.__getitem__, tokens)), len(data.rstrip(_CONTINUATION))
+
+
+class Tier:
+    """One resolution: record layout, chunking and retention."""
+
+    def __init__(self, name: str, bucket: int, fields: int, retention: int, chunk_format: str):
+        self.name = name
+        self.bucket = bucket             # seconds per record (0 = raw samples)
+        self.fields = fields             # value fields after the timestamp
+        self.retention = retention       # seconds
+        self.chunk_format = chunk_format
+
+    def chunk_of(self, timestamp: int) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime(self.chunk_format)
+
+    def chunk_start(self, chunk: str) -> int:
+        return int(datetime.strptime(chunk, self.chunk_format).replace(tzinfo=timezone.utc).timestamp())
+
+
+# raw: (t, value); aggregated: (t, mean, min, max, count)
+TIERS = {
+    "raw": Tier("raw", 0, 1, RAW_DAYS * 86400, "%Y%m%d"),
+    "1m": Tier("1m", 60, 4, MINUTE_DAYS * 86400, "%Y%m"),
+    "1h": Tier("1h", 3600, 4, HOUR_YEARS * 366 * 86400, "%Y"),
+}
+
+
+def decode_columns(data: bytes, tier: Tier, base: int) -> tuple:
+    """Chunk bytes -> ([times, field1, ...] column lists, bytes in complete records)."""
+    width = tier.fields + 1
+    values, end = decode_varints(data)
+    complete = len(values) - len(values) % width
+    if complete < len(values):
+        end = _offset_of(data, complete)    # truncated record: keep whole ones only
+    columns = [list(itertools.accumulate(values[i:complete:width])) for i in range(width)]
+    if tier.bucket:
+        # count is stored as-is, not delta-encoded
+        columns[-1] = values[width - 1:complete:width]
+    columns[0] = [base + t for t in columns[0]]
+    return columns, end
+
+
+def decode_chunk(data: bytes, tier: Tier, base: int) -> tuple:
+    """Chunk bytes -> (records as tuples, bytes in complete records)."""
+    columns, end = decode_columns(data, tier, base)
+    return list(zip(*columns)), end
+
+
+def _offset_of(data: bytes, count: int) -> int:
+    """Byte offset just past the first `count` varints."""
+    seen = 0
+    for i, byte in enumerate(data):
+        if seen == count:
+            return i
+        if not byte & 0x80:
+            seen += 1
+    return len(data)
+
+# ============================================
+# STORE
+# ============================================
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class ChunkWriter:
+    """Append handle for one series' current chunk in one tier."""
+
+    def __init__(self, path: Path, tier: Tier, chunk: str):
+        self.path = path
+        self.tier = tier
+        self.chunk = chunk
+        self.base = tier.chunk_start(chunk)
+        self.last = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            data = path.read_bytes()
+            records, end = decode_chunk(data, tier, self.base)
+            if end < len(data):
+                logger.warning(f"{path}: dropping {len(data) - end} bytes of a partial record")
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+            if records:
+                self.last = records[-1]
+        self.file = open(path, "ab")
+
+    def append(self, record: tuple):
+        previous = self.last or (self.base,) + (0,) * self.tier.fields
+        deltas = [a - b for a, b in zip(record, previous)]
+        if self.tier.bucket:
+            deltas[-1] = record[-1]
+        self.file.write(encode_varints(deltas))
+        self.last = record
+
+    def close(self):
+        self.file.close()
+
+
+class Bucket:
+    __slots__ = ("start", "count", "total", "low", "high")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.count = self.total = 0
+        self.low = self.high = None
+
+    def add(self, value: int):
+        self.count += 1
+        self.total += value
+        self.low = value if self.low is None else min(self.low, value)
+        self.high = value if self.high is None else max(self.high, value)
+
+    def record(self) -> tuple:
+        return (self.start, round(self.total / self.count), self.low, self.high, self.count)
+
+
+class StatsStore:
+    def __init__(self, root: Path = STORE_DIR):
+        self.root = root
+        self.writers = {}        # (tier, series) -> ChunkWriter
+        self.buckets = {}        # (tier, series) -> Bucket
+        self.restored = set()    # series whose open buckets were rebuilt this run
+        self.lock = threading.Lock()
+
+    # ---- paths ----
+
+    def _dir(self, tier: str, series: str) -> Path:
+        return self.root / tier / _SAFE.sub("_", series)
+
+    def series(self) -> list:
+        raw = self.root / "raw"
+        return sorted(p.name for p in raw.iterdir()) if raw.is_dir() else []
+
+    def chunks(self, tier: str, series: str) -> list:
+        directory = self._dir(tier, series)
+        return sorted(p.stem for p in directory.glob("*.bin")) if directory.is_dir() else []
+
+    def _overlapping(self, tier: str, series: str, start: int, end: int) -> list:
+        """Chunk names of tier that may hold records in [start, end]."""
+        spec = TIERS[tier]
+        chunks = self.chunks(tier, series)
+        index = max(0, bisect.bisect_right(chunks, spec.chunk_of(start)) - 1)
+        return [c for c in chunks[index:] if spec.chunk_start(c) <= end]
+
+    # ---- writing ----
+
+    def _writer(self, tier: Tier, series: str, timestamp: int) -> ChunkWriter:
+        key = (tier.name, series)
+        chunk = tier.chunk_of(timestamp)
+        writer = self.writers.get(key)
+        if writer is None or writer.chunk != chunk:
+            if writer is not None:
+                writer.close()
+            writer = self.writers[key] = ChunkWriter(self._dir(tier.name, series) / f"{chunk}.bin", tier, chunk)
+        return writer
+
+    def _restore_buckets(self, series: str, timestamp: int):
+        """Re-aggregate raw samples not yet in the 1m/1h tiers (previous run's open buckets)."""
+        start = timestamp - timestamp % 3600 - 3600
+        for t, value in self.read(series, "raw", start, timestamp - 1):
+            self._aggregate(series, t, value)
+
+    def _aggregate(self, series: str, timestamp: int, value: int):
+        for name in ("1m", "1h"):
+            tier = TIERS[name]
+            start = timestamp - timestamp % tier.bucket
+            bucket = self.buckets.get((name, series))
+            if bucket is not None and bucket.start != start:
+                writer = self._writer(tier, series, bucket.start)
+                if writer.last is None or writer.last[0] < bucket.start:
+                    writer.append(bucket.record())
+                bucket = None
+            if bucket is None:
+                bucket = self.buckets[(name, series)] = Bucket(start)
+            bucket.add(value)
+
+    def append(self, samples: dict, timestamp: int = None):
+        """samples: {series: float}. One call per poll."""
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        with self.lock:
+            for series, value in samples.items():
+                if value is None:
+                    continue
+                writer = self._writer(TIERS["raw"], series, timestamp)
+                if writer.last is not None and timestamp <= writer.last[0]:
+                    continue            # clock went backwards or duplicate poll
+                if series not in self.restored:
+                    self.restored.add(series)
+                    self._restore_buckets(series, timestamp)
+                fixed = round(value * SCALE)
+                writer.append((timestamp, fixed))
+                self._aggregate(series, timestamp, fixed)
+            self.flush()
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.file.flush()
+
+    def expire(self, now: int = None) -> int:
+        """Delete chunks entirely older than their tier's retention."""
+        now = int(time.time() if now is None else now)
+        removed = 0
+        with self.lock:
+            for tier in TIERS.values():
+                tier_dir = self.root / tier.name
+                if not tier_dir.is_dir():
+                    continue
+                for series_dir in tier_dir.iterdir():
+                    chunks = sorted(series_dir.glob("*.bin"))
+                    # chunk i ends where chunk i+1 starts; the newest is never expired
+                    for chunk, following in zip(chunks, chunks[1:]):
+                        if tier.chunk_start(following.stem) < now - tier.retention:
+                            writer = self.writers.get((tier.name, series_dir.name))
+                            if writer is not None and writer.path == chunk:
+                                continue
+                            chunk.unlink()
+                            chunk.with_suffix(".hist").unlink(missing_ok=True)
+                            removed += 1
+        return removed
+
+    def close(self):
+        with self.lock:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers.clear()
+
+    # ---- reading ----
+
+    def _columns(self, tier: str, series: str, chunk: str) -> list:
+        spec = TIERS[tier]
+        data = (self._dir(tier, series) / f"{chunk}.bin").read_bytes()
+        return decode_columns(data, spec, spec.chunk_start(chunk))[0]
+
+    def _decode(self, tier: str, series: str, chunk: str) -> list:
+        return list(zip(*self._columns(tier, series, chunk)))
+
+    def read_columns(self, series: str, tier: str, start: int, end: int) -> list:
+        """[times, field1, ...] of series in [start, end] from one tier (fixed-point values)."""
+        columns = [[] for _ in range(TIERS[tier].fields + 1)]
+        for chunk in self._overlapping(tier, series, start, end):
+            for column, decoded in zip(columns, self._columns(tier, series, chunk)):
+                column.extend(decoded)
+        first, last = bisect.bisect_left(columns[0], start), bisect.bisect_right(columns[0], end)
+        return [column[first:last] for column in columns]
+
+    def read(self, series: str, tier: str, start: int, end: int) -> list:
+        """Records of series in [start, end] from one tier as tuples."""
+        return list(zip(*self.read_columns(series, tier, start, end)))
+
+    def _chunk_histogram(self, series: str, chunk: str, closed: bool) -> dict:
+        """{value: count} for a whole raw chunk; cached beside closed chunks."""
+        path = self._dir("raw", series) / f"{chunk}.hist"
+        if path.exists():
+            values, _ = decode_varints(path.read_bytes())
+            return dict(zip(itertools.accumulate(values[0::2]), values[1::2]))
+        histogram = Counter(self._columns("raw", series, chunk)[1])
+        if closed:
+            ordered = sorted(histogram.items())
+            deltas = [v - p for v, p in zip((v for v, _ in ordered), [0] + [v for v, _ in ordered])]
+            tmp = path.with_suffix(".hist.tmp")
+            tmp.write_bytes(encode_varints(itertools.chain.from_iterable(
+                zip(deltas, (c for _, c in ordered)))))
+            tmp.rename(path)
+        return histogram
+
+    def histogram(self, series: str, start: int, end: int, now: int = None) -> Counter:
+        """
+        Raw value distribution in [start, end]. Closed daily chunks fully
+        inside the range come from their cached histogram; only the chunks
+        at the edges of the range are decoded.
+        """
+        now = int(time.time() if now is None else now)
+        spec = TIERS["raw"]
+        histogram = Counter()
+        for chunk in self._overlapping("raw", series, start, end):
+            base = spec.chunk_start(chunk)
+            following = base + 86400            # raw chunks are UTC days
+            if start <= base and following - 1 <= end and following <= now:
+                histogram.update(self._chunk_histogram(series, chunk, closed=True))
+            else:
+                times, values = self._columns("raw", series, chunk)
+                histogram.update(values[bisect.bisect_left(times, start):bisect.bisect_right(times, end)])
+        return histogram
+
+    def last(self, series: str, tier: str, end: int):
+        """Newest record at or before end, reading chunks from the newest back."""
+        spec = TIERS[tier]
+        for chunk in reversed(self.chunks(tier, series)):
+            if spec.chunk_start(chunk) > end:
+                continue
+            records = self._decode(tier, series, chunk)
+            index = bisect.bisect_right([r[0] for r in records], end)
+            if index:
+                return records[index - 1]
+        return None
+
+    def summary(self, series: str, tier: str, stat: str, start: int, end: int):
+        """stat of series over [start, end] as a float, or None without data."""
+        if stat == "last":
+            record = self.last(series, tier, end)
+            return record[1] / SCALE if record and record[0] >= start else None
+        if tier == "raw":
+            return summarize_histogram(self.histogram(series, start, end), stat)
+        return summarize(self.read_columns(series, tier, start, end), stat)
+
+    def pick_tier(self, start: int, now: int = None) -> str:
+        now = int(time.time() if now is None else now)
+        for name in ("raw", "1m", "1h"):
+            if now - start <= TIERS[name].retention:
+                return name
+        return "1h"
+
+
+def _percentile(stat: str):
+    match = re.fullmatch(r"p(\d{1,2}(?:\.\d+)?)", stat)
+    if not match:
+        raise ValueError(f"unknown stat {stat!r}")
+    return float(match.group(1))
+
+
+def summarize_histogram(histogram: dict, stat: str):
+    """Apply stat (mean, min, max, count, pNN) to a {value: count} distribution."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    if stat == "count":
+        return float(total)
+    if stat == "min":
+        return min(histogram) / SCALE
+    if stat == "max":
+        return max(histogram) / SCALE
+    if stat == "mean":
+        return sum(v * c for v, c in histogram.items()) / total / SCALE
+    rank = max(1, -(-total * _percentile(stat) // 100))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value / SCALE
+
+
+def summarize(columns: list, stat: str):
+    """Apply stat (mean, min, max, count, pNN) to 1m/1h columns; float or None."""
+    _, means, lows, highs, counts = columns
+    if not means:
+        return None
+    if stat == "count":
+        return float(sum(counts))
+    if stat == "min":
+        return min(lows) / SCALE
+    if stat == "max":
+        return max(highs) / SCALE
+    if stat == "mean":
+        return sum(map(operator.mul, means, counts)) / sum(counts) / SCALE
+    ordered = sorted(means)
+    rank = max(1, -(-len(ordered) * _percentile(stat) // 100))
+    return ordered[int(rank) - 1] / SCALE
+
+# ============================================
+# POLLER
+# ============================================
+
+def flatten_stats(stats: dict) -> dict:
+    """/api/stats response -> {series: value}."""
+    out = {}
+    for camera, values in (stats.get("cameras") or {}).items():
+        for field in CAMERA_FIELDS:
+            if isinstance(values.get(field), (int, float)):
+                out[f"cameras.{camera}.{field}"] = values[field]
+    for detector, values in (stats.get("detectors") or {}).items():
+        for field in DETECTOR_FIELDS:
+            if isinstance(values.get(field), (int, float)):
+                out[f"detectors.{detector}.{field}"] = values[field]
+    if isinstance(stats.get("detection_fps"), (int, float)):
+        out["detection_fps"] = stats["detection_fps"]
+    return out
+
+
+def fetch_stats(url: str) -> dict:
+    with urllib.request.urlopen(f"{url.rstrip('/')}/api/stats", timeout=5) as resp:
+        return json.load(resp)
+
+
+def cmd_poll(store: StatsStore, args) -> int:
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logger.info(f"Recording {args.frigate_url}/api/stats every {args.interval}s into {store.root}")
+    failures = 0
+    polls = 0
+    next_expire = 0.0
+    while not stop.is_set():
+        started = time.monotonic()
+        try:
+            samples = flatten_stats(fetch_stats(args.frigate_url))
+            store.append(samples)
+            polls += 1
+            if failures:
+                logger.info(f"Frigate stats available again after {failures} failed polls")
+            failures = 0
+        except (OSError, ValueError) as e:
+            failures += 1
+            if failures == 1:
+                logger.warning(f"Frigate stats unavailable: {e}")
+        if started >= next_expire:
+            removed = store.expire()
+            if removed:
+                logger.info(f"Expired {removed} chunks past retention")
+            next_expire = started + 3600
+        stop.wait(max(0.0, args.interval - (time.monotonic() - started)))
+    store.close()
+    logger.info(f"Stopped after {polls} polls")
+    return 0
+
+
+def parse_duration(value: str) -> int:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw]?)", value)
+    if not match:
+        raise argparse.ArgumentTypeError("expected e.g. 90s, 15m, 6h, 7d, 2w")
+    return int(float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}[match.group(2)])
+
+
+def cmd_query(store: StatsStore, args) -> int:
+    started = time.perf_counter()
+    now = int(time.time())
+    start = now - args.since
+    tier = store.pick_tier(start, now) if args.tier == "auto" else args.tier
+    matched = [s for s in store.series() if fnmatch.fnmatchcase(s, args.pattern)]
+    if not matched:
+        print(f"No series match {args.pattern!r}")
+        return 1
+    results = {series: store.summary(series, tier, args.stat, start, now) for series in matched}
+    elapsed = (time.perf_counter() - started) * 1000
+    if args.json:
+        print(json.dumps({"stat": args.stat, "tier": tier, "since": args.since, "results": results}))
+    else:
+        for series, value in results.items():
+            print(f"{series:<48} {args.stat:>5} {'-' if value is None else f'{value:10.2f}'}")
+        print(f"({len(matched)} series from the {tier} tier, {elapsed:.1f} ms)")
+    return 0
+
+
+def cmd_series(store: StatsStore, args) -> int:
+    total = 0
+    for series in store.series():
+        sizes = []
+        for tier in TIERS:
+            directory = store._dir(tier, series)
+            size = sum(p.stat().st_size for p in directory.glob("*.bin")) if directory.is_dir() else 0
+            total += size
+            sizes.append(f"{tier} {size / 1024:8.1f} KB")
+        print(f"{series:<48} " + "  ".join(sizes))
+    print(f"Total {total / 1048576:.2f} MB in {store.root}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local time-series history of Frigate /api/stats")
+    parser.add_argument("--store", type=Path, default=STORE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("poll", help="Record /api/stats continuously")
+    p.add_argument("--frigate-url", default=FRIGATE_URL)
+    p.add_argument("--interval", type=float, default=POLL_INTERVAL)
+    p = sub.add_parser("query", help="Summarise matching series over a time range")
+    p.add_argument("pattern", help="Series glob, e.g. 'cameras.*.camera_fps'")
+    p.add_argument("--since", type=parse_duration, default=parse_duration("1d"))
+    p.add_argument("--stat", default="mean", help="mean, min, max, last, count or pNN (e.g. p95)")
+    p.add_argument("--tier", choices=["auto", *TIERS], default="auto")
+    p.add_argument("--json", action="store_true")
+    sub.add_parser("series", help="List series and storage per tier")
+    args = parser.parse_args()
+
+    store = StatsStore(args.store)
+    try:
+        return {"poll": cmd_poll, "query": cmd_query, "series": cmd_series}[args.command](store, args)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+Shared Playwright loader for the scripts that drive Home Assistant's web UI
+(ha_setup.py, hacs_setup.py, hacs_configure.py, tuya_reauth.py).
+
+Playwright is imported on use, so runs that settle over the HA API (or only
+print --help) never pay for importing it.
+"""
+
+
+def playwright():
+    """playwright.async_api.async_playwright, imported on first use."""
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        raise RuntimeError("playwright not installed. Run: pip install playwright && playwright install chromium")
+    return async_playwright
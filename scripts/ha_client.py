@@ -0,0 +1,554 @@
+"""
+Async Home Assistant client shared by the homelab scripts.
+
+One websocket connection per process carries everything:
+  - a local entity-state mirror, seeded and kept current by HA's
+    subscribe_entities diffs, so reads never leave the process
+  - service calls, which are batched: calls within BATCH_WINDOW that differ
+    only in target entity_id are merged into a single call. Calls are never
+    deduplicated - toggle, counter.increment or notify must run once per
+    call - so a repeat for an entity already in the batch goes out after it
+  - event subscriptions
+The underlying aiohttp session is reused for the few REST endpoints that
+have no websocket equivalent. The connection is re-established with backoff
+and subscriptions are replayed, which also resyncs the mirror.
+
+SyncHAClient runs the same client on a background event loop for the
+scripts that are not asyncio-based.
+
+    async with HAClient() as ha:
+        await ha.subscribe_entities()
+        if ha.state("input_boolean.dog_mode") == "on":
+            await ha.call_service("light", "turn_on", target={"entity_id": "light.porch"})
+
+Requires aiohttp (pip install aiohttp) and a long-lived access token in
+HA_TOKEN.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HA_URL = os.environ.get("HA_URL", "http://localhost:8123")
+HA_TOKEN = os.environ.get("HA_TOKEN", "")
+BATCH_WINDOW = 0.02
+REQUEST_TIMEOUT = 30
+RECONNECT_MAX_DELAY = 30
+
+logger = logging.getLogger(__name__)
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise RuntimeError("aiohttp not installed. Run: pip install aiohttp")
+    return aiohttp
+
+
+class HAError(Exception):
+    """Error result from Home Assistant, or the connection was lost."""
+
+    def __init__(self, message: str, code: str = None):
+        super().__init__(message)
+        self.code = code
+
+
+class EntityState:
+    __slots__ = ("entity_id", "state", "attributes", "last_changed", "last_updated")
+
+    def __init__(self, entity_id, state, attributes, last_changed, last_updated):
+        self.entity_id = entity_id
+        self.state = state
+        self.attributes = attributes
+        self.last_changed = last_changed
+        self.last_updated = last_updated
+
+    def __repr__(self):
+        return f"<EntityState {self.entity_id}={self.state}>"
+
+
+class HAClient:
+    def __init__(self, url: str = HA_URL, token: str = HA_TOKEN,
+                 batch_window: float = BATCH_WINDOW):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.batch_window = batch_window
+        self.states = {}
+        self.connected = asyncio.Event()
+        self.stats = {"sent": 0, "received": 0, "service_calls": 0, "service_requests": 0}
+
+        self._session = None
+        self._ws = None
+        self._reader = None
+        self._next_id = 1
+        self._pending = {}
+        self._handlers = {}         # subscription id -> handler(event)
+        self._subscriptions = []    # (message, handler) replayed on reconnect
+        self._listeners = []        # (entity_ids or None, callback(entity_id, old, new))
+        self._batch = []
+        self._batch_task = None
+        self._closing = False
+        self._resync = False
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---- connection ----
+
+    async def connect(self):
+        aiohttp = _aiohttp()
+        if not self.token:
+            raise HAError("HA_TOKEN is not set (create a long-lived access token in your HA profile)")
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={"Authorization": f"Bearer {self.token}"})
+        await self._open()
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def _open(self):
+        ws_url = self.url.replace("http", "ws", 1) + "/api/websocket"
+        self._ws = await self._session.ws_connect(ws_url, heartbeat=30, max_msg_size=0)
+        msg = await self._ws.receive_json()
+        if msg.get("type") != "auth_required":
+            raise HAError(f"Unexpected handshake: {msg}")
+        await self._ws.send_json({"type": "auth", "access_token": self.token})
+        msg = await self._ws.receive_json()
+        if msg.get("type") != "auth_ok":
+            raise HAError(msg.get("message", "Authentication failed"), "auth_invalid")
+        self.ha_version = msg.get("ha_version")
+        # Let HA send several messages per frame
+        self._next_id = 1
+        await self._ws.send_json({"id": self._take_id(), "type": "supported_features",
+                                  "features": {"coalesce_messages": 1}})
+        self.connected.set()
+
+    async def close(self):
+        self._closing = True
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+        if self._session is not None:
+            await self._session.close()
+        self._fail_pending(HAError("Client closed"))
+
+    def _take_id(self) -> int:
+        msg_id = self._next_id
+        self._next_id += 1
+        return msg_id
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def _read_loop(self):
+        aiohttp = _aiohttp()
+        delay = 1
+        while not self._closing:
+            try:
+                async for frame in self._ws:
+                    if frame.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    data = json.loads(frame.data)
+                    for msg in data if isinstance(data, list) else (data,):
+                        self.stats["received"] += 1
+                        self._dispatch(msg)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"HA websocket error: {e}")
+            except Exception:
+                # Whatever killed the reader, the mirror is only current while it runs
+                logger.exception("HA websocket reader failed")
+            if self._closing:
+                return
+
+            self.connected.clear()
+            self._handlers.clear()
+            self._fail_pending(HAError("Connection to Home Assistant lost"))
+            logger.warning("HA websocket closed, reconnecting")
+            if not self._ws.closed:
+                await self._ws.close()
+            while not self._closing:
+                await asyncio.sleep(delay)
+                try:
+                    await self._open()
+                    await self._resubscribe()
+                    delay = 1
+                    break
+                except Exception as e:
+                    if self._ws is not None and not self._ws.closed:
+                        await self._ws.close()
+                    delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                    logger.warning(f"Reconnect to HA failed ({e}), retrying in {delay}s")
+
+    async def _resubscribe(self):
+        # The next subscribe_entities snapshot replaces the mirror wholesale
+        self._resync = True
+        # Kept intact until every replay is sent, so a failed attempt loses none
+        for message, handler in list(self._subscriptions):
+            # No pending future: the result is dropped by _dispatch, events flow
+            msg_id = self._take_id()
+            self._handlers[msg_id] = handler
+            await self._ws.send_json({**message, "id": msg_id})
+
+    def _dispatch(self, msg: dict):
+        msg_id = msg.get("id")
+        kind = msg.get("type")
+        if kind == "event":
+            handler = self._handlers.get(msg_id)
+            if handler is not None:
+                try:
+                    handler(msg["event"])
+                except Exception:
+                    logger.exception(f"Event handler failed for subscription {msg_id}")
+        elif kind == "result":
+            future = self._pending.pop(msg_id, None)
+            if future is None or future.done():
+                return
+            if msg.get("success"):
+                future.set_result(msg.get("result"))
+            else:
+                error = msg.get("error") or {}
+                future.set_exception(HAError(error.get("message", "Unknown error"), error.get("code")))
+        elif kind == "pong":
+            future = self._pending.pop(msg_id, None)
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    async def send(self, message: dict, timeout: float = REQUEST_TIMEOUT):
+        """Send one command and wait for its result."""
+        await self.connected.wait()
+        msg_id = self._take_id()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        await self._ws.send_json({**message, "id": msg_id})
+        self.stats["sent"] += 1
+        return await asyncio.wait_for(future, timeout)
+
+    async def ping(self) -> float:
+        started = time.perf_counter()
+        await self.send({"type": "ping"})
+        return time.perf_counter() - started
+
+    # ---- subscriptions ----
+
+    async def _subscribe(self, message: dict, handler):
+        await self.connected.wait()
+        msg_id = self._take_id()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        self._handlers[msg_id] = handler
+        await self._ws.send_json({**message, "id": msg_id})
+        self.stats["sent"] += 1
+        try:
+            await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        except BaseException:
+            self._handlers.pop(msg_id, None)
+            raise
+        self._subscriptions.append((message, handler))
+        return msg_id
+
+    async def subscribe_events(self, callback, event_type: str = None) -> int:
+        """callback(event) for every event (of event_type, if given)."""
+        message = {"type": "subscribe_events"}
+        if event_type:
+            message["event_type"] = event_type
+        return await self._subscribe(message, callback)
+
+    async def subscribe_entities(self, entity_ids=None, timeout: float = REQUEST_TIMEOUT):
+        """
+        Start mirroring entity states (all, or just entity_ids) into
+        self.states. Returns once the initial snapshot has arrived.
+        """
+        snapshot = asyncio.get_running_loop().create_future()
+
+        def handler(event):
+            self._apply_entity_diff(event)
+            if not snapshot.done():
+                snapshot.set_result(None)
+
+        message = {"type": "subscribe_entities"}
+        if entity_ids:
+            message["entity_ids"] = list(entity_ids)
+        await self._subscribe(message, handler)
+        await asyncio.wait_for(snapshot, timeout)
+
+    def _apply_entity_diff(self, event: dict):
+        """Apply a subscribe_entities message (a=added, c=changed, r=removed)."""
+        changes = []
+        if self._resync and "a" in event:
+            self._resync = False
+            for entity_id in set(self.states) - set(event["a"]):
+                changes.append((entity_id, self.states.pop(entity_id), None))
+        for entity_id, s in (event.get("a") or {}).items():
+            old = self.states.get(entity_id)
+            new = EntityState(entity_id, s.get("s"), s.get("a") or {},
+                              s.get("lc"), s.get("lu") or s.get("lc"))
+            self.states[entity_id] = new
+            changes.append((entity_id, old, new))
+
+        for entity_id, diff in (event.get("c") or {}).items():
+            old = self.states.get(entity_id)
+            if old is None:
+                continue
+            new = EntityState(entity_id, old.state, dict(old.attributes),
+                              old.last_changed, old.last_updated)
+            add = diff.get("+") or {}
+            if "s" in add:
+                new.state = add["s"]
+            if "lc" in add:
+                new.last_changed = new.last_updated = add["lc"]
+            elif "lu" in add:
+                new.last_updated = add["lu"]
+            if "a" in add:
+                new.attributes.update(add["a"])
+            for key in (diff.get("-") or {}).get("a", ()):
+                new.attributes.pop(key, None)
+            self.states[entity_id] = new
+            changes.append((entity_id, old, new))
+
+        for entity_id in event.get("r") or ():
+            old = self.states.pop(entity_id, None)
+            changes.append((entity_id, old, None))
+
+        for entity_ids, callback in self._listeners:
+            for entity_id, old, new in changes:
+                if entity_ids is None or entity_id in entity_ids:
+                    try:
+                        callback(entity_id, old, new)
+                    except Exception:
+                        logger.exception(f"State listener failed for {entity_id}")
+
+    def listen(self, callback, entity_ids=None):
+        """callback(entity_id, old, new) on every mirrored change. Returns an unlisten function."""
+        entry = (set(entity_ids) if entity_ids else None, callback)
+        self._listeners.append(entry)
+        return lambda: self._listeners.remove(entry)
+
+    # ---- state reads (from the mirror) ----
+
+    def get(self, entity_id: str) -> EntityState:
+        return self.states.get(entity_id)
+
+    def state(self, entity_id: str, default=None):
+        s = self.states.get(entity_id)
+        return s.state if s is not None else default
+
+    def attribute(self, entity_id: str, name: str, default=None):
+        s = self.states.get(entity_id)
+        return s.attributes.get(name, default) if s is not None else default
+
+    async def wait_for_state(self, entity_id: str, predicate, timeout: float = None):
+        """Wait until predicate(state string) is true for entity_id."""
+        if predicate(self.state(entity_id)):
+            return self.get(entity_id)
+        done = asyncio.get_running_loop().create_future()
+
+        def on_change(_, old, new):
+            if not done.done() and predicate(new.state if new else None):
+                done.set_result(new)
+
+        unlisten = self.listen(on_change, [entity_id])
+        try:
+            return await asyncio.wait_for(done, timeout)
+        finally:
+            unlisten()
+
+    # ---- service calls ----
+
+    async def call_service(self, domain: str, service: str, data: dict = None,
+                           target: dict = None, return_response: bool = False):
+        """
+        Queue a service call. Calls made within batch_window are flushed
+        together: calls that differ only in target entity_id are merged into
+        one call. A call for an entity that call already targets is sent
+        separately, after it, so every call takes effect once.
+        """
+        if return_response:
+            message = {"type": "call_service", "domain": domain, "service": service,
+                       "service_data": data or {}, "return_response": True}
+            if target:
+                message["target"] = target
+            self.stats["service_requests"] += 1
+            self.stats["service_calls"] += 1
+            return await self.send(message)
+
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((domain, service, data or {}, target or {}, future))
+        self.stats["service_requests"] += 1
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._flush_after(self.batch_window))
+        return await future
+
+    async def _flush_after(self, delay: float):
+        await asyncio.sleep(delay)
+        # Calls queued while this flush is still sending need their own task
+        self._batch_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Send all queued service calls now."""
+        batch, self._batch = self._batch, []
+        # (domain, service, data) -> calls to send in order
+        groups = {}
+        for domain, service, data, target, future in batch:
+            entity_ids = target.get("entity_id") if set(target) <= {"entity_id"} else None
+            if isinstance(entity_ids, str):
+                entity_ids = [entity_ids]
+            calls = groups.setdefault((domain, service, json.dumps(data, sort_keys=True)), [])
+            group = None
+            if entity_ids:
+                # Join the first call that does not target any of these entities yet
+                group = next((g for g in calls if g["entity_ids"]
+                              and not set(entity_ids) & set(g["entity_ids"])), None)
+            if group is None:
+                group = {"domain": domain, "service": service, "data": data, "target": target,
+                         "entity_ids": [], "futures": []}
+                calls.append(group)
+            if entity_ids:
+                group["entity_ids"].extend(entity_ids)
+            group["futures"].append(future)
+
+        async def run(group):
+            message = {"type": "call_service", "domain": group["domain"],
+                       "service": group["service"], "service_data": group["data"]}
+            if group["entity_ids"]:
+                message["target"] = {"entity_id": group["entity_ids"]}
+            elif group["target"]:
+                message["target"] = group["target"]
+            self.stats["service_calls"] += 1
+            try:
+                result = await self.send(message)
+            except Exception as e:
+                for future in group["futures"]:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for future in group["futures"]:
+                if not future.done():
+                    future.set_result(result)
+
+        async def run_in_order(calls):
+            for group in calls:
+                await run(group)
+
+        await asyncio.gather(*(run_in_order(calls) for calls in groups.values()))
+
+    # ---- REST (same session) ----
+
+    async def rest(self, method: str, path: str, payload: dict = None):
+        if self._session is None:
+            self._session = _aiohttp().ClientSession(headers={"Authorization": f"Bearer {self.token}"})
+        async with self._session.request(method, f"{self.url}{path}", json=payload,
+                                         timeout=_aiohttp().ClientTimeout(total=REQUEST_TIMEOUT)) as resp:
+            if resp.status >= 400:
+                raise HAError(f"{method} {path}: HTTP {resp.status}", str(resp.status))
+            if resp.content_type == "application/json":
+                return await resp.json()
+            return await resp.text()
+
+
+async def wait_until_ready(url: str = HA_URL, timeout: float = 180) -> bool:
+    """Wait until HA's HTTP API answers (401 counts - it is up, just needs auth)."""
+    aiohttp = _aiohttp()
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{url.rstrip('/')}/api/",
+                                       timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    if resp.status in (200, 401):
+                        return True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5)
+    return False
+
+
+async def config_entry_states(domain: str, url: str = HA_URL, token: str = HA_TOKEN) -> list:
+    """
+    States of an integration's config entries ("loaded", "setup_error",
+    "setup_retry", ...), or None when HA cannot be asked (no token, not
+    reachable). Lets the UI-automation scripts skip starting a browser. Uses
+    the REST endpoint with urllib, so it costs neither aiohttp's import
+    time nor a websocket handshake.
+    """
+    if not token:
+        return None
+    import urllib.request
+
+    def fetch():
+        request = urllib.request.Request(
+            f"{url.rstrip('/')}/api/config/config_entries/entry?domain={domain}",
+            headers={"Authorization": f"Bearer {token}"})
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            return json.load(resp)
+
+    try:
+        entries = await asyncio.to_thread(fetch)
+    except (OSError, ValueError) as e:   # URLError/HTTPError are OSErrors
+        logger.debug(f"config entries for {domain} unavailable: {e}")
+        return None
+    return [entry.get("state") for entry in entries]
+
+
+# ============================================
+# SYNC WRAPPER
+# ============================================
+
+class SyncHAClient:
+    """
+    HAClient on a background event-loop thread, for blocking scripts. State
+    reads come straight from the mirror; calls block until HA answers.
+    """
+
+    def __init__(self, url: str = HA_URL, token: str = HA_TOKEN, entity_ids=None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True,
+                                        name="ha-client")
+        self._thread.start()
+        self.client = HAClient(url, token)
+        try:
+            self._run(self.client.connect())
+            self._run(self.client.subscribe_entities(entity_ids))
+        except BaseException:
+            self.close()
+            raise
+
+    def _run(self, coro, timeout: float = REQUEST_TIMEOUT + 5):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def state(self, entity_id: str, default=None):
+        return self.client.state(entity_id, default)
+
+    def attribute(self, entity_id: str, name: str, default=None):
+        return self.client.attribute(entity_id, name, default)
+
+    def call_service(self, domain: str, service: str, data: dict = None, target: dict = None):
+        return self._run(self.client.call_service(domain, service, data, target))
+
+    def close(self):
+        try:
+            self._run(self.client.close(), timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            self._loop.close()
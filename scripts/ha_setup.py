@@ -4,20 +4,28 @@ Home Assistant Automated Setup Script
 Uses Playwright to configure Home Assistant via the web interface
 """
 
+import argparse
 import asyncio
+import os
 import sys
 import time
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
+import ha_browser
+import log_setup
+import tracing
 
 # Configuration
-HA_URL = "http://192.168.x.x:8123"
+HA_URL = os.environ.get("HA_URL", "http://192.168.x.x:8123")
 USERNAME = "person1"
 PASSWORD = "YOUR_HA_PASSWORD"
 DISPLAY_NAME = "Person1"
 
+logger = log_setup.setup_logging("ha_setup", log_setup.LOG_DIR / "ha_setup.jsonl",
+                                console_format="%(message)s", rate_limit=None)
+
+@tracing.traced("wait_for_ha")
 async def wait_for_ha_ready(page, timeout=120):
     """Wait for Home Assistant to be fully loaded"""
-    print("Waiting for Home Assistant to be ready...")
+    logger.info("Waiting for Home Assistant to be ready...")
     start = time.time()
     while time.time() - start < timeout:
         try:
@@ -30,9 +38,10 @@ async def wait_for_ha_ready(page, timeout=120):
         await asyncio.sleep(2)
     return False
 
+@tracing.traced("login")
 async def login(page):
     """Login to Home Assistant"""
-    print("\n=== Logging into Home Assistant ===")
+    logger.info("=== Logging into Home Assistant ===")
 
     await page.goto(HA_URL)
     await page.wait_for_load_state('networkidle')
@@ -41,7 +50,7 @@ async def login(page):
     # Check if we see the login form with "Welcome home!" text
     welcome_text = page.locator('text="Welcome home!"')
     if await welcome_text.count() > 0:
-        print("Login form detected, logging in...")
+        logger.info("Login form detected, logging in...")
 
         # Fill username - using the placeholder text
         username_input = page.locator('input').first
@@ -57,12 +66,13 @@ async def login(page):
         login_btn = page.locator('text="Log in"')
         await login_btn.click()
 
-        print("Login submitted, waiting for dashboard...")
+        logger.info("Login submitted, waiting for dashboard...")
         await asyncio.sleep(5)
 
     await page.wait_for_load_state('networkidle')
     return True
 
+@tracing.traced("check_logged_in")
 async def check_logged_in(page):
     """Check if we're logged into the dashboard"""
     try:
@@ -72,23 +82,26 @@ async def check_logged_in(page):
     except:
         return False
 
+@tracing.traced("navigate_settings")
 async def navigate_to_settings(page):
     """Navigate to Settings page"""
-    print("Navigating to Settings...")
+    logger.info("Navigating to Settings...")
     await page.goto(f"{HA_URL}/config")
     await page.wait_for_load_state('networkidle')
     await asyncio.sleep(2)
 
+@tracing.traced("navigate_integrations")
 async def navigate_to_integrations(page):
     """Navigate to Integrations page"""
-    print("Navigating to Integrations...")
+    logger.info("Navigating to Integrations...")
     await page.goto(f"{HA_URL}/config/integrations")
     await page.wait_for_load_state('networkidle')
     await asyncio.sleep(2)
 
+@tracing.traced("config_flow_mqtt")
 async def add_mqtt_integration(page):
     """Add MQTT integration"""
-    print("\n=== Setting up MQTT Integration ===")
+    logger.info("=== Setting up MQTT Integration ===")
 
     await page.goto(f"{HA_URL}/config/integrations")
     await page.wait_for_load_state('networkidle')
@@ -112,16 +125,17 @@ async def add_mqtt_integration(page):
                 await mqtt_item.click()
                 await asyncio.sleep(2)
 
-                print("MQTT dialog opened, filling details...")
+                logger.info("MQTT dialog opened, filling details...")
                 return True
 
-    print("Could not find Add Integration button")
+    logger.warning("Could not find Add Integration button")
     return False
 
+@tracing.traced("config_flow_frigate")
 async def add_frigate_integration(page):
     """Navigate to add Frigate integration (requires HACS first)"""
-    print("\n=== Frigate Integration ===")
-    print("Note: Frigate integration requires HACS to be installed first")
+    logger.info("=== Frigate Integration ===")
+    logger.info("Note: Frigate integration requires HACS to be installed first")
 
     await page.goto(f"{HA_URL}/config/integrations")
     await page.wait_for_load_state('networkidle')
@@ -129,17 +143,19 @@ async def add_frigate_integration(page):
 
     return True
 
+@tracing.traced("screenshot")
 async def take_screenshot(page, name):
     """Take a screenshot for debugging"""
     try:
         await page.screenshot(path=f"/opt/homelab/screenshots/{name}.png")
-        print(f"Screenshot saved: {name}.png")
+        logger.info(f"Screenshot saved: {name}.png")
     except Exception as e:
-        print(f"Could not save screenshot: {e}")
+        logger.warning(f"Could not save screenshot: {e}")
 
+@tracing.traced("explore_integrations")
 async def explore_integrations(page):
     """Explore available integrations"""
-    print("\n=== Exploring Integrations ===")
+    logger.info("=== Exploring Integrations ===")
 
     await page.goto(f"{HA_URL}/config/integrations")
     await page.wait_for_load_state('networkidle')
@@ -154,9 +170,10 @@ async def explore_integrations(page):
         await asyncio.sleep(2)
         await take_screenshot(page, "add_integration_dialog")
 
+@tracing.traced("explore_settings")
 async def explore_settings(page):
     """Explore the settings pages"""
-    print("\n=== Exploring Settings ===")
+    logger.info("=== Exploring Settings ===")
 
     await page.goto(f"{HA_URL}/config")
     await page.wait_for_load_state('networkidle')
@@ -170,16 +187,18 @@ async def explore_settings(page):
     await take_screenshot(page, "updates_page")
 
 async def main():
-    print("=" * 60)
-    print("Home Assistant Automated Setup")
-    print("=" * 60)
+    logger.info("=" * 60)
+    logger.info("Home Assistant Automated Setup")
+    logger.info("=" * 60)
 
+    async_playwright = ha_browser.playwright()
     async with async_playwright() as p:
         # Launch browser
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--no-sandbox', '--disable-gpu']
-        )
+        with tracing.span("browser_launch"):
+            browser = await p.chromium.launch(
+                headless=True,
+                args=['--no-sandbox', '--disable-gpu']
+            )
 
         context = await browser.new_context(
             viewport={'width': 1920, 'height': 1080},
@@ -191,10 +210,10 @@ async def main():
         try:
             # Wait for HA to be ready
             if not await wait_for_ha_ready(page):
-                print("ERROR: Home Assistant not responding")
+                logger.error("Home Assistant not responding")
                 return 1
 
-            print("Home Assistant is responding!")
+            logger.info("Home Assistant is responding!")
 
             # Navigate to main page
             await page.goto(HA_URL)
@@ -202,7 +221,7 @@ async def main():
             await asyncio.sleep(3)
 
             current_url = page.url
-            print(f"Current page: {current_url}")
+            logger.info(f"Current page: {current_url}")
 
             # Take initial screenshot
             await take_screenshot(page, "01_initial")
@@ -216,7 +235,7 @@ async def main():
 
             # Verify we're logged in
             if await check_logged_in(page):
-                print("\n✓ Successfully logged into Home Assistant!")
+                logger.info("✓ Successfully logged into Home Assistant!")
                 await take_screenshot(page, "03_dashboard")
 
                 # Explore the interface
@@ -224,19 +243,17 @@ async def main():
                 await explore_integrations(page)
 
             else:
-                print("\n✗ Could not verify login - checking page state")
+                logger.warning("✗ Could not verify login - checking page state")
                 await take_screenshot(page, "03_login_issue")
                 current_url = page.url
-                print(f"Current URL after login attempt: {current_url}")
+                logger.info(f"Current URL after login attempt: {current_url}")
 
-            print("\n=== Basic Setup Complete ===")
-            print(f"Access Home Assistant at: {HA_URL}")
-            print(f"Username: {USERNAME}")
+            logger.info("=== Basic Setup Complete ===")
+            logger.info(f"Access Home Assistant at: {HA_URL}")
+            logger.info(f"Username: {USERNAME}")
 
         except Exception as e:
-            print(f"Error during setup: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error during setup: {e}")
             await take_screenshot(page, "error")
             return 1
         finally:
@@ -245,4 +262,7 @@ async def main():
     return 0
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set up Home Assistant through its web UI")
+    tracing.add_arguments(parser)
+    tracing.configure("ha_setup", parser.parse_args())
     sys.exit(asyncio.run(main()))
@@ -2,16 +2,28 @@
 """Simple HACS configuration script"""
 
 import asyncio
+import os
 import sys
-from playwright.async_api import async_playwright
+import ha_browser
+import ha_client
+import log_setup
 
-HA_URL = "http://192.168.x.x:8123"
+HA_URL = os.environ.get("HA_URL", "http://192.168.x.x:8123")
 USERNAME = "person1"
 PASSWORD = "YOUR_HA_PASSWORD"
 
+logger = log_setup.setup_logging("hacs_configure", log_setup.LOG_DIR / "hacs_configure.jsonl",
+                                console_format="%(message)s", rate_limit=None)
+
 async def main():
-    print("Starting HACS configuration...")
+    logger.info("Starting HACS configuration...")
+
+    # Settled over the API when HA_TOKEN is set, without starting a browser
+    if "loaded" in (await ha_client.config_entry_states("hacs", HA_URL) or []):
+        logger.info("HACS is already configured")
+        return 0
 
+    async_playwright = ha_browser.playwright()
     async with async_playwright() as p:
         browser = await p.chromium.launch(
             headless=True,
@@ -28,53 +40,53 @@ async def main():
 
         try:
             # Go to login page
-            print("Navigating to Home Assistant...")
+            logger.info("Navigating to Home Assistant...")
             await page.goto(HA_URL, wait_until='domcontentloaded')
             await asyncio.sleep(5)
 
             # Login if needed
             if await page.locator('text="Welcome home!"').count() > 0:
-                print("Logging in...")
+                logger.info("Logging in...")
                 await page.locator('input').first.fill(USERNAME)
                 await page.locator('input').nth(1).fill(PASSWORD)
                 await page.locator('text="Log in"').click()
                 await asyncio.sleep(5)
 
             # Navigate to integrations
-            print("Going to integrations page...")
+            logger.info("Going to integrations page...")
             await page.goto(f"{HA_URL}/config/integrations", wait_until='domcontentloaded')
             await asyncio.sleep(5)
 
             await page.screenshot(path="/opt/homelab/screenshots/hacs_config_01.png")
-            print("Screenshot saved: hacs_config_01.png")
+            logger.info("Screenshot saved: hacs_config_01.png")
 
             # Click Add Integration
-            print("Clicking Add Integration...")
+            logger.info("Clicking Add Integration...")
             await page.locator('ha-fab').click()
             await asyncio.sleep(3)
 
             await page.screenshot(path="/opt/homelab/screenshots/hacs_config_02.png")
-            print("Screenshot saved: hacs_config_02.png")
+            logger.info("Screenshot saved: hacs_config_02.png")
 
             # Search for HACS
-            print("Searching for HACS...")
+            logger.info("Searching for HACS...")
             search = page.locator('input').first
             await search.fill("HACS")
             await asyncio.sleep(3)
 
             await page.screenshot(path="/opt/homelab/screenshots/hacs_config_03.png")
-            print("Screenshot saved: hacs_config_03.png")
+            logger.info("Screenshot saved: hacs_config_03.png")
 
             # Click HACS in results
-            print("Selecting HACS...")
+            logger.info("Selecting HACS...")
             await page.locator('text="HACS"').first.click()
             await asyncio.sleep(3)
 
             await page.screenshot(path="/opt/homelab/screenshots/hacs_config_04.png")
-            print("Screenshot saved: hacs_config_04.png")
+            logger.info("Screenshot saved: hacs_config_04.png")
 
             # Check all the acknowledgment checkboxes by clicking on text labels
-            print("Checking acknowledgments...")
+            logger.info("Checking acknowledgments...")
 
             # Use JavaScript to check the checkboxes
             await page.evaluate('''() => {
@@ -88,50 +100,50 @@ async def main():
             await asyncio.sleep(1)
 
             await page.screenshot(path="/opt/homelab/screenshots/hacs_config_05.png")
-            print("Screenshot saved: hacs_config_05.png")
+            logger.info("Screenshot saved: hacs_config_05.png")
 
             # Click Submit
-            print("Clicking Submit...")
+            logger.info("Clicking Submit...")
             submit = page.locator('text="Submit"').first
             if await submit.count() > 0:
                 await submit.click()
                 await asyncio.sleep(5)
 
             await page.screenshot(path="/opt/homelab/screenshots/hacs_config_06.png")
-            print("Screenshot saved: hacs_config_06.png")
+            logger.info("Screenshot saved: hacs_config_06.png")
 
             # Check for GitHub auth
-            print("\nChecking for GitHub authentication dialog...")
+            logger.info("Checking for GitHub authentication dialog...")
             content = await page.content()
             if "github" in content.lower() or "device" in content.lower():
-                print("\n" + "="*60)
-                print("GitHub Authentication Required!")
-                print("="*60)
+                logger.info("="*60)
+                logger.info("GitHub Authentication Required!")
+                logger.info("="*60)
 
                 # Look for the link
                 link = page.locator('a[href*="github"]')
                 if await link.count() > 0:
                     href = await link.first.get_attribute('href')
-                    print(f"\n1. Visit: {href}")
+                    logger.info(f"1. Visit: {href}")
                 else:
-                    print("\n1. Visit: https://github.com/login/device")
+                    logger.info("1. Visit: https://github.com/login/device")
 
                 # Look for device code
                 inputs = page.locator('input')
                 for i in range(await inputs.count()):
                     val = await inputs.nth(i).input_value()
                     if val and len(val) >= 4 and len(val) <= 20:
-                        print(f"2. Enter code: {val}")
+                        logger.info(f"2. Enter code: {val}")
                         break
 
-                print("\n3. Authorize HACS on GitHub")
-                print("4. Return here and the setup will complete")
-                print("="*60)
+                logger.info("3. Authorize HACS on GitHub")
+                logger.info("4. Return here and the setup will complete")
+                logger.info("="*60)
 
-            print("\nHACS configuration script complete!")
+            logger.info("HACS configuration script complete!")
 
         except Exception as e:
-            print(f"Error: {e}")
+            logger.error(f"Error: {e}")
             await page.screenshot(path="/opt/homelab/screenshots/hacs_error.png")
             return 1
         finally:
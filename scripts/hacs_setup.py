@@ -4,27 +4,37 @@ HACS Setup Script
 Adds HACS integration to Home Assistant via Playwright
 """
 
+import argparse
 import asyncio
+import os
 import sys
 import time
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
+import ha_browser
+import ha_client
+import log_setup
+import tracing
 
 # Configuration
-HA_URL = "http://192.168.x.x:8123"
+HA_URL = os.environ.get("HA_URL", "http://192.168.x.x:8123")
 USERNAME = "person1"
 PASSWORD = "YOUR_HA_PASSWORD"
 
+logger = log_setup.setup_logging("hacs_setup", log_setup.LOG_DIR / "hacs_setup.jsonl",
+                                console_format="%(message)s", rate_limit=None)
+
+@tracing.traced("screenshot")
 async def take_screenshot(page, name):
     """Take a screenshot for debugging"""
     try:
         await page.screenshot(path=f"/opt/homelab/screenshots/{name}.png")
-        print(f"Screenshot saved: {name}.png")
+        logger.info(f"Screenshot saved: {name}.png")
     except Exception as e:
-        print(f"Could not save screenshot: {e}")
+        logger.warning(f"Could not save screenshot: {e}")
 
+@tracing.traced("login")
 async def login(page):
     """Login to Home Assistant"""
-    print("\n=== Logging into Home Assistant ===")
+    logger.info("=== Logging into Home Assistant ===")
 
     await page.goto(HA_URL)
     await page.wait_for_load_state('networkidle')
@@ -33,7 +43,7 @@ async def login(page):
     # Check if we see the login form
     welcome_text = page.locator('text="Welcome home!"')
     if await welcome_text.count() > 0:
-        print("Login form detected, logging in...")
+        logger.info("Login form detected, logging in...")
 
         # Fill username
         username_input = page.locator('input').first
@@ -49,15 +59,16 @@ async def login(page):
         login_btn = page.locator('text="Log in"')
         await login_btn.click()
 
-        print("Login submitted, waiting for dashboard...")
+        logger.info("Login submitted, waiting for dashboard...")
         await asyncio.sleep(5)
 
     await page.wait_for_load_state('networkidle')
     return True
 
+@tracing.traced("config_flow_hacs")
 async def add_hacs_integration(page):
     """Add HACS integration"""
-    print("\n=== Adding HACS Integration ===")
+    logger.info("=== Adding HACS Integration ===")
 
     # Navigate to integrations page
     await page.goto(f"{HA_URL}/config/integrations")
@@ -67,7 +78,7 @@ async def add_hacs_integration(page):
     await take_screenshot(page, "hacs_01_integrations_page")
 
     # Click Add Integration button (the floating action button)
-    print("Looking for Add Integration button...")
+    logger.info("Looking for Add Integration button...")
     add_btn = page.locator('ha-fab')
     if await add_btn.count() > 0:
         await add_btn.click()
@@ -75,7 +86,7 @@ async def add_hacs_integration(page):
         await take_screenshot(page, "hacs_02_add_dialog")
 
         # Search for HACS
-        print("Searching for HACS...")
+        logger.info("Searching for HACS...")
         search_input = page.locator('search-input-outlined input, vaadin-combo-box-light input, ha-search-field input, input[type="search"]').first
         if await search_input.count() > 0:
             await search_input.fill("HACS")
@@ -98,23 +109,24 @@ async def add_hacs_integration(page):
                         await hacs_item.click()
                         await asyncio.sleep(2)
                         await take_screenshot(page, "hacs_04_hacs_selected")
-                        print("HACS selected!")
+                        logger.info("HACS selected!")
                         return await complete_hacs_setup(page)
                     except Exception as e:
-                        print(f"Could not click selector {selector}: {e}")
+                        logger.warning(f"Could not click selector {selector}: {e}")
                         continue
 
-            print("Could not find HACS in search results")
+            logger.warning("Could not find HACS in search results")
         else:
-            print("Could not find search input")
+            logger.warning("Could not find search input")
     else:
-        print("Could not find Add Integration button")
+        logger.warning("Could not find Add Integration button")
 
     return False
 
+@tracing.traced("config_flow_submit")
 async def complete_hacs_setup(page):
     """Complete the HACS setup dialog"""
-    print("\n=== Completing HACS Setup ===")
+    logger.info("=== Completing HACS Setup ===")
     await asyncio.sleep(2)
 
     # HACS shows a dialog with checkboxes - click on the text labels instead
@@ -132,44 +144,44 @@ async def complete_hacs_setup(page):
             formfield = page.locator(f'ha-formfield:has-text("{text}")')
             if await formfield.count() > 0:
                 await formfield.click()
-                print(f"Clicked: {text[:50]}...")
+                logger.info(f"Clicked: {text[:50]}...")
                 await asyncio.sleep(0.3)
             else:
                 # Try clicking directly on text
                 label = page.locator(f'text="{text}"').first
                 if await label.count() > 0:
                     await label.click()
-                    print(f"Clicked text: {text[:50]}...")
+                    logger.info(f"Clicked text: {text[:50]}...")
                     await asyncio.sleep(0.3)
         except Exception as e:
-            print(f"Could not click checkbox for: {text[:30]}... - {e}")
+            logger.warning(f"Could not click checkbox for: {text[:30]}... - {e}")
 
     await take_screenshot(page, "hacs_05_checkboxes_checked")
     await asyncio.sleep(1)
 
     # Click Submit button
-    print("Clicking Submit button...")
+    logger.info("Clicking Submit button...")
     submit_btn = page.locator('mwc-button:has-text("Submit"), ha-button:has-text("Submit"), button:has-text("Submit")').first
     if await submit_btn.count() > 0:
         await submit_btn.click()
         await asyncio.sleep(3)
         await take_screenshot(page, "hacs_06_submitted")
-        print("Submit clicked!")
+        logger.info("Submit clicked!")
     else:
-        print("Could not find Submit button")
+        logger.warning("Could not find Submit button")
 
     await asyncio.sleep(2)
     await take_screenshot(page, "hacs_07_after_submit")
 
     # Check for GitHub authentication step
     # HACS uses device code flow for GitHub OAuth
-    print("\nChecking for GitHub authentication...")
+    logger.info("Checking for GitHub authentication...")
 
     # Look for the device code dialog
     page_content = await page.content()
 
     if "github.com/login/device" in page_content or "device" in page_content.lower():
-        print("\n*** GitHub Device Authentication Required ***")
+        logger.info("*** GitHub Device Authentication Required ***")
 
         # Try to find the device code
         code_elem = page.locator('code, .code, ha-textfield input, input[readonly]')
@@ -178,7 +190,7 @@ async def complete_hacs_setup(page):
                 try:
                     code_text = await code_elem.nth(i).text_content()
                     if code_text and len(code_text) > 0:
-                        print(f"Device code found: {code_text}")
+                        logger.info(f"Device code found: {code_text}")
                 except:
                     pass
 
@@ -186,17 +198,18 @@ async def complete_hacs_setup(page):
         github_link = page.locator('a[href*="github.com"]')
         if await github_link.count() > 0:
             href = await github_link.first.get_attribute('href')
-            print(f"GitHub authorization URL: {href}")
+            logger.info(f"GitHub authorization URL: {href}")
         else:
-            print("Visit: https://github.com/login/device")
+            logger.info("Visit: https://github.com/login/device")
 
-        print("\nPlease authorize HACS on GitHub, then the setup will complete automatically.")
+        logger.info("Please authorize HACS on GitHub, then the setup will complete automatically.")
 
     return True
 
+@tracing.traced("navigate_integrations")
 async def check_hacs_installed(page):
     """Check if HACS is already configured"""
-    print("\n=== Checking for existing HACS installation ===")
+    logger.info("=== Checking for existing HACS installation ===")
 
     await page.goto(f"{HA_URL}/config/integrations")
     await page.wait_for_load_state('networkidle')
@@ -205,21 +218,28 @@ async def check_hacs_installed(page):
     # Look for HACS in the integrations list
     hacs_card = page.locator('ha-integration-card:has-text("HACS")')
     if await hacs_card.count() > 0:
-        print("HACS is already installed!")
+        logger.info("HACS is already installed!")
         return True
 
     return False
 
 async def main():
-    print("=" * 60)
-    print("HACS Setup Script")
-    print("=" * 60)
+    logger.info("=" * 60)
+    logger.info("HACS Setup Script")
+    logger.info("=" * 60)
+
+    # Settled over the API when HA_TOKEN is set, without starting a browser
+    if "loaded" in (await ha_client.config_entry_states("hacs", HA_URL) or []):
+        logger.info("HACS is already configured!")
+        return 0
 
+    async_playwright = ha_browser.playwright()
     async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--no-sandbox', '--disable-gpu']
-        )
+        with tracing.span("browser_launch"):
+            browser = await p.chromium.launch(
+                headless=True,
+                args=['--no-sandbox', '--disable-gpu']
+            )
 
         context = await browser.new_context(
             viewport={'width': 1920, 'height': 1080},
@@ -235,18 +255,16 @@ async def main():
 
             # Check if HACS is already installed
             if await check_hacs_installed(page):
-                print("\nHACS is already configured!")
+                logger.info("HACS is already configured!")
                 await take_screenshot(page, "hacs_already_installed")
             else:
-                print("\nHACS not found, adding integration...")
+                logger.info("HACS not found, adding integration...")
                 await add_hacs_integration(page)
 
-            print("\n=== HACS Setup Script Complete ===")
+            logger.info("=== HACS Setup Script Complete ===")
 
         except Exception as e:
-            print(f"Error during setup: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Error during setup: {e}")
             await take_screenshot(page, "hacs_error")
             return 1
         finally:
@@ -255,4 +273,7 @@ async def main():
     return 0
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the HACS integration through Home Assistant's web UI")
+    tracing.add_arguments(parser)
+    tracing.configure("hacs_setup", parser.parse_args())
     sys.exit(asyncio.run(main()))
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+Detection-to-Notification Latency Tracer
+
+Follows each Frigate event through the security pipeline and times every hop:
+
+  frigate_publish  Frigate frame_time -> frigate/events received from the broker
+  router           frigate/events -> frigate/events/<camera>/<label>/new
+                   (frigate_event_router.py; absent when the router is not running)
+  ha_trigger       MQTT receive -> HA automation_triggered
+  pre_notify       automation_triggered -> first notify.* call started
+  snapshot         camera.snapshot step duration
+  ai               ai_task.* step duration
+  notify           notify.* step duration (until the service call returned)
+  end_to_end       Frigate frame_time -> last notify call returned
+
+Events are correlated by Frigate event id: MQTT payloads carry it, and each
+automation run's trace (trace/get over the HA websocket) holds the trigger
+payload plus a timestamp for every action step. When a trace is unavailable
+(stored_traces exhausted, run still going at the end) the run is matched to
+the most recent MQTT message on its trigger topic, and call_service events in
+the run's context give step start times.
+
+Modes:
+  trace    watch live traffic for --duration seconds (or until Ctrl-C)
+  inject   publish synthetic Frigate events (bench_frigate_router's generator,
+           re-stamped to the current time) and trace only those. The events
+           fire the real camera automations, so inject needs an explicit
+           --host for a test broker; the production broker (MQTT_HOST) is
+           refused unless --allow-production is given as well.
+
+Save a run with --save and compare a later one against it with --compare to
+see what a config change did to p50/p95/p99.
+
+Needs HA_TOKEN for the HA stages; without it only the MQTT stages are timed.
+
+Usage:
+    latency_tracer.py trace [--duration 600] [--save before.json]
+    latency_tracer.py --host TEST_BROKER inject [--events 20] [--interval 5]
+                             [--camera wyze_garage] [--compare before.json]
+                             [--allow-production]
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+import bench_frigate_router
+import ha_client
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+SOURCE_TOPIC = "frigate/events"
+RUN_TIMEOUT = 180           # AI analysis steps can take a while
+TRACE_POLL_INTERVAL = 1.0
+TOPIC_MATCH_WINDOW = 30     # seconds between MQTT receive and trigger for fallback matching
+
+STAGES = ["frigate_publish", "router", "ha_trigger", "pre_notify",
+          "snapshot", "ai", "notify", "end_to_end"]
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# TIMELINES
+# ============================================
+
+class EventTimeline:
+    __slots__ = ("event_id", "camera", "label", "frame_time", "mqtt", "routed", "runs")
+
+    def __init__(self, event_id, camera, label):
+        self.event_id = event_id
+        self.camera = camera
+        self.label = label
+        self.frame_time = None
+        self.mqtt = None        # first frigate/events receive
+        self.routed = None      # first frigate/events/<camera>/<label>/new receive
+        self.runs = []
+
+
+class AutomationRun:
+    __slots__ = ("entity_id", "context_id", "topic", "triggered", "event_id",
+                 "steps", "service_starts", "finished")
+
+    def __init__(self, entity_id, context_id, topic, triggered):
+        self.entity_id = entity_id
+        self.context_id = context_id
+        self.topic = topic
+        self.triggered = triggered
+        self.event_id = None
+        self.steps = []             # (service, start, end) from the trace
+        self.service_starts = []    # (service, time) from call_service events
+        self.finished = False
+
+
+def _ts(value) -> float:
+    return datetime.fromisoformat(value).timestamp() if isinstance(value, str) else value
+
+
+def _stage_for(service: str) -> str:
+    if service == "camera.snapshot":
+        return "snapshot"
+    if service.startswith("ai_task."):
+        return "ai"
+    if service.startswith("notify."):
+        return "notify"
+    return None
+
+
+class Tracer:
+    def __init__(self, only_ids: set = None):
+        self.only_ids = only_ids
+        self.events = {}
+        self.runs = {}              # context id -> AutomationRun
+        self.recent = {}            # topic -> [(receive time, event id)]
+        self.lock = threading.Lock()
+        self.counts = {"mqtt": 0, "triggered": 0, "traced": 0, "fallback": 0, "unmatched": 0}
+
+    # ---- MQTT (paho network thread) ----
+
+    def on_mqtt(self, topic: str, payload: bytes):
+        received = time.time()
+        try:
+            obj = json.loads(payload)
+        except ValueError:
+            return
+        if topic == SOURCE_TOPIC:
+            after = obj.get("after") or {}
+            event_id = after.get("id")
+            if obj.get("type") != "new" or not event_id:
+                return
+            camera, label = after.get("camera"), after.get("label")
+        else:
+            event_id = obj.get("id")
+            if obj.get("type") != "new" or not event_id:
+                return
+            camera, label = obj.get("camera"), obj.get("label")
+        if self.only_ids is not None and event_id not in self.only_ids:
+            return
+
+        with self.lock:
+            self.counts["mqtt"] += 1
+            timeline = self.events.get(event_id)
+            if timeline is None:
+                timeline = self.events[event_id] = EventTimeline(event_id, camera, label)
+            if topic == SOURCE_TOPIC:
+                timeline.frame_time = after.get("frame_time")
+                timeline.mqtt = timeline.mqtt or received
+            else:
+                timeline.routed = timeline.routed or received
+            self.recent.setdefault(topic, []).append((received, event_id))
+            cutoff = received - TOPIC_MATCH_WINDOW
+            self.recent[topic] = [r for r in self.recent[topic] if r[0] >= cutoff]
+
+    # ---- HA events (asyncio loop) ----
+
+    def on_automation_triggered(self, event: dict):
+        data = event.get("data") or {}
+        source = data.get("source") or ""
+        if not source.startswith(f"mqtt topic {SOURCE_TOPIC}"):
+            return
+        context_id = (event.get("context") or {}).get("id")
+        run = AutomationRun(data.get("entity_id"), context_id,
+                            source[len("mqtt topic "):], _ts(event["time_fired"]))
+        with self.lock:
+            self.counts["triggered"] += 1
+            self.runs[context_id] = run
+        return run
+
+    def on_call_service(self, event: dict):
+        context_id = (event.get("context") or {}).get("id")
+        with self.lock:
+            run = self.runs.get(context_id)
+            if run is not None:
+                data = event.get("data") or {}
+                run.service_starts.append((f"{data.get('domain')}.{data.get('service')}",
+                                           _ts(event["time_fired"])))
+
+    def apply_trace(self, run: AutomationRun, trace: dict):
+        """Fill run.event_id and run.steps from a trace/get result."""
+        steps = trace.get("trace") or {}
+        for path, elements in steps.items():
+            if not path.startswith("trigger"):
+                continue
+            trigger = (elements[0].get("changed_variables") or {}).get("trigger") or {}
+            payload = trigger.get("payload_json")
+            if payload is None:
+                try:
+                    payload = json.loads(trigger.get("payload") or "")
+                except ValueError:
+                    payload = {}
+            run.event_id = payload.get("id") or (payload.get("after") or {}).get("id")
+
+        config = trace.get("config") or {}
+        timeline = []
+        for path, elements in steps.items():
+            if path.startswith("trigger") or path.startswith("condition"):
+                continue
+            service = _service_at(config, path)
+            for element in elements:
+                timeline.append((_ts(element["timestamp"]), service))
+        timeline.sort(key=lambda item: item[0])
+        finish = _ts((trace.get("timestamp") or {}).get("finish"))
+        for i, (start, service) in enumerate(timeline):
+            end = timeline[i + 1][0] if i + 1 < len(timeline) else finish
+            if service is not None and end is not None:
+                run.steps.append((service, start, end))
+
+    def attach(self, run: AutomationRun, traced: bool):
+        with self.lock:
+            if run.event_id is None:
+                # No trace: newest message on the trigger topic before the trigger fired
+                candidates = [event_id for received, event_id in self.recent.get(run.topic, [])
+                              if received <= run.triggered + 1]
+                run.event_id = candidates[-1] if candidates else None
+            timeline = self.events.get(run.event_id)
+            if timeline is None:
+                self.counts["unmatched"] += 1
+                return
+            self.counts["traced" if traced else "fallback"] += 1
+            timeline.runs.append(run)
+
+    # ---- results ----
+
+    def latencies(self) -> dict:
+        samples = {stage: [] for stage in STAGES}
+        with self.lock:
+            for timeline in self.events.values():
+                if timeline.frame_time and timeline.mqtt:
+                    samples["frigate_publish"].append(timeline.mqtt - timeline.frame_time)
+                if timeline.mqtt and timeline.routed:
+                    samples["router"].append(timeline.routed - timeline.mqtt)
+                received = timeline.routed or timeline.mqtt
+                last_notify = None
+                for run in timeline.runs:
+                    if received:
+                        samples["ha_trigger"].append(run.triggered - received)
+                    notify_starts = [start for service, start, _ in run.steps
+                                     if service.startswith("notify.")]
+                    notify_starts += [start for service, start in run.service_starts
+                                      if service.startswith("notify.") and not run.steps]
+                    if notify_starts:
+                        samples["pre_notify"].append(min(notify_starts) - run.triggered)
+                    for service, start, end in run.steps:
+                        stage = _stage_for(service)
+                        if stage:
+                            samples[stage].append(end - start)
+                        if stage == "notify":
+                            last_notify = max(last_notify or end, end)
+                if last_notify and timeline.frame_time:
+                    samples["end_to_end"].append(last_notify - timeline.frame_time)
+        return samples
+
+
+def _service_at(config: dict, path: str):
+    """Service name of the action at a trace path like action/2/then/0."""
+    node = config
+    for part in path.split("/"):
+        if isinstance(node, list):
+            try:
+                node = node[int(part)]
+            except (ValueError, IndexError):
+                return None
+        elif isinstance(node, dict):
+            if part in ("action", "actions"):
+                node = node.get("action") if isinstance(node.get("action"), list) else node.get("actions")
+            else:
+                node = node.get(part)
+        else:
+            return None
+    if not isinstance(node, dict):
+        return None
+    service = node.get("service") or node.get("action")
+    return service if isinstance(service, str) else None
+
+# ============================================
+# HOME ASSISTANT
+# ============================================
+
+async def follow_run(ha, tracer: Tracer, run: AutomationRun):
+    """Wait for the run's trace to finish, then attach it to its Frigate event."""
+    item_id = ha.attribute(run.entity_id, "id")
+    deadline = time.monotonic() + RUN_TIMEOUT
+    seen = set()
+    while item_id and time.monotonic() < deadline:
+        await asyncio.sleep(TRACE_POLL_INTERVAL)
+        try:
+            runs = await ha.send({"type": "trace/list", "domain": "automation", "item_id": item_id})
+        except ha_client.HAError as e:
+            logger.debug(f"trace/list failed for {run.entity_id}: {e}")
+            break
+        pending = False
+        for summary in runs or []:
+            start = _ts((summary.get("timestamp") or {}).get("start"))
+            if summary["run_id"] in seen or start is None or start < run.triggered - 1:
+                continue
+            if (summary.get("timestamp") or {}).get("finish") is None:
+                pending = True
+                continue
+            seen.add(summary["run_id"])
+            try:
+                trace = await ha.send({"type": "trace/get", "domain": "automation",
+                                       "item_id": item_id, "run_id": summary["run_id"]})
+            except ha_client.HAError:
+                continue
+            if (trace.get("context") or {}).get("id") == run.context_id:
+                tracer.apply_trace(run, trace)
+                run.finished = True
+                tracer.attach(run, traced=True)
+                return
+        if not pending and seen:
+            break
+    tracer.attach(run, traced=False)
+
+
+async def watch_ha(ha, tracer: Tracer, tasks: set):
+    await ha.subscribe_entities()
+
+    def triggered(event):
+        run = tracer.on_automation_triggered(event)
+        if run is not None:
+            task = asyncio.create_task(follow_run(ha, tracer, run))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    await ha.subscribe_events(triggered, "automation_triggered")
+    await ha.subscribe_events(tracer.on_call_service, "call_service")
+
+# ============================================
+# INJECTOR
+# ============================================
+
+def inject(client, events: int, interval: float, cameras: list, label: str,
+           updates: int, injected: set, done: threading.Event, seed: int = 11):
+    """Publish synthetic events in real time: event k starts k*interval seconds in."""
+    rng = random.Random(seed)
+    t0 = time.time() + 0.5
+    queue = []
+    for k in range(events):
+        start = t0 + k * interval
+        event_id = f"{start:.6f}-{rng.randrange(36 ** 6):06x}"
+        injected.add(event_id)
+        payloads = bench_frigate_router.synthetic_event(
+            rng, cameras[k % len(cameras)], label, event_id, start, updates)
+        for i, payload in enumerate(payloads):
+            heapq.heappush(queue, (start + i * 0.2, k, i, payload))
+
+    while queue:
+        at, _, _, payload = heapq.heappop(queue)
+        delay = at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        client.publish(SOURCE_TOPIC, payload, qos=0)
+    logger.info(f"Injected {events} synthetic events")
+    done.set()
+
+# ============================================
+# REPORT
+# ============================================
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples: dict) -> dict:
+    return {stage: {"count": len(values), "p50": percentile(values, 50),
+                    "p95": percentile(values, 95), "p99": percentile(values, 99),
+                    "max": max(values)}
+            for stage, values in samples.items() if values}
+
+
+def _fmt(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def print_report(samples: dict, summary: dict, counts: dict, baseline: dict = None):
+    print()
+    print(f"MQTT events: {counts['mqtt']}  automation runs: {counts['triggered']} "
+          f"(traced {counts['traced']}, fallback {counts['fallback']}, unmatched {counts['unmatched']})")
+    if not summary:
+        print("\nNo complete samples - is Frigate (or the injector) publishing to this broker?")
+        return
+    print()
+    print(f"{'stage':<16}{'n':>6}{'p50':>11}{'p95':>11}{'p99':>11}{'max':>11}")
+    for stage in STAGES:
+        s = summary.get(stage)
+        if s is None:
+            continue
+        print(f"{stage:<16}{s['count']:>6}{_fmt(s['p50']):>11}{_fmt(s['p95']):>11}"
+              f"{_fmt(s['p99']):>11}{_fmt(s['max']):>11}")
+        b = (baseline or {}).get(stage)
+        if b:
+            deltas = "".join(f"{(s[k] - b[k]) * 1000:>+9.1f}ms" for k in ("p50", "p95", "p99"))
+            print(f"{'  vs baseline':<22}{deltas}")
+
+    for stage in STAGES:
+        values = samples.get(stage)
+        if not values:
+            continue
+        print(f"\n{stage}")
+        counts_by_bucket = [0] * (len(BUCKETS) + 1)
+        for v in values:
+            counts_by_bucket[next((i for i, b in enumerate(BUCKETS) if v <= b), len(BUCKETS))] += 1
+        peak = max(counts_by_bucket)
+        for i, n in enumerate(counts_by_bucket):
+            if n == 0:
+                continue
+            label = f"<= {_fmt(BUCKETS[i])}" if i < len(BUCKETS) else f"> {_fmt(BUCKETS[-1])}"
+            print(f"  {label:>10} {n:>6} {'#' * max(1, round(40 * n / peak))}")
+
+# ============================================
+# MAIN
+# ============================================
+
+async def run(args) -> int:
+    injected = set() if args.mode == "inject" else None
+    tracer = Tracer(only_ids=injected)
+    client = mqtt_client.create_client(
+        f"latency-tracer-{random.randrange(1 << 16):04x}", args.host, args.port,
+        subscriptions=[(f"{SOURCE_TOPIC}/#", 0)], on_message=tracer.on_mqtt)
+
+    ha = None
+    tasks = set()
+    if ha_client.HA_TOKEN:
+        try:
+            ha = ha_client.HAClient()
+            await ha.connect()
+            await watch_ha(ha, tracer, tasks)
+        except Exception as e:
+            logger.warning(f"Home Assistant unavailable, tracing MQTT stages only: {e}")
+            await ha.close()
+            ha = None
+    else:
+        logger.warning("HA_TOKEN not set, tracing MQTT stages only")
+
+    try:
+        if args.mode == "inject":
+            done = threading.Event()
+            threading.Thread(target=inject, daemon=True, args=(
+                client, args.events, args.interval, args.camera, args.label,
+                args.updates, injected, done)).start()
+            while not done.is_set():
+                await asyncio.sleep(0.5)
+        else:
+            logger.info(f"Tracing for {args.duration}s (Ctrl-C to stop early)")
+            await asyncio.sleep(args.duration)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+    if tasks:
+        logger.info(f"Waiting up to {args.settle}s for {len(tasks)} automation run(s) to finish")
+        await asyncio.wait(tasks, timeout=args.settle)
+    mqtt_client.close_client(client)
+    if ha is not None:
+        await ha.close()
+
+    samples = tracer.latencies()
+    summary = summarize(samples)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["summary"]
+    print_report(samples, summary, tracer.counts, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"created": time.time(), "mode": args.mode, "counts": tracer.counts,
+                       "summary": summary, "samples": samples}, f, indent=1)
+        logger.info(f"Saved results to {args.save}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Trace Frigate -> HA -> notify latency per stage")
+    parser.add_argument("--host", help=f"MQTT broker (default {mqtt_client.MQTT_HOST}; required for inject)")
+    parser.add_argument("--port", type=int, default=mqtt_client.MQTT_PORT)
+    parser.add_argument("--settle", type=float, default=60,
+                        help="Seconds to wait for in-flight automation runs at the end")
+    parser.add_argument("--save", help="Write summary and raw samples to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier --save")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p = sub.add_parser("trace", help="Trace live traffic")
+    p.add_argument("--duration", type=float, default=600)
+
+    p = sub.add_parser("inject", help="Publish synthetic events and trace them")
+    p.add_argument("--events", type=int, default=20)
+    p.add_argument("--interval", type=float, default=5, help="Seconds between event starts")
+    p.add_argument("--camera", action="append",
+                   help="Camera for injected events (repeatable, round-robin; default all)")
+    p.add_argument("--label", default="person")
+    p.add_argument("--updates", type=int, default=10, help="Update messages per event")
+    p.add_argument("--allow-production", action="store_true",
+                   help="Inject into the production broker (real automations and notifications)")
+
+    args = parser.parse_args()
+    if args.mode == "inject":
+        if not args.host:
+            parser.error("inject needs an explicit --host (a test broker)")
+        if args.host in (mqtt_client.MQTT_HOST, "127.0.0.1", "localhost", "mosquitto") and not args.allow_production:
+            parser.error(f"{args.host} is the production broker; injected events trigger real "
+                         "alerts and notifications. Pass --allow-production to do it anyway")
+        if not args.camera:
+            args.camera = list(bench_frigate_router.CAMERAS)
+    args.host = args.host or mqtt_client.MQTT_HOST
+    try:
+        return asyncio.run(run(args))
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
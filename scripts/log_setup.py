@@ -0,0 +1,310 @@
+"""
+Shared logging setup for the homelab scripts.
+
+Log calls only format the message and put the record on a bounded queue; a
+background QueueListener thread does the console and file I/O, so a slow disk
+or a full pipe never stalls a control loop. When the queue is full records are
+dropped and counted rather than blocking.
+
+The log file is JSON lines with stable fields, one object per record:
+
+    {"ts": "2026-10-19T07:12:03.481+00:00", "level": "INFO", "script": "system-monitor",
+     "logger": "__main__", "phase": "sample", "duration_ms": 12.4, "msg": "..."}
+
+`phase` and `duration_ms` are present when set - by the phase() context
+manager or via extra={"phase": ..., "duration_ms": ...} - and any other
+extra={"fields": {...}} keys are merged in. Query with jq, e.g.
+
+    jq -r 'select(.phase == "discovery") | .duration_ms' /var/log/tplink-ip-updater.jsonl
+
+Files rotate on size (LOG_MAX_BYTES) and age (LOG_ROTATE_HOURS), keeping
+LOG_BACKUPS old files. Repeated INFO/DEBUG messages from the same call site
+are rate limited (LOG_RATE_LIMIT, "<count>/<seconds>"); the next record let
+through reports how many were suppressed. Warnings and errors always pass. extra={"sample": 0.1} logs about one in ten
+records from a call site instead.
+
+Usage:
+    import log_setup
+    logger = log_setup.setup_logging("system-monitor", LOG_DIR / "system-monitor.jsonl")
+
+    with log_setup.phase(logger, "discovery"):
+        ...
+"""
+
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import tracing
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+LOG_DIR = Path(os.environ.get("LOG_DIR", "/opt/homelab/logs"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_HOURS = float(os.environ.get("LOG_ROTATE_HOURS", "24"))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "7"))
+LOG_RATE_LIMIT = os.environ.get("LOG_RATE_LIMIT", "10/60")
+QUEUE_SIZE = 10000
+
+CONSOLE_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+_phase = contextvars.ContextVar("log_phase", default=None)
+_listener = None
+
+# ============================================
+# FORMATTING
+# ============================================
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with a fixed set of leading fields."""
+
+    def __init__(self, script: str):
+        super().__init__()
+        self.script = script
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "script": self.script,
+            "logger": record.name,
+        }
+        phase = getattr(record, "phase", None)
+        if phase is not None:
+            entry["phase"] = phase
+        duration_ms = getattr(record, "duration_ms", None)
+        if duration_ms is not None:
+            entry["duration_ms"] = round(duration_ms, 3)
+        entry["msg"] = record.getMessage()
+        fields = getattr(record, "fields", None)
+        if fields:
+            for key, value in fields.items():
+                entry.setdefault(key, value)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SuppressedCountFormatter(logging.Formatter):
+    """Console formatter that notes how many similar records were dropped."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            line += f" ({suppressed} similar suppressed)"
+        return line
+
+# ============================================
+# FILTERS AND HANDLERS
+# ============================================
+
+
+class ContextFilter(logging.Filter):
+    """Stamp the current phase onto records that do not set one explicitly."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "phase", None) is None:
+            record.phase = _phase.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `count` records per `period` seconds from each call
+    site (logger, file, line). Records carrying a `sample` attribute are
+    sampled instead: every round(1/sample)-th one from the call site is kept.
+    Records at or above `exempt_level` always pass.
+    """
+
+    def __init__(self, count: int, period: float, exempt_level: int = logging.WARNING):
+        super().__init__()
+        self.count = count
+        self.period = period
+        self.exempt_level = exempt_level
+        self.sites = {}   # call site -> [window start, records in window, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.exempt_level:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        site = self.sites.get(key)
+
+        sample = getattr(record, "sample", None)
+        if sample is not None:
+            if site is None:
+                site = self.sites[key] = [0.0, 0, 0]
+            every = max(1, round(1 / sample)) if sample > 0 else 0
+            site[1] += 1
+            if every and site[1] % every == 1 % every:
+                record.suppressed, site[2] = site[2], 0
+                return True
+            site[2] += 1
+            return False
+
+        now = record.created
+        if site is None or now - site[0] >= self.period:
+            suppressed = site[2] if site else 0
+            self.sites[key] = [now, 1, 0]
+            record.suppressed = suppressed
+            return True
+        if site[1] < self.count:
+            site[1] += 1
+            record.suppressed, site[2] = site[2], 0
+            return True
+        site[2] += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the stock prepare(), keep the traceback out of msg so the
+        # JSON formatter can put it in its own field
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Roll over when the file exceeds max_bytes or is older than max_age seconds."""
+
+    def __init__(self, filename, max_bytes: int, max_age: float, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.max_age = max_age
+        try:
+            opened = os.stat(self.baseFilename).st_mtime if os.path.getsize(self.baseFilename) else time.time()
+        except OSError:
+            opened = time.time()
+        self.rollover_at = opened + max_age if max_age else None
+
+    def shouldRollover(self, record) -> bool:
+        if self.rollover_at and record.created >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        if self.max_age:
+            self.rollover_at = time.time() + self.max_age
+
+# ============================================
+# SETUP
+# ============================================
+
+
+def _parse_rate(spec: str):
+    count, _, period = spec.partition("/")
+    return int(count), float(period or 60)
+
+
+def setup_logging(script: str = None, log_file=None, level: str = LOG_LEVEL,
+                  console_format: str = CONSOLE_FORMAT, rate_limit: str = LOG_RATE_LIMIT) -> logging.Logger:
+    """
+    Route all logging through the background writer and return the
+    "__main__" logger. log_file (optional) receives JSON lines; if it cannot
+    be opened the script carries on with console output only. Safe to call
+    more than once - later calls replace the earlier handlers.
+    """
+    global _listener
+    script = script or Path(sys.argv[0]).stem
+
+    handlers = []
+    console = logging.StreamHandler()
+    console.setFormatter(SuppressedCountFormatter(console_format))
+    handlers.append(console)
+
+    file_error = None
+    if log_file:
+        try:
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            file_handler = RotatingFileHandler(log_file, LOG_MAX_BYTES, LOG_ROTATE_HOURS * 3600, LOG_BACKUPS)
+            file_handler.setFormatter(JsonFormatter(script))
+            handlers.append(file_handler)
+        except OSError as e:
+            file_error = e
+
+    if _listener:
+        _listener.stop()
+        atexit.unregister(_listener.stop)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    if rate_limit:
+        count, period = _parse_rate(rate_limit)
+        queue_handler.addFilter(RateLimitFilter(count, period))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+    # Registered after logging's own atexit hook, so it runs first and the
+    # queue is drained before handlers are closed
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger("__main__")
+    if file_error:
+        logger.warning(f"Could not open log file {log_file}: {file_error}")
+    return logger
+
+
+@contextlib.contextmanager
+def phase(logger: logging.Logger, name: str, level: int = logging.INFO):
+    """
+    Tag every record logged inside the block (including from other modules
+    and asyncio tasks started within it) with phase=name, then log the
+    phase's duration_ms when it ends. The block is also a tracing span.
+    """
+    token = _phase.set(name)
+    start = time.perf_counter()
+    failed = False
+    try:
+        with tracing.span(name):
+            yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.log(logging.WARNING if failed else level,
+                   f"{name} {'failed' if failed else 'done'} in {duration_ms:.0f} ms",
+                   extra={"duration_ms": duration_ms})
+        _phase.reset(token)
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Media Retention Service - size/age/count quotas for HA snapshots and clips
+
+Replaces the nightly `find /config/www/blink_clips -mtime +7 -delete`
+shell_command and adds the cleanup the intruder snapshots never had.
+
+Keeps an in-memory index (path -> size, mtime) of each managed directory:
+  - built once at startup by a throttled scandir walk (SCAN_BATCH entries,
+    then a short pause), with inotify watches added first so nothing written
+    during the walk is missed
+  - kept current from inotify events (close_write, moved_to/from, delete);
+    a queue overflow or a lost watch schedules a fresh throttled scan, and a
+    reconciling scan runs every RESCAN_HOURS anyway
+  - falls back to the periodic scan alone where inotify is unavailable
+
+Each policy sets a maximum age, total size and file count. Over-quota files
+are deleted oldest first in batches of DELETE_BATCH with DELETE_PAUSE
+seconds between batches, so freeing a lot of space never turns into one
+long burst of unlinks on the SSD.
+
+Usage per directory is published as MQTT discovery sensors
+(sensor.media_retention_<name>_size / _files / _oldest, deletions in the
+attributes) and printed by `status`.
+
+Usage:
+    media_retention.py run [--dry-run]
+    media_retention.py status
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import heapq
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+WWW_DIR = HOMELAB_DIR / "homeassistant" / "www"
+
+DAY = 86400
+GB = 1024 ** 3
+
+# name, directory, filename patterns, and quotas (None = no limit)
+POLICIES = [
+    {"name": "blink_clips", "path": WWW_DIR / "blink_clips", "patterns": ["*.mp4"],
+     "max_age_days": 7, "max_bytes": 20 * GB, "max_files": 5000},
+    {"name": "snapshots", "path": WWW_DIR / "snapshots", "patterns": ["*.jpg", "*.jpeg", "*.png"],
+     "max_age_days": 30, "max_bytes": 2 * GB, "max_files": 2000},
+]
+
+DELETE_BATCH = 25            # files per deletion batch
+DELETE_PAUSE = 2.0           # seconds between batches
+SCAN_BATCH = 500             # directory entries per scan step
+SCAN_PAUSE = 0.05            # seconds between scan steps
+RESCAN_HOURS = 24
+ENFORCE_INTERVAL = 60        # seconds between quota checks when nothing changes
+METRICS_INTERVAL = 60
+AVAILABILITY_TOPIC = "media_retention/status"
+STATE_TOPIC = "media_retention/{name}/state"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# INOTIFY
+# ============================================
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify(7) binding through libc; raises OSError where unsupported."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify not available")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}     # watch descriptor -> directory
+
+    def add_watch(self, path: Path) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch {path}: {os.strerror(err)}")
+        self.paths[wd] = Path(path)
+        return wd
+
+    def read(self, timeout: float) -> list:
+        """[(directory or None, mask, name)] - waits up to timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            directory = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+            events.append((directory, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+# ============================================
+# INDEX
+# ============================================
+
+class MediaIndex:
+    """Files under one policy's directory, with running totals and an age-ordered heap."""
+
+    def __init__(self, policy: dict):
+        self.policy = policy
+        self.name = policy["name"]
+        self.root = Path(policy["path"])
+        self.files = {}             # path -> (size, mtime)
+        self.total_bytes = 0
+        self._heap = []             # (mtime, path); stale entries skipped lazily
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.last_scan = 0.0
+        self.dirty = True
+
+    def matches(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, p) for p in self.policy["patterns"])
+
+    def update(self, path: str, size: int, mtime: float):
+        old = self.files.get(path)
+        if old is not None:
+            self.total_bytes -= old[0]
+        self.files[path] = (size, mtime)
+        self.total_bytes += size
+        if old is None or old[1] != mtime:
+            heapq.heappush(self._heap, (mtime, path))
+        self.dirty = True
+
+    def remove(self, path: str):
+        old = self.files.pop(path, None)
+        if old is not None:
+            self.total_bytes -= old[0]
+            self.dirty = True
+
+    def remove_tree(self, directory: str):
+        prefix = directory.rstrip("/") + "/"
+        for path in [p for p in self.files if p.startswith(prefix)]:
+            self.remove(path)
+
+    def refresh(self, path: str):
+        """Re-stat one file after an inotify event."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.remove(path)
+            return
+        self.update(path, st.st_size, st.st_mtime)
+
+    def oldest(self):
+        """(path, size, mtime) of the oldest indexed file, or None."""
+        while self._heap:
+            mtime, path = self._heap[0]
+            current = self.files.get(path)
+            if current is not None and current[1] == mtime:
+                return path, current[0], mtime
+            heapq.heappop(self._heap)
+        return None
+
+    def over_quota(self, now: float) -> str:
+        """Why the oldest file should go, or None when within every quota."""
+        oldest = self.oldest()
+        if oldest is None:
+            return None
+        p = self.policy
+        if p.get("max_files") is not None and len(self.files) > p["max_files"]:
+            return "count"
+        if p.get("max_bytes") is not None and self.total_bytes > p["max_bytes"]:
+            return "size"
+        if p.get("max_age_days") is not None and now - oldest[2] > p["max_age_days"] * DAY:
+            return "age"
+        return None
+
+    def usage(self, now: float) -> dict:
+        oldest = self.oldest()
+        return {"size_mb": round(self.total_bytes / 1e6, 1), "files": len(self.files),
+                "oldest_days": round((now - oldest[2]) / DAY, 2) if oldest else 0,
+                "deleted_files": self.deleted_files,
+                "deleted_mb": round(self.deleted_bytes / 1e6, 1)}
+
+
+def throttled_scan(index: MediaIndex, watcher: Inotify = None):
+    """Rebuild the index with a paced walk; returns the number of files found."""
+    found = {}
+    pending = [str(index.root)]
+    seen = 0
+    while pending:
+        directory = pending.pop()
+        if watcher is not None:
+            try:
+                watcher.add_watch(directory)
+            except OSError as e:
+                logger.warning(f"{e}")
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                seen += 1
+                if seen % SCAN_BATCH == 0:
+                    time.sleep(SCAN_PAUSE)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and index.matches(entry.name):
+                        st = entry.stat(follow_symlinks=False)
+                        found[entry.path] = (st.st_size, st.st_mtime)
+                except FileNotFoundError:
+                    continue
+
+    # Reconcile: events that arrived during the walk are already in the index
+    for path in [p for p in index.files if p not in found]:
+        if not os.path.exists(path):
+            index.remove(path)
+    for path, (size, mtime) in found.items():
+        if index.files.get(path) != (size, mtime):
+            index.update(path, size, mtime)
+    # Drop heap entries left behind by overwritten or externally deleted files
+    index._heap = [(mtime, path) for path, (_, mtime) in index.files.items()]
+    heapq.heapify(index._heap)
+    index.last_scan = time.time()
+    return len(found)
+
+# ============================================
+# SERVICE
+# ============================================
+
+class RetentionService:
+    def __init__(self, policies: list, dry_run: bool = False, mqtt: bool = True):
+        self.indexes = [MediaIndex(p) for p in policies]
+        self.dry_run = dry_run
+        self.next_delete = 0.0
+        self.next_metrics = 0.0
+        self.rescan = set(self.indexes)
+        self.watcher = None
+        try:
+            self.watcher = Inotify()
+        except OSError as e:
+            logger.warning(f"inotify unavailable ({e}), relying on periodic scans")
+        self.client = None
+        if mqtt:
+            try:
+                self.client = mqtt_client.create_client(
+                    f"media-retention-{os.getpid()}", availability_topic=AVAILABILITY_TOPIC)
+                self.publish_discovery()
+            except (OSError, RuntimeError) as e:
+                logger.warning(f"MQTT unavailable, metrics disabled: {e}")
+                self.client = None
+
+    def index_for(self, directory: Path) -> MediaIndex:
+        for index in self.indexes:
+            if directory == index.root or index.root in directory.parents:
+                return index
+        return None
+
+    def handle_events(self, events: list):
+        for directory, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, rescanning")
+                self.rescan.update(self.indexes)
+                continue
+            if directory is None:
+                continue
+            index = self.index_for(directory)
+            if index is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # The watched directory itself went away - pick it up again on rescan
+                index.remove_tree(str(directory))
+                self.rescan.add(index)
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.rescan.add(index)      # watch it and index what is inside
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    index.remove_tree(path)
+                continue
+            if not index.matches(name):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                index.remove(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                index.refresh(path)
+
+    def enforce(self, now: float) -> int:
+        """Delete one batch of over-quota files across all policies."""
+        deleted = 0
+        for index in self.indexes:
+            while deleted < DELETE_BATCH:
+                reason = index.over_quota(now)
+                if reason is None:
+                    break
+                path, size, mtime = index.oldest()
+                age = (now - mtime) / DAY
+                if self.dry_run:
+                    logger.info(f"[dry-run] would delete {path} ({reason}, {age:.1f}d, {size / 1e6:.1f}MB)")
+                else:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.error(f"Could not delete {path}: {e}")
+                        index.remove(path)      # stop retrying it until the next scan
+                        continue
+                    logger.info(f"Deleted {path} ({reason}, {age:.1f}d, {size / 1e6:.1f}MB)")
+                index.remove(path)
+                index.deleted_files += 1
+                index.deleted_bytes += size
+                deleted += 1
+        return deleted
+
+    def publish_discovery(self):
+        device = {"identifiers": ["media_retention"], "name": "Media Retention",
+                  "manufacturer": "homelab"}
+        for index in self.indexes:
+            topic = STATE_TOPIC.format(name=index.name)
+            base = {"state_topic": topic, "availability_topic": AVAILABILITY_TOPIC,
+                    "json_attributes_topic": topic}
+            mqtt_client.publish_discovery(self.client, "sensor", f"media_retention_{index.name}_size", {
+                **base, "name": f"{index.name} size", "unit_of_measurement": "MB",
+                "device_class": "data_size", "state_class": "measurement",
+                "value_template": "{{ value_json.size_mb }}"}, device)
+            mqtt_client.publish_discovery(self.client, "sensor", f"media_retention_{index.name}_files", {
+                **base, "name": f"{index.name} files", "state_class": "measurement",
+                "value_template": "{{ value_json.files }}"}, device)
+            mqtt_client.publish_discovery(self.client, "sensor", f"media_retention_{index.name}_oldest", {
+                **base, "name": f"{index.name} oldest", "unit_of_measurement": "d",
+                "value_template": "{{ value_json.oldest_days }}"}, device)
+
+    def publish_metrics(self, now: float):
+        for index in self.indexes:
+            if index.dirty:
+                index.dirty = False
+                if self.client is not None:
+                    self.client.publish(STATE_TOPIC.format(name=index.name),
+                                        json.dumps(index.usage(now)), qos=1, retain=True)
+
+    def run(self):
+        logger.info(f"Media retention started ({'dry run' if self.dry_run else 'deleting'})")
+        for index in self.indexes:
+            p = index.policy
+            logger.info(f"  {index.name}: {index.root} {','.join(p['patterns'])} "
+                        f"age<={p['max_age_days']}d size<={(p['max_bytes'] or 0) / GB:.0f}GB "
+                        f"files<={p['max_files']}")
+        try:
+            while True:
+                now = time.time()
+                for index in self.indexes:
+                    if now - index.last_scan > RESCAN_HOURS * 3600:
+                        self.rescan.add(index)
+                while self.rescan:
+                    index = self.rescan.pop()
+                    started = time.monotonic()
+                    count = throttled_scan(index, self.watcher)
+                    logger.info(f"Indexed {index.name}: {count} files, "
+                                f"{index.total_bytes / 1e6:.1f}MB ({time.monotonic() - started:.1f}s)")
+                    now = time.time()
+
+                if now >= self.next_delete:
+                    if self.enforce(now):
+                        self.next_delete = now + DELETE_PAUSE
+                if now >= self.next_metrics:
+                    self.publish_metrics(now)
+                    self.next_metrics = now + METRICS_INTERVAL
+
+                busy = any(index.over_quota(now) for index in self.indexes)
+                timeout = max(0.0, self.next_delete - now) if busy else ENFORCE_INTERVAL
+                if self.watcher is not None:
+                    self.handle_events(self.watcher.read(timeout))
+                else:
+                    time.sleep(timeout)
+        except KeyboardInterrupt:
+            logger.info("Media retention stopped")
+        finally:
+            if self.client is not None:
+                self.publish_metrics(time.time())
+                mqtt_client.close_client(self.client, AVAILABILITY_TOPIC)
+            if self.watcher is not None:
+                self.watcher.close()
+
+
+def status() -> int:
+    now = time.time()
+    print(f"{'policy':<14}{'files':>8}{'size MB':>10}{'oldest d':>10}{'over quota':>12}  path")
+    for policy in POLICIES:
+        index = MediaIndex(policy)
+        throttled_scan(index)
+        u = index.usage(now)
+        over = 0
+        while index.over_quota(now):
+            path, _, _ = index.oldest()
+            index.remove(path)
+            over += 1
+        print(f"{index.name:<14}{u['files']:>8}{u['size_mb']:>10.1f}{u['oldest_days']:>10.1f}"
+              f"{over:>12}  {index.root}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Quota-based retention for HA snapshots and clips")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="Run the retention service")
+    p.add_argument("--dry-run", action="store_true", help="Log deletions instead of deleting")
+    p.add_argument("--no-mqtt", action="store_true", help="Do not publish usage sensors")
+    sub.add_parser("status", help="Scan once and print usage per policy")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        return status()
+    RetentionService(POLICIES, dry_run=args.dry_run, mqtt=not args.no_mqtt).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
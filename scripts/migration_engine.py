@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+"""
+Migration Engine - resumable, verified bulk copy of a directory tree
+
+Replaces rsync + du/find polling for large one-off moves such as
+/mnt/mobiledata -> /mnt/seagate/mobiledata. Every file and symlink under SRC
+is recorded in a SQLite journal with its size, mtime and state; parallel
+workers copy pending files while hashing the stream (blake2b), and a file is
+only marked done after the destination filesystem has been synced, so a
+journal entry always means the bytes are on disk.
+
+The journal also holds a storage_index of SRC, so a resumed run or a status
+check re-lists only directories whose mtime changed instead of walking the
+whole tree again. Files that already exist at the destination with the
+right size (e.g. from an earlier rsync) are hashed on both sides and adopted
+instead of copied.
+
+"Complete" (exit 0 from status) means: no run in progress, the source scan
+is up to date, every source file and symlink has a verified copy that still
+matches the source's size and mtime (re-checked per file, which catches
+files rewritten in place), and every source directory - empty ones included -
+exists at the destination. Sockets, FIFOs and device nodes are not copied;
+they are marked failed, so the migration never reports complete with them.
+`verify` re-reads the destination and checks it against the journal hashes.
+
+Usage:
+    migration_engine.py run SRC DST [--workers 4] [--max-mbps 0] [--idle] [--rescan]
+    migration_engine.py status SRC DST [--no-scan]
+    migration_engine.py verify SRC DST
+"""
+
+import argparse
+import ctypes
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import storage_index
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+JOURNAL_DIR = Path(os.environ.get("MIGRATION_JOURNAL_DIR", HOMELAB_DIR / "data" / "migrations"))
+
+DEFAULT_WORKERS = 4
+COPY_BLOCK = 1024 * 1024
+HASH_DIGEST_SIZE = 20
+TEMP_SUFFIX = ".migrate-tmp"
+CHECKPOINT_SECONDS = 5       # sync destination + commit done marks this often
+PROGRESS_SECONDS = 15
+HEARTBEAT_STALE = 60         # a run whose heartbeat is older than this is considered dead
+MAX_PASSES = 3               # re-copy passes for files that changed while being copied
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# JOURNAL
+# ============================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    rel TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    hash TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_state ON files (state);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+
+def journal_path(src: str, dst: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{src}__{dst}").strip("_")
+    return JOURNAL_DIR / f"{slug}.db"
+
+
+class Journal:
+    def __init__(self, path: Path, src: str, dst: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.src, self.dst = src, dst
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.index = storage_index.StorageIndex(conn=self.conn)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def put(self, **values):
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", values.items())
+
+    def _on_change(self, rel_dir: str, files):
+        """storage_index callback: reconcile the journal rows of one directory."""
+        known = {rel: (size, mtime_ns) for rel, size, mtime_ns in self.conn.execute(
+            "SELECT rel, size, mtime_ns FROM files WHERE dir = ?", (rel_dir,))}
+        present = set()
+        for name, size, mtime_ns, mode in files or ():
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            present.add(rel)
+            if known.get(rel) != (size, mtime_ns):
+                self.conn.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,NULL,NULL)",
+                                  (rel, rel_dir, size, mtime_ns, mode, PENDING))
+        gone = [(rel,) for rel in known if rel not in present]
+        self.conn.executemany("DELETE FROM files WHERE rel = ?", gone)
+
+    def scan(self, rescan: bool = False) -> dict:
+        if rescan:
+            self.index.invalidate(self.src)
+        result = self.index.refresh(self.src, on_change=self._on_change)
+        with self.conn:
+            self.put(scanned=time.time())
+        return result
+
+    def counts(self) -> dict:
+        counts = {state: (0, 0) for state in (PENDING, DONE, FAILED)}
+        for state, files, size in self.conn.execute(
+                "SELECT state, COUNT(*), COALESCE(SUM(size), 0) FROM files GROUP BY state"):
+            counts[state] = (files, size)
+        return counts
+
+    def running_pid(self):
+        pid, heartbeat = self.get("pid"), self.get("heartbeat", 0)
+        if not pid or time.time() - heartbeat > HEARTBEAT_STALE:
+            return None
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return pid
+
+# ============================================
+# COPY
+# ============================================
+
+class RateLimiter:
+    """Shared bandwidth cap across worker threads."""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self.lock = threading.Lock()
+        self.next_free = time.monotonic()
+
+    def consume(self, n: int):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_free)
+            self.next_free = start + n / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+def hash_file(path: str, limiter: RateLimiter = None) -> str:
+    digest = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(COPY_BLOCK)
+            if not block:
+                break
+            if limiter:
+                limiter.consume(len(block))
+            digest.update(block)
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return digest.hexdigest()
+
+
+def copy_file(src: str, dst: str, limiter: RateLimiter) -> str:
+    """
+    Copy src to dst via a temp name, hashing the stream; returns the hash.
+    Not fsync'ed per file - the caller syncs the filesystem before trusting it.
+    """
+    tmp = dst + TEMP_SUFFIX
+    digest = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            while True:
+                block = fin.read(COPY_BLOCK)
+                if not block:
+                    break
+                limiter.consume(len(block))
+                digest.update(block)
+                fout.write(block)
+            os.posix_fadvise(fin.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        os.rename(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return digest.hexdigest()
+
+
+def link_digest(target: str) -> str:
+    """Journal hash of a symlink: its target path."""
+    return hashlib.blake2b(os.fsencode(target), digest_size=HASH_DIGEST_SIZE).hexdigest()
+
+
+def copy_symlink(src: str, dst: str) -> str:
+    """Recreate the symlink src at dst (via a temp name); returns its hash."""
+    target = os.readlink(src)
+    tmp = dst + TEMP_SUFFIX
+    try:
+        os.unlink(tmp)
+    except FileNotFoundError:
+        pass
+    os.symlink(target, tmp)
+    try:
+        os.rename(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return link_digest(target)
+
+
+def migrate_one(src_root: str, dst_root: str, rel: str, size: int, mtime_ns: int, mode: int,
+                limiter: RateLimiter) -> tuple:
+    """Worker: returns (rel, state, hash, bytes_copied, error)."""
+    src, dst = os.path.join(src_root, rel), os.path.join(dst_root, rel)
+    try:
+        st = os.lstat(src)
+        if (st.st_size, st.st_mtime_ns, stat.S_IFMT(st.st_mode)) != (size, mtime_ns, stat.S_IFMT(mode)):
+            return rel, PENDING, None, 0, "changed since scan"
+        copied = 0
+        if stat.S_ISLNK(mode):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            digest = copy_symlink(src, dst)
+        elif not stat.S_ISREG(mode):
+            return rel, FAILED, None, 0, f"unsupported file type {stat.filemode(mode)}"
+        else:
+            try:
+                existing = os.stat(dst)
+            except FileNotFoundError:
+                existing = None
+            digest = None
+            if existing is not None and existing.st_size == size:
+                # Left over from rsync or a run that died before its checkpoint
+                digest = hash_file(src, limiter)
+                if hash_file(dst, limiter) != digest:
+                    digest = None
+            if digest is None:
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                digest = copy_file(src, dst, limiter)
+                copied = size
+        st = os.lstat(src)
+        if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+            return rel, PENDING, None, copied, "changed during copy"
+        if not stat.S_ISLNK(mode):
+            os.chmod(dst, mode & 0o7777)
+        if os.geteuid() == 0:
+            os.chown(dst, st.st_uid, st.st_gid, follow_symlinks=False)
+        os.utime(dst, ns=(st.st_atime_ns, mtime_ns), follow_symlinks=False)
+        return rel, DONE, digest, copied, None
+    except FileNotFoundError:
+        return rel, PENDING, None, 0, "source vanished"
+    except OSError as e:
+        return rel, FAILED, None, 0, str(e)
+
+
+def sync_filesystem(path: str):
+    """syncfs() the filesystem holding path (falls back to a global sync)."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syncfs(fd) != 0:
+            os.sync()
+    except (OSError, AttributeError):
+        os.sync()
+    finally:
+        os.close(fd)
+
+
+class Progress:
+    def __init__(self, total_files: int, total_bytes: int):
+        self.total_files, self.total_bytes = total_files, total_bytes
+        self.files = self.bytes = self.copied = 0
+        self.started = self.last = time.monotonic()
+        self.last_bytes = 0
+        self.rate = None
+
+    def add(self, size: int, copied: int):
+        self.files += 1
+        self.bytes += size
+        self.copied += copied
+
+    def report(self, force: bool = False) -> dict:
+        now = time.monotonic()
+        if not force and now - self.last < PROGRESS_SECONDS:
+            return None
+        instant = (self.bytes - self.last_bytes) / max(now - self.last, 1e-6)
+        self.rate = instant if self.rate is None else 0.7 * self.rate + 0.3 * instant
+        self.last, self.last_bytes = now, self.bytes
+        remaining = self.total_bytes - self.bytes
+        eta = remaining / self.rate if self.rate else None
+        logger.info(f"{self.files}/{self.total_files} files, "
+                    f"{self.bytes / 1e9:.2f}/{self.total_bytes / 1e9:.2f} GB, "
+                    f"{self.rate / 1e6:.1f} MB/s, ETA {_duration(eta)}")
+        return {"rate": self.rate, "eta": eta}
+
+
+def _duration(seconds) -> str:
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+def missing_dirs(journal: Journal) -> list:
+    """Indexed source directories (empty ones included) absent at the destination."""
+    return [rel for (rel,) in journal.conn.execute(
+                "SELECT path FROM dirs WHERE root = ? ORDER BY path", (journal.src,))
+            if not os.path.isdir(os.path.join(journal.dst, rel))]
+
+
+def create_dirs(journal: Journal) -> list:
+    """Create missing destination directories with the source's mode; returns those still missing."""
+    for rel in missing_dirs(journal):
+        try:
+            st = os.stat(os.path.join(journal.src, rel))
+            os.makedirs(os.path.join(journal.dst, rel), exist_ok=True)
+            os.chmod(os.path.join(journal.dst, rel), st.st_mode & 0o7777)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Failed to create directory {rel}: {e}")
+    return missing_dirs(journal)
+
+
+def run(journal: Journal, args) -> int:
+    other = journal.running_pid()
+    if other and other != os.getpid():
+        logger.error(f"Migration already running (pid {other})")
+        return 2
+    if args.idle and not storage_index.set_idle_io_priority():
+        logger.warning("Could not set idle IO priority")
+    with journal.conn:
+        journal.put(pid=os.getpid(), heartbeat=time.time())
+
+    scan = journal.scan(args.rescan)
+    logger.info(f"Scanned {journal.src}: {scan['dirs']} dirs, {scan['listed']} re-listed "
+                f"({scan['seconds']:.1f}s)")
+    counts = journal.counts()
+    todo_files = counts[PENDING][0] + counts[FAILED][0]
+    todo_bytes = counts[PENDING][1] + counts[FAILED][1]
+    logger.info(f"{counts[DONE][0]} files already migrated, {todo_files} to go "
+                f"({todo_bytes / 1e9:.2f} GB)")
+
+    limiter = RateLimiter(args.max_mbps * 1e6)
+    progress = Progress(todo_files, todo_bytes)
+    results = []
+    last_checkpoint = time.monotonic()
+
+    def checkpoint():
+        sync_filesystem(journal.dst)
+        with journal.conn:
+            for rel, state, digest, _, error in results:
+                if state == PENDING:
+                    # Re-stat so the next pass copies the current version
+                    try:
+                        st = os.stat(os.path.join(journal.src, rel))
+                        journal.conn.execute("UPDATE files SET size = ?, mtime_ns = ?, state = ?, "
+                                             "error = ? WHERE rel = ?",
+                                             (st.st_size, st.st_mtime_ns, PENDING, error, rel))
+                    except FileNotFoundError:
+                        journal.conn.execute("DELETE FROM files WHERE rel = ?", (rel,))
+                else:
+                    journal.conn.execute("UPDATE files SET state = ?, hash = ?, error = ? WHERE rel = ?",
+                                         (state, digest, error, rel))
+            journal.put(heartbeat=time.time())
+        results.clear()
+
+    interrupted = False
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for _ in range(MAX_PASSES):
+            rows = journal.conn.execute(
+                "SELECT rel, size, mtime_ns, mode FROM files WHERE state != ? ORDER BY rel",
+                (DONE,)).fetchall()
+            if not rows:
+                break
+            inflight = {}
+            rows_iter = iter(rows)
+            try:
+                while True:
+                    while len(inflight) < args.workers * 4:
+                        row = next(rows_iter, None)
+                        if row is None:
+                            break
+                        future = pool.submit(migrate_one, journal.src, journal.dst, *row, limiter)
+                        inflight[future] = row[1]
+                    if not inflight:
+                        break
+                    finished, _ = wait(inflight, timeout=1, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        size = inflight.pop(future)
+                        result = future.result()
+                        results.append(result)
+                        if result[1] == DONE:
+                            progress.add(size, result[3])
+                        elif result[1] == FAILED:
+                            logger.warning(f"Failed {result[0]}: {result[4]}")
+                    if time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                        checkpoint()
+                        last_checkpoint = time.monotonic()
+                    stats = progress.report()
+                    if stats:
+                        with journal.conn:
+                            journal.put(rate=stats["rate"], eta=stats["eta"])
+            except KeyboardInterrupt:
+                logger.warning("Interrupted - finishing files in flight and checkpointing")
+                interrupted = True
+                for future in inflight:
+                    future.cancel()
+                try:
+                    for future in inflight:
+                        if not future.cancelled():
+                            results.append(future.result())
+                except KeyboardInterrupt:
+                    pass   # checkpoint what finished; the rest is adopted or recopied next run
+            checkpoint()
+            if interrupted:
+                break
+
+    missing = [] if interrupted else create_dirs(journal)
+    progress.report(force=True)
+    with journal.conn:
+        journal.put(pid=None, rate=None, eta=None)
+    counts = journal.counts()
+    logger.info(f"Copied {progress.copied / 1e9:.2f} GB; done {counts[DONE][0]}, "
+                f"pending {counts[PENDING][0]}, failed {counts[FAILED][0]}")
+    for rel in missing[:10]:
+        logger.warning(f"Directory missing at destination: {rel}")
+    if interrupted:
+        return 130
+    return 0 if counts[PENDING][0] == 0 and counts[FAILED][0] == 0 and not missing else 1
+
+# ============================================
+# STATUS / VERIFY
+# ============================================
+
+def restat_done(journal: Journal) -> int:
+    """
+    Re-stat every migrated source file; ones whose size or mtime changed
+    (e.g. rewritten in place, which does not touch the directory mtime the
+    scan relies on) go back to pending. Returns how many changed.
+    """
+    changed = []
+    for rel, size, mtime_ns in journal.conn.execute(
+            "SELECT rel, size, mtime_ns FROM files WHERE state = ?", (DONE,)).fetchall():
+        try:
+            st = os.lstat(os.path.join(journal.src, rel))
+        except FileNotFoundError:
+            changed.append((None, None, rel))
+            continue
+        if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+            changed.append((st.st_size, st.st_mtime_ns, rel))
+    with journal.conn:
+        journal.conn.executemany("DELETE FROM files WHERE rel = ?",
+                                 [(rel,) for size, _, rel in changed if size is None])
+        journal.conn.executemany("UPDATE files SET size = ?, mtime_ns = ?, state = ?, hash = NULL, "
+                                 "error = 'changed after copy' WHERE rel = ?",
+                                 [(size, mtime_ns, PENDING, rel) for size, mtime_ns, rel in changed
+                                  if size is not None])
+    return len(changed)
+
+
+def status(journal: Journal, args) -> int:
+    pid = journal.running_pid()
+    if not pid and not args.no_scan:
+        journal.scan()
+    counts = journal.counts()
+    total_files = sum(f for f, _ in counts.values())
+    total_bytes = sum(b for _, b in counts.values())
+    done_files, done_bytes = counts[DONE]
+    pct = done_bytes / total_bytes * 100 if total_bytes else 100.0
+    print(f"Source:      {journal.src}")
+    print(f"Destination: {journal.dst}")
+    print(f"Status:      {'RUNNING (pid %d)' % pid if pid else 'NOT RUNNING'}")
+    print(f"Files:       {done_files}/{total_files} verified, "
+          f"{counts[FAILED][0]} failed, {counts[PENDING][0]} pending")
+    print(f"Data:        {done_bytes / 1e9:.2f}/{total_bytes / 1e9:.2f} GB ({pct:.1f}%)")
+    rate, eta = journal.get("rate"), journal.get("eta")
+    if pid and rate:
+        print(f"Throughput:  {rate / 1e6:.1f} MB/s, ETA {_duration(eta)}")
+    scanned = journal.get("scanned")
+    if scanned:
+        print(f"Last scan:   {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(scanned))}")
+    for rel, error in journal.conn.execute(
+            "SELECT rel, error FROM files WHERE state = ? LIMIT 10", (FAILED,)):
+        print(f"  failed: {rel}: {error}")
+    missing = missing_dirs(journal)
+    if missing:
+        print(f"Directories: {len(missing)} missing at destination (e.g. {missing[0]})")
+    complete = not pid and scanned and done_files == total_files and not missing
+    if complete and not args.no_scan:
+        changed = restat_done(journal)
+        if changed:
+            print(f"Changed:     {changed} files modified since they were copied")
+            complete = False
+    print("COMPLETE" if complete else "INCOMPLETE")
+    return 0 if complete else 1
+
+
+def verify(journal: Journal, args) -> int:
+    """Re-hash every migrated file at the destination; mismatches go back to pending."""
+    if journal.running_pid():
+        logger.error("Migration is running; verify after it finishes")
+        return 2
+    rows = journal.conn.execute("SELECT rel, hash, mode FROM files WHERE state = ?", (DONE,)).fetchall()
+    bad = []
+
+    def check(row):
+        rel, expected, mode = row
+        path = os.path.join(journal.dst, rel)
+        try:
+            if stat.S_ISLNK(mode):
+                return rel, link_digest(os.readlink(path)) == expected
+            return rel, hash_file(path) == expected
+        except OSError:
+            return rel, False
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for i, (rel, ok) in enumerate(pool.map(check, rows), 1):
+            if not ok:
+                bad.append(rel)
+                logger.warning(f"Mismatch: {rel}")
+            if i % 10000 == 0:
+                logger.info(f"Verified {i}/{len(rows)}")
+    with journal.conn:
+        journal.conn.executemany("UPDATE files SET state = ?, hash = NULL WHERE rel = ?",
+                                 [(PENDING, rel) for rel in bad])
+    logger.info(f"Verified {len(rows)} files, {len(bad)} mismatched")
+    return 0 if not bad else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Resumable verified directory migration")
+    parser.add_argument("--journal", type=Path, help="Journal file (default: derived from SRC/DST)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Copy (or resume copying) SRC to DST")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p.add_argument("--max-mbps", type=float, default=0, help="Bandwidth cap in MB/s (0 = none)")
+    p.add_argument("--idle", action="store_true", help="Run at idle IO priority")
+    p.add_argument("--rescan", action="store_true",
+                   help="Re-list every source directory (catches files rewritten in place)")
+    p = sub.add_parser("status", help="Progress from the journal; exit 0 when complete")
+    p.add_argument("--no-scan", action="store_true", help="Do not check the source for changes")
+    p = sub.add_parser("verify", help="Re-hash the destination against the journal")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    for p in sub.choices.values():
+        p.add_argument("src")
+        p.add_argument("dst")
+
+    args = parser.parse_args()
+    src, dst = str(Path(args.src).resolve()), str(Path(args.dst).resolve())
+    if not os.path.isdir(src):
+        logger.error(f"Source is not a directory: {src}")
+        return 2
+    if args.command == "run":
+        os.makedirs(dst, exist_ok=True)
+    elif not os.path.isdir(dst):
+        logger.error(f"Destination is not a directory: {dst}")
+        return 2
+
+    journal = Journal(args.journal or journal_path(src, dst), src, dst)
+    try:
+        if args.command == "run":
+            return run(journal, args)
+        if args.command == "status":
+            return status(journal, args)
+        return verify(journal, args)
+    finally:
+        journal.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
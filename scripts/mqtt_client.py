@@ -0,0 +1,102 @@
+"""
+Shared MQTT connection helper for the long-running homelab services.
+
+Wraps paho-mqtt so each service gets the same broker settings, credentials,
+last-will availability topic and reconnect behaviour, and works with both the
+1.x and 2.x paho callback APIs. paho-mqtt is imported lazily so scripts that
+only import helpers from a service module do not need it installed.
+"""
+
+import json
+import logging
+import os
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+MQTT_HOST = os.environ.get("MQTT_HOST", "127.0.0.1")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_USER = os.environ.get("MQTT_USER", "homeassistant")
+MQTT_PASS = os.environ.get("MQTT_PASS", "YOUR_MQTT_PASSWORD")
+KEEPALIVE = 30
+DISCOVERY_PREFIX = os.environ.get("MQTT_DISCOVERY_PREFIX", "homeassistant")
+
+logger = logging.getLogger(__name__)
+
+
+def _paho():
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise RuntimeError("paho-mqtt not installed. Run: pip install paho-mqtt")
+    return mqtt
+
+
+def create_client(client_id: str, host: str = MQTT_HOST, port: int = MQTT_PORT,
+                  username: str = MQTT_USER, password: str = MQTT_PASS,
+                  availability_topic: str = None, subscriptions=(), on_message=None):
+    """
+    Create a connected client running its network loop in a background
+    thread. Subscriptions are (re)made on every connect, and if an
+    availability topic is given it is set to "online" on connect and to
+    "offline" by the broker if the client drops.
+
+    on_message(topic, payload) receives the topic as str and payload as bytes.
+    """
+    mqtt = _paho()
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    else:
+        client = mqtt.Client(client_id=client_id)
+
+    if username:
+        client.username_pw_set(username, password)
+    if availability_topic:
+        client.will_set(availability_topic, "offline", qos=1, retain=True)
+    client.reconnect_delay_set(min_delay=1, max_delay=30)
+
+    def on_connect(client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            logger.error(f"MQTT connect to {host}:{port} refused: {reason_code}")
+            return
+        logger.info(f"Connected to MQTT broker {host}:{port}")
+        for topic, qos in subscriptions:
+            client.subscribe(topic, qos)
+        if availability_topic:
+            client.publish(availability_topic, "online", qos=1, retain=True)
+
+    def on_disconnect(client, userdata, *args):
+        # paho 1.x passes (rc,), 2.x (flags, reason_code, properties)
+        reason_code = args[1] if len(args) > 1 else args[0]
+        if reason_code != 0:
+            logger.warning(f"Disconnected from MQTT broker ({reason_code}), reconnecting")
+
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+    if on_message is not None:
+        client.on_message = lambda c, u, msg: on_message(msg.topic, msg.payload)
+
+    client.connect(host, port, KEEPALIVE)
+    client.loop_start()
+    return client
+
+
+def close_client(client, availability_topic: str = None):
+    """Publish "offline" (if used), then disconnect cleanly."""
+    if availability_topic:
+        client.publish(availability_topic, "offline", qos=1, retain=True).wait_for_publish(2)
+    client.disconnect()
+    client.loop_stop()
+
+
+def publish_discovery(client, component: str, object_id: str, config: dict, device: dict = None):
+    """
+    Publish a retained MQTT discovery config so HA creates (or updates) the
+    entity <component>.<object_id>. unique_id defaults to object_id.
+    """
+    payload = {"unique_id": object_id, "object_id": object_id, **config}
+    if device:
+        payload["device"] = device
+    client.publish(f"{DISCOVERY_PREFIX}/{component}/{object_id}/config",
+                   json.dumps(payload), qos=1, retain=True)
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+Notification Gateway - coalesced, rate-limited alerts for Telegram and HA
+
+Automations publish alerts to MQTT (via script.notify_gateway) instead of
+calling notify.* directly:
+
+    topic:   notify_gateway/alert
+    payload: {"camera": "backyard", "event_id": "...", "title": "...",
+              "message": "...", "snapshot": "/local/snapshots/x.jpg" or URL,
+              "targets": ["telegram", "mobile_app_person1"],
+              "priority": "critical" | "normal", "data": {... notify data ...}}
+
+Alerts are grouped by camera (or event_id / title when there is no camera).
+The first alert of a group is delivered at once; alerts for the same group
+arriving within COALESCE_WINDOW are merged and delivered as one notification
+when the window closes, so a burst of Frigate events on one camera costs one
+message and one image upload per window instead of one per event.
+
+Each notification carries one snapshot, downscaled to SNAPSHOT_MAX_SIDE and
+written under www/snapshots/notify (mobile apps load it from /local/...,
+Telegram gets the bytes via sendPhoto). Every target has its own queue and
+worker: Telegram is paced by a token bucket matching its per-chat limits and
+honours 429 retry_after; transient failures are retried with exponential
+backoff and jitter.
+
+Configuration (environment):
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID   Telegram target (skipped if unset)
+    TELEGRAM_API_URL                       default https://api.telegram.org
+    HA_URL, HA_TOKEN                       for notify.<target> service calls
+
+Usage:
+    notification_gateway.py [--window 10] [--telegram-api http://127.0.0.1:8081]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import re
+import signal
+import sys
+import time
+from pathlib import Path
+
+import ha_client
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+WWW_DIR = HOMELAB_DIR / "homeassistant" / "www"
+SNAPSHOT_DIR = WWW_DIR / "snapshots" / "notify"
+
+ALERT_TOPIC = "notify_gateway/alert"
+AVAILABILITY_TOPIC = "notify_gateway/status"
+CLIENT_ID = "notification-gateway"
+
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_PER_MINUTE = 20     # Telegram's limit for one group chat
+TELEGRAM_BURST = 3
+TELEGRAM_CAPTION_LIMIT = 1024
+TELEGRAM_TEXT_LIMIT = 4096
+
+COALESCE_WINDOW = 10         # seconds
+MAX_MERGED_LINES = 4
+SNAPSHOT_MAX_SIDE = 1280
+SNAPSHOT_QUALITY = 80
+MAX_QUEUE = 100              # per target; oldest normal-priority entries are dropped first
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+REQUEST_TIMEOUT = 20
+STATS_INTERVAL = 300
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise RuntimeError("aiohttp not installed. Run: pip install aiohttp")
+    return aiohttp
+
+# ============================================
+# COALESCING
+# ============================================
+
+PRIORITIES = {"normal": 0, "critical": 1}
+
+
+def alert_key(alert: dict) -> str:
+    return alert.get("camera") or alert.get("event_id") or alert.get("title") or "default"
+
+
+def _unique(items) -> list:
+    result = []
+    for item in items:
+        if item and item not in result:
+            result.append(item)
+    return result
+
+
+def merge_alerts(alerts: list) -> dict:
+    """One notification from alerts about the same camera/event."""
+    top = max(alerts, key=lambda a: PRIORITIES.get(a.get("priority"), 0))
+    snapshot = next((a["snapshot"] for a in reversed(alerts) if a.get("snapshot")), None)
+    return {"key": alert_key(top), "title": top.get("title", ""),
+            "lines": _unique((a.get("message") or "").strip() for a in alerts),
+            "priority": top.get("priority", "normal"),
+            "targets": _unique(t for a in alerts for t in a.get("targets") or ()),
+            "snapshot": snapshot, "data": top.get("data") or {}, "count": len(alerts)}
+
+
+def combine(queued: dict, newer: dict) -> dict:
+    """Fold a notification into one for the same key still waiting in a queue."""
+    top = newer if PRIORITIES.get(newer["priority"], 0) >= PRIORITIES.get(queued["priority"], 0) else queued
+    merged = {**queued, **newer, "title": top["title"], "priority": top["priority"], "data": top["data"],
+              "lines": _unique(queued["lines"] + newer["lines"]),
+              "count": queued["count"] + newer["count"]}
+    if not newer.get("image"):
+        for field in ("image", "image_url"):
+            if queued.get(field):
+                merged[field] = queued[field]
+    return merged
+
+
+def render_message(notification: dict) -> str:
+    lines = notification["lines"]
+    shown = lines[-MAX_MERGED_LINES:]
+    message = "\n".join(shown)
+    if notification["count"] > 1:
+        hidden = len(lines) - len(shown)
+        message += f"\n({notification['count']} alerts" + (f", {hidden} older not shown)" if hidden else ")")
+    return message
+
+
+class Coalescer:
+    """Leading edge immediately, then at most one merged notification per window per key."""
+
+    def __init__(self, window: float, emit):
+        self.window = window
+        self.emit = emit
+        self.last_sent = {}
+        self.pending = {}
+
+    def add(self, alert: dict):
+        key = alert_key(alert)
+        now = time.monotonic()
+        if key in self.pending:
+            self.pending[key].append(alert)
+            return
+        last = self.last_sent.get(key)
+        if last is None or now - last >= self.window:
+            self.last_sent[key] = now
+            self.emit(merge_alerts([alert]))
+            return
+        self.pending[key] = [alert]
+        asyncio.get_running_loop().call_later(last + self.window - now, self._flush, key)
+
+    def _flush(self, key: str):
+        alerts = self.pending.pop(key, None)
+        if alerts:
+            self.last_sent[key] = time.monotonic()
+            self.emit(merge_alerts(alerts))
+
+    def expire(self):
+        cutoff = time.monotonic() - self.window
+        for key in [k for k, t in self.last_sent.items() if t < cutoff and k not in self.pending]:
+            del self.last_sent[key]
+
+# ============================================
+# SNAPSHOTS
+# ============================================
+
+def _downscale(data: bytes) -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((SNAPSHOT_MAX_SIDE, SNAPSHOT_MAX_SIDE))
+    out = io.BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=SNAPSHOT_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def local_path(ref: str):
+    """Map HA's /local/... and /config/... references onto this host."""
+    if ref.startswith("/local/"):
+        return WWW_DIR / ref[len("/local/"):]
+    if ref.startswith("/config/"):
+        return HOMELAB_DIR / "homeassistant" / ref[len("/config/"):]
+    return Path(ref)
+
+
+async def load_snapshot(session, ref: str) -> bytes:
+    if ref.startswith(("http://", "https://")):
+        async with session.get(ref, timeout=_aiohttp().ClientTimeout(total=REQUEST_TIMEOUT)) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+    return await asyncio.to_thread(local_path(ref).read_bytes)
+
+# ============================================
+# DELIVERY
+# ============================================
+
+class RetryAfter(Exception):
+    def __init__(self, seconds: float):
+        super().__init__(f"retry after {seconds}s")
+        self.seconds = seconds
+
+
+class PermanentError(Exception):
+    """The request itself is wrong; retrying will not help."""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Target:
+    """Queue + worker for one destination; send(notification) does the actual call."""
+
+    def __init__(self, name: str, stats: dict):
+        self.name = name
+        self.stats = stats
+        self.queue = []
+        self.wakeup = asyncio.Event()
+
+    def put(self, notification: dict):
+        for i, queued in enumerate(self.queue):
+            if queued["key"] == notification["key"]:
+                # Still waiting (rate limit or retries) - send one combined message instead
+                self.queue[i] = combine(queued, notification)
+                self.stats["coalesced"] += notification["count"]
+                return
+        if len(self.queue) >= MAX_QUEUE:
+            victims = [n for n in self.queue if n["priority"] != "critical"] or self.queue
+            self.queue.remove(victims[0])
+            self.stats["dropped"] += 1
+            logger.warning(f"{self.name}: queue full, dropped '{victims[0]['title']}'")
+        self.queue.append(notification)
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            notification = self.queue.pop(0)
+            await self.deliver(notification)
+
+    async def deliver(self, notification: dict):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                await self.send(notification)
+                self.stats["sent"] += 1
+                return
+            except RetryAfter as e:
+                self.stats["rate_limited"] += 1
+                delay = e.seconds
+            except PermanentError as e:
+                logger.error(f"{self.name}: giving up on '{notification['title']}': {e}")
+                self.stats["failed"] += 1
+                return
+            except Exception as e:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                logger.warning(f"{self.name}: attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+        logger.error(f"{self.name}: dropped '{notification['title']}' after {MAX_ATTEMPTS} attempts")
+        self.stats["failed"] += 1
+
+    async def send(self, notification: dict):
+        raise NotImplementedError
+
+
+class TelegramTarget(Target):
+    def __init__(self, stats: dict, session, api_url: str, token: str, chat_id: str):
+        super().__init__("telegram", stats)
+        self.session = session
+        self.base = f"{api_url.rstrip('/')}/bot{token}"
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(TELEGRAM_PER_MINUTE / 60, TELEGRAM_BURST)
+
+    async def send(self, notification: dict):
+        aiohttp = _aiohttp()
+        text = f"{notification['title']}\n{render_message(notification)}".strip()
+        image = notification.get("image")
+        await self.bucket.take()
+        if image:
+            form = aiohttp.FormData()
+            form.add_field("chat_id", str(self.chat_id))
+            form.add_field("caption", text[:TELEGRAM_CAPTION_LIMIT])
+            form.add_field("photo", image, filename="snapshot.jpg", content_type="image/jpeg")
+            request = self.session.post(f"{self.base}/sendPhoto", data=form,
+                                        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        else:
+            request = self.session.post(f"{self.base}/sendMessage",
+                                        json={"chat_id": self.chat_id, "text": text[:TELEGRAM_TEXT_LIMIT]},
+                                        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        async with request as resp:
+            try:
+                body = await resp.json(content_type=None)
+            except ValueError:
+                body = {}
+            if resp.status == 429:
+                raise RetryAfter((body.get("parameters") or {}).get("retry_after", 5))
+            if resp.status >= 500:
+                raise ConnectionError(f"HTTP {resp.status}")
+            if resp.status >= 400 or not body.get("ok", False):
+                raise PermanentError(body.get("description", f"HTTP {resp.status}"))
+        if image:
+            self.stats["image_bytes"] += len(image)
+
+
+class HATarget(Target):
+    """notify.<service> through the shared HA websocket client."""
+
+    def __init__(self, service: str, stats: dict, ha):
+        super().__init__(service, stats)
+        self.service = service
+        self.ha = ha
+
+    async def send(self, notification: dict):
+        data = dict(notification["data"])
+        if notification.get("image_url"):
+            data["image"] = notification["image_url"]
+        try:
+            await self.ha.call(notification, self.service, data)
+        except ha_client.HAError as e:
+            if e.code in ("not_found", "invalid_format", "unauthorized"):
+                raise PermanentError(str(e))
+            raise
+
+
+class HAConnection:
+    """Connects on first use so the gateway starts even while HA is down."""
+
+    def __init__(self):
+        self.client = None
+        self.lock = asyncio.Lock()
+
+    async def call(self, notification: dict, service: str, data: dict):
+        async with self.lock:
+            if self.client is None:
+                client = ha_client.HAClient()
+                try:
+                    await client.connect()
+                except Exception:
+                    await client.close()
+                    raise
+                self.client = client
+        await self.client.call_service("notify", service, {
+            "title": notification["title"], "message": render_message(notification), "data": data})
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+
+# ============================================
+# GATEWAY
+# ============================================
+
+class Gateway:
+    def __init__(self, window: float, telegram_api: str):
+        aiohttp = _aiohttp()
+        self.session = aiohttp.ClientSession()
+        self.ha = HAConnection()
+        self.stats = {"received": 0, "invalid": 0, "notifications": 0, "coalesced": 0,
+                      "sent": 0, "failed": 0, "retries": 0, "rate_limited": 0, "dropped": 0,
+                      "image_bytes": 0, "unknown_target": 0}
+        self.targets = {}
+        self.tasks = []
+        if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+            self._add(TelegramTarget(self.stats, self.session, telegram_api,
+                                     TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID))
+        else:
+            logger.info("TELEGRAM_BOT_TOKEN/TELEGRAM_CHAT_ID not set - Telegram alerts disabled")
+        self.coalescer = Coalescer(window, self._emit)
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+
+    def _add(self, target: Target):
+        self.targets[target.name] = target
+        self.tasks.append(asyncio.create_task(target.run()))
+
+    def submit(self, payload: bytes):
+        try:
+            alert = json.loads(payload)
+            if not isinstance(alert, dict) or not (alert.get("title") or alert.get("message")):
+                raise ValueError("alert needs a title or message")
+        except ValueError as e:
+            self.stats["invalid"] += 1
+            logger.warning(f"Ignoring invalid alert: {e}")
+            return
+        self.stats["received"] += 1
+        self.coalescer.add(alert)
+
+    def _emit(self, notification: dict):
+        self.stats["notifications"] += 1
+        self.stats["coalesced"] += notification["count"] - 1
+        asyncio.create_task(self._dispatch(notification))
+
+    async def _dispatch(self, notification: dict):
+        if notification["snapshot"]:
+            try:
+                raw = await load_snapshot(self.session, notification["snapshot"])
+                image = await asyncio.to_thread(_downscale, raw)
+                name = f"{re.sub(r'[^A-Za-z0-9_-]', '_', notification['key'])}_{int(time.time() * 1000)}.jpg"
+                await asyncio.to_thread((SNAPSHOT_DIR / name).write_bytes, image)
+                notification["image"] = image
+                notification["image_url"] = f"/local/{(SNAPSHOT_DIR / name).relative_to(WWW_DIR)}"
+            except Exception as e:
+                logger.warning(f"Snapshot {notification['snapshot']} unavailable ({e}), sending without")
+                if notification["snapshot"].startswith(("http://", "https://", "/local/")):
+                    notification["image_url"] = notification["snapshot"]
+        for name in notification["targets"]:
+            target = self.targets.get(name)
+            if target is None and name != "telegram":
+                target = HATarget(name, self.stats, self.ha)
+                self._add(target)
+            if target is None:
+                self.stats["unknown_target"] += 1
+                continue
+            target.put(notification)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.ha.close()
+        await self.session.close()
+
+
+async def serve(args):
+    loop = asyncio.get_running_loop()
+    gateway = Gateway(args.window, args.telegram_api)
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    client = mqtt_client.create_client(
+        CLIENT_ID, host=args.host, port=args.port, availability_topic=AVAILABILITY_TOPIC,
+        subscriptions=[(ALERT_TOPIC, 1)],
+        on_message=lambda topic, payload: loop.call_soon_threadsafe(gateway.submit, payload))
+    # script.notify_gateway falls back to direct notify calls while this is off
+    mqtt_client.publish_discovery(client, "binary_sensor", "notification_gateway", {
+        "name": "Notification Gateway", "state_topic": AVAILABILITY_TOPIC,
+        "payload_on": "online", "payload_off": "offline", "device_class": "connectivity"})
+    logger.info(f"Listening for alerts on {ALERT_TOPIC} (coalescing window {args.window}s)")
+
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), STATS_INTERVAL)
+            except asyncio.TimeoutError:
+                gateway.coalescer.expire()
+                s = gateway.stats
+                queued = sum(len(t.queue) for t in gateway.targets.values())
+                logger.info(f"Received {s['received']}, notifications {s['notifications']} "
+                            f"(coalesced {s['coalesced']}), sent {s['sent']}, failed {s['failed']}, "
+                            f"retries {s['retries']}, rate limited {s['rate_limited']}, queued {queued}")
+    finally:
+        mqtt_client.close_client(client, AVAILABILITY_TOPIC)
+        await gateway.close()
+    logger.info("Notification gateway stopped")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Coalescing, rate-limited notification gateway")
+    parser.add_argument("--host", default=mqtt_client.MQTT_HOST)
+    parser.add_argument("--port", type=int, default=mqtt_client.MQTT_PORT)
+    parser.add_argument("--window", type=float, default=COALESCE_WINDOW,
+                        help="Seconds during which alerts for one camera are merged")
+    parser.add_argument("--telegram-api", default=TELEGRAM_API_URL,
+                        help="Telegram Bot API base URL (point at fake_telegram_server.py to test)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except (RuntimeError, OSError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Recorder Growth Analyzer - where home-assistant_v2.db grows, and what to exclude
+
+Opens a COPY of the recorder database read-only and streams through the
+states and state_attributes tables in keyset-paginated chunks (memory stays
+bounded by the number of entities, not rows). It aggregates per entity:
+
+  - state rows and bytes written per day
+  - attribute sets created per day and their bytes, plus which attribute
+    keys change on nearly every update (e.g. a `last_updated: now()`
+    attribute that forces a new state_attributes row each time)
+
+and per event type. It then proposes a recorder block for configuration.yaml:
+entities/globs to exclude (high-churn entities without long-term
+statistics), attributes to drop, purge_keep_days and commit_interval, with
+the estimated database size and write volume before and after.
+
+Copy the database first (HA keeps it open and in WAL mode):
+    sqlite3 /opt/homelab/homeassistant/home-assistant_v2.db ".backup /tmp/ha.db"
+
+Usage:
+    recorder_analyzer.py /tmp/ha.db [--top 25] [--target-mb 500] [--json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import automation_analyzer
+import recorder_db
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HA_CONFIG_DIR = automation_analyzer.HA_CONFIG_DIR
+CHUNK_SIZE = 50000
+
+# Exclusion candidates: written more often than this and at least this share
+# of all state bytes
+EXCLUDE_MIN_ROWS_PER_DAY = 1440
+EXCLUDE_MIN_SHARE = 0.01
+
+# An attribute is "volatile" when it changes in this share of new attribute sets
+VOLATILE_KEY_SHARE = 0.5
+
+# Fallback on-disk sizes when SQLite has no dbstat table
+STATE_ROW_BYTES = 110
+ATTRIBUTE_OVERHEAD = 1.2
+
+# HA defaults
+DEFAULT_KEEP_DAYS = 10
+DEFAULT_COMMIT_INTERVAL = 5
+PROPOSED_COMMIT_INTERVAL = 30
+KEEP_DAYS_OPTIONS = (3, 5, 7, 10, 14)
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# AGGREGATION
+# ============================================
+
+class EntityStats:
+    __slots__ = ("entity_id", "rows", "state_bytes", "first_ts", "last_ts", "attr_sets",
+                 "attr_bytes", "key_changes", "last_attrs")
+
+    def __init__(self, entity_id: str):
+        self.entity_id = entity_id
+        self.rows = 0
+        self.state_bytes = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.attr_sets = 0
+        self.attr_bytes = 0
+        self.key_changes = {}
+        self.last_attrs = None
+
+    @property
+    def state_class(self):
+        return (self.last_attrs or {}).get("state_class")
+
+    def volatile_keys(self) -> dict:
+        """{key: share of new attribute sets in which it changed}"""
+        if self.attr_sets < 2:
+            return {}
+        return {key: n / (self.attr_sets - 1) for key, n in self.key_changes.items()
+                if n / (self.attr_sets - 1) >= VOLATILE_KEY_SHARE}
+
+
+def scan_states(conn, entities: dict, chunk_size: int):
+    """Pass 1: rows, state bytes and time range per entity."""
+    if recorder_db.has_table(conn, "states_meta"):
+        for metadata_id, entity_id in conn.execute("SELECT metadata_id, entity_id FROM states_meta"):
+            entities[metadata_id] = EntityStats(entity_id)
+        owner = "metadata_id"
+    else:
+        owner = "entity_id"
+    if recorder_db.has_column(conn, "states", "last_updated_ts"):
+        updated = "last_updated_ts"
+    else:
+        # Before schema 32 last_updated is a DATETIME string
+        updated = "CAST(strftime('%s', last_updated) AS REAL)"
+    query = (f"SELECT state_id, {owner}, LENGTH(state), {updated} FROM states "
+             "WHERE state_id > ? ORDER BY state_id LIMIT ?")
+
+    scanned = 0
+    for rows in recorder_db.iter_chunks(conn, query, chunk_size=chunk_size):
+        for _, key, state_len, ts in rows:
+            stats = entities.get(key)
+            if stats is None:
+                stats = entities[key] = EntityStats(str(key))
+            stats.rows += 1
+            stats.state_bytes += state_len or 0
+            if ts is not None:
+                if stats.first_ts is None or ts < stats.first_ts:
+                    stats.first_ts = ts
+                if stats.last_ts is None or ts > stats.last_ts:
+                    stats.last_ts = ts
+        scanned += len(rows)
+        logger.debug(f"states: {scanned} rows")
+    return scanned
+
+
+def scan_attributes(conn, entities: dict, chunk_size: int) -> dict:
+    """
+    Pass 2: attribute sets per entity, in id (creation) order, tracking which
+    keys differ from the entity's previous set.
+    """
+    owner = "metadata_id" if recorder_db.has_table(conn, "states_meta") else "entity_id"
+    query = ("SELECT attributes_id, LENGTH(shared_attrs), shared_attrs FROM state_attributes "
+             "WHERE attributes_id > ? ORDER BY attributes_id LIMIT ?")
+    owners_query = (f"SELECT attributes_id, MIN({owner}) FROM states "
+                    "WHERE attributes_id BETWEEN ? AND ? GROUP BY attributes_id")
+    totals = {"sets": 0, "bytes": 0, "orphaned_sets": 0, "orphaned_bytes": 0}
+
+    for rows in recorder_db.iter_chunks(conn, query, chunk_size=chunk_size):
+        owners = dict(conn.execute(owners_query, (rows[0][0], rows[-1][0])))
+        for attributes_id, size, shared in rows:
+            size = size or 0
+            totals["sets"] += 1
+            totals["bytes"] += size
+            stats = entities.get(owners.get(attributes_id))
+            if stats is None:
+                totals["orphaned_sets"] += 1
+                totals["orphaned_bytes"] += size
+                continue
+            try:
+                attrs = json.loads(shared) if shared else {}
+            except ValueError:
+                attrs = {}
+            previous = stats.last_attrs
+            if previous is not None:
+                for key in attrs.keys() | previous.keys():
+                    if attrs.get(key) != previous.get(key):
+                        stats.key_changes[key] = stats.key_changes.get(key, 0) + 1
+            stats.last_attrs = attrs
+            stats.attr_sets += 1
+            stats.attr_bytes += size
+    return totals
+
+
+def scan_events(conn) -> dict:
+    """{event_type: (rows, data bytes)} - aggregated by SQLite."""
+    if recorder_db.has_table(conn, "event_types"):
+        query = ("SELECT t.event_type, COUNT(*), COALESCE(SUM(LENGTH(d.shared_data)), 0) "
+                 "FROM events e JOIN event_types t ON t.event_type_id = e.event_type_id "
+                 "LEFT JOIN event_data d ON d.data_id = e.data_id GROUP BY e.event_type_id")
+    else:
+        query = ("SELECT event_type, COUNT(*), COALESCE(SUM(LENGTH(event_data)), 0) "
+                 "FROM events GROUP BY event_type")
+    return {event_type: (rows, size) for event_type, rows, size in conn.execute(query)}
+
+
+def disk_factors(conn, state_rows: int, attr_payload: int, event_rows: int) -> dict:
+    """Bytes on disk per state row / per attribute byte / per event row."""
+    sizes = recorder_db.table_bytes(conn)
+    factors = {"state_row": STATE_ROW_BYTES, "attr_byte": ATTRIBUTE_OVERHEAD,
+               "event_row": STATE_ROW_BYTES, "measured": False, "statistics": 0}
+    if not sizes:
+        return factors
+
+    def with_indexes(table):
+        return sizes.get(table, 0) + sum(sizes.get(i, 0) for i in recorder_db.table_indexes(conn, table))
+
+    factors["measured"] = True
+    if state_rows:
+        factors["state_row"] = with_indexes("states") / state_rows
+    if attr_payload:
+        factors["attr_byte"] = with_indexes("state_attributes") / attr_payload
+    if event_rows:
+        factors["event_row"] = (with_indexes("events") + with_indexes("event_data")) / event_rows
+    factors["statistics"] = sum(with_indexes(t) for t in
+                                ("statistics", "statistics_short_term", "statistics_meta"))
+    return factors
+
+# ============================================
+# PROPOSAL
+# ============================================
+
+def current_recorder_config(config_dir: Path) -> dict:
+    config_file = config_dir / "configuration.yaml"
+    if not config_file.exists():
+        return {}
+    secrets = automation_analyzer.load_secrets(config_dir)
+    config = automation_analyzer.load_yaml(config_file, config_dir, secrets) or {}
+    return config.get("recorder") or {}
+
+
+def template_locations(config_dir: Path) -> dict:
+    """{entity_id: file:line} for template entities defined in YAML."""
+    try:
+        units = automation_analyzer.load_units(config_dir)
+    except (OSError, ValueError):
+        return {}
+    return {u.ident: u.location for u in units if u.kind == "template"}
+
+
+def _glob_groups(candidates: set, all_entities: list) -> tuple:
+    """
+    Collapse candidates sharing a "domain.word_" prefix into an entity glob,
+    but only when every recorded entity with that prefix is a candidate.
+    """
+    by_prefix = {}
+    for entity_id in candidates:
+        domain, _, object_id = entity_id.partition(".")
+        if "_" in object_id:
+            by_prefix.setdefault(f"{domain}.{object_id.split('_')[0]}_", []).append(entity_id)
+    globs, covered = [], set()
+    for prefix, members in sorted(by_prefix.items()):
+        if len(members) < 3:
+            continue
+        if all(e in candidates for e in all_entities if e.startswith(prefix)):
+            globs.append(prefix + "*")
+            covered.update(members)
+    return globs, sorted(candidates - covered)
+
+
+def build_report(entities: dict, events: dict, attr_totals: dict, factors: dict,
+                 recorder: dict, locations: dict, target_mb: float) -> dict:
+    entities = [e for e in entities.values() if e.rows or e.attr_sets]
+    first = min((e.first_ts for e in entities if e.first_ts), default=None)
+    last = max((e.last_ts for e in entities if e.last_ts), default=None)
+    days = max((last - first) / 86400, 1 / 24) if first else 1.0
+
+    def entity_bytes(e):
+        return e.rows * factors["state_row"] + e.attr_bytes * factors["attr_byte"]
+
+    total_state_bytes = sum(entity_bytes(e) for e in entities) or 1
+    rows = []
+    for e in sorted(entities, key=entity_bytes, reverse=True):
+        size = entity_bytes(e)
+        volatile = e.volatile_keys()
+        rows.append({
+            "entity_id": e.entity_id, "rows": e.rows, "rows_per_day": e.rows / days,
+            "attr_sets": e.attr_sets, "bytes": size, "bytes_per_day": size / days,
+            "share": size / total_state_bytes, "state_class": e.state_class,
+            "volatile_attributes": {k: round(v, 3) for k, v in sorted(volatile.items())},
+            "defined_at": locations.get(e.entity_id),
+        })
+
+    # Exclusion candidates: hot, large and without long-term statistics
+    candidates = {r["entity_id"] for r in rows
+                  if r["rows_per_day"] >= EXCLUDE_MIN_ROWS_PER_DAY
+                  and r["share"] >= EXCLUDE_MIN_SHARE and not r["state_class"]}
+    globs, single = _glob_groups(candidates, [r["entity_id"] for r in rows])
+
+    # Attribute fixes: new sets that would collapse without the volatile keys
+    attribute_fixes = []
+    by_id = {e.entity_id: e for e in entities}
+    for r in rows:
+        if r["entity_id"] in candidates or not r["volatile_attributes"]:
+            continue
+        e = by_id[r["entity_id"]]
+        other = max([n for k, n in e.key_changes.items() if k not in r["volatile_attributes"]],
+                    default=0)
+        remaining_sets = min(e.attr_sets, other + 1)
+        saved = e.attr_bytes * (1 - remaining_sets / e.attr_sets) * factors["attr_byte"]
+        attribute_fixes.append({
+            "entity_id": e.entity_id, "attributes": sorted(r["volatile_attributes"]),
+            "sets_per_day": e.attr_sets / days, "saved_per_day": saved / days,
+            "defined_at": r["defined_at"],
+        })
+
+    # Events
+    event_rows = [{"event_type": t, "rows": n, "rows_per_day": n / days,
+                   "bytes_per_day": n * factors["event_row"] / days}
+                  for t, (n, _) in sorted(events.items(), key=lambda i: i[1][0], reverse=True)]
+    events_per_day = sum(e["bytes_per_day"] for e in event_rows)
+
+    state_per_day = total_state_bytes / days
+    excluded_per_day = sum(r["bytes_per_day"] for r in rows if r["entity_id"] in candidates)
+    attr_saved_per_day = sum(f["saved_per_day"] for f in attribute_fixes)
+    proposed_per_day = state_per_day - excluded_per_day - attr_saved_per_day + events_per_day
+    current_per_day = state_per_day + events_per_day
+    statistics = factors["statistics"]
+
+    keep_days = int(recorder.get("purge_keep_days", DEFAULT_KEEP_DAYS))
+    options = sorted(set(KEEP_DAYS_OPTIONS) | {keep_days})
+    projection = {k: {"current": (current_per_day * k + statistics) / 1e6,
+                      "proposed": (proposed_per_day * k + statistics) / 1e6} for k in options}
+    fitting = [k for k in options if k <= keep_days and projection[k]["proposed"] <= target_mb]
+    proposed_keep = max(fitting) if fitting else min(options)
+
+    return {
+        "window_days": days, "entities": rows, "events": event_rows,
+        "attribute_totals": attr_totals, "factors": factors,
+        "candidates": sorted(candidates), "globs": globs, "exclude_entities": single,
+        "attribute_fixes": attribute_fixes,
+        "current": {"keep_days": keep_days,
+                    "commit_interval": recorder.get("commit_interval", DEFAULT_COMMIT_INTERVAL),
+                    "per_day_mb": current_per_day / 1e6,
+                    "size_mb": projection[keep_days]["current"]},
+        "proposed": {"keep_days": proposed_keep,
+                     "commit_interval": max(PROPOSED_COMMIT_INTERVAL,
+                                            recorder.get("commit_interval", 0)),
+                     "per_day_mb": proposed_per_day / 1e6,
+                     "size_mb": projection[proposed_keep]["proposed"]},
+        "projection": projection,
+        "recorder": recorder,
+    }
+
+
+def proposal_yaml(report: dict) -> str:
+    recorder = report["recorder"]
+    exclude = recorder.get("exclude") or {}
+    globs = sorted(set(exclude.get("entity_globs") or []) | set(report["globs"]))
+    entities = sorted(set(exclude.get("entities") or []) | set(report["exclude_entities"]))
+    lines = ["recorder:",
+             f"  purge_keep_days: {report['proposed']['keep_days']}",
+             f"  commit_interval: {report['proposed']['commit_interval']}",
+             "  exclude:"]
+    if exclude.get("domains"):
+        lines.append("    domains:")
+        lines.extend(f"      - {d}" for d in exclude["domains"])
+    if globs:
+        lines.append("    entity_globs:")
+        lines.extend(f"      - {g}" for g in globs)
+    if entities:
+        lines.append("    entities:")
+        lines.extend(f"      - {e}" for e in entities)
+    if exclude.get("event_types"):
+        lines.append("    event_types:")
+        lines.extend(f"      - {t}" for t in exclude["event_types"])
+    return "\n".join(lines)
+
+# ============================================
+# OUTPUT
+# ============================================
+
+def print_report(report: dict, top: int):
+    mb = 1e6
+    factors = report["factors"]
+    print(f"Recorder window: {report['window_days']:.1f} days "
+          f"(on-disk sizes {'measured via dbstat' if factors['measured'] else 'estimated'})\n")
+
+    print(f"{'Entity':<48} {'Rows/day':>9} {'Attr sets':>9} {'MB/day':>8} {'Share':>6}  Notes")
+    for r in report["entities"][:top]:
+        notes = []
+        if r["entity_id"] in report["candidates"]:
+            notes.append("EXCLUDE")
+        if r["state_class"]:
+            notes.append("statistics")
+        if r["volatile_attributes"]:
+            notes.append("volatile: " + ", ".join(r["volatile_attributes"]))
+        print(f"{r['entity_id'][:48]:<48} {r['rows_per_day']:>9,.0f} {r['attr_sets']:>9,} "
+              f"{r['bytes_per_day'] / mb:>8.2f} {r['share']:>6.1%}  {'; '.join(notes)}")
+
+    if report["events"]:
+        print(f"\n{'Event type':<48} {'Rows/day':>9} {'MB/day':>8}")
+        for e in report["events"][:10]:
+            print(f"{e['event_type'][:48]:<48} {e['rows_per_day']:>9,.0f} {e['bytes_per_day'] / mb:>8.2f}")
+
+    totals = report["attribute_totals"]
+    if totals["orphaned_sets"]:
+        print(f"\n{totals['orphaned_sets']:,} orphaned attribute sets "
+              f"({totals['orphaned_bytes'] / mb:.1f} MB) - removed by the next purge")
+
+    if report["attribute_fixes"]:
+        print("\nAttributes that change on (almost) every update - each change writes a new "
+              "state_attributes row:")
+        for fix in report["attribute_fixes"]:
+            where = f" ({fix['defined_at']})" if fix["defined_at"] else ""
+            print(f"  {fix['entity_id']}{where}: drop {', '.join(fix['attributes'])} -> "
+                  f"saves ~{fix['saved_per_day'] / mb:.2f} MB/day "
+                  f"({fix['sets_per_day']:,.0f} attribute rows/day)")
+
+    current, proposed = report["current"], report["proposed"]
+    print("\nProjected database size (MB) by purge_keep_days:")
+    print(f"  {'days':>4} {'current':>9} {'proposed':>9}")
+    for days, p in report["projection"].items():
+        print(f"  {days:>4} {p['current']:>9.1f} {p['proposed']:>9.1f}")
+
+    print("\nProposed recorder configuration:\n")
+    print(proposal_yaml(report))
+    saved = current["size_mb"] - proposed["size_mb"]
+    print(f"\nWrites: {current['per_day_mb']:.1f} -> {proposed['per_day_mb']:.1f} MB/day; "
+          f"commit_interval {current['commit_interval']}s -> {proposed['commit_interval']}s "
+          f"batches them into fewer fsyncs")
+    print(f"Size at steady state: {current['size_mb']:.1f} MB ({current['keep_days']} days) -> "
+          f"{proposed['size_mb']:.1f} MB ({proposed['keep_days']} days), saving ~{saved:.1f} MB")
+    if report["attribute_fixes"]:
+        print("(includes dropping the volatile attributes listed above)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Analyze recorder database growth and propose purge settings")
+    parser.add_argument("database", type=Path, help="COPY of home-assistant_v2.db")
+    parser.add_argument("--config-dir", type=Path, default=HA_CONFIG_DIR,
+                        help="Home Assistant config directory, for the current recorder settings")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--target-mb", type=float, default=500,
+                        help="Largest acceptable database size for the keep-days proposal")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if Path(f"{args.database}-wal").exists():
+        logger.warning(f"{args.database}-wal exists - this looks like the live database. "
+                       "Analyze a copy made with sqlite3 .backup instead.")
+    try:
+        conn = recorder_db.open_readonly(args.database)
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        return 1
+
+    started = time.monotonic()
+    entities = {}
+    try:
+        state_rows = scan_states(conn, entities, args.chunk_size)
+        attr_totals = scan_attributes(conn, entities, args.chunk_size)
+        events = scan_events(conn)
+        factors = disk_factors(conn, state_rows, attr_totals["bytes"],
+                               sum(n for n, _ in events.values()))
+    finally:
+        conn.close()
+    logger.info(f"Scanned {state_rows:,} states and {attr_totals['sets']:,} attribute sets "
+                f"in {time.monotonic() - started:.1f}s")
+
+    report = build_report(entities, events, attr_totals, factors,
+                          current_recorder_config(args.config_dir),
+                          template_locations(args.config_dir), args.target_mb)
+    if args.json:
+        report["proposal_yaml"] = proposal_yaml(report)
+        report["projection"] = {str(k): v for k, v in report["projection"].items()}
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Read-only access to a copy of Home Assistant's recorder database.
+
+The database is opened with SQLite's read-only URI mode so analysis can never
+write to it (or create a journal next to it). Queries aggregate in SQL and
+iterate cursors rather than fetching whole tables, so memory stays bounded
+on multi-gigabyte databases. Supports the current schema (states_meta /
+event_types, schema 36+) and falls back to the older entity_id / event_type
+columns.
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+def open_readonly(path) -> sqlite3.Connection:
+    path = Path(path).resolve()
+    if not path.exists():
+        raise FileNotFoundError(f"Recorder database not found: {path}")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def has_table(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (name,)).fetchone() is not None
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def time_span(conn) -> tuple:
+    """(first, last) state timestamp in epoch seconds, or (None, None)."""
+    if has_column(conn, "states", "last_updated_ts"):
+        row = conn.execute("SELECT MIN(last_updated_ts), MAX(last_updated_ts) FROM states").fetchone()
+    else:
+        row = conn.execute("SELECT strftime('%s', MIN(last_updated)), "
+                           "strftime('%s', MAX(last_updated)) FROM states").fetchone()
+    if row[0] is None:
+        return None, None
+    return float(row[0]), float(row[1])
+
+
+def state_counts(conn) -> dict:
+    """{entity_id: number of state rows}."""
+    if has_table(conn, "states_meta"):
+        query = ("SELECT m.entity_id, COUNT(*) FROM states s "
+                 "JOIN states_meta m ON m.metadata_id = s.metadata_id GROUP BY s.metadata_id")
+    else:
+        query = "SELECT entity_id, COUNT(*) FROM states GROUP BY entity_id"
+    return {entity_id: count for entity_id, count in conn.execute(query) if entity_id}
+
+
+def event_counts(conn) -> dict:
+    """{event_type: number of recorded events}."""
+    if has_table(conn, "event_types"):
+        query = ("SELECT t.event_type, COUNT(*) FROM events e "
+                 "JOIN event_types t ON t.event_type_id = e.event_type_id GROUP BY e.event_type_id")
+    else:
+        query = "SELECT event_type, COUNT(*) FROM events GROUP BY event_type"
+    return {event_type: count for event_type, count in conn.execute(query) if event_type}
+
+
+def automation_trigger_counts(conn) -> dict:
+    """
+    {automation entity_id: automation_triggered events}. Empty when the
+    recorder excludes the automation domain, which also drops these events.
+    """
+    if has_table(conn, "event_types") and has_table(conn, "event_data"):
+        query = ("SELECT json_extract(d.shared_data, '$.entity_id'), COUNT(*) FROM events e "
+                 "JOIN event_types t ON t.event_type_id = e.event_type_id "
+                 "JOIN event_data d ON d.data_id = e.data_id "
+                 "WHERE t.event_type = 'automation_triggered' GROUP BY 1")
+    else:
+        query = ("SELECT json_extract(event_data, '$.entity_id'), COUNT(*) FROM events "
+                 "WHERE event_type = 'automation_triggered' GROUP BY 1")
+    try:
+        return {entity_id: count for entity_id, count in conn.execute(query) if entity_id}
+    except sqlite3.OperationalError:
+        return {}
+
+
+def table_bytes(conn) -> dict:
+    """
+    {table or index name: bytes on disk} from the dbstat virtual table, or
+    an empty dict when SQLite was built without it.
+    """
+    try:
+        return {name: size for name, size in
+                conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")}
+    except sqlite3.OperationalError:
+        return {}
+
+
+def table_indexes(conn, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA index_list({table})")]
+
+
+def iter_chunks(conn, query: str, key_index: int = 0, chunk_size: int = 50000, start=None):
+    """
+    Yield lists of rows from a keyset-paginated query. The query must take a
+    single "key > ?" parameter, ORDER BY that key and end with "LIMIT ?";
+    key_index is the key's position in each row. Only one chunk is held in
+    memory at a time.
+    """
+    last = -1 if start is None else start
+    while True:
+        rows = conn.execute(query, (last, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][key_index]
@@ -3,8 +3,15 @@
 # Homelab Restore Script - Restore from Backblaze B2
 # Downloads and extracts backup to recreate the environment
 #
-# Usage: ./restore-from-cloud.sh [backup-filename]
-#   If no filename provided, lists available backups and prompts for selection
+# Usage: ./restore-from-cloud.sh [snapshot-id | backup-filename]
+#   If no backup provided, lists available snapshots and archives and prompts
+#   for selection. A snapshot is rebuilt from its chunks, an archive is
+#   downloaded and extracted; either is then restored in full.
+#
+#        ./restore-from-cloud.sh --file PATH [--file PATH ...] [--from BACKUP]
+#   Restore individual files (e.g. homeassistant/automations.yaml) from a
+#   snapshot or archive without downloading the whole backup. BACKUP is a
+#   snapshot id or prefix (default: latest) or an archive name.
 #
 
 set -euo pipefail
@@ -22,6 +29,9 @@ LOG_FILE="/var/log/homelab-restore.log"
 # Backblaze B2 settings
 B2_BUCKET="your-bucket-name"
 B2_REMOTE="backblaze:${B2_BUCKET}"
+B2_REPO="${B2_REMOTE}/repo"
+BACKUP_ENGINE="${HOMELAB_DIR}/scripts/backup_engine.py"
+RESTORE_TOOL="${HOMELAB_DIR}/scripts/backup_restore.py"
 
 # ============================================
 # LOGGING
@@ -39,26 +49,33 @@ log_error() {
 # FUNCTIONS
 # ============================================
 
+cloud_backups() {
+    # One "<type> <name> <bytes>" line per backup, newest first: nightly
+    # snapshots from the chunk repository, then full archives
+    python3 "$BACKUP_ENGINE" snapshots --remote "$B2_REPO" --rclone-config "$RCLONE_CONFIG" \
+        2>>"$LOG_FILE" | sort -r | awk '{print "snapshot", $1, $4}'
+    rclone --config="$RCLONE_CONFIG" ls --max-depth 1 --include "homelab-backup-*.tar.*" "${B2_REMOTE}/" \
+        2>/dev/null | sort -k2 -r | awk '{print "archive", $2, $1}'
+}
+
 list_cloud_backups() {
     log "Available backups in cloud:"
     echo ""
-    echo "ID   Size       Date                Filename"
-    echo "---  ---------  ------------------  -----------------------------------------"
+    echo "ID   Type      Size       Date                Name"
+    echo "---  --------  ---------  ------------------  -----------------------------------------"
 
     local i=1
-    while IFS= read -r line; do
-        local size=$(echo "$line" | awk '{print $1}')
-        local file=$(echo "$line" | awk '{print $2}')
-        local date=$(echo "$file" | sed 's/homelab-backup-//' | sed 's/.tar.gz//' | sed 's/_/ /')
-        printf "[%d]  %-9s  %s  %s\n" "$i" "$(numfmt --to=iec $size)" "$date" "$file"
+    while read -r kind name size; do
+        local date=$(echo "$name" | sed 's/homelab-backup-//' | sed -E 's/\.tar\..*//' | sed 's/_/ /')
+        printf "[%d]  %-8s  %-9s  %s  %s\n" "$i" "$kind" "$(numfmt --to=iec $size)" "$date" "$name"
         ((i++))
-    done < <(rclone --config="$RCLONE_CONFIG" ls "${B2_REMOTE}/" 2>/dev/null | sort -k2 -r)
+    done < <(cloud_backups)
     echo ""
 }
 
 get_backup_by_id() {
     local id=$1
-    rclone --config="$RCLONE_CONFIG" ls "${B2_REMOTE}/" 2>/dev/null | sort -k2 -r | sed -n "${id}p" | awk '{print $2}'
+    cloud_backups | sed -n "${id}p" | awk '{print $1, $2}'
 }
 
 download_backup() {
@@ -84,6 +101,27 @@ download_backup() {
     fi
 }
 
+fetch_snapshot() {
+    # Rebuild the whole snapshot tree from its chunks; every file is checked
+    # against its recorded hash before anything is written
+    local snapshot_id="$1"
+    local snapshot_dir="$2"
+
+    log "Fetching snapshot ${snapshot_id}..."
+    rm -rf "${snapshot_dir:?}"
+    mkdir -p "$snapshot_dir"
+
+    if python3 "$RESTORE_TOOL" --repo "$B2_REPO" --archives "$B2_REMOTE" \
+            --rclone-config "$RCLONE_CONFIG" restore "$snapshot_id" '*' \
+            --target "$snapshot_dir" --no-pre-restore >/dev/null 2>>"$LOG_FILE"; then
+        log "Snapshot fetched: $(find "$snapshot_dir" -type f | wc -l) files"
+        return 0
+    else
+        log_error "Snapshot fetch failed"
+        return 1
+    fi
+}
+
 extract_backup() {
     local archive_path="$1"
 
@@ -91,7 +129,8 @@ extract_backup() {
     mkdir -p "$RESTORE_DIR"
     rm -rf "${RESTORE_DIR:?}/*"
 
-    if tar -xzf "$archive_path" -C "$RESTORE_DIR"; then
+    # tar detects gzip (.tar.gz) or zstd (.tar.zst) compression itself
+    if tar -xf "$archive_path" -C "$RESTORE_DIR"; then
         log "Extraction successful"
         return 0
     else
@@ -234,8 +273,43 @@ restore_files() {
 # MAIN
 # ============================================
 
+restore_selected_files() {
+    # Index-based restore: fetches only the chunks/byte ranges for these files
+    local from="$1"
+    shift
+
+    log "Restoring $* from ${from}"
+    python3 "$RESTORE_TOOL" --repo "$B2_REPO" --archives "$B2_REMOTE" \
+        --rclone-config "$RCLONE_CONFIG" restore "$from" "$@" 2>&1 | tee -a "$LOG_FILE"
+}
+
 main() {
-    local backup_name="${1:-}"
+    local backup_name=""
+    local kind="archive"
+    local from="latest"
+    local files=()
+
+    while [[ $# -gt 0 ]]; do
+        case "$1" in
+            --file)
+                files+=("$2")
+                shift 2
+                ;;
+            --from)
+                from="$2"
+                shift 2
+                ;;
+            *)
+                backup_name="$1"
+                shift
+                ;;
+        esac
+    done
+
+    if (( ${#files[@]} > 0 )); then
+        restore_selected_files "$from" "${files[@]}"
+        exit $?
+    fi
 
     log "=========================================="
     log "Homelab Restore Starting"
@@ -252,15 +326,31 @@ main() {
             exit 0
         fi
 
-        backup_name=$(get_backup_by_id "$selection")
+        read -r kind backup_name < <(get_backup_by_id "$selection") || true
 
         if [[ -z "$backup_name" ]]; then
             log_error "Invalid selection"
             exit 1
         fi
+    elif [[ "$backup_name" != homelab-backup-* ]]; then
+        kind="snapshot"
     fi
 
-    log "Selected backup: ${backup_name}"
+    log "Selected ${kind}: ${backup_name}"
+
+    if [[ "$kind" == "snapshot" ]]; then
+        local snapshot_dir="${RESTORE_DIR}/${backup_name}"
+        if ! fetch_snapshot "$backup_name" "$snapshot_dir"; then
+            exit 1
+        fi
+
+        restore_files "$snapshot_dir"
+
+        log "=========================================="
+        log "Restore process complete"
+        log "=========================================="
+        exit 0
+    fi
 
     # Download backup
     local local_path
@@ -275,7 +365,7 @@ main() {
     extract_backup "$local_path"
 
     # Find extracted directory
-    local extract_dir="${RESTORE_DIR}/$(basename "$backup_name" .tar.gz)"
+    local extract_dir="${RESTORE_DIR}/${backup_name%%.tar.*}"
     if [[ ! -d "$extract_dir" ]]; then
         extract_dir=$(find "$RESTORE_DIR" -maxdepth 1 -type d -name "homelab-backup-*" | head -1)
     fi
@@ -46,35 +46,26 @@ fi
 # Step 1: Verify migration completed
 echo -e "${YELLOW}Step 1: Verifying migration status...${NC}"
 
-SOURCE_SIZE=$(du -sb /mnt/mobiledata/ 2>/dev/null | cut -f1)
-DEST_SIZE=$(du -sb /mnt/seagate/mobiledata/ 2>/dev/null | cut -f1)
-
-if [ -z "$SOURCE_SIZE" ] || [ -z "$DEST_SIZE" ]; then
-    echo -e "${RED}Error: Cannot determine source/destination sizes${NC}"
-    echo "Source: /mnt/mobiledata/"
-    echo "Destination: /mnt/seagate/mobiledata/"
-    exit 1
-fi
-
-# Allow 1% tolerance for filesystem overhead
-TOLERANCE=$((SOURCE_SIZE / 100))
-DIFF=$((SOURCE_SIZE - DEST_SIZE))
-if [ $DIFF -lt 0 ]; then DIFF=$((-DIFF)); fi
-
-if [ $DIFF -gt $TOLERANCE ]; then
-    echo -e "${RED}Error: Migration appears incomplete${NC}"
-    echo "Source size: $(numfmt --to=iec $SOURCE_SIZE)"
-    echo "Destination size: $(numfmt --to=iec $DEST_SIZE)"
-    echo "Difference: $(numfmt --to=iec $DIFF)"
+MIGRATE="python3 $HOMELAB_DIR/scripts/migration_engine.py"
+MIGRATION_SRC="/mnt/mobiledata/"
+MIGRATION_DST="/mnt/seagate/mobiledata/"
+
+# Before anything destructive: a final pass that re-lists every source
+# directory (catching files rewritten in place), a re-hash of the whole
+# destination against the journal, then the completeness check
+migration_incomplete() {
+    echo -e "${RED}Error: $1${NC}"
     echo ""
-    echo "Please wait for migration to complete or run verification manually:"
-    echo "  du -sh /mnt/mobiledata/ /mnt/seagate/mobiledata/"
+    echo "Start or resume the migration (safe to interrupt and re-run) with:"
+    echo "  $MIGRATE run $MIGRATION_SRC $MIGRATION_DST"
     exit 1
-fi
+}
+
+$MIGRATE run --rescan "$MIGRATION_SRC" "$MIGRATION_DST" || migration_incomplete "Final migration pass did not complete"
+$MIGRATE verify "$MIGRATION_SRC" "$MIGRATION_DST" || migration_incomplete "Destination does not match the journal hashes"
+$MIGRATE status "$MIGRATION_SRC" "$MIGRATION_DST" || migration_incomplete "Migration appears incomplete"
 
-echo -e "${GREEN}Migration verified - sizes match within tolerance${NC}"
-echo "Source: $(numfmt --to=iec $SOURCE_SIZE)"
-echo "Destination: $(numfmt --to=iec $DEST_SIZE)"
+echo -e "${GREEN}Migration verified - every file copied and hash-checked${NC}"
 echo ""
 
 # Prompt for confirmation
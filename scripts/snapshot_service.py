@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Snapshot Service - event snapshots and cached AI analysis for automations
+
+Camera automations used to take a full-resolution camera.snapshot, sleep a
+fixed 2 seconds and send the whole frame to ai_task.generate_data. This
+service is called instead (rest_command.analyze_frigate_event):
+
+    POST /analyze {"camera": "wyze_garage", "event_id": "<frigate id>",
+                   "task_name": "...", "instructions": "..."}
+    ->  {"data": "<model answer>", "image": "/local/snapshots/ai/<id>.jpg",
+         "event_id": "...", "cached": false | "event" | "similar", "dhash": "..."}
+
+  1. The event's best frame is fetched straight from Frigate, already cropped
+     to the object (snapshot.jpg?crop=1), and downscaled to SNAPSHOT_HEIGHT.
+     Without an event_id the camera's in-progress event is looked up. Frigate
+     serves the best frame so far while the event runs, so there is no delay.
+  2. Results are cached per (event, instructions): every automation asking
+     about the same event gets one model call, and concurrent requests share it.
+  3. A 64-bit difference hash of the crop is compared with recent analyses on
+     the same camera; a near-identical frame (re-detection of someone standing
+     in the same place) reuses that answer instead of calling the model again.
+  4. Otherwise the crop is written to www/snapshots/ai and analysed through
+     HA's ai_task.generate_data (AI_TASK_ENTITY) over the shared websocket.
+
+    GET /snapshot/<event_id>.jpg   the processed crop
+    GET /stats                     counters
+
+fake_ha_server.py answers ai_task.generate_data (--ai-response) so the
+service can be exercised without a real model.
+
+Usage:
+    snapshot_service.py [--port 8767] [--frigate-url http://127.0.0.1:5002]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import ha_client
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:
+    aiohttp = web = None
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+WWW_DIR = HOMELAB_DIR / "homeassistant" / "www"
+IMAGE_DIR = WWW_DIR / "snapshots" / "ai"
+CACHE_DB = Path(os.environ.get("SNAPSHOT_CACHE_DB", HOMELAB_DIR / "data" / "snapshot_cache.db"))
+FRIGATE_URL = os.environ.get("FRIGATE_URL", "http://127.0.0.1:5002")
+AI_TASK_ENTITY = os.environ.get("AI_TASK_ENTITY", "ai_task.google_ai_task")
+
+SNAPSHOT_HEIGHT = 640
+SNAPSHOT_QUALITY = 85
+SNAPSHOT_RETRIES = 5          # Frigate may not have a frame for a brand-new event yet
+SNAPSHOT_RETRY_DELAY = 0.3
+SIMILAR_MAX_DISTANCE = 6      # dHash bits; 0 = identical
+SIMILAR_WINDOW = 300          # seconds a previous analysis can be reused for a similar frame
+CACHE_DAYS = 7
+REQUEST_TIMEOUT = 10
+MODEL_TIMEOUT = 60
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# IMAGES
+# ============================================
+
+def _pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Pillow not installed. Run: pip install pillow")
+    return Image
+
+
+def prepare_image(data: bytes) -> tuple:
+    """Downscale to SNAPSHOT_HEIGHT, re-encode; returns (jpeg bytes, 64-bit dHash)."""
+    Image = _pil()
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    if image.height > SNAPSHOT_HEIGHT:
+        image = image.resize((max(1, image.width * SNAPSHOT_HEIGHT // image.height), SNAPSHOT_HEIGHT),
+                             Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=SNAPSHOT_QUALITY, optimize=True)
+    return out.getvalue(), dhash(image)
+
+
+def dhash(image) -> int:
+    """Difference hash: brightness gradient of a 9x8 greyscale thumbnail."""
+    small = image.convert("L").resize((9, 8), _pil().BILINEAR).tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (small[row * 9 + col] > small[row * 9 + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+# ============================================
+# CACHE
+# ============================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    event_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    camera TEXT,
+    dhash INTEGER,
+    image TEXT,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (event_id, task)
+);
+CREATE INDEX IF NOT EXISTS analyses_camera ON analyses (camera, task, created);
+"""
+
+
+def _to_sql(value):
+    # SQLite INTEGER is signed 64-bit; store hashes with the top bit set as negatives
+    return value - (1 << 64) if value is not None and value >= 1 << 63 else value
+
+
+def _from_sql(value):
+    return value & ((1 << 64) - 1) if value is not None else None
+
+
+def task_key(task_name: str, instructions: str) -> str:
+    return hashlib.blake2b(f"{task_name}\n{instructions}".encode(), digest_size=8).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, path: Path = CACHE_DB):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def by_event(self, event_id: str, task: str):
+        row = self.conn.execute("SELECT result, image, dhash FROM analyses WHERE event_id = ? AND task = ?",
+                                (event_id, task)).fetchone()
+        return row and (row[0], row[1], _from_sql(row[2]))
+
+    def similar(self, camera: str, task: str, value: int):
+        """Most recent analysis on camera whose crop is within SIMILAR_MAX_DISTANCE bits."""
+        best = None
+        for event_id, result, stored in self.conn.execute(
+                "SELECT event_id, result, dhash FROM analyses WHERE camera = ? AND task = ? "
+                "AND created > ? AND dhash IS NOT NULL ORDER BY created DESC",
+                (camera, task, time.time() - SIMILAR_WINDOW)):
+            distance = hamming(value, _from_sql(stored))
+            if distance <= SIMILAR_MAX_DISTANCE and (best is None or distance < best[2]):
+                best = (event_id, result, distance)
+        return best
+
+    def store(self, event_id: str, task: str, camera: str, value, image: str, result: str):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO analyses VALUES (?,?,?,?,?,?,?)",
+                              (event_id, task, camera, _to_sql(value), image, result, time.time()))
+
+    def prune(self) -> int:
+        with self.conn:
+            return self.conn.execute("DELETE FROM analyses WHERE created < ?",
+                                     (time.time() - CACHE_DAYS * 86400,)).rowcount
+
+# ============================================
+# SERVICE
+# ============================================
+
+class SnapshotService:
+    def __init__(self, frigate_url: str, cache: AnalysisCache):
+        self.frigate_url = frigate_url.rstrip("/")
+        self.cache = cache
+        self.session = None
+        self.ha = None
+        self.ha_lock = asyncio.Lock()
+        self.inflight = {}
+        self.stats = {"requests": 0, "event_hits": 0, "similar_hits": 0, "model_calls": 0,
+                      "model_errors": 0, "snapshot_errors": 0, "snapshot_ms": 0.0, "model_ms": 0.0}
+        IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
+    async def close(self):
+        if self.ha is not None:
+            await self.ha.close()
+        if self.session is not None:
+            await self.session.close()
+
+    async def _get(self, path: str, params: dict = None):
+        async with self.session.get(f"{self.frigate_url}{path}", params=params) as resp:
+            if resp.status == 404:
+                return None
+            resp.raise_for_status()
+            return await (resp.json() if resp.content_type == "application/json" else resp.read())
+
+    async def current_event(self, camera: str):
+        """Id of the camera's newest in-progress person event, if any."""
+        events = await self._get("/api/events", {"cameras": camera, "labels": "person",
+                                                 "in_progress": 1, "limit": 1})
+        return events[0]["id"] if events else None
+
+    async def fetch_snapshot(self, event_id: str) -> bytes:
+        params = {"crop": 1, "height": SNAPSHOT_HEIGHT, "bbox": 0, "timestamp": 0}
+        for attempt in range(SNAPSHOT_RETRIES):
+            data = await self._get(f"/api/events/{event_id}/snapshot.jpg", params)
+            if data:
+                return data
+            await asyncio.sleep(SNAPSHOT_RETRY_DELAY * (attempt + 1))
+        raise LookupError(f"Frigate has no snapshot for event {event_id}")
+
+    async def _model(self, task_name: str, instructions: str, image_name: str) -> str:
+        async with self.ha_lock:
+            if self.ha is None:
+                client = ha_client.HAClient()
+                try:
+                    await client.connect()
+                except Exception:
+                    await client.close()
+                    raise
+                self.ha = client
+        result = await asyncio.wait_for(self.ha.call_service(
+            "ai_task", "generate_data", {
+                "task_name": task_name, "instructions": instructions, "entity_id": AI_TASK_ENTITY,
+                "attachments": [{"media_content_type": "image/jpeg",
+                                 "media_content_id": f"media-source://media_source/local/snapshots/ai/{image_name}"}]},
+            return_response=True), MODEL_TIMEOUT)
+        return ((result or {}).get("response") or {}).get("data", "")
+
+    async def analyze(self, request: dict) -> dict:
+        self.stats["requests"] += 1
+        camera = request.get("camera") or ""
+        event_id = request.get("event_id") or ""
+        task_name = request.get("task_name") or "Camera Analysis"
+        instructions = request.get("instructions") or ""
+        task = task_key(task_name, instructions)
+
+        if not event_id:
+            if not camera:
+                raise ValueError("camera or event_id is required")
+            event_id = await self.current_event(camera)
+            if not event_id:
+                raise LookupError(f"No in-progress person event on {camera}")
+
+        cached = self.cache.by_event(event_id, task)
+        if cached:
+            self.stats["event_hits"] += 1
+            return {"data": cached[0], "image": cached[1], "event_id": event_id, "cached": "event",
+                    "dhash": f"{cached[2]:016x}" if cached[2] is not None else None}
+
+        # Several automations often ask about the same event at once
+        key = (event_id, task)
+        if key in self.inflight:
+            result = await asyncio.shield(self.inflight[key])
+            self.stats["event_hits"] += 1
+            return {**result, "cached": "event"}
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await self._analyze_new(camera, event_id, task, task_name, instructions)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()   # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self.inflight[key]
+
+    async def _analyze_new(self, camera, event_id, task, task_name, instructions) -> dict:
+        started = time.monotonic()
+        try:
+            raw = await self.fetch_snapshot(event_id)
+        except Exception:
+            self.stats["snapshot_errors"] += 1
+            raise
+        jpeg, value = await asyncio.to_thread(prepare_image, raw)
+        name = f"{re.sub(r'[^A-Za-z0-9._-]', '_', event_id)}.jpg"
+        await asyncio.to_thread((IMAGE_DIR / name).write_bytes, jpeg)
+        image = f"/local/{(IMAGE_DIR / name).relative_to(WWW_DIR)}"
+        self.stats["snapshot_ms"] += (time.monotonic() - started) * 1000
+
+        similar = self.cache.similar(camera, task, value) if camera else None
+        if similar:
+            source, result, distance = similar
+            self.stats["similar_hits"] += 1
+            logger.info(f"{event_id}: reusing analysis of {source} (dHash distance {distance})")
+            self.cache.store(event_id, task, camera, value, image, result)
+            return {"data": result, "image": image, "event_id": event_id, "cached": "similar",
+                    "dhash": f"{value:016x}"}
+
+        started = time.monotonic()
+        try:
+            result = await self._model(task_name, instructions, name)
+        except Exception:
+            self.stats["model_errors"] += 1
+            raise
+        self.stats["model_calls"] += 1
+        self.stats["model_ms"] += (time.monotonic() - started) * 1000
+        self.cache.store(event_id, task, camera, value, image, result)
+        return {"data": result, "image": image, "event_id": event_id, "cached": False,
+                "dhash": f"{value:016x}"}
+
+
+def make_app(service: SnapshotService):
+    async def analyze(request):
+        try:
+            body = await request.json()
+            return web.json_response(await service.analyze(body))
+        except (ValueError, json.JSONDecodeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        except LookupError as e:
+            return web.json_response({"error": str(e)}, status=404)
+        except Exception as e:
+            logger.warning(f"Analysis failed: {e!r}")
+            return web.json_response({"error": str(e) or type(e).__name__}, status=502)
+
+    async def snapshot(request):
+        path = IMAGE_DIR / f"{re.sub(r'[^A-Za-z0-9._-]', '_', request.match_info['event_id'])}.jpg"
+        if not path.exists():
+            return web.json_response({"error": "not found"}, status=404)
+        return web.FileResponse(path)
+
+    async def stats(request):
+        return web.json_response(service.stats)
+
+    app = web.Application()
+    app.router.add_post("/analyze", analyze)
+    app.router.add_get("/snapshot/{event_id}.jpg", snapshot)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+async def serve(host: str, port: int, service: SnapshotService):
+    await service.start()
+    runner = web.AppRunner(make_app(service))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Snapshot service on http://{host}:{port} (Frigate {service.frigate_url})")
+    try:
+        while True:
+            pruned = service.cache.prune()
+            if pruned:
+                logger.info(f"Pruned {pruned} cached analyses older than {CACHE_DAYS} days")
+            await asyncio.sleep(3600)
+    finally:
+        await runner.cleanup()
+        await service.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Frigate event snapshots with cached AI analysis")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--frigate-url", default=FRIGATE_URL)
+    parser.add_argument("--cache-db", type=Path, default=CACHE_DB)
+    args = parser.parse_args()
+
+    if web is None:
+        logger.error("aiohttp not installed. Run: pip install aiohttp")
+        return 1
+    try:
+        _pil()
+        asyncio.run(serve(args.host, args.port, SnapshotService(args.frigate_url, AnalysisCache(args.cache_db))))
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Solar Aggregator - combined and smoothed inverter sensors outside HA
+
+configuration.yaml used to compute Combined PV Power and the *_smoothed
+inverter sensors as template sensors. They re-rendered on every Solarman
+update and stamped a last_updated attribute, so every reading produced a new
+recorder row per template even when the power had not changed.
+
+This service mirrors the raw inverter entities over the HA websocket and
+publishes the derived series as MQTT discovery sensors instead:
+
+  - readings that are unavailable/unknown/non-numeric (WiFi dropouts) are
+    ignored, so every series keeps its last valid value
+  - each series is the sum of its sources, averaged over a time window
+    (time-weighted, so a burst of readings does not dominate)
+  - a new value is only published when it moves by more than the series'
+    deadband, or after QUIET_PUBLISH seconds if it has drifted at all
+
+Inverter Connection Status and Inverter Data Age are published too, only
+when they actually change (no now() attributes).
+
+Entities keep their old ids (sensor.solar_power_smoothed etc.). HA keeps the
+removed template entities in its entity registry, which would push the MQTT
+ones to *_2; run once with --adopt-template-entities to delete those
+registry entries before discovery is published.
+
+Usage:
+    solar_aggregator.py [--window solar_power_smoothed=120] [--deadband grid_power_smoothed=50]
+                        [--adopt-template-entities]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import ha_client
+import mqtt_client
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+TOPIC_PREFIX = "solar_aggregator"
+AVAILABILITY_TOPIC = f"{TOPIC_PREFIX}/status"
+CLIENT_ID = "solar-aggregator"
+
+DEVICE_STATE_ENTITY = "sensor.inverter_device_state"
+INVALID_STATES = ("unavailable", "unknown", "none", "")
+
+TICK = 5                 # seconds between window/age re-evaluations
+QUIET_PUBLISH = 300      # publish a drifted value at least this often
+STALE_MINUTES = (1, 5, 15)   # data age thresholds: live / recent / stale / offline
+STATS_INTERVAL = 300
+
+# object_id: name, sources (summed), unit, device_class, icon, window s, deadband, decimals
+SERIES = {
+    "combined_pv_power": ("Combined PV Power", ("sensor.inverter_pv1_power", "sensor.inverter_pv2_power"),
+                          "W", "power", "mdi:solar-power", 30, 20, 0),
+    "solar_power_smoothed": ("Solar Power Smoothed", ("sensor.inverter_pv_power",),
+                             "W", "power", "mdi:solar-power", 60, 20, 0),
+    "battery_percent_smoothed": ("Battery Percent Smoothed", ("sensor.inverter_battery",),
+                                 "%", "battery", "mdi:battery", 0, 1, 0),
+    "battery_power_smoothed": ("Battery Power Smoothed", ("sensor.inverter_battery_power",),
+                               "W", "power", "mdi:battery-charging", 60, 25, 0),
+    "grid_power_smoothed": ("Grid Power Smoothed", ("sensor.inverter_grid_power",),
+                            "W", "power", "mdi:transmission-tower", 30, 25, 0),
+    "load_power_smoothed": ("Load Power Smoothed", ("sensor.inverter_load_power",),
+                            "W", "power", "mdi:home-lightning-bolt", 30, 25, 0),
+}
+
+# grid_power_smoothed carries a direction attribute like the old template
+GRID_IDLE_WATTS = 50
+
+DEVICE = {"identifiers": ["solar_aggregator"], "name": "Solar Aggregator",
+          "manufacturer": "homelab", "model": "solar_aggregator.py"}
+
+# ============================================
+# LOGGING
+# ============================================
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# AGGREGATION
+# ============================================
+
+def parse_reading(state):
+    """Float value of an entity state, or None for dropouts and garbage."""
+    if state is None or str(state).lower() in INVALID_STATES:
+        return None
+    try:
+        value = float(state)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None   # NaN
+
+
+class Series:
+    """One derived sensor: sum of sources, time-weighted window average, deadband."""
+
+    def __init__(self, object_id: str, sources, window: float, deadband: float, decimals: int):
+        self.object_id = object_id
+        self.sources = tuple(sources)
+        self.window = window
+        self.deadband = deadband
+        self.decimals = decimals
+        self.samples = deque()      # (time, value), value holds until the next sample
+        self.published = None
+        self.published_at = 0.0
+
+    def add(self, value: float, now: float):
+        self.samples.append((now, value))
+
+    def value(self, now: float):
+        if not self.samples:
+            return None
+        if self.window <= 0:
+            return self.samples[-1][1]
+        start = now - self.window
+        # Keep the last sample before the window: it is the value at window start
+        while len(self.samples) > 1 and self.samples[1][0] <= start:
+            self.samples.popleft()
+        total = weight = 0.0
+        for i, (t, v) in enumerate(self.samples):
+            end = self.samples[i + 1][0] if i + 1 < len(self.samples) else now
+            span = end - max(t, start)
+            if span > 0:
+                total += v * span
+                weight += span
+        return total / weight if weight else self.samples[-1][1]
+
+    def due(self, now: float):
+        """Rounded value if it should be published now, else None."""
+        value = self.value(now)
+        if value is None:
+            return None
+        value = round(value, self.decimals) if self.decimals else int(round(value))
+        if self.published is None:
+            return value
+        change = abs(value - self.published)
+        if change >= self.deadband or (change and now - self.published_at >= QUIET_PUBLISH):
+            return value
+        return None
+
+    def mark(self, value, now: float):
+        self.published = value
+        self.published_at = now
+
+
+class Aggregator:
+    """
+    Turns raw entity states into (object_id, payload) messages.
+    Pure state machine - no HA or MQTT - so it can be driven directly.
+    """
+
+    def __init__(self, windows: dict = None, deadbands: dict = None):
+        self.series = {}
+        for object_id, (_, sources, _, _, _, window, deadband, decimals) in SERIES.items():
+            self.series[object_id] = Series(object_id, sources, (windows or {}).get(object_id, window),
+                                            (deadbands or {}).get(object_id, deadband), decimals)
+        self.by_source = {}
+        for series in self.series.values():
+            for source in series.sources:
+                self.by_source.setdefault(source, []).append(series)
+        self.last_valid = {}
+        self.last_seen = None       # wall clock of the newest valid reading
+        self.online = None
+        self.age = None
+        self.stats = {"readings": 0, "dropouts": 0, "published": 0}
+
+    @property
+    def entities(self):
+        return set(self.by_source) | {DEVICE_STATE_ENTITY}
+
+    def update(self, entity_id: str, state, now: float, wall: float = None) -> list:
+        wall = time.time() if wall is None else wall
+        if entity_id == DEVICE_STATE_ENTITY:
+            online = state is not None and str(state).lower() not in INVALID_STATES
+            if online:
+                self.last_seen = max(self.last_seen or 0, wall)
+            return self._connection(online)
+
+        value = parse_reading(state)
+        if value is None:
+            self.stats["dropouts"] += 1
+            return []
+        self.stats["readings"] += 1
+        self.last_valid[entity_id] = value
+        self.last_seen = max(self.last_seen or 0, wall)
+        for series in self.by_source.get(entity_id, ()):
+            if all(source in self.last_valid for source in series.sources):
+                series.add(sum(self.last_valid[s] for s in series.sources), now)
+        return self.tick(now, wall)
+
+    def tick(self, now: float, wall: float = None) -> list:
+        wall = time.time() if wall is None else wall
+        out = []
+        for series in self.series.values():
+            value = series.due(now)
+            if value is None:
+                continue
+            series.mark(value, now)
+            attributes = {}
+            if series.object_id == "grid_power_smoothed":
+                attributes["direction"] = ("importing" if value > GRID_IDLE_WATTS else
+                                           "exporting" if value < -GRID_IDLE_WATTS else "idle")
+            out.append((series.object_id, {"value": value, "attributes": attributes}))
+        out.extend(self._age(wall))
+        self.stats["published"] += len(out)
+        return out
+
+    def _connection(self, online: bool) -> list:
+        if online == self.online:
+            return []
+        self.online = online
+        return [("inverter_connection_status", {
+            "value": "Online" if online else "Offline",
+            "attributes": {"last_seen": _iso(self.last_seen)}})]
+
+    def _age(self, wall: float) -> list:
+        if self.last_seen is None:
+            return []
+        # Whole minutes: the old template re-rendered (and was recorded) every minute
+        age = int((wall - self.last_seen) // 60)
+        if age == self.age:
+            return []
+        self.age = age
+        status = next((name for limit, name in zip(STALE_MINUTES, ("live", "recent", "stale"))
+                       if age < limit), "offline")
+        return [("inverter_data_age", {"value": age, "attributes": {"status": status}})]
+
+
+def _iso(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")
+
+# ============================================
+# SERVICE
+# ============================================
+
+def _parse_override(value: str):
+    object_id, _, number = value.partition("=")
+    if object_id not in SERIES:
+        raise argparse.ArgumentTypeError(f"unknown series {object_id!r} (one of {', '.join(SERIES)})")
+    try:
+        return object_id, float(number)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected SERIES=NUMBER")
+
+
+def state_topic(object_id: str) -> str:
+    return f"{TOPIC_PREFIX}/{object_id}"
+
+
+def publish_discovery(client):
+    common = {"availability_topic": AVAILABILITY_TOPIC, "value_template": "{{ value_json.value }}",
+              "json_attributes_template": "{{ value_json.attributes | tojson }}"}
+    for object_id, (name, sources, unit, device_class, icon, *_) in SERIES.items():
+        mqtt_client.publish_discovery(client, "sensor", object_id, {
+            **common, "name": name, "state_topic": state_topic(object_id),
+            "json_attributes_topic": state_topic(object_id), "unit_of_measurement": unit,
+            "device_class": device_class, "state_class": "measurement", "icon": icon}, DEVICE)
+    for object_id, name, config in (
+            ("inverter_connection_status", "Inverter Connection Status", {"icon": "mdi:wifi"}),
+            ("inverter_data_age", "Inverter Data Age",
+             {"unit_of_measurement": "min", "icon": "mdi:clock-outline"})):
+        mqtt_client.publish_discovery(client, "sensor", object_id, {
+            **common, **config, "name": name, "state_topic": state_topic(object_id),
+            "json_attributes_topic": state_topic(object_id)}, DEVICE)
+
+
+async def adopt_template_entities(ha) -> int:
+    """Delete template-platform registry entries holding the entity ids we publish."""
+    removed = 0
+    for object_id in [*SERIES, "inverter_connection_status", "inverter_data_age"]:
+        entity_id = f"sensor.{object_id}"
+        try:
+            entry = await ha.send({"type": "config/entity_registry/get", "entity_id": entity_id})
+        except ha_client.HAError as e:
+            if e.code != "not_found":
+                logger.warning(f"{entity_id}: registry lookup failed ({e})")
+            continue
+        if (entry or {}).get("platform") != "template":
+            continue
+        await ha.send({"type": "config/entity_registry/remove", "entity_id": entity_id})
+        logger.info(f"Removed template entity {entity_id} from the registry")
+        removed += 1
+    return removed
+
+
+async def serve(args):
+    loop = asyncio.get_running_loop()
+    aggregator = Aggregator(dict(args.window), dict(args.deadband))
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    client = mqtt_client.create_client(CLIENT_ID, host=args.host, port=args.port,
+                                       availability_topic=AVAILABILITY_TOPIC)
+
+    def publish(messages):
+        for object_id, payload in messages:
+            client.publish(state_topic(object_id), json.dumps(payload, separators=(",", ":")),
+                           qos=1, retain=True)
+
+    def on_change(entity_id, old, new):
+        if new is None:
+            return      # dropped from the mirror (HA restarting): keep last values
+        updated = new.last_updated if isinstance(new.last_updated, (int, float)) else None
+        publish(aggregator.update(entity_id, new.state, time.monotonic(), updated))
+
+    ha = ha_client.HAClient()
+    try:
+        await ha.connect()
+        if args.adopt_template_entities:
+            await adopt_template_entities(ha)
+        publish_discovery(client)
+        ha.listen(on_change, aggregator.entities)
+        await ha.subscribe_entities(aggregator.entities)
+        logger.info(f"Aggregating {len(aggregator.entities)} inverter entities into "
+                    f"{len(SERIES)} series on {TOPIC_PREFIX}/<series>")
+
+        last_stats = time.monotonic()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), TICK)
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            publish(aggregator.tick(now))
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                s = aggregator.stats
+                logger.info(f"Readings {s['readings']}, dropouts ignored {s['dropouts']}, "
+                            f"published {s['published']}")
+    finally:
+        mqtt_client.close_client(client, AVAILABILITY_TOPIC)
+        await ha.close()
+    logger.info("Solar aggregator stopped")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Combined and smoothed inverter sensors via MQTT discovery")
+    parser.add_argument("--host", default=mqtt_client.MQTT_HOST)
+    parser.add_argument("--port", type=int, default=mqtt_client.MQTT_PORT)
+    parser.add_argument("--window", action="append", type=_parse_override, default=[],
+                        help="SERIES=SECONDS averaging window (0 = latest value, repeatable)")
+    parser.add_argument("--deadband", action="append", type=_parse_override, default=[],
+                        help="SERIES=VALUE minimum change to publish (repeatable)")
+    parser.add_argument("--adopt-template-entities", action="store_true",
+                        help="Remove the old template sensors from HA's entity registry first")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except (RuntimeError, OSError, ha_client.HAError) as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Homelab Stack Startup Orchestrator
+
+Replaces the fixed sleeps and sequential `docker inspect` polling in
+docker-startup.sh:
+  - Waits for the Docker daemon by pinging the socket, not a fixed sleep
+  - Subscribes to container events (start / health_status / die) before
+    touching anything, so readiness is pushed rather than polled
+  - Starts services in parallel along the docker-compose depends_on graph,
+    each one as soon as its own dependencies meet their condition
+  - Recreates only containers whose compose config hash (which covers the
+    resolved .env values) differs from the running container's label;
+    unchanged containers are simply started
+  - Waits for Frigate cameras to report fps instead of sleeping 30s
+  - Prints a per-service time-to-healthy breakdown
+
+Usage:
+    stack_startup.py [--project-dir DIR] [--timeout SECONDS] [--json]
+"""
+
+import argparse
+import json
+import logging
+import queue
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from docker_api import DockerClient, DockerError
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path("/opt/homelab")
+FRIGATE_STATS_URL = "http://localhost:5002/api/stats"
+
+DOCKER_READY_TIMEOUT = 120     # Seconds to wait for the daemon socket
+SERVICE_TIMEOUT = 180          # Seconds for one service to become ready
+CAMERA_TIMEOUT = 120           # Seconds to wait for cameras after Frigate is up
+CAMERA_POLL_INTERVAL = 1
+
+CONFIG_HASH_LABEL = "com.docker.compose.config-hash"
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# COMPOSE MODEL
+# ============================================
+
+def compose(project_dir: Path, *args) -> str:
+    result = subprocess.run(["docker", "compose", *args], cwd=project_dir,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"docker compose {' '.join(args)}: {result.stderr.strip()}")
+    return result.stdout
+
+
+def load_project(project_dir: Path) -> tuple:
+    """
+    Return (project name, services) where services maps name ->
+    {"depends_on": {dep: condition}, "healthcheck": bool, "hash": str}.
+    """
+    config = json.loads(compose(project_dir, "config", "--format", "json"))
+    hashes = {}
+    for line in compose(project_dir, "config", "--hash", "*").splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            hashes[parts[0]] = parts[1]
+
+    services = {}
+    for name, svc in config["services"].items():
+        depends = svc.get("depends_on") or {}
+        if isinstance(depends, list):
+            depends = {dep: {"condition": "service_started"} for dep in depends}
+        healthcheck = svc.get("healthcheck") or {}
+        services[name] = {
+            "depends_on": {dep: opts.get("condition", "service_started")
+                           for dep, opts in depends.items()},
+            "healthcheck": bool(healthcheck.get("test")) and not healthcheck.get("disable"),
+            "hash": hashes.get(name),
+        }
+    return config["name"], services
+
+# ============================================
+# ORCHESTRATOR
+# ============================================
+
+class ServiceState:
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.spec = spec
+        self.container = None
+        self.action = None         # started / recreated / running
+        # pending, launching, started, healthy, exited, failed, timeout
+        self.phase = "pending"
+        self.exit_code = None
+        self.launched_at = None
+        self.started_at = None
+        self.healthy_at = None
+        self.deadline = None
+
+    @property
+    def ready(self) -> bool:
+        if self.spec["healthcheck"]:
+            return self.phase == "healthy"
+        return self.phase in ("started", "healthy")
+
+
+class Orchestrator:
+    def __init__(self, project_dir: Path, timeout: int = SERVICE_TIMEOUT):
+        self.project_dir = project_dir
+        self.timeout = timeout
+        self.docker = DockerClient()
+        self.events = queue.Queue()
+        self.subscribed = threading.Event()
+        self.events_lost = False
+        self.compose_lock = threading.Lock()
+        self.t0 = time.monotonic()
+        self.project = None
+        self.services = {}
+
+    def elapsed(self, t) -> str:
+        return f"{t - self.t0:6.1f}s" if t is not None else "     -"
+
+    # ---- event intake ----
+
+    def _watch_events(self):
+        """Forward container events for this project onto the queue."""
+        filters = {"type": ["container"], "label": [f"{PROJECT_LABEL}={self.project}"],
+                   "event": ["start", "die", "health_status"]}
+        try:
+            for event in self.docker.events(filters=filters, on_connect=self.subscribed.set):
+                attrs = event.get("Actor", {}).get("Attributes", {})
+                self.events.put(("docker", attrs.get(SERVICE_LABEL), event.get("Action", ""),
+                                 (event.get("Actor", {}).get("ID"), attrs.get("exitCode"))))
+        except Exception as e:
+            self.events.put(("error", None, f"event stream lost, polling instead: {e}", None))
+        finally:
+            self.events_lost = True
+            self.subscribed.set()
+
+    # ---- per-service launch ----
+
+    def _find_container(self, name: str):
+        found = self.docker.containers(filters={"label": [
+            f"{PROJECT_LABEL}={self.project}", f"{SERVICE_LABEL}={name}"]})
+        return found[0] if found else None
+
+    def _launch(self, svc: ServiceState):
+        """Start or recreate one service, then report its current state."""
+        try:
+            container = self._find_container(svc.name)
+            current = container["Labels"].get(CONFIG_HASH_LABEL) if container else None
+            if container is None or current != svc.spec["hash"]:
+                reason = "missing" if container is None else "config changed"
+                logger.info(f"{svc.name}: recreating ({reason})")
+                with self.compose_lock:
+                    compose(self.project_dir, "up", "-d", "--no-deps", "--force-recreate",
+                            svc.name)
+                svc.action = "recreated"
+                container = self._find_container(svc.name)
+            elif container["State"] != "running":
+                self.docker.start(container["Id"])
+                svc.action = "started"
+            else:
+                svc.action = "running"
+            svc.container = container["Id"]
+            self.events.put(("launched", svc.name, None, None))
+        except Exception as e:
+            self.events.put(("failed", svc.name, str(e), None))
+
+    def _refresh(self, svc: ServiceState):
+        """
+        Catch up with state that changed before events were subscribed. A
+        container that is not running yet (created, restarting) stays
+        "launching"; its next event re-inspects it.
+        """
+        info = self.docker.inspect(svc.container)
+        state = info["State"]
+        now = time.monotonic()
+        if state.get("Running"):
+            svc.started_at = svc.started_at or now
+            health = (state.get("Health") or {}).get("Status")
+            if health == "healthy" or not svc.spec["healthcheck"]:
+                svc.phase = "healthy" if health == "healthy" else "started"
+                svc.healthy_at = svc.healthy_at or (now if health == "healthy" else None)
+            else:
+                svc.phase = "started"
+        elif state.get("Status") in ("exited", "dead"):
+            svc.exit_code = state.get("ExitCode", 0)
+            svc.phase = "exited"
+
+    # ---- scheduling ----
+
+    def _deps_met(self, svc: ServiceState) -> bool:
+        for dep, condition in svc.spec["depends_on"].items():
+            other = self.services.get(dep)
+            if other is None:
+                continue
+            if other.phase == "failed":
+                continue  # don't hold the stack hostage to one broken service
+            if condition == "service_healthy" and not (other.ready or other.phase == "timeout"):
+                return False
+            if condition == "service_started" and other.phase in ("pending", "launching"):
+                return False
+            if condition == "service_completed_successfully" and other.phase != "exited":
+                return False
+        return True
+
+    def _launch_ready(self):
+        for svc in self.services.values():
+            if svc.phase == "pending" and self._deps_met(svc):
+                svc.phase = "launching"
+                svc.launched_at = time.monotonic()
+                svc.deadline = svc.launched_at + self.timeout
+                threading.Thread(target=self._launch, args=(svc,), daemon=True).start()
+
+    def _handle(self, kind, name, detail, extra):
+        svc = self.services.get(name)
+        now = time.monotonic()
+        if kind == "error":
+            logger.warning(detail)
+            return
+        if svc is None:
+            return
+
+        if kind == "failed":
+            svc.phase = "failed"
+            logger.error(f"{name}: failed to start: {detail}")
+        elif kind == "launched":
+            self._refresh(svc)
+            logger.info(f"{name}: {svc.action} ({svc.phase})")
+        elif kind == "docker":
+            container_id, exit_code = extra
+            # Before launch completes the container may still be the old one
+            # being replaced; its state is picked up by _refresh() instead
+            if svc.phase in ("pending", "failed") or not svc.container or container_id != svc.container:
+                return
+            if svc.phase == "launching":
+                # Launched, but not running when it was inspected: look again
+                self._refresh(svc)
+                if svc.phase != "launching":
+                    logger.info(f"{name}: {svc.phase}")
+                return
+            if detail == "start":
+                svc.started_at = now
+                if svc.phase != "healthy":
+                    svc.phase = "started"
+            elif detail == "health_status: healthy":
+                svc.phase = "healthy"
+                svc.healthy_at = svc.healthy_at or now
+                logger.info(f"{name}: healthy after {now - svc.launched_at:.1f}s")
+            elif detail == "health_status: unhealthy":
+                logger.warning(f"{name}: unhealthy")
+            elif detail == "die":
+                svc.exit_code = int(exit_code or 0)
+                svc.phase = "exited"
+
+    def run(self) -> dict:
+        self.project, specs = load_project(self.project_dir)
+        self.services = {name: ServiceState(name, spec) for name, spec in specs.items()}
+
+        threading.Thread(target=self._watch_events, daemon=True).start()
+        self.subscribed.wait(timeout=10)
+
+        while True:
+            self._launch_ready()
+            waiting = [s for s in self.services.values()
+                       if s.phase not in ("failed", "timeout", "exited") and not s.ready]
+            if not waiting:
+                break
+
+            try:
+                self._handle(*self.events.get(timeout=1))
+            except queue.Empty:
+                pass
+
+            if self.events_lost:
+                for svc in waiting:
+                    if svc.container and svc.phase in ("launching", "started", "healthy"):
+                        self._refresh(svc)
+
+            now = time.monotonic()
+            for svc in waiting:
+                if svc.deadline and now > svc.deadline and not svc.ready:
+                    svc.phase = "timeout"
+                    logger.warning(f"{svc.name}: not ready within {self.timeout}s")
+                elif svc.phase == "pending" and now - self.t0 > self.timeout * 3:
+                    svc.phase = "failed"
+                    logger.error(f"{svc.name}: dependencies never became ready")
+
+        return self.services
+
+# ============================================
+# CAMERA CHECK
+# ============================================
+
+def wait_for_cameras(timeout: int = CAMERA_TIMEOUT) -> dict:
+    """Poll Frigate until every camera reports frames. Returns {camera: seconds}."""
+    start = time.monotonic()
+    streaming = {}
+    cameras = None
+    while time.monotonic() - start < timeout:
+        try:
+            with urllib.request.urlopen(FRIGATE_STATS_URL, timeout=5) as resp:
+                stats = json.load(resp)
+            cameras = stats.get("cameras", {})
+            for name, cam in cameras.items():
+                if name not in streaming and (cam.get("camera_fps") or 0) > 0:
+                    streaming[name] = time.monotonic() - start
+                    logger.info(f"Camera {name} streaming ({cam['camera_fps']} fps)")
+            if cameras and len(streaming) == len(cameras):
+                break
+        except Exception:
+            pass
+        time.sleep(CAMERA_POLL_INTERVAL)
+
+    for name in (cameras or {}):
+        if name not in streaming:
+            logger.warning(f"Camera {name} not streaming after {timeout}s")
+    return streaming
+
+
+def system_uptime() -> float:
+    try:
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError):
+        return 0.0
+
+# ============================================
+# MAIN
+# ============================================
+
+def wait_for_docker(client: DockerClient, timeout: int = DOCKER_READY_TIMEOUT) -> bool:
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if client.ping():
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def report(orch: Orchestrator, cameras: dict, camera_base: float) -> dict:
+    rows = []
+    logger.info(f"{'Service':<22} {'Action':<10} {'Launched':>9} {'Started':>9} "
+                f"{'Healthy':>9} {'Status':<8}")
+    for svc in sorted(orch.services.values(),
+                      key=lambda s: (s.healthy_at or s.started_at or float("inf"))):
+        logger.info(f"{svc.name:<22} {svc.action or '-':<10} {orch.elapsed(svc.launched_at):>9} "
+                    f"{orch.elapsed(svc.started_at):>9} {orch.elapsed(svc.healthy_at):>9} "
+                    f"{svc.phase:<8}")
+        rows.append({
+            "service": svc.name, "action": svc.action, "status": svc.phase,
+            "launched_s": svc.launched_at and svc.launched_at - orch.t0,
+            "started_s": svc.started_at and svc.started_at - orch.t0,
+            "healthy_s": svc.healthy_at and svc.healthy_at - orch.t0,
+        })
+    camera_rows = {name: camera_base + t for name, t in cameras.items()}
+    for name, t in sorted(camera_rows.items(), key=lambda kv: kv[1]):
+        logger.info(f"camera {name:<15} streaming at {t:6.1f}s")
+    return {"services": rows, "cameras_s": camera_rows}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Parallel, health-gated stack startup")
+    parser.add_argument("--project-dir", type=Path, default=HOMELAB_DIR)
+    parser.add_argument("--timeout", type=int, default=SERVICE_TIMEOUT,
+                        help="Seconds for each service to become ready")
+    parser.add_argument("--no-camera-check", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print the timing report as JSON")
+    args = parser.parse_args()
+
+    boot_uptime = system_uptime()
+    logger.info(f"Stack startup beginning ({boot_uptime:.0f}s after boot)")
+
+    orch = Orchestrator(args.project_dir, args.timeout)
+    if not wait_for_docker(orch.docker):
+        logger.error("Docker daemon not reachable")
+        return 1
+    logger.info(f"Docker ready after {time.monotonic() - orch.t0:.1f}s")
+
+    try:
+        orch.run()
+    except (RuntimeError, DockerError) as e:
+        logger.error(f"Startup failed: {e}")
+        return 1
+
+    cameras = {}
+    camera_base = time.monotonic() - orch.t0
+    frigate = orch.services.get("frigate")
+    if not args.no_camera_check and frigate is not None and frigate.ready:
+        cameras = wait_for_cameras()
+
+    result = report(orch, cameras, camera_base)
+    total = time.monotonic() - orch.t0
+    result["total_s"] = total
+    result["since_boot_s"] = boot_uptime + total
+    logger.info(f"Startup complete in {total:.1f}s ({boot_uptime + total:.0f}s after boot)")
+    if args.json:
+        print(json.dumps(result, indent=2))
+
+    failed = [s.name for s in orch.services.values() if s.phase in ("failed", "timeout")]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Storage Index - instant usage and migration-progress queries for large trees
+
+Keeps a persistent SQLite index of every directory under the indexed roots
+(normally the two mergerfs branches behind /mnt/frigate-pool): file count,
+apparent bytes, oldest/newest file mtime, subdirectories, and for Frigate's
+recordings/<YYYY-MM-DD>/<HH>/<camera> layout the camera and day.
+
+Refreshing is incremental: every directory is stat'ed, but only those whose
+mtime changed since the last run are listed again. Adding or removing a file
+changes its directory's mtime, so a refresh of a tree with a million
+segments costs a few thousand stat calls instead of a full `du` / `find`.
+(Files rewritten in place without a rename are not noticed until their
+directory changes - Frigate and rsync both write to a temp name and rename.)
+
+Commands:
+  usage      bytes/files per branch, camera or day (+ free space per branch)
+  compare    file/byte totals of two trees, e.g. migration progress;
+             exits 0 when the destination holds everything in the source
+  rebalance  move the oldest recording hours from the fuller branch to the
+             emptier one, at idle IO priority and a bandwidth cap, until
+             their free space is within --until-diff percent
+
+Usage:
+    storage_index.py usage [--by camera|day|branch] [--root DIR ...] [--no-refresh]
+    storage_index.py compare SRC DST
+    storage_index.py rebalance [--older-than-days 3] [--max-mbps 40] [--max-gb 50] [--interval 60] [--dry-run]
+"""
+
+import argparse
+import ctypes
+import json
+import logging
+import os
+import platform
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+HOMELAB_DIR = Path(os.environ.get("HOMELAB_DIR", "/opt/homelab"))
+INDEX_DB = Path(os.environ.get("STORAGE_INDEX_DB", HOMELAB_DIR / "data" / "storage_index.db"))
+
+BRANCHES = ["/mnt/frigate-ssd1", "/mnt/frigate-ssd2"]   # mergerfs branches of /mnt/frigate-pool
+RECORDINGS_DIR = "recordings"
+
+LIST_PAUSE_EVERY = 200       # directory listings between short pauses during refresh
+LIST_PAUSE = 0.02
+COPY_BLOCK = 1024 * 1024
+TEMP_SUFFIX = ".rebalance-tmp"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# ============================================
+# IO PRIORITY
+# ============================================
+
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "armv7l": 314, "i686": 289}
+
+
+def set_idle_io_priority() -> bool:
+    """ionice -c3 for this process (IO only when the disk is otherwise idle), plus nice 10."""
+    try:
+        os.nice(10)
+    except OSError:
+        pass
+    number = SYS_IOPRIO_SET.get(platform.machine())
+    if number is None:
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        value = IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT
+        return libc.syscall(number, IOPRIO_WHO_PROCESS, 0, value) == 0
+    except (OSError, AttributeError):
+        return False
+
+# ============================================
+# INDEX
+# ============================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    oldest REAL,
+    newest REAL,
+    children TEXT NOT NULL,
+    camera TEXT,
+    day TEXT,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS dirs_camera ON dirs (root, camera, day);
+CREATE TABLE IF NOT EXISTS roots (
+    root TEXT PRIMARY KEY,
+    refreshed REAL,
+    dirs INTEGER,
+    listed INTEGER
+);
+"""
+
+
+def recording_key(rel: str):
+    """(camera, day) for recordings/<YYYY-MM-DD>/<HH>/<camera>, else (None, None)."""
+    parts = rel.split("/")
+    if len(parts) == 4 and parts[0] == RECORDINGS_DIR and len(parts[1]) == 10:
+        return parts[3], parts[1]
+    return None, None
+
+
+class StorageIndex:
+    def __init__(self, db_path: Path = INDEX_DB, conn: sqlite3.Connection = None):
+        if conn is None:
+            db_path = Path(db_path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(db_path)
+        self.conn = conn
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _list(self, root: str, rel: str, st, listing: list = None) -> tuple:
+        files = size = 0
+        oldest = newest = None
+        children = []
+        with os.scandir(os.path.join(root, rel) if rel else root) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        children.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        fst = entry.stat(follow_symlinks=False)
+                        files += 1
+                        size += fst.st_size
+                        oldest = fst.st_mtime if oldest is None else min(oldest, fst.st_mtime)
+                        newest = fst.st_mtime if newest is None else max(newest, fst.st_mtime)
+                        if listing is not None:
+                            listing.append((entry.name, fst.st_size, fst.st_mtime_ns, fst.st_mode))
+                    elif listing is not None:
+                        # Symlinks and special files are not counted, but are listed
+                        fst = entry.stat(follow_symlinks=False)
+                        listing.append((entry.name, fst.st_size, fst.st_mtime_ns, fst.st_mode))
+                except FileNotFoundError:
+                    continue
+        camera, day = recording_key(rel)
+        return (root, rel, st.st_mtime_ns, files, size, oldest, newest,
+                json.dumps(sorted(children)), camera, day)
+
+    def refresh(self, root: str, paths=None, on_change=None) -> dict:
+        """
+        Bring root's rows up to date; only directories whose mtime changed are
+        listed. With paths, only those subtrees (relative paths) are visited.
+
+        on_change(rel, files) is called for every re-listed directory with its
+        non-directory entries (symlinks and special files included) as
+        [(name, size, mtime_ns, mode)], and with files=None for directories
+        that disappeared. Writes it makes on this index's connection are
+        committed together with the directory rows.
+        """
+        root = str(Path(root))
+        known = {path: (mtime_ns, children) for path, mtime_ns, children in self.conn.execute(
+            "SELECT path, mtime_ns, children FROM dirs WHERE root = ?", (root,))}
+        stack = list(paths) if paths is not None else [""]
+        seen = set()
+        updates = []
+        listed = 0
+        started = time.monotonic()
+        while stack:
+            rel = stack.pop()
+            try:
+                st = os.stat(os.path.join(root, rel) if rel else root)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            seen.add(rel)
+            row = known.get(rel)
+            if row is not None and row[0] == st.st_mtime_ns:
+                children = json.loads(row[1])
+            else:
+                listing = [] if on_change else None
+                try:
+                    record = self._list(root, rel, st, listing)
+                except (FileNotFoundError, NotADirectoryError):
+                    seen.discard(rel)
+                    continue
+                updates.append(record)
+                if on_change:
+                    on_change(rel, listing)
+                children = json.loads(record[7])
+                listed += 1
+                if listed % LIST_PAUSE_EVERY == 0:
+                    time.sleep(LIST_PAUSE)
+            stack.extend(f"{rel}/{c}" if rel else c for c in children)
+
+        # Rows under the visited subtrees that were not seen are gone
+        prefixes = [""] if paths is None else list(paths)
+        stale = [p for p in known if p not in seen and any(
+            pre == "" or p == pre or p.startswith(pre + "/") for pre in prefixes)]
+        if on_change:
+            for p in stale:
+                on_change(p, None)
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?,?,?,?,?,?,?,?,?,?)", updates)
+            self.conn.executemany("DELETE FROM dirs WHERE root = ? AND path = ?",
+                                  [(root, p) for p in stale])
+            if paths is None:
+                self.conn.execute("INSERT OR REPLACE INTO roots VALUES (?,?,?,?)",
+                                  (root, time.time(), len(seen), listed))
+        return {"dirs": len(seen), "listed": listed, "removed": len(stale),
+                "seconds": time.monotonic() - started}
+
+    def invalidate(self, root: str):
+        """Make the next refresh re-list every directory under root."""
+        with self.conn:
+            self.conn.execute("UPDATE dirs SET mtime_ns = -1 WHERE root = ?", (str(Path(root)),))
+
+    def totals(self, root: str) -> tuple:
+        row = self.conn.execute("SELECT COALESCE(SUM(files), 0), COALESCE(SUM(bytes), 0) "
+                                "FROM dirs WHERE root = ?", (str(Path(root)),)).fetchone()
+        return row[0], row[1]
+
+    def by_top_level(self, root: str) -> dict:
+        result = {}
+        for path, files, size in self.conn.execute(
+                "SELECT path, files, bytes FROM dirs WHERE root = ?", (str(Path(root)),)):
+            top = path.split("/", 1)[0] if path else "."
+            f, b = result.get(top, (0, 0))
+            result[top] = (f + files, b + size)
+        return result
+
+    def grouped(self, roots: list, by: str) -> list:
+        """[(key, files, bytes, oldest, newest)] for recordings grouped by camera, day or branch."""
+        column = {"camera": "camera", "day": "day", "branch": "root"}[by]
+        marks = ",".join("?" * len(roots))
+        return self.conn.execute(
+            f"SELECT {column}, SUM(files), SUM(bytes), MIN(oldest), MAX(newest) FROM dirs "
+            f"WHERE root IN ({marks}) AND camera IS NOT NULL GROUP BY {column} ORDER BY {column}",
+            [str(Path(r)) for r in roots]).fetchall()
+
+    def oldest_hours(self, root: str, older_than: float) -> list:
+        """Recording hour directories on root whose newest file is older than the cutoff."""
+        return self.conn.execute(
+            "SELECT path, files, bytes FROM dirs WHERE root = ? AND camera IS NOT NULL "
+            "AND files > 0 AND newest < ? ORDER BY newest", (str(Path(root)), older_than)).fetchall()
+
+# ============================================
+# REBALANCE
+# ============================================
+
+def free_fraction(path: str) -> float:
+    st = os.statvfs(path)
+    return st.f_bavail / st.f_blocks if st.f_blocks else 0.0
+
+
+def throttled_copy(src: str, dst: str, max_bps: float) -> int:
+    """Copy src to dst (temp name, fsync, rename) at no more than max_bps; returns bytes."""
+    tmp = dst + TEMP_SUFFIX
+    copied = 0
+    started = time.monotonic()
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            while True:
+                block = fin.read(COPY_BLOCK)
+                if not block:
+                    break
+                fout.write(block)
+                copied += len(block)
+                if max_bps:
+                    ahead = copied / max_bps - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+            fout.flush()
+            os.fsync(fout.fileno())
+            # Moved segments are cold - keep them out of the page cache
+            os.posix_fadvise(fout.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            os.posix_fadvise(fin.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        if os.path.getsize(tmp) != os.path.getsize(src):
+            raise OSError(f"size mismatch copying {src}")
+        os.rename(tmp, dst)
+        st = os.stat(src)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return copied
+
+
+def rebalance(index: StorageIndex, args) -> int:
+    for branch in args.branches:
+        index.refresh(branch)
+
+    max_bps = args.max_mbps * 1e6 if args.max_mbps else 0
+    budget = args.max_gb * 1e9
+    moved_bytes = moved_files = 0
+    cutoff = time.time() - args.older_than_days * 86400
+
+    while moved_bytes < budget:
+        free = {b: free_fraction(b) for b in args.branches}
+        src = min(free, key=free.get)
+        dst = max(free, key=free.get)
+        if src == dst or os.path.samefile(src, dst):
+            logger.info("Nothing to balance: need two distinct branches")
+            break
+        gap = (free[dst] - free[src]) * 100
+        if gap <= args.until_diff:
+            logger.info(f"Branches balanced: free space differs by {gap:.1f}%")
+            break
+        hours = index.oldest_hours(src, cutoff)
+        if not hours:
+            logger.info(f"No recordings older than {args.older_than_days} days left on {src}")
+            break
+        rel, files, size = hours[0]
+        logger.info(f"{'[dry-run] ' if args.dry_run else ''}Moving {rel} ({files} files, "
+                    f"{size / 1e6:.0f}MB) {src} -> {dst} (free {free[src] * 100:.1f}% vs {free[dst] * 100:.1f}%)")
+        if args.dry_run:
+            break
+
+        src_dir, dst_dir = os.path.join(src, rel), os.path.join(dst, rel)
+        os.makedirs(dst_dir, exist_ok=True)
+        for entry in sorted(os.scandir(src_dir), key=lambda e: e.name):
+            if not entry.is_file(follow_symlinks=False) or entry.name.endswith(TEMP_SUFFIX):
+                continue
+            target = os.path.join(dst_dir, entry.name)
+            try:
+                moved_bytes += throttled_copy(entry.path, target, max_bps)
+                os.unlink(entry.path)
+                moved_files += 1
+            except FileNotFoundError:
+                # Frigate's retention removed it mid-copy; do not resurrect it on the other branch
+                if os.path.exists(target) and not os.path.exists(entry.path):
+                    os.unlink(target)
+        # Drop the emptied camera/hour/day directories on the source branch
+        parent = rel.rsplit("/", 1)[0]
+        empty = rel
+        while empty != RECORDINGS_DIR:
+            try:
+                os.rmdir(os.path.join(src, empty))
+            except OSError:
+                break
+            empty = empty.rsplit("/", 1)[0]
+        index.refresh(src, [empty])
+        index.refresh(dst, [parent])
+
+    logger.info(f"Moved {moved_files} files, {moved_bytes / 1e9:.2f}GB")
+    return 0
+
+# ============================================
+# COMMANDS
+# ============================================
+
+def _size(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1024 or unit == "TB":
+            return f"{n:.1f}{unit}" if unit != "B" else f"{n:.0f}B"
+        n /= 1024
+
+
+def refresh_logged(index: StorageIndex, root: str):
+    r = index.refresh(root)
+    logger.info(f"Index {root}: {r['dirs']} dirs, {r['listed']} listed, "
+                f"{r['removed']} removed ({r['seconds']:.2f}s)")
+
+
+def usage(index: StorageIndex, args) -> int:
+    if not args.no_refresh:
+        for root in args.root:
+            refresh_logged(index, root)
+    print(f"{'root':<28}{'files':>10}{'size':>11}{'disk free':>11}")
+    for root in args.root:
+        files, size = index.totals(root)
+        free = f"{free_fraction(root) * 100:.1f}%" if os.path.isdir(root) else "-"
+        print(f"{root:<28}{files:>10}{_size(size):>11}{free:>11}")
+    rows = index.grouped(args.root, args.by)
+    if rows:
+        print()
+        print(f"{args.by:<28}{'files':>10}{'size':>11}  span")
+        for key, files, size, oldest, newest in rows:
+            span = (f"{time.strftime('%Y-%m-%d', time.localtime(oldest))} .. "
+                    f"{time.strftime('%Y-%m-%d', time.localtime(newest))}") if oldest else ""
+            print(f"{key:<28}{files:>10}{_size(size):>11}  {span}")
+    return 0
+
+
+def compare(index: StorageIndex, args) -> int:
+    for root in (args.src, args.dst):
+        if not os.path.isdir(root):
+            logger.error(f"Not a directory: {root}")
+            return 2
+        refresh_logged(index, root)
+    src_files, src_bytes = index.totals(args.src)
+    dst_files, dst_bytes = index.totals(args.dst)
+    pct = dst_bytes / src_bytes * 100 if src_bytes else 100.0
+    print(f"Source      {args.src}: {src_files} files, {_size(src_bytes)}")
+    print(f"Destination {args.dst}: {dst_files} files, {_size(dst_bytes)}")
+    print(f"Progress: {pct:.1f}% of bytes, {dst_files}/{src_files} files")
+
+    src_top, dst_top = index.by_top_level(args.src), index.by_top_level(args.dst)
+    behind = [(top, f, b, *dst_top.get(top, (0, 0))) for top, (f, b) in sorted(src_top.items())
+              if dst_top.get(top, (0, 0)) != (f, b)]
+    if behind:
+        print("\nDiffering top-level directories:")
+        for top, f, b, df, db in behind[:20]:
+            print(f"  {top:<30} {df}/{f} files  {_size(db)}/{_size(b)}")
+    complete = dst_files >= src_files and dst_bytes >= src_bytes and not any(
+        df < f or db < b for _, f, b, df, db in behind)
+    print(f"\n{'COMPLETE' if complete else 'INCOMPLETE'}")
+    return 0 if complete else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Incremental storage index for recordings and migrations")
+    parser.add_argument("--db", type=Path, default=INDEX_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("usage", help="Usage per branch and camera/day")
+    p.add_argument("--root", action="append", help="Indexed root (repeatable, default: mergerfs branches)")
+    p.add_argument("--by", choices=("camera", "day", "branch"), default="camera")
+    p.add_argument("--no-refresh", action="store_true", help="Answer from the index as it is")
+
+    p = sub.add_parser("compare", help="Compare two trees (migration progress)")
+    p.add_argument("src")
+    p.add_argument("dst")
+
+    p = sub.add_parser("rebalance", help="Move old recordings to the emptier branch")
+    p.add_argument("--branch", dest="branches", action="append", help="Branch (repeatable)")
+    p.add_argument("--older-than-days", type=float, default=3)
+    p.add_argument("--max-mbps", type=float, default=40, help="Copy bandwidth cap in MB/s (0 = none)")
+    p.add_argument("--max-gb", type=float, default=50, help="Stop after moving this much")
+    p.add_argument("--until-diff", type=float, default=5,
+                   help="Stop when branch free space differs by at most this many percent")
+    p.add_argument("--interval", type=float, default=0,
+                   help="Keep running, rebalancing every N minutes (0 = once)")
+    p.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+    index = StorageIndex(args.db)
+    try:
+        if args.command == "usage":
+            args.root = args.root or BRANCHES
+            return usage(index, args)
+        if args.command == "compare":
+            return compare(index, args)
+        args.branches = args.branches or BRANCHES
+        if not set_idle_io_priority():
+            logger.warning("Could not set idle IO priority; relying on the bandwidth cap")
+        while True:
+            rc = rebalance(index, args)
+            if not args.interval:
+                return rc
+            time.sleep(args.interval * 60)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,15 +5,21 @@ Polls system metrics once per minute and takes automated actions.
 
 Current Monitors:
 - CPU Auto-throttle: Pauses Frigate AI when CPU >80% for 10min, resumes when <70% for 20min
+- Containers: per-container CPU/memory/pressure from cgroup v2 (cgroup_stats.py),
+  logged with the CPU status and when a container is stalled on memory
 """
 
+import argparse
 import time
-import psutil
 import subprocess
-import logging
 import json
 from datetime import datetime
 
+import cgroup_stats
+import ha_client
+import log_setup
+import tracing
+
 # ============================================
 # CONFIGURATION
 # ============================================
@@ -24,6 +30,9 @@ MQTT_PORT = "1883"
 MQTT_USER = "homeassistant"
 MQTT_PASS = "YOUR_MQTT_PASSWORD"
 
+# Home Assistant (websocket via ha_client; needs HA_TOKEN in the environment)
+PAUSED_ENTITY = "input_boolean.frigate_detection_paused"
+
 # CPU Monitor Settings
 CPU_HIGH_THRESHOLD = 80      # Pause detection when CPU above this
 CPU_LOW_THRESHOLD = 70       # Resume detection when CPU below this
@@ -31,6 +40,13 @@ CPU_HIGH_MINUTES = 10        # Minutes above threshold before pausing
 CPU_LOW_MINUTES = 20         # Minutes below threshold before resuming
 POLL_INTERVAL = 60           # Poll every 60 seconds
 
+# Container Monitor Settings
+MEMORY_STALL_WARN = 10       # Warn when a container's tasks stall >10% of the time on memory
+TOP_CONTAINERS = 3           # Containers listed in status lines
+
+# Tracing (--trace / TRACE_FILE)
+TRACE_FLUSH_POLLS = 60       # Rewrite the trace file every hour of polls
+
 # ============================================
 # STATE
 # ============================================
@@ -42,6 +58,11 @@ class MonitorState:
         self.cpu_low_count = 0
         self.frigate_paused = False
         self.last_action_time = None
+        self.ha = None               # SyncHAClient, or None when HA is unavailable
+        self.ha_down_logged = False  # Warn once per outage, not every poll
+        self.containers = None       # CgroupCollector, or None without Docker/cgroup v2
+        self.containers_down_logged = False
+        self.container_stats = {}    # Latest per-container sample
 
 state = MonitorState()
 
@@ -49,25 +70,13 @@ state = MonitorState()
 # LOGGING
 # ============================================
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[logging.StreamHandler()]
-)
-logger = logging.getLogger(__name__)
-
-# Also log to file if possible
-try:
-    file_handler = logging.FileHandler('/opt/homelab/logs/system-monitor.log')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
-    logger.addHandler(file_handler)
-except Exception as e:
-    logger.warning(f"Could not add file handler: {e}")
+logger = log_setup.setup_logging("system-monitor", log_setup.LOG_DIR / "system-monitor.jsonl")
 
 # ============================================
 # MQTT CONTROL
 # ============================================
 
+@tracing.traced("mqtt_publish", cat="publish")
 def mqtt_publish(topic, payload):
     """Publish MQTT message via mosquitto_pub"""
     try:
@@ -86,14 +95,61 @@ def mqtt_publish(topic, payload):
         logger.error(f"MQTT publish failed: {e}")
         return False
 
-def call_ha_service_mqtt(entity_id, command):
-    """Call HA service via MQTT (for input_boolean)"""
-    topic = f"homeassistant/input_boolean/{entity_id.split('.')[-1]}/set"
-    return mqtt_publish(topic, command)
+# ============================================
+# HOME ASSISTANT
+# ============================================
+
+def connect_ha():
+    """Open the shared HA connection and mirror the pause flag; None if unavailable"""
+    try:
+        ha = ha_client.SyncHAClient(entity_ids=[PAUSED_ENTITY])
+    except Exception as e:
+        if not state.ha_down_logged:
+            logger.warning(f"Home Assistant unavailable, dashboard flag will not be synced: {e}")
+            state.ha_down_logged = True
+        return None
+    if state.ha_down_logged:
+        logger.info("Reconnected to Home Assistant")
+        state.ha_down_logged = False
+    return ha
+
+def ensure_ha():
+    """Retry the HA connection while it is down; adopt HA's pause flag once it is up"""
+    if state.ha is not None:
+        return
+    state.ha = connect_ha()
+    if state.ha is not None and state.ha.state(PAUSED_ENTITY) == 'on':
+        state.frigate_paused = True
+        logger.info("Frigate detection is currently paused (from HA)")
+
+def drop_ha():
+    """Close a connection whose call failed; ensure_ha opens a fresh one"""
+    if state.ha is not None:
+        state.ha.close()
+        state.ha = None
+
+@tracing.traced("ha_service_call", cat="publish")
+def set_ha_boolean(entity_id, on):
+    """Set an input_boolean through HA's websocket API"""
+    # One retry on a fresh connection, so a dropped socket does not lose the update
+    for _ in range(2):
+        ensure_ha()
+        if state.ha is None:
+            return False
+        try:
+            state.ha.call_service('input_boolean', 'turn_on' if on else 'turn_off',
+                                  target={'entity_id': entity_id})
+            return True
+        except Exception as e:
+            logger.error(f"HA service call failed for {entity_id}: {e}")
+            drop_ha()
+    return False
 
 def get_frigate_state():
-    """Get current Frigate detection state from cached state"""
-    # We track state internally - no need to query HA constantly
+    """Get current Frigate detection state (HA's mirrored flag, else internal state)"""
+    # The mirror is kept current by HA's push updates - reading it costs nothing
+    if state.ha is not None and state.ha.state(PAUSED_ENTITY) is not None:
+        return state.ha.state(PAUSED_ENTITY) == 'on'
     return state.frigate_paused
 
 def pause_frigate():
@@ -107,7 +163,7 @@ def pause_frigate():
             success = False
 
     # Also set the HA boolean for dashboard sync
-    call_ha_service_mqtt('input_boolean.frigate_detection_paused', 'ON')
+    set_ha_boolean(PAUSED_ENTITY, True)
 
     if success:
         state.frigate_paused = True
@@ -126,7 +182,7 @@ def resume_frigate():
             success = False
 
     # Also set the HA boolean for dashboard sync
-    call_ha_service_mqtt('input_boolean.frigate_detection_paused', 'OFF')
+    set_ha_boolean(PAUSED_ENTITY, False)
 
     if success:
         state.frigate_paused = False
@@ -134,24 +190,64 @@ def resume_frigate():
         logger.info("🟢 RESUMED Frigate detection on all cameras (CPU normal)")
     return success
 
+# ============================================
+# CONTAINERS
+# ============================================
+
+def connect_containers():
+    """Open the cgroup collector (first sample primes the rates); None if unavailable"""
+    try:
+        collector = cgroup_stats.CgroupCollector()
+        collector.sample()
+    except Exception as e:
+        if not state.containers_down_logged:
+            logger.warning(f"Per-container stats unavailable, retrying every poll: {e}")
+            state.containers_down_logged = True
+        return None
+    logger.info(f"Tracking {len(collector.cgroups)} containers via cgroup v2")
+    state.containers_down_logged = False
+    return collector
+
+def ensure_containers():
+    """Retry the cgroup collector while it is unavailable (e.g. Docker started after us)"""
+    if state.containers is None:
+        state.containers = connect_containers()
+
+def top_containers():
+    """'frigate 180% 1.2G, ...' for the busiest containers in the latest sample"""
+    busiest = sorted(state.container_stats.items(), key=lambda item: -item[1].get('cpu_percent', 0))
+    return ", ".join(f"{name} {s.get('cpu_percent', 0):.0f}% {(s['memory_bytes'] or 0) / 1073741824:.1f}G"
+                     for name, s in busiest[:TOP_CONTAINERS])
+
 # ============================================
 # MONITORS
 # ============================================
 
+def _psutil():
+    # Imported on first use, after the HA connection is up
+    try:
+        import psutil
+    except ImportError:
+        raise RuntimeError("psutil not installed. Run: pip install psutil")
+    return psutil
+
 def check_cpu():
     """
     CPU Auto-throttle Monitor
     - Pauses Frigate when CPU >80% for 10 consecutive minutes
     - Resumes when CPU <70% for 20 consecutive minutes
     """
-    cpu_percent = psutil.cpu_percent(interval=1)
+    with tracing.span("sample_cpu", cat="sampling"):
+        cpu_percent = _psutil().cpu_percent(interval=1)
+    tracing.counter("cpu", percent=cpu_percent)
 
     if cpu_percent > CPU_HIGH_THRESHOLD:
         state.cpu_high_count += 1
         state.cpu_low_count = 0  # Reset low counter
 
         if state.cpu_high_count >= CPU_HIGH_MINUTES and not state.frigate_paused:
-            logger.warning(f"CPU high for {CPU_HIGH_MINUTES} min ({cpu_percent:.1f}%), pausing Frigate")
+            logger.warning(f"CPU high for {CPU_HIGH_MINUTES} min ({cpu_percent:.1f}%), pausing Frigate"
+                           + (f" | Top: {top_containers()}" if state.container_stats else ""))
             pause_frigate()
             state.cpu_high_count = 0  # Reset to avoid repeated triggers
 
@@ -172,7 +268,26 @@ def check_cpu():
     # Log status every 5 minutes
     if (state.cpu_high_count + state.cpu_low_count) % 5 == 0:
         status = "PAUSED" if state.frigate_paused else "ACTIVE"
-        logger.info(f"CPU: {cpu_percent:.1f}% | Frigate: {status} | High:{state.cpu_high_count} Low:{state.cpu_low_count}")
+        logger.info(f"CPU: {cpu_percent:.1f}% | Frigate: {status} | High:{state.cpu_high_count} Low:{state.cpu_low_count}"
+                    + (f" | Top: {top_containers()}" if state.container_stats else ""),
+                    extra={"fields": {"cpu_percent": cpu_percent, "frigate_paused": state.frigate_paused}})
+
+def check_containers():
+    """
+    Container Monitor
+    - Samples every container's cgroup (rates over the last poll interval)
+    - Warns when a container spends more than MEMORY_STALL_WARN % stalled on memory
+    """
+    if state.containers is None:
+        return
+    with tracing.span("sample_containers", cat="sampling") as span:
+        state.container_stats = state.containers.sample()
+        span.set(containers=len(state.container_stats))
+    for name, stats in state.container_stats.items():
+        stall = ((stats.get('memory_pressure') or {}).get('some') or {}).get('stall_percent', 0)
+        if stall > MEMORY_STALL_WARN:
+            logger.warning(f"{name} stalled on memory {stall:.1f}% of the last minute "
+                           f"({(stats['memory_bytes'] or 0) / 1048576:.0f} MB)")
 
 # ============================================
 # MAIN LOOP
@@ -183,15 +298,32 @@ def run_monitors():
     logger.info("🚀 System Monitor started")
     logger.info(f"CPU thresholds: Pause >{CPU_HIGH_THRESHOLD}% for {CPU_HIGH_MINUTES}min, Resume <{CPU_LOW_THRESHOLD}% for {CPU_LOW_MINUTES}min")
 
+    # Pick up a pause left over from a previous run instead of assuming active
+    ensure_ha()
+
+    polls = 0
     while True:
         try:
             # Run all monitors
-            check_cpu()
-
-            # Add future monitors here:
-            # check_memory()
-            # check_disk()
-            # check_temperature()
+            with tracing.span("poll"):
+                ensure_ha()
+                # A Docker/cgroup failure must not skip the CPU check
+                try:
+                    ensure_containers()
+                    check_containers()
+                except Exception as e:
+                    logger.error(f"Container monitor error: {e}", exc_info=True)
+                    state.containers = None
+                check_cpu()
+
+                # Add future monitors here:
+                # check_memory()
+                # check_disk()
+                # check_temperature()
+
+            polls += 1
+            if polls % TRACE_FLUSH_POLLS == 0:
+                tracing.flush()
 
             time.sleep(POLL_INTERVAL)
 
@@ -203,4 +335,7 @@ def run_monitors():
             time.sleep(POLL_INTERVAL)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background system monitor")
+    tracing.add_arguments(parser)
+    tracing.configure("system-monitor", parser.parse_args())
     run_monitors()
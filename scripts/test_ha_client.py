@@ -0,0 +1,159 @@
+"""
+Tests for ha_client.py against fake_ha_server.py, run in-process.
+
+    python3 -m pytest scripts/test_ha_client.py
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp import web
+
+import fake_ha_server
+import ha_client
+
+
+async def start_fake_ha(sensors: int = 3):
+    ha = fake_ha_server.FakeHA(fake_ha_server.DEFAULT_TOKEN, sensors)
+    runner = web.AppRunner(fake_ha_server.make_app(ha))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return ha, runner, f"http://127.0.0.1:{port}"
+
+
+async def until(predicate, timeout: float = 2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def test_mirror_follows_entity_diffs():
+    async def run():
+        ha, runner, url = await start_fake_ha()
+        try:
+            async with ha_client.HAClient(url, fake_ha_server.DEFAULT_TOKEN) as client:
+                await client.subscribe_entities()
+                assert client.state("light.porch") == "off"
+                assert client.attribute("sensor.fake_0001", "unit_of_measurement") == "W"
+
+                changes = []
+                client.listen(lambda e, old, new: changes.append((e, old.state, new.state)),
+                              ["light.porch"])
+                ha.set_state("light.porch", "on", {"brightness": 200})
+                ha.set_state("sensor.fake_0000", "12.5")
+                await until(lambda: client.state("sensor.fake_0000") == "12.5")
+
+                porch = client.get("light.porch")
+                assert porch.state == "on"
+                assert porch.attributes["brightness"] == 200
+                assert porch.attributes["friendly_name"] == "Porch"
+                assert changes == [("light.porch", "off", "on")]
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_service_calls_are_batched_but_not_deduplicated():
+    async def run():
+        ha, runner, url = await start_fake_ha()
+        try:
+            async with ha_client.HAClient(url, fake_ha_server.DEFAULT_TOKEN) as client:
+                await client.subscribe_entities()
+                await asyncio.gather(
+                    client.call_service("input_boolean", "turn_on",
+                                        target={"entity_id": "input_boolean.dog_mode"}),
+                    client.call_service("input_boolean", "turn_on",
+                                        target={"entity_id": "input_boolean.cameras_armed"}),
+                    client.call_service("input_boolean", "turn_on",
+                                        target={"entity_id": "input_boolean.dog_mode"}))
+
+                # The repeat for dog_mode is its own call (toggle/notify must run twice)
+                assert [sorted(c["target"]["entity_id"]) for c in ha.service_log] == [
+                    ["input_boolean.cameras_armed", "input_boolean.dog_mode"],
+                    ["input_boolean.dog_mode"]]
+                assert client.stats["service_requests"] == 3
+                assert client.stats["service_calls"] == 2
+                await until(lambda: client.state("input_boolean.cameras_armed") == "on")
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_call_queued_during_flush_is_sent():
+    async def run():
+        ha, runner, url = await start_fake_ha()
+        try:
+            async with ha_client.HAClient(url, fake_ha_server.DEFAULT_TOKEN) as client:
+                send = client.send
+                queued = []
+
+                async def send_and_queue(message, timeout=ha_client.REQUEST_TIMEOUT):
+                    if not queued:
+                        # Queue a call while this batch is still being sent
+                        queued.append(asyncio.create_task(client.call_service(
+                            "light", "turn_off", target={"entity_id": "light.porch"})))
+                        await asyncio.sleep(0)
+                    return await send(message, timeout)
+
+                client.send = send_and_queue
+                await client.call_service("light", "turn_on", target={"entity_id": "light.porch"})
+                await asyncio.wait_for(queued[0], 2)
+                assert [c["service"] for c in ha.service_log] == ["turn_on", "turn_off"]
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_failing_event_callback_does_not_stop_the_reader():
+    async def run():
+        ha, runner, url = await start_fake_ha()
+        try:
+            async with ha_client.HAClient(url, fake_ha_server.DEFAULT_TOKEN) as client:
+                await client.subscribe_entities()
+
+                def broken(event):
+                    raise KeyError("boom")
+
+                await client.subscribe_events(broken, "state_changed")
+                ha.set_state("light.porch", "on")
+                ha.set_state("sensor.fake_0000", "7")
+                await until(lambda: client.state("sensor.fake_0000") == "7")
+                assert client.state("light.porch") == "on"
+                assert not client._reader.done()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_reader_reconnects_and_resyncs_after_unexpected_error():
+    async def run():
+        ha, runner, url = await start_fake_ha()
+        try:
+            async with ha_client.HAClient(url, fake_ha_server.DEFAULT_TOKEN) as client:
+                await client.subscribe_entities()
+                dispatch = client._dispatch
+
+                def fail_once(msg):
+                    client._dispatch = dispatch
+                    raise RuntimeError("unexpected")
+
+                client._dispatch = fail_once
+                ha.set_state("light.porch", "on")
+                await until(lambda: ha.stats["connections"] == 2, timeout=5)
+                # The diff lost with the old reader arrives in the resync snapshot
+                await until(lambda: client.state("light.porch") == "on")
+                ha.set_state("sensor.fake_0000", "9")
+                await until(lambda: client.state("sensor.fake_0000") == "9")
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
@@ -0,0 +1,111 @@
+"""
+Tests for notification_gateway.py against fake_telegram_server.py, run
+in-process.
+
+    python3 -m pytest scripts/test_notification_gateway.py
+"""
+
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp import web
+
+import fake_telegram_server
+import notification_gateway
+
+
+@pytest.fixture(autouse=True)
+def telegram_config(monkeypatch, tmp_path):
+    monkeypatch.setattr(notification_gateway, "TELEGRAM_BOT_TOKEN", fake_telegram_server.DEFAULT_TOKEN)
+    monkeypatch.setattr(notification_gateway, "TELEGRAM_CHAT_ID", "42")
+    monkeypatch.setattr(notification_gateway, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(notification_gateway, "BACKOFF_BASE", 0.01)
+
+
+async def start_fake_telegram(per_minute: int = 20, fail_rate: float = 0.0):
+    tg = fake_telegram_server.FakeTelegram(fake_telegram_server.DEFAULT_TOKEN, per_minute, fail_rate)
+    runner = web.AppRunner(fake_telegram_server.make_app(tg))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return tg, runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def until(predicate, timeout: float = 3):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def alert(camera: str, message: str) -> bytes:
+    return json.dumps({"camera": camera, "title": f"Person at {camera}", "message": message,
+                       "targets": ["telegram"]}).encode()
+
+
+def test_burst_is_sent_once_then_merged():
+    async def run():
+        tg, runner, url = await start_fake_telegram()
+        gateway = notification_gateway.Gateway(0.3, url)
+        try:
+            for i in range(4):
+                gateway.submit(alert("backyard", f"event {i}"))
+            gateway.submit(alert("front_door", "event 4"))
+            await until(lambda: len(tg.messages) == 3)
+
+            texts = [m["text"] for m in tg.messages]
+            assert texts[:2] == ["Person at backyard\nevent 0", "Person at front_door\nevent 4"]
+            assert texts[2] == "Person at backyard\nevent 1\nevent 2\nevent 3\n(3 alerts)"
+            assert gateway.stats["coalesced"] == 2
+        finally:
+            await gateway.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_server_errors_are_retried():
+    async def run():
+        tg, runner, url = await start_fake_telegram(fail_rate=1.0)
+        gateway = notification_gateway.Gateway(0.3, url)
+        try:
+            gateway.submit(alert("backyard", "event 0"))
+            await until(lambda: tg.stats["failed"] >= 2)
+            tg.fail_rate = 0.0
+            await until(lambda: gateway.stats["sent"] == 1)
+
+            assert len(tg.messages) == 1
+            assert gateway.stats["retries"] >= 2
+            assert gateway.stats["failed"] == 0
+        finally:
+            await gateway.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def test_rate_limited_alerts_wait_and_fold_together():
+    async def run():
+        tg, runner, url = await start_fake_telegram(per_minute=1)
+        gateway = notification_gateway.Gateway(0, url)
+        try:
+            gateway.submit(alert("backyard", "event 0"))
+            gateway.submit(alert("garage", "event 1"))
+            await until(lambda: gateway.stats["rate_limited"] == 1)
+
+            # While "garage" waits out retry_after, later garage alerts share one queue entry
+            gateway.submit(alert("garage", "event 2"))
+            gateway.submit(alert("garage", "event 3"))
+            await until(lambda: gateway.targets["telegram"].queue)
+            queue = gateway.targets["telegram"].queue
+            await until(lambda: queue[0]["count"] == 2)
+            assert len(queue) == 1
+            assert queue[0]["lines"] == ["event 2", "event 3"]
+            assert len(tg.messages) == 1
+        finally:
+            await gateway.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
@@ -0,0 +1,110 @@
+"""
+Tests for snapshot_service.py's analysis cache, with a stand-in Frigate
+snapshot endpoint and fake_ha_server.py answering ai_task.generate_data.
+
+    python3 -m pytest scripts/test_snapshot_service.py
+"""
+
+import asyncio
+import io
+
+import pytest
+
+pytest.importorskip("aiohttp")
+Image = pytest.importorskip("PIL.Image")
+from aiohttp import web
+
+import fake_ha_server
+import ha_client
+import snapshot_service
+
+
+def gradient(reverse: bool = False) -> bytes:
+    """A 320x240 JPEG; the two directions are far apart in dHash."""
+    image = Image.new("L", (320, 240))
+    image.putdata([(255 - x if reverse else x) % 256 for _ in range(240) for x in range(320)])
+    out = io.BytesIO()
+    image.convert("RGB").save(out, "JPEG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def service_dirs(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot_service, "WWW_DIR", tmp_path)
+    monkeypatch.setattr(snapshot_service, "IMAGE_DIR", tmp_path / "snapshots" / "ai")
+    return tmp_path
+
+
+async def start(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def run_with_service(test, tmp_path):
+    frames = {"a": gradient(), "b": gradient(), "c": gradient(reverse=True)}
+
+    async def snapshot(request):
+        return web.Response(body=frames[request.match_info["event_id"]], content_type="image/jpeg")
+
+    frigate = web.Application()
+    frigate.router.add_get("/api/events/{event_id}/snapshot.jpg", snapshot)
+    frigate_runner, frigate_url = await start(frigate)
+    ha = fake_ha_server.FakeHA(fake_ha_server.DEFAULT_TOKEN, 0, ai_response="SAFE: nobody")
+    ha_runner, ha_url = await start(fake_ha_server.make_app(ha))
+
+    service = snapshot_service.SnapshotService(
+        frigate_url, snapshot_service.AnalysisCache(tmp_path / "cache.db"))
+    await service.start()
+    service.ha = ha_client.HAClient(ha_url, fake_ha_server.DEFAULT_TOKEN)
+    await service.ha.connect()
+    try:
+        await test(service, ha)
+    finally:
+        await service.close()
+        await frigate_runner.cleanup()
+        await ha_runner.cleanup()
+
+
+def request(event_id: str, instructions: str = "Is anyone there?") -> dict:
+    return {"camera": "backyard", "event_id": event_id, "task_name": "Backyard",
+            "instructions": instructions}
+
+
+def test_same_event_is_analysed_once(service_dirs):
+    async def test(service, ha):
+        first = await service.analyze(request("a"))
+        second = await service.analyze(request("a"))
+        assert (first["cached"], second["cached"]) == (False, "event")
+        assert first["data"] == second["data"] == "SAFE: nobody"
+        assert (service_dirs / "snapshots" / "ai" / "a.jpg").exists()
+
+        # Different instructions are a different question about the same frame
+        other = await service.analyze(request("a", "Is a dog there?"))
+        assert other["cached"] is False
+        assert ha.stats["ai_calls"] == 2
+
+    asyncio.run(run_with_service(test, service_dirs))
+
+
+def test_concurrent_requests_share_one_model_call(service_dirs):
+    async def test(service, ha):
+        results = await asyncio.gather(*(service.analyze(request("a")) for _ in range(3)))
+        assert sorted(str(r["cached"]) for r in results) == ["False", "event", "event"]
+        assert ha.stats["ai_calls"] == 1
+
+    asyncio.run(run_with_service(test, service_dirs))
+
+
+def test_similar_frame_reuses_analysis(service_dirs):
+    async def test(service, ha):
+        await service.analyze(request("a"))
+        similar = await service.analyze(request("b"))
+        different = await service.analyze(request("c"))
+        assert similar["cached"] == "similar"
+        assert different["cached"] is False
+        assert ha.stats["ai_calls"] == 2
+        assert service.stats["similar_hits"] == 1
+
+    asyncio.run(run_with_service(test, service_dirs))
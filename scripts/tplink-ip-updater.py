@@ -5,19 +5,29 @@ TP-Link IP Auto-Updater for Home Assistant
 Discovers TP-Link devices on the network and updates Home Assistant's
 config_entries with current IPs. Run on startup to handle DHCP changes.
 
-Requires: python-kasa (pip install python-kasa)
+Requires: python-kasa (pip install python-kasa), aiohttp, and HA_TOKEN (a
+long-lived access token) to reload the integration without a restart
+
+Usage:
+    tplink-ip-updater.py [--trace [PATH]] [--profile [HZ]]
 """
 
+import argparse
 import asyncio
 import json
 import subprocess
 import sys
-import time
 from pathlib import Path
 
+import ha_client
+import log_setup
+import tracing
+
 # Configuration
 HA_CONFIG_PATH = Path("/opt/homelab/homeassistant/.storage/core.config_entries")
-LOG_FILE = Path("/var/log/tplink-ip-updater.log")
+LOG_FILE = Path("/var/log/tplink-ip-updater.jsonl")
+
+logger = log_setup.setup_logging("tplink-ip-updater", LOG_FILE)
 
 # Known devices by MAC address (lowercase, with colons)
 KNOWN_DEVICES = {
@@ -28,60 +38,49 @@ KNOWN_DEVICES = {
 }
 
 
-def log(message: str):
-    """Log to file and stdout."""
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    line = f"[{timestamp}] {message}"
-    print(line)
-    try:
-        with open(LOG_FILE, "a") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
-
-
 async def discover_tplink_devices(timeout: int = 10) -> dict:
     """Discover TP-Link devices on the network using python-kasa."""
     try:
         from kasa import Discover
 
-        log(f"Discovering TP-Link devices (timeout: {timeout}s)...")
+        logger.info(f"Discovering TP-Link devices (timeout: {timeout}s)...")
         devices = await Discover.discover(timeout=timeout)
 
         result = {}
         for ip, dev in devices.items():
             try:
-                await dev.update()
+                with tracing.span("device_update", cat="discovery", ip=ip):
+                    await dev.update()
                 mac = dev.mac.lower().replace("-", ":")
                 result[mac] = {
                     "ip": ip,
                     "alias": dev.alias,
                     "model": dev.model,
                 }
-                log(f"  Found: {dev.alias} ({dev.model}) at {ip} - MAC: {mac}")
+                logger.info(f"  Found: {dev.alias} ({dev.model}) at {ip} - MAC: {mac}")
             except Exception as e:
-                log(f"  Error getting info from {ip}: {e}")
+                logger.warning(f"  Error getting info from {ip}: {e}")
 
         return result
     except ImportError:
-        log("ERROR: python-kasa not installed. Run: pip install python-kasa")
+        logger.error("python-kasa not installed. Run: pip install python-kasa")
         return {}
     except Exception as e:
-        log(f"ERROR during discovery: {e}")
+        logger.error(f"Discovery failed: {e}")
         return {}
 
 
 def update_config_entries(discovered: dict) -> bool:
     """Update HA config_entries with discovered IPs."""
     if not HA_CONFIG_PATH.exists():
-        log(f"ERROR: Config file not found: {HA_CONFIG_PATH}")
+        logger.error(f"Config file not found: {HA_CONFIG_PATH}")
         return False
 
     try:
         with open(HA_CONFIG_PATH) as f:
             config = json.load(f)
     except Exception as e:
-        log(f"ERROR reading config: {e}")
+        logger.error(f"Could not read config: {e}")
         return False
 
     updated = False
@@ -98,13 +97,13 @@ def update_config_entries(discovered: dict) -> bool:
         if unique_id in discovered:
             new_ip = discovered[unique_id]["ip"]
             if new_ip != current_ip:
-                log(f"Updating {title}: {current_ip} -> {new_ip}")
+                logger.info(f"Updating {title}: {current_ip} -> {new_ip}")
                 entry["data"]["host"] = new_ip
                 updated = True
             else:
-                log(f"No change for {title}: {current_ip}")
+                logger.info(f"No change for {title}: {current_ip}")
         else:
-            log(f"WARNING: {title} (MAC: {unique_id}) not discovered on network")
+            logger.warning(f"{title} (MAC: {unique_id}) not discovered on network")
 
     if updated:
         try:
@@ -118,13 +117,13 @@ def update_config_entries(discovered: dict) -> bool:
             with open(HA_CONFIG_PATH, "w") as f:
                 json.dump(config, f, indent=2)
 
-            log(f"Config updated successfully (backup: {backup_path})")
+            logger.info(f"Config updated successfully (backup: {backup_path})")
             return True
         except Exception as e:
-            log(f"ERROR writing config: {e}")
+            logger.error(f"Could not write config: {e}")
             return False
     else:
-        log("No IP changes needed")
+        logger.info("No IP changes needed")
         return False
 
 
@@ -139,100 +138,97 @@ def get_tplink_entry_ids() -> list:
         return []
 
 
+@tracing.traced("wait_for_ha")
 async def wait_for_ha(timeout: int = 180) -> bool:
     """Wait for Home Assistant to be ready."""
-    import urllib.request
-    import urllib.error
-
-    log(f"Waiting for Home Assistant to be ready (max {timeout}s)...")
-    start = time.time()
+    logger.info(f"Waiting for Home Assistant to be ready (max {timeout}s)...")
+    if await ha_client.wait_until_ready(timeout=timeout):
+        logger.info("Home Assistant is ready")
+        return True
+    logger.warning("Home Assistant not ready within timeout")
+    return False
 
-    while time.time() - start < timeout:
-        try:
-            req = urllib.request.Request("http://localhost:8123/api/", method="GET")
-            with urllib.request.urlopen(req, timeout=5) as resp:
-                if resp.status in (200, 401):  # 401 = needs auth but HA is up
-                    log("Home Assistant is ready")
-                    return True
-        except Exception:
-            pass
-        await asyncio.sleep(5)
 
-    log("WARNING: Home Assistant not ready within timeout")
-    return False
+async def _reload_entry(ha, entry_id: str):
+    with tracing.span("reload_entry", entry_id=entry_id):
+        return await ha.call_service("homeassistant", "reload_config_entry", {"entry_id": entry_id})
 
 
 async def reload_tplink_integration(entry_ids: list):
-    """Reload TP-Link integration entries via HA API."""
-    import urllib.request
-    import urllib.error
-
+    """Reload TP-Link integration entries over HA's websocket API."""
     if not entry_ids:
-        log("No TP-Link entries to reload")
+        logger.info("No TP-Link entries to reload")
+        return
+
+    if not ha_client.HA_TOKEN:
+        logger.warning("HA_TOKEN not set - integration will use new IPs on next restart")
         return
 
     # Wait for HA to be fully up
     if not await wait_for_ha():
-        log("Skipping reload - HA not available")
+        logger.warning("Skipping reload - HA not available")
         return
 
     # Give HA a few more seconds to fully initialize integrations
-    await asyncio.sleep(10)
+    with tracing.span("settle"):
+        await asyncio.sleep(10)
 
-    for entry_id in entry_ids:
-        try:
-            # Use config entry reload endpoint
-            url = f"http://localhost:8123/api/config/config_entries/entry/{entry_id}/reload"
-            req = urllib.request.Request(url, method="POST")
-            req.add_header("Content-Type", "application/json")
-
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                if resp.status == 200:
-                    log(f"Reloaded TP-Link entry {entry_id}")
-                else:
-                    log(f"Reload returned status {resp.status}")
-        except urllib.error.HTTPError as e:
-            if e.code == 401:
-                log("HA API requires auth - integration will use new IPs on next restart")
-            else:
-                log(f"Failed to reload entry {entry_id}: {e}")
-        except Exception as e:
-            log(f"Error reloading {entry_id}: {e}")
+    try:
+        async with ha_client.HAClient() as ha:
+            # Queued together, so all reloads go out on the one connection at once
+            results = await asyncio.gather(
+                *(_reload_entry(ha, entry_id) for entry_id in entry_ids),
+                return_exceptions=True)
+    except Exception as e:
+        logger.warning(f"Could not connect to HA ({e}) - integration will use new IPs on next restart")
+        return
+
+    for entry_id, result in zip(entry_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to reload entry {entry_id}: {result}")
+        else:
+            logger.info(f"Reloaded TP-Link entry {entry_id}")
 
-    log("TP-Link reload complete (changes will apply on next HA restart if API auth required)")
+    logger.info("TP-Link reload complete")
 
 
 async def main():
     """Main entry point."""
-    log("=" * 50)
-    log("TP-Link IP Auto-Updater starting")
+    logger.info("TP-Link IP Auto-Updater starting")
 
     # Short wait for network interfaces
-    await asyncio.sleep(5)
+    with tracing.span("network_wait"):
+        await asyncio.sleep(5)
 
     # Discover devices (runs in parallel with HA startup)
-    discovered = await discover_tplink_devices(timeout=15)
+    with log_setup.phase(logger, "discovery"):
+        discovered = await discover_tplink_devices(timeout=15)
 
     if not discovered:
-        log("No TP-Link devices discovered. Will retry on next boot.")
-        log("=" * 50)
+        logger.info("No TP-Link devices discovered. Will retry on next boot.")
         return  # Don't exit with error - don't block anything
 
-    log(f"Discovered {len(discovered)} device(s)")
+    logger.info(f"Discovered {len(discovered)} device(s)")
 
     # Get entry IDs before updating config
     entry_ids = get_tplink_entry_ids()
 
     # Update config if needed
-    if update_config_entries(discovered):
+    with log_setup.phase(logger, "config_update"):
+        updated = update_config_entries(discovered)
+
+    if updated:
         # Reload integration (waits for HA, doesn't block boot)
-        await reload_tplink_integration(entry_ids)
+        with log_setup.phase(logger, "reload"):
+            await reload_tplink_integration(entry_ids)
     else:
-        log("IPs unchanged - no reload needed")
+        logger.info("IPs unchanged - no reload needed")
 
-    log("TP-Link IP Auto-Updater complete")
-    log("=" * 50)
+    logger.info("TP-Link IP Auto-Updater complete")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update Home Assistant's TP-Link entries with current IPs")
+    tracing.add_arguments(parser)
+    tracing.configure("tplink-ip-updater", parser.parse_args())
     asyncio.run(main())
@@ -0,0 +1,319 @@
+"""
+Phase timing for the homelab scripts, exported as a Chrome trace.
+
+Wrap the phases worth seeing in spans:
+
+    import tracing
+
+    with tracing.span("discovery", timeout=15):
+        ...
+
+    @tracing.traced("login")
+    async def login(page): ...
+
+Tracing is off unless enabled, and then span() returns one shared no-op
+object, so instrumented code costs a global lookup per span. Enable it with
+TRACE_FILE (a path, or "1" for <LOG_DIR>/traces/<script>-<timestamp>.json) or
+a script's --trace [PATH] flag. The file is written on exit (SIGTERM included)
+and on flush(). Open it at https://ui.perfetto.dev or chrome://tracing. Spans
+are drawn per thread, and per asyncio task inside the event loop, so
+concurrent awaits do not overlap on one track.
+
+TRACE_PROFILE=<hz> or --profile [HZ] also starts a sampling profiler that
+records the stacks of every thread at that rate. They go to <trace>.folded in
+collapsed-stack format, for speedscope or flamegraph.pl.
+"""
+
+import asyncio
+import atexit
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+
+# ============================================
+# CONFIGURATION
+# ============================================
+
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+TRACE_PROFILE = os.environ.get("TRACE_PROFILE", "")
+TRACE_DIR = Path(os.environ.get("LOG_DIR", "/opt/homelab/logs")) / "traces"
+MAX_EVENTS = 200000          # Oldest events are dropped past this (long-running services)
+MAX_TRACK_NAMES = 1024       # Track names kept before pruning ones no longer in use
+DEFAULT_PROFILE_HZ = 100
+
+_recorder = None
+
+# ============================================
+# RECORDER
+# ============================================
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("recorder", "name", "cat", "args", "start", "tid")
+
+    def __init__(self, recorder, name: str, cat: str, args: dict):
+        self.recorder = recorder
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.tid = self.recorder.tid()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.recorder.complete(self.name, self.cat, self.start, end, self.tid, self.args)
+        return False
+
+    def set(self, **args):
+        """Attach result details (counts, sizes) to the span before it ends."""
+        self.args.update(args)
+
+
+class Recorder:
+    def __init__(self, path: Path, script: str):
+        self.path = path
+        self.script = script
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+        self.started = datetime.now().astimezone().isoformat(timespec="seconds")
+        self.events = deque(maxlen=MAX_EVENTS)
+        # asyncio task / thread ident -> small track id. Tasks are weak keys:
+        # a service creates one per message, and must not keep them all alive
+        self.task_tracks = weakref.WeakKeyDictionary()
+        self.thread_tracks = {}
+        self.track_names = {}
+        self.next_track = 1
+        self.prune_at = MAX_TRACK_NAMES
+        self.profiler = None
+        self.lock = threading.Lock()
+
+    def tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        tracks, key = (self.task_tracks, task) if task is not None else \
+            (self.thread_tracks, threading.get_ident())
+        track = tracks.get(key)
+        if track is None:
+            with self.lock:
+                track = tracks.get(key)
+                if track is None:
+                    track = tracks[key] = self.next_track
+                    self.next_track += 1
+                    if task is not None:
+                        self.track_names[track] = f"{threading.current_thread().name}: {task.get_name()}"
+                    else:
+                        self.track_names[track] = threading.current_thread().name
+                    if len(self.track_names) >= self.prune_at:
+                        self._prune_track_names()
+        return track
+
+    def _prune_track_names(self):
+        """Forget names of tracks with no live task/thread and no retained events."""
+        used = set(self.task_tracks.values()) | set(self.thread_tracks.values())
+        used.update(event["tid"] for event in list(self.events))
+        self.track_names = {tid: name for tid, name in self.track_names.items() if tid in used}
+        self.prune_at = max(MAX_TRACK_NAMES, 2 * len(self.track_names))
+
+    def complete(self, name, cat, start, end, tid, args):
+        self.events.append({
+            "name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": tid,
+            "ts": (start - self.origin) / 1000, "dur": (end - start) / 1000, "args": args,
+        })
+
+    def counter(self, name, values):
+        self.events.append({
+            "name": name, "ph": "C", "pid": self.pid, "tid": 0,
+            "ts": (time.perf_counter_ns() - self.origin) / 1000, "args": values,
+        })
+
+    def write(self):
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+                     "args": {"name": self.script}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                      "args": {"name": name}} for tid, name in list(self.track_names.items())]
+        trace = {
+            "traceEvents": metadata + list(self.events),
+            "displayTimeUnit": "ms",
+            "otherData": {"script": self.script, "started": self.started},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(trace))
+        tmp.replace(self.path)
+        if self.profiler:
+            self.profiler.write(self.path.with_suffix(".folded"))
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples every other thread's Python stack at a fixed rate."""
+
+    def __init__(self, hz: float):
+        super().__init__(name="trace-profiler", daemon=True)
+        self.interval = 1 / hz
+        self.stacks = Counter()
+        self.stopping = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: Path):
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        path.write_text("\n".join(lines) + "\n")
+
+# ============================================
+# API
+# ============================================
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def span(name: str, cat: str = "phase", **args):
+    """Context manager timing a block; a no-op unless tracing is enabled."""
+    if _recorder is None:
+        return _NOOP
+    return Span(_recorder, name, cat, args)
+
+
+def traced(name: str = None, cat: str = "phase"):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(fn):
+        label = name or fn.__name__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*a, **kw):
+                if _recorder is None:
+                    return await fn(*a, **kw)
+                with Span(_recorder, label, cat, {}):
+                    return await fn(*a, **kw)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*a, **kw):
+                if _recorder is None:
+                    return fn(*a, **kw)
+                with Span(_recorder, label, cat, {}):
+                    return fn(*a, **kw)
+        return wrapper
+    return decorate
+
+
+def counter(name: str, **values):
+    """Record a counter sample (drawn as a graph track)."""
+    if _recorder is not None:
+        _recorder.counter(name, values)
+
+
+def flush():
+    """Write the trace so far; long-running services call this periodically."""
+    if _recorder is not None:
+        _recorder.write()
+
+
+def _on_sigterm(signum, frame):
+    sys.exit(128 + signum)
+
+
+def enable(script: str, path=None, profile_hz: float = None) -> Path:
+    """Start recording; the trace is written at exit. Returns the trace path."""
+    global _recorder
+    if _recorder is not None:
+        return _recorder.path
+    if not path or path in ("1", "auto"):
+        path = TRACE_DIR / f"{script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    _recorder = Recorder(Path(path), script)
+    if profile_hz:
+        _recorder.profiler = SamplingProfiler(profile_hz)
+        _recorder.profiler.start()
+    atexit.register(_finish)
+    # Services are stopped with SIGTERM, which skips atexit unless handled
+    if threading.current_thread() is threading.main_thread() and \
+            signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _on_sigterm)
+    return _recorder.path
+
+
+def _finish():
+    if _recorder.profiler:
+        _recorder.profiler.stopping.set()
+        _recorder.profiler.join(timeout=1)
+    try:
+        _recorder.write()
+    except OSError as e:
+        print(f"Could not write trace {_recorder.path}: {e}", file=sys.stderr)
+
+
+def add_arguments(parser):
+    """Add --trace / --profile to a script's argparse parser."""
+    parser.add_argument("--trace", nargs="?", const="auto", default=TRACE_FILE or None, metavar="PATH",
+                        help="Write a Chrome trace of the run (default path under $LOG_DIR/traces)")
+    parser.add_argument("--profile", nargs="?", type=float, const=DEFAULT_PROFILE_HZ, metavar="HZ",
+                        default=_profile_hz(TRACE_PROFILE),
+                        help=f"Also sample stacks at HZ (default {DEFAULT_PROFILE_HZ}) into <trace>.folded")
+
+
+def _profile_hz(value: str):
+    if not value or value == "0":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return DEFAULT_PROFILE_HZ
+
+
+def configure(script: str, args=None) -> Path:
+    """
+    Enable tracing from parsed --trace/--profile arguments, or from
+    TRACE_FILE/TRACE_PROFILE when the script has no argument parser.
+    Returns the trace path, or None when tracing stays off.
+    """
+    path = getattr(args, "trace", None) if args is not None else TRACE_FILE
+    profile_hz = getattr(args, "profile", None) if args is not None else _profile_hz(TRACE_PROFILE)
+    if profile_hz and not path:
+        path = "auto"
+    if not path:
+        return None
+    return enable(script, path, profile_hz)
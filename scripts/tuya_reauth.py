@@ -3,28 +3,41 @@
 Automate Tuya re-authentication in Home Assistant using Playwright
 """
 import asyncio
+import os
 import sys
-from playwright.async_api import async_playwright
+import ha_browser
+import ha_client
+import log_setup
 
-HA_URL = "http://192.168.x.x:8123"
+HA_URL = os.environ.get("HA_URL", "http://192.168.x.x:8123")
 HA_USER = "Person1"
 HA_PASSWORD = "YOUR_HA_PASSWORD"
 TUYA_EMAIL = "your-email@example.com"
 TUYA_PASSWORD = "YOUR_TUYA_PASSWORD"
 
+logger = log_setup.setup_logging("tuya_reauth", log_setup.LOG_DIR / "tuya_reauth.jsonl",
+                                console_format="%(message)s", rate_limit=None)
+
 async def reauth_tuya():
+    # Settled over the API when HA_TOKEN is set, without starting a browser
+    states = await ha_client.config_entry_states("tuya", HA_URL)
+    if states and all(state == "loaded" for state in states):
+        logger.info("All Tuya entries are loaded - nothing to re-authenticate")
+        return True
+
+    async_playwright = ha_browser.playwright()
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         context = await browser.new_context(viewport={"width": 1280, "height": 720})
         page = await context.new_page()
 
-        print("1. Navigating to Home Assistant...")
+        logger.info("1. Navigating to Home Assistant...")
         await page.goto(HA_URL)
         await page.wait_for_load_state("networkidle", timeout=15000)
 
         # HA Login
         if "auth" in page.url:
-            print("2. Logging into HA...")
+            logger.info("2. Logging into HA...")
             await page.wait_for_timeout(2000)
 
             await page.evaluate(f'''() => {{
@@ -50,19 +63,19 @@ async def reauth_tuya():
             await page.wait_for_timeout(4000)
 
             if "auth" in page.url:
-                print("   ERROR: HA login failed")
+                logger.error("   HA login failed")
                 await browser.close()
                 return False
-            print("   HA login successful!")
+            logger.info("   HA login successful!")
 
         # Navigate to Tuya integration
-        print("3. Navigating to Tuya integration...")
+        logger.info("3. Navigating to Tuya integration...")
         await page.goto(f"{HA_URL}/config/integrations/integration/tuya")
         await page.wait_for_timeout(3000)
         await page.screenshot(path="/tmp/tuya_page.png")
 
         # Click the 3-dot menu on the failed entry (right side)
-        print("4. Clicking 3-dot menu on failed entry...")
+        logger.info("4. Clicking 3-dot menu on failed entry...")
         # The 3-dot menu is at approximately x=1205, y=290 based on screenshot
         # Use coordinate click on the right side of the entry
         await page.mouse.click(1205, 290)
@@ -70,32 +83,32 @@ async def reauth_tuya():
         await page.screenshot(path="/tmp/tuya_menu_opened.png")
 
         # Try Reload first, then System options if needed
-        print("5. Trying Reload...")
+        logger.info("5. Trying Reload...")
         try:
             await page.click("text=Reload", timeout=3000)
-            print("   Clicked Reload")
+            logger.info("   Clicked Reload")
             await page.wait_for_timeout(5000)
             await page.screenshot(path="/tmp/tuya_after_reload.png")
         except Exception as e:
-            print(f"   Reload failed: {e}")
+            logger.warning(f"   Reload failed: {e}")
             # Try System options
-            print("   Trying System options...")
+            logger.info("   Trying System options...")
             try:
                 await page.click("text=System options", timeout=3000)
                 await page.wait_for_timeout(1000)
                 await page.screenshot(path="/tmp/tuya_system_options.png")
                 # Look for reconfigure here
                 await page.click("text=Reconfigure", timeout=3000)
-                print("   Clicked Reconfigure from System options")
+                logger.info("   Clicked Reconfigure from System options")
             except:
                 await page.screenshot(path="/tmp/tuya_no_reconfig.png")
-                print("   Could not find reconfigure option")
+                logger.warning("   Could not find reconfigure option")
 
         await page.wait_for_timeout(3000)
         await page.screenshot(path="/tmp/tuya_after_reconfig.png")
 
         # Now look for the Tuya OAuth page (should be in an iframe or new content)
-        print("6. Looking for Tuya login form...")
+        logger.info("6. Looking for Tuya login form...")
 
         # Check for iframe with tuya domain
         frames = page.frames
@@ -103,7 +116,7 @@ async def reauth_tuya():
         for frame in frames:
             if "tuya" in frame.url.lower() and "192.168" not in frame.url:
                 tuya_frame = frame
-                print(f"   Found Tuya OAuth frame: {frame.url[:60]}...")
+                logger.info(f"   Found Tuya OAuth frame: {frame.url[:60]}...")
                 break
 
         if tuya_frame:
@@ -112,30 +125,30 @@ async def reauth_tuya():
 
             # Look for inputs in the Tuya frame
             inputs = await tuya_frame.query_selector_all("input")
-            print(f"   Found {len(inputs)} inputs in Tuya frame")
+            logger.info(f"   Found {len(inputs)} inputs in Tuya frame")
 
             for inp in inputs:
                 inp_type = await inp.get_attribute("type")
                 if inp_type in ["text", "email", None]:
                     await inp.fill(TUYA_EMAIL)
-                    print(f"   Filled email")
+                    logger.info(f"   Filled email")
                 elif inp_type == "password":
                     await inp.fill(TUYA_PASSWORD)
-                    print(f"   Filled password")
+                    logger.info(f"   Filled password")
 
             # Click login button
             btn = await tuya_frame.query_selector("button")
             if btn:
                 await btn.click()
-                print("   Clicked Tuya login button")
+                logger.info("   Clicked Tuya login button")
                 await page.wait_for_timeout(5000)
         else:
-            print("   No Tuya OAuth frame found")
+            logger.warning("   No Tuya OAuth frame found")
             # Maybe it's a popup or in the main page
             await page.screenshot(path="/tmp/tuya_no_oauth.png")
 
         await page.screenshot(path="/tmp/tuya_final.png")
-        print("\n7. Done! Screenshots saved to /tmp/tuya_*.png")
+        logger.info("7. Done! Screenshots saved to /tmp/tuya_*.png")
 
         await page.wait_for_timeout(2000)
         await browser.close()